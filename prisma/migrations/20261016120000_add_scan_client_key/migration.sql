@@ -0,0 +1,3 @@
+-- AlterTable: Idempotenz-Schlüssel für offline erfasste Pi-Scans (Batch-Upload)
+ALTER TABLE "Scan" ADD COLUMN IF NOT EXISTS "clientKey" TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS "Scan_clientKey_key" ON "Scan"("clientKey");
@@ -0,0 +1,2 @@
+-- CreateIndex: Delta-Sync der Pi-Ticketspiegel nach (updatedAt, id) je Mandant
+CREATE INDEX IF NOT EXISTS "Ticket_accountId_updatedAt_id_idx" ON "Ticket"("accountId", "updatedAt", "id");
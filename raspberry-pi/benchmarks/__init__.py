@@ -0,0 +1 @@
+"""Latency benchmarks with simulated scanner, GPIO and server (python -m benchmarks.run)."""
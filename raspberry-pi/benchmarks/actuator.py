@@ -0,0 +1,163 @@
+"""
+Actuator sequencer check – relay/LED timeouts, buzzer preemption, fixed thread count.
+
+Drives RelayControllers (timestamping fake GPIO) on one shared Sequencer:
+  Timeout   grant → relay off after `duration`; lag = off - (on + duration)
+  Batch     relay + both LEDs of a grant in one backend write (one ioctl on gpiochip)
+  Burst     many grant/deny on several lanes – thread count must not grow
+  Stale     grant → NOT-AUF: the grant's close timeout must not close the relay;
+            grant → deny: green LED off at once, red stays for the deny time
+  Tone      decision tone cuts off a scan beep at once; a scan beep during a
+            decision tone is dropped
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.actuator [--grants 50] [--lanes 4] [--duration 0.05]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import threading
+import time
+
+from emp_scanner import relay as relay_module
+from emp_scanner.relay import RelayController
+from emp_scanner.sequencer import Sequencer
+
+from benchmarks.fakes import install_fake_gpio
+
+RELAY_PIN, LED_GREEN, LED_RED, BUZZER = 24, 22, 23, 18
+
+
+def _controller(seq: Sequencer, lane: int, duration: float) -> RelayController:
+    off = 10 * lane
+    return RelayController(RELAY_PIN + off, LED_GREEN + off, LED_RED + off, BUZZER + off,
+                           duration=duration, sequencer=seq)
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+def run(grants: int, lanes: int, duration: float) -> int:
+    gpio = install_fake_gpio()
+    relay_module.DENY_LED_SECONDS = duration * 2
+    seq = Sequencer()
+    relays = [_controller(seq, i, duration) for i in range(lanes)]
+    failures = []
+    try:
+        # ─── Timeout ──────────────────────────────────────────────────────────
+        relay = relays[0]
+        lags = []
+        for _ in range(grants):
+            t_on = relay.grant()
+            time.sleep(duration + 0.02)
+            offs = [t for t, p, v in gpio.transitions if p == RELAY_PIN and not v and t > t_on]
+            if not offs:
+                failures.append("Timeout: Relais nicht geschlossen")
+                break
+            lags.append(offs[0] - (t_on + duration))
+
+        w0 = gpio.writes
+        relay.grant()
+        writes_grant = gpio.writes - w0
+        if writes_grant != 1:
+            failures.append(f"Batch: Freigabe schreibt {writes_grant}× statt einmal (Relais + LEDs)")
+        time.sleep(duration + 0.02)
+
+        # ─── Burst ────────────────────────────────────────────────────────────
+        threads_before = threading.active_count()
+        t0 = time.monotonic()
+        for n in range(grants * lanes):
+            r = relays[n % lanes]
+            if n % 3:
+                r.grant()
+            else:
+                r.deny()
+            r.scan_beep()
+        burst_ms = (time.monotonic() - t0) * 1000
+        threads_peak = threading.active_count()
+        time.sleep(duration * 3 + 1.0)
+        if threads_peak > threads_before:
+            failures.append(f"Burst: Threads {threads_before} → {threads_peak}")
+        for i in range(lanes):
+            if gpio.state.get(RELAY_PIN + 10 * i):
+                failures.append(f"Burst: Relais #{i + 1} nach dem Burst noch offen")
+
+        # ─── Stale ────────────────────────────────────────────────────────────
+        relay.grant()
+        time.sleep(duration / 2)
+        relay.emergency_open()
+        time.sleep(duration * 2)
+        if not gpio.state.get(RELAY_PIN):
+            failures.append("Stale: Freigabe-Timeout hat NOT-AUF geschlossen")
+        relay.close()
+
+        relay.grant()
+        relay.deny()
+        if gpio.state.get(LED_GREEN) or not gpio.state.get(RELAY_PIN):
+            failures.append("Stale: Ablehnung nach Freigabe – LEDs/Relais falsch")
+        time.sleep(duration * 1.5)
+        if not gpio.state.get(LED_RED):
+            failures.append("Stale: Freigabe-Timeout hat rote LED der Ablehnung gelöscht")
+        if gpio.state.get(RELAY_PIN):
+            failures.append("Stale: Relais der Freigabe nicht geschlossen")
+        time.sleep(duration * 2)
+        if gpio.state.get(LED_RED):
+            failures.append("Stale: rote LED nicht zurückgesetzt")
+
+        # ─── Tone ─────────────────────────────────────────────────────────────
+        time.sleep(0.6)
+        relay.scan_beep()
+        time.sleep(0.05)
+        t_grant = relay.grant()
+        time.sleep(0.02)
+        cut = [t for t, f in gpio.tones(BUZZER) if f == 523 and t >= t_grant]
+        cut_ms = (cut[0] - t_grant) * 1000 if cut else None
+        if cut_ms is None:
+            failures.append("Ton: Freigabeton hat Scan-Piep nicht abgelöst")
+
+        time.sleep(0.1)
+        relay.scan_beep()
+        time.sleep(0.6)
+        if any(f == 1500 for t, f in gpio.tones(BUZZER) if t > t_grant):
+            failures.append("Ton: Scan-Piep hat Freigabeton unterbrochen")
+        if gpio.tones(BUZZER)[-1][1] != 0:
+            failures.append("Ton: Buzzer nach Freigabeton nicht gestoppt")
+
+        stats = seq.stats()
+    finally:
+        for r in relays:
+            r.cleanup()
+        seq.stop()
+
+    print(f"{lanes} Durchgänge, ein Aktor-Thread, Relais-Dauer {duration * 1000:.0f} ms")
+    print(f"Timeout-Verzug   p50 {_pct(lags, 0.5):6.2f} ms   p99 {_pct(lags, 0.99):6.2f} ms   "
+          f"max {max(lags, default=0) * 1000:6.2f} ms")
+    print(f"Schreibzugriffe  {writes_grant} je Freigabe (Relais + grün + rot in einem Batch)")
+    print(f"Burst            {grants * lanes} Entscheidungen + Scan-Pieps abgesetzt in {burst_ms:.1f} ms, "
+          f"Threads {threads_before} → {threads_peak}")
+    print(f"Ton abgelöst     {cut_ms if cut_ms is not None else float('nan'):6.2f} ms nach Freigabe, "
+          f"Abbrüche {sum(r.preempted for r in relays)}")
+    print(f"Sequencer        ausgeführt {stats['executed']}, verworfen {stats['dropped']}, "
+          f"max. Verzug {stats['max_lag_ms']} ms")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Aktor-Sequencer prüfen")
+    parser.add_argument("--grants", type=int, default=50)
+    parser.add_argument("--lanes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.grants, args.lanes, args.duration)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Code index check – lookup latency and memory of the mmap index vs. the SQLite code indexes.
+
+Fills a temporary TicketStore with synthetic tickets (each with QR code, RFID code,
+barcode and uuid), builds the index and verifies that every code, its whitespace
+variant and codes changed after the build (overlay) resolve to the right ticket.
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.code_index [--tickets 300000] [--lookups 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from emp_scanner.ticket_store import TicketStore
+
+PAGE = 5000
+
+
+def _ticket(i: int) -> dict:
+    return {
+        "id": i, "name": f"Ticket {i}", "qrCode": f"QR{i:09d}", "rfidCode": f"{i * 7919:012X}",
+        "barcode": f"4{i:012d}", "uuid": str(uuid.UUID(int=i)), "status": "VALID",
+        "validityType": "DATE_RANGE", "areaIds": [],
+    }
+
+
+def _rss_kb() -> dict:
+    """RssAnon (Python-Heap) und RssFile (gemappte Seiten, vom Kernel jederzeit verwerfbar)."""
+    rss = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                key, value = line.split()[:2]
+                rss[key.rstrip(":")] = int(value)
+    return rss
+
+
+def _lookup_us(store: TicketStore, codes: list[str]) -> float:
+    start = time.perf_counter()
+    for c in codes:
+        store.lookup(c)
+    return (time.perf_counter() - start) / len(codes) * 1e6
+
+
+def run(tickets: int, lookups: int) -> int:
+    failures = []
+    workdir = tempfile.mkdtemp(prefix="emp-index-")
+    try:
+        store = TicketStore(os.path.join(workdir, "tickets.db"))
+        progress = store.begin_snapshot({"device": {}, "cursor": None})
+        for start in range(1, tickets + 1, PAGE):
+            store.add_snapshot_page(progress, [_ticket(i) for i in range(start, min(start + PAGE, tickets + 1))])
+        t0 = time.perf_counter()
+        store.finish_snapshot(progress)
+        finish_ms = (time.perf_counter() - t0) * 1000
+        size = os.path.getsize(store.index_path)
+
+        rng = random.Random(1)
+        sample = [rng.randint(1, tickets) for _ in range(lookups)]
+        fields = ("qrCode", "rfidCode", "barcode", "uuid")
+        codes = [_ticket(i)[rng.choice(fields)] for i in sample]
+        misses = [f"UNBEKANNT{i}" for i in range(lookups)]
+
+        rss = _rss_kb()
+        index_hit = _lookup_us(store, codes)
+        index_miss = _lookup_us(store, misses)
+        rss_index = {k: v - rss.get(k, 0) for k, v in _rss_kb().items()}
+        for i, c in zip(sample[:2000], codes[:2000]):
+            if (store.lookup(c) or {}).get("id") != i:
+                failures.append(f"Index: {c} nicht gefunden")
+                break
+        spaced = " " + codes[0][:4] + " " + codes[0][4:] + " "
+        if (store.lookup(spaced) or {}).get("id") != sample[0]:
+            failures.append("Normalisierung: Code mit Leerzeichen nicht gefunden")
+
+        # Änderungen nach dem Build: neuer Code, gelöschtes Ticket, neues Ticket
+        changed = dict(_ticket(5), qrCode="NEU-5")
+        store.apply_changes([changed, _ticket(tickets + 1)], [6], [], {"updatedAt": "x", "id": 0})
+        if store.lookup("QR000000005") or (store.lookup("NEU-5") or {}).get("id") != 5:
+            failures.append("Overlay: geänderter Code falsch aufgelöst")
+        if store.lookup("QR000000006"):
+            failures.append("Overlay: gelöschtes Ticket noch gefunden")
+        if (store.lookup(_ticket(tickets + 1)["barcode"]) or {}).get("id") != tickets + 1:
+            failures.append("Overlay: neues Ticket nicht gefunden")
+        t0 = time.perf_counter()
+        store.rebuild_index()
+        rebuild_ms = (time.perf_counter() - t0) * 1000
+        if store.lookup("QR000000005") or (store.lookup("NEU-5") or {}).get("id") != 5 or store.stats()["overlay"]:
+            failures.append("Neubau: Index weicht vom Bestand ab")
+
+        index = store._index
+        store._index = None
+        sql_hit = _lookup_us(store, codes)
+        sql_miss = _lookup_us(store, misses)
+        store._index = index
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Tickets: {tickets} ({tickets * 4} Codes), Index {size / 1024 / 1024:.1f} MB")
+    print(f"Snapshot-Übernahme inkl. Index: {finish_ms:.0f} ms, Neubau: {rebuild_ms:.0f} ms")
+    print(f"Lookup Treffer:  Index {index_hit:6.1f} µs   SQLite {sql_hit:6.1f} µs")
+    print(f"Lookup unbekannt: Index {index_miss:6.1f} µs   SQLite {sql_miss:6.1f} µs")
+    print(f"RSS-Zuwachs durch {2 * lookups} Index-Lookups: anonym {rss_index.get('RssAnon', 0)} kB, "
+          f"gemappt {rss_index.get('RssFile', 0)} kB")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Code-Index gegen SQLite-Lookup messen")
+    parser.add_argument("--tickets", type=int, default=300000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.tickets, args.lookups)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Connection check – warm keep-alive connection, TLS resumption, DNS cache and deadlines.
+
+The stub server closes keep-alive connections after --idle-timeout seconds (like a
+load balancer) and adds --connect-delay once per new connection (handshake round
+trips of a real link). With openssl available it serves HTTPS with a throwaway
+self-signed certificate on "localhost", so DNS and TLS are part of the path.
+
+  Idle      scans with pauses longer than the idle timeout: without keepalive every
+            scan opens a new connection, with the keepalive job (conditional config
+            GET) the scan finds a warm connection
+  TLS       new connections offer the last session → resumed handshakes
+  DNS       one lookup for all connections
+  Deadline  unreachable server (accept queue full) → connect deadline of the scan;
+            hanging server → read deadline
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.connection [--scans 5] [--idle-timeout 1.0] [--connect-delay 0.05]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from emp_scanner import connection
+from emp_scanner.api_client import ApiClient
+from emp_scanner.connection import ConnectionManager
+
+from benchmarks.stub_server import StubServer
+
+DEADLINE = (0.3, 0.6)
+
+
+def _certificate(workdir: str) -> str | None:
+    """Self-signed certificate + key for localhost (PEM), None without openssl."""
+    key, cert = f"{workdir}/key.pem", f"{workdir}/cert.pem"
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                        "-nodes", "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+                        "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    with open(f"{workdir}/server.pem", "w") as out:
+        for path in (key, cert):
+            with open(path) as f:
+                out.write(f.read())
+    return cert
+
+
+def _client(server: StubServer, cafile: str | None, keepalive_idle: float) -> ApiClient:
+    manager = ConnectionManager(headers={"Authorization": "Bearer bench"}, pool_size=4,
+                                keepalive_idle=keepalive_idle, verify=cafile or True)
+    if cafile:
+        # REQUESTS_CA_BUNDLE o. ä. der Umgebung würde das Testzertifikat verdrängen
+        manager.session.trust_env = False
+        manager.session.verify = cafile
+    return ApiClient(server.url.replace("127.0.0.1", "localhost"), "bench", 1, connection=manager)
+
+
+def _idle_scans(server: StubServer, api: ApiClient, scans: int, gap: float, keepalive: bool) -> tuple[list, int]:
+    """Scans with pauses of gap seconds; (latencies, new connections during the scans)."""
+    stop = threading.Event()
+    job = None
+    if keepalive:
+        def _job():
+            while not stop.wait(api.connection.keepalive_idle / 3):
+                api.keepalive()
+        job = threading.Thread(target=_job, daemon=True)
+        job.start()
+    api.validate_scan("1000000")
+    latencies, connections = [], 0
+    try:
+        for i in range(scans):
+            time.sleep(gap)
+            before = server.connections
+            start = time.monotonic()
+            result = api.validate_scan(f"1{i:07d}")
+            latencies.append(time.monotonic() - start if result.get("granted") else None)
+            connections += server.connections - before
+    finally:
+        stop.set()
+        if job:
+            job.join()
+    return latencies, connections
+
+
+def _deadlines() -> tuple[float, float, str, str]:
+    """Elapsed time and outcome of a scan against an unreachable and a hanging server."""
+    # Voller Accept-Puffer: SYN wird verworfen, connect hängt bis zur Connect-Deadline
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    port = listener.getsockname()[1]
+    fill = []
+    for _ in range(3):
+        s = socket.socket()
+        s.setblocking(False)
+        s.connect_ex(("127.0.0.1", port))
+        fill.append(s)
+    time.sleep(0.1)
+    api = ApiClient(f"http://127.0.0.1:{port}", "bench", 1)
+    start = time.monotonic()
+    unreachable = api.validate_scan("1000000")
+    connect_elapsed = time.monotonic() - start
+    for s in fill + [listener]:
+        s.close()
+
+    server = StubServer(failure_mode="hang").start()
+    server.outage = True
+    try:
+        api = ApiClient(server.url, "bench", 1)
+        start = time.monotonic()
+        hanging = api.validate_scan("1000000")
+        read_elapsed = time.monotonic() - start
+    finally:
+        server.stop()
+    return connect_elapsed, read_elapsed, unreachable.get("message", ""), hanging.get("message", "")
+
+
+def _p50(values: list) -> float:
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] * 1000 if values else float("nan")
+
+
+def run(scans: int, idle_timeout: float, connect_delay: float) -> int:
+    failures = []
+    workdir = tempfile.mkdtemp(prefix="emp-connection-")
+    cafile = _certificate(workdir)
+    gap = idle_timeout * 1.5
+    results = {}
+    try:
+        for keepalive in (False, True):
+            server = StubServer(tickets=[], certfile=f"{workdir}/server.pem" if cafile else None).start()
+            server.idle_timeout = idle_timeout
+            server.connect_delay = connect_delay
+            api = _client(server, cafile, keepalive_idle=idle_timeout / 2 if keepalive else 0)
+            try:
+                latencies, connections = _idle_scans(server, api, scans, gap, keepalive)
+                results[keepalive] = (latencies, connections, api.connection.stats())
+            finally:
+                api.connection.close()
+                server.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    saved = dict(connection.DEADLINES)
+    connection.DEADLINES["scan"] = DEADLINE
+    try:
+        connect_elapsed, read_elapsed, connect_msg, read_msg = _deadlines()
+    finally:
+        connection.DEADLINES.update(saved)
+
+    cold, warm = results[False], results[True]
+    if None in cold[0] + warm[0]:
+        failures.append("Scan ohne Freigabe")
+    if cold[1] < scans:
+        failures.append(f"Ohne Keepalive: nur {cold[1]} neue Verbindungen bei {scans} Scans – Stub schließt nicht")
+    if warm[1]:
+        failures.append(f"Keepalive: {warm[1]} Scans mussten neu verbinden")
+    if not _p50(warm[0]) < _p50(cold[0]) - connect_delay * 1000 / 2:
+        failures.append("Keepalive: Scan-Latenz nicht kürzer")
+    if cafile and cold[2]["tls_resumed"] < cold[2]["tls_handshakes"] - 1:
+        failures.append(f"TLS: nur {cold[2]['tls_resumed']} von {cold[2]['tls_handshakes']} Handshakes fortgesetzt")
+    if cold[2]["dns_cache"]["misses"] != 1:
+        failures.append(f"DNS: {cold[2]['dns_cache']['misses']} Auflösungen statt 1")
+    if not DEADLINE[0] * 0.8 <= connect_elapsed < DEADLINE[0] + 0.3:
+        failures.append(f"Connect-Deadline: {connect_elapsed:.2f} s statt {DEADLINE[0]} s")
+    if not DEADLINE[1] * 0.8 <= read_elapsed < DEADLINE[1] + 0.3:
+        failures.append(f"Read-Deadline: {read_elapsed:.2f} s statt {DEADLINE[1]} s")
+
+    print(f"{'HTTPS' if cafile else 'HTTP (ohne openssl)'} über localhost, Stub schließt nach {idle_timeout:.1f} s "
+          f"Ruhe, +{connect_delay * 1000:.0f} ms je neue Verbindung, {scans} Scans im Abstand {gap:.1f} s")
+    for label, (latencies, connections, stats) in (("ohne Keepalive", cold), ("mit Keepalive", warm)):
+        tls = stats.get("tls", {})
+        print(f"{label:15} Scan p50 {_p50(latencies):6.1f} ms   neue Verbindungen {connections}/{scans}   "
+              f"Handshakes {stats['connects']} (TLS fortgesetzt {stats['tls_resumed']}, "
+              f"TLS Ø {tls.get('avg', 0)} ms)   Proben {stats['probes']}   "
+              f"DNS {stats['dns_cache']['misses']} Auflösung(en), {stats['dns_cache']['hits']} aus dem Cache")
+    print(f"Deadlines (Test {DEADLINE[0]}/{DEADLINE[1]} s)  nicht erreichbar → {connect_elapsed:.2f} s, "
+          f"hängt → {read_elapsed:.2f} s")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Warme Verbindung, TLS-Fortsetzung und Deadlines prüfen")
+    parser.add_argument("--scans", type=int, default=5)
+    parser.add_argument("--idle-timeout", type=float, default=1.0)
+    parser.add_argument("--connect-delay", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    return run(args.scans, args.idle_timeout, args.connect_delay)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Door contact check – relay closes when the door has cycled, tailgating and forced opening.
+
+Drives a RelayController with DoorMonitor on the simulated GPIO backend; the
+simulated door contact and exit button fire edges like the hardware would.
+
+  Relock     grant → door opens → door closes: relay-open time vs relay_duration
+  Tailgate   second opening after one grant → one tailgate event
+  Forced     opening without grant → forced; during NOT-AUF → nothing
+  Exit       exit button → relay opens without LED, exit event
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.door [--passages 10] [--duration 1.0] [--open-after 0.1] [--open-for 0.2]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+
+from emp_scanner.door import DoorMonitor
+from emp_scanner.relay import RelayController
+from emp_scanner.sequencer import Sequencer
+
+from benchmarks.fakes import install_fake_gpio
+
+RELAY_PIN, LED_GREEN, LED_RED, BUZZER = 24, 22, 23, 18
+CONTACT, EXIT = 17, 4
+WINDOW = 0.5
+
+
+def _relay_open_time(gpio, t_on: float) -> float | None:
+    offs = [t for t, p, v in gpio.transitions if p == RELAY_PIN and not v and t > t_on]
+    return offs[0] - t_on if offs else None
+
+
+def run(passages: int, duration: float, open_after: float, open_for: float) -> int:
+    gpio = install_fake_gpio()
+    seq = Sequencer()
+    relay = RelayController(RELAY_PIN, LED_GREEN, LED_RED, BUZZER, duration=duration, sequencer=seq)
+    events: list[tuple] = []
+    door = DoorMonitor(relay, contact_pin=CONTACT, exit_pin=EXIT, tailgate_window=WINDOW, debounce=0,
+                       on_event=lambda *e: events.append(e))
+    gpio.set_input(CONTACT, False)   # Tür zu
+    door.start()
+    failures = []
+
+    def cycle():
+        gpio.set_input(CONTACT, True)
+        time.sleep(open_for)
+        gpio.set_input(CONTACT, False)
+
+    try:
+        # ─── Relock ───────────────────────────────────────────────────────────
+        open_times = []
+        for n in range(passages):
+            t_on = relay.grant()
+            door.granted(f"T{n}", n, t_on)
+            time.sleep(open_after)
+            cycle()
+            time.sleep(WINDOW + 0.05)
+            open_times.append(_relay_open_time(gpio, t_on))
+        if None in open_times:
+            failures.append("Relock: Relais nach Türzyklus nicht geschlossen")
+            open_times = [t for t in open_times if t is not None]
+        elif max(open_times) > open_after + open_for + 0.05:
+            failures.append(f"Relock: Relais {max(open_times) * 1000:.0f} ms offen statt nach dem Türzyklus")
+        if events:
+            failures.append(f"Relock: unerwartete Ereignisse {events}")
+
+        # ─── Tailgate ─────────────────────────────────────────────────────────
+        events.clear()
+        t_on = relay.grant()
+        door.granted("TAIL", 42, t_on)
+        cycle()
+        time.sleep(0.05)
+        cycle()
+        time.sleep(WINDOW + 0.05)
+        if [(e[0], e[2]) for e in events] != [("tailgate", 42)]:
+            failures.append(f"Tailgate: erwartet ein Ereignis für Ticket 42, erhalten {events}")
+
+        # ─── Forced / NOT-AUF ─────────────────────────────────────────────────
+        events.clear()
+        cycle()
+        door.free = True
+        cycle()
+        door.free = False
+        if [e[0] for e in events] != ["forced"]:
+            failures.append(f"Forced: erwartet ein Ereignis (nicht bei NOT-AUF), erhalten {events}")
+
+        # ─── Exit ─────────────────────────────────────────────────────────────
+        events.clear()
+        leds_before = dict(gpio.state)
+        gpio.set_input(EXIT, False)
+        gpio.set_input(EXIT, True)
+        exit_on = gpio.state.get(RELAY_PIN)
+        cycle()
+        time.sleep(0.02)
+        if not exit_on or gpio.state.get(LED_GREEN) != leds_before.get(LED_GREEN):
+            failures.append("Exit: Relais nicht geöffnet oder LED geschaltet")
+        if gpio.state.get(RELAY_PIN):
+            failures.append("Exit: Relais nach Durchgang nicht geschlossen")
+        if [e[0] for e in events] != ["exit"]:
+            failures.append(f"Exit: erwartet Ausgangstaster-Ereignis, erhalten {events}")
+
+        stats = door.stats()
+    finally:
+        door.close()
+        relay.cleanup()
+        seq.stop()
+
+    avg = sum(open_times) / len(open_times) if open_times else 0.0
+    print(f"Relais-Dauer {duration * 1000:.0f} ms, Tür öffnet nach {open_after * 1000:.0f} ms "
+          f"für {open_for * 1000:.0f} ms")
+    print(f"Relais offen     Ø {avg * 1000:7.1f} ms (ohne Türkontakt {duration * 1000:.0f} ms), "
+          f"max. Durchsatz {1 / max(avg, 1e-3):.1f}/s statt {1 / duration:.1f}/s")
+    print(f"Türzyklus        Ø {stats['cycle_ms']} ms, eingespart {stats['relay_saved_ms']} ms gesamt")
+    print(f"Ereignisse       Durchgänge {stats['passages']}, Mehrfach {stats['tailgates']}, "
+          f"ohne Freigabe {stats['forced']}, Ausgangstaster {stats['exits']}")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Türkontakt und Mehrfachdurchgang prüfen")
+    parser.add_argument("--passages", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=1.0)
+    parser.add_argument("--open-after", type=float, default=0.1)
+    parser.add_argument("--open-for", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.passages, args.duration, args.open_after, args.open_for)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Hardware fakes for benchmarks: timestamping GPIO and synthetic evdev input.
+
+install_fake_gpio  emp_scanner.gpio.SimulatedGpio as backend; records (time.monotonic, pin, state)
+                   per write and (time.monotonic, pin, freq) per buzzer PWM change
+FakeInputDevice  drop-in for evdev.InputDevice; type_code() injects key events
+                 exactly like a HID scanner in keyboard mode (key down/up + Enter).
+                 Works with the reader thread (read_loop) and with loop.add_reader
+                 (fd is a pipe that becomes readable when events are queued).
+FakeInputDir     temporary /dev/input + /sys/class/input; plug()/unplug() create and
+                 remove nodes like udev, so inotify hotplug detection sees them.
+FakeSerialScanner  serial reader on a pty: SerialScannerInput opens the slave side,
+                   type_code() writes code + terminator to the master.
+"""
+from __future__ import annotations
+
+import errno
+import os
+import queue
+import shutil
+import time
+from types import SimpleNamespace
+
+from emp_scanner import gpio as gpio_module
+from emp_scanner import hotplug as hotplug_module
+from emp_scanner import scanner as scanner_module
+from emp_scanner.gpio import SimulatedGpio
+from emp_scanner.scanner import KEY_MAP, KEY_MAP_SHIFT
+
+EV_KEY = 1
+EV_REL = 2
+KEY_ENTER = 28
+KEY_LEFTSHIFT = 42
+
+
+def install_fake_gpio() -> SimulatedGpio:
+    """Simulated GPIO as process-wide backend (before creating RelayControllers)."""
+    gpio = SimulatedGpio()
+    gpio_module.set_backend(gpio)
+    return gpio
+
+
+class _Event:
+    __slots__ = ("type", "code", "value", "sec", "usec")
+
+    def __init__(self, type_: int, code: int, value: int):
+        self.type = type_
+        self.code = code
+        self.value = value
+        # Zeitstempel wie vom Kernel (evdev InputEvent.sec/usec)
+        t = time.time()
+        self.sec = int(t)
+        self.usec = int((t - self.sec) * 1e6)
+
+
+class _Ecodes:
+    EV_KEY = EV_KEY
+    EV_REL = EV_REL
+
+
+def _reverse_keymap() -> dict[str, tuple[int, bool]]:
+    out = {}
+    for code, char in KEY_MAP.items():
+        out[char] = (code, False)
+    for code, char in KEY_MAP_SHIFT.items():
+        out.setdefault(char, (code, True))
+    for code, char in KEY_MAP.items():
+        if char.isalpha():
+            out.setdefault(char.upper(), (code, True))
+    return out
+
+
+class FakeInputDevice:
+    """Synthetic HID scanner. One instance per path; type_code() is thread-safe."""
+
+    devices: dict[str, "FakeInputDevice"] = {}
+
+    def __init__(self, path: str, name: str = "Bench HID Scanner", vendor: int = 0x1EAB,
+                 product: int = 0x0D10, phys: str = "usb-bench-1.3/input0", mouse: bool = False):
+        self.path = path
+        self.name = name
+        self.phys = phys
+        self.info = SimpleNamespace(vendor=vendor, product=product, bustype=3)
+        self.mouse = mouse
+        self._events: queue.Queue = queue.Queue()
+        self._keys = _reverse_keymap()
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        self._disconnected = False
+        FakeInputDevice.devices[path] = self
+
+    @property
+    def fd(self) -> int:
+        return self._rfd
+
+    @classmethod
+    def open(cls, path: str) -> "FakeInputDevice":
+        return cls.devices.get(path) or cls(path)
+
+    @classmethod
+    def existing(cls, path: str) -> "FakeInputDevice":
+        """Like evdev.InputDevice(path): fails for nodes that are not plugged in."""
+        dev = cls.devices.get(path)
+        if dev is None:
+            raise FileNotFoundError(errno.ENOENT, "Kein Gerät", path)
+        return dev
+
+    def capabilities(self, verbose: bool = False) -> dict:
+        caps = {EV_KEY: sorted(KEY_MAP) + [KEY_ENTER, KEY_LEFTSHIFT]}
+        if self.mouse:
+            caps[EV_REL] = [0, 1]
+        return caps
+
+    def grab(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self):
+        """Non-blocking like evdev: all queued events, BlockingIOError if none."""
+        try:
+            os.read(self._rfd, 4096)
+        except BlockingIOError:
+            pass
+        if self._disconnected:
+            raise OSError("Gerät getrennt")
+        events = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event is not None:
+                events.append(event)
+        if not events:
+            raise BlockingIOError()
+        return events
+
+    def read_loop(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                raise OSError("Gerät getrennt")
+            yield event
+
+    def type_code(self, code: str, inter_key: float = 0.0, enter: bool = True) -> float:
+        """
+        Inject key events for code (+ Enter unless enter=False, like a reader without
+        suffix). With inter_key every key is delivered on its own, like a slow
+        reader or a person typing. Returns time.monotonic() of the first key.
+        """
+        t_first = time.monotonic()
+        for char in code:
+            scancode, shift = self._keys[char]
+            if shift:
+                self._events.put(_Event(EV_KEY, KEY_LEFTSHIFT, 1))
+            self._events.put(_Event(EV_KEY, scancode, 1))
+            self._events.put(_Event(EV_KEY, scancode, 0))
+            if shift:
+                self._events.put(_Event(EV_KEY, KEY_LEFTSHIFT, 0))
+            if inter_key:
+                os.write(self._wfd, b"x")
+                time.sleep(inter_key)
+        if enter:
+            self._events.put(_Event(EV_KEY, KEY_ENTER, 1))
+            self._events.put(_Event(EV_KEY, KEY_ENTER, 0))
+        os.write(self._wfd, b"x")
+        return t_first
+
+    def disconnect(self):
+        self._disconnected = True
+        self._events.put(None)
+        os.write(self._wfd, b"x")
+
+
+def install_fake_evdev():
+    """Route ScannerInput's evdev access to FakeInputDevice."""
+    scanner_module.HAS_EVDEV = True
+    scanner_module.InputDevice = FakeInputDevice.existing
+
+
+class FakeInputDir:
+    """/dev/input and /sys/class/input below root. plug() writes sysfs first, then the node (like udev)."""
+
+    def __init__(self, root: str):
+        self.dev_dir = os.path.join(root, "input")
+        self.sys_dir = os.path.join(root, "sys")
+        os.makedirs(self.dev_dir, exist_ok=True)
+        os.makedirs(self.sys_dir, exist_ok=True)
+        hotplug_module.SYSFS_INPUT = self.sys_dir
+        self._next = 0
+
+    def plug(self, **kwargs) -> FakeInputDevice:
+        """New device under the next free eventN (kwargs: name, vendor, product, phys, mouse)."""
+        name = f"event{self._next}"
+        self._next += 1
+        path = os.path.join(self.dev_dir, name)
+        dev = FakeInputDevice(path, **kwargs)
+        base = os.path.join(self.sys_dir, name, "device")
+        os.makedirs(os.path.join(base, "id"))
+        for rel, value in (("id/vendor", f"{dev.info.vendor:04x}"), ("id/product", f"{dev.info.product:04x}"),
+                           ("phys", dev.phys), ("name", dev.name)):
+            with open(os.path.join(base, rel), "w") as f:
+                f.write(value + "\n")
+        with open(path, "w"):
+            pass
+        return dev
+
+    def unplug(self, dev: FakeInputDevice):
+        FakeInputDevice.devices.pop(dev.path, None)
+        os.unlink(dev.path)
+        shutil.rmtree(os.path.join(self.sys_dir, os.path.basename(dev.path)), ignore_errors=True)
+        dev.disconnect()
+    scanner_module.ecodes = _Ecodes
+
+
+class FakeSerialScanner:
+    """Serial-mode reader on a pseudo terminal. link: optional symlink (e.g. <dir>/ttyACM0) for auto-detection."""
+
+    def __init__(self, link: str | None = None, terminator: bytes = b"\r\n"):
+        self.master, self._slave = os.openpty()
+        self.path = os.ttyname(self._slave)
+        self.terminator = terminator
+        self.link = link
+        if link:
+            os.symlink(self.path, link)
+
+    def write(self, data: bytes):
+        os.write(self.master, data)
+
+    def type_code(self, code: str, terminator: bool = True) -> float:
+        """Code in one write, like a reader with a full USB packet. Returns time.monotonic() before the write."""
+        t = time.monotonic()
+        self.write(code.encode() + (self.terminator if terminator else b""))
+        return t
+
+    def unplug(self):
+        """Abziehen: Link entfernen, pty schließen (Leser sieht EIO)."""
+        if self.link:
+            os.unlink(self.link)
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
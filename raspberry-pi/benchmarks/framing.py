@@ -0,0 +1,115 @@
+"""
+Scan framing check – Enter, fixed length and idle gap, keyboard input rejected.
+
+Feeds synthetic key events through ScannerInput (event-loop mode) and measures
+last key → code emitted for each way a frame can end. Typing at human speed and
+single stray keys must never produce a scan.
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.framing [--codes 20] [--frame-gap 0.1]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+from emp_scanner.scanner import ScannerInput
+
+from benchmarks.fakes import FakeInputDevice, install_fake_evdev
+
+SCANNER_KEY = 0.002   # s je Taste (schneller HID-Scanner)
+HUMAN_KEY = 0.07      # s je Taste (schnelles Tippen, unter frame_gap)
+
+
+def _collect(scans: list, count: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(scans) >= count:
+            return True
+        time.sleep(0.001)
+    return False
+
+
+def run(codes: int, frame_gap: float) -> int:
+    install_fake_evdev()
+    failures = []
+    lines = []
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    cases = (
+        ("Enter", {}, {"enter": True}),
+        ("Feste Länge", {"frame_length": 10}, {"enter": False}),
+        ("Pause (ohne Enter)", {}, {"enter": False}),
+    )
+    try:
+        for i, (label, framing, typing) in enumerate(cases):
+            path = f"/dev/input/framing-{i}"
+            dev = FakeInputDevice.open(path)
+            scans: list[tuple[str, float]] = []
+            scanner = ScannerInput(lambda code, _t_first, _t_enter: scans.append((code, time.monotonic())),
+                                   device_path=path, timestamps=True, hotplug=False,
+                                   framing=dict(framing, frame_gap=frame_gap))
+            loop.call_soon_threadsafe(scanner.start, loop)
+            time.sleep(0.05)
+
+            latencies = []
+            expected = []
+            for n in range(codes):
+                code = f"Ab{n:08d}"[:10]
+                expected.append(code)
+                dev.type_code(code, SCANNER_KEY, **typing)
+                t_last = time.monotonic() - SCANNER_KEY   # type_code schläft nach jeder Taste
+                if not _collect(scans, n + 1, 2):
+                    failures.append(f"{label}: Code {code} nicht erkannt")
+                    break
+                latencies.append(scans[n][1] - t_last)
+                time.sleep(frame_gap + 0.02)
+
+            # Tastatur: ganzes Wort in Tippgeschwindigkeit, dann einzelne Tasten
+            before = len(scans)
+            dev.type_code("hallo", HUMAN_KEY, enter=True)
+            for key in "xyz":
+                dev.type_code(key, 0, enter=False)
+                time.sleep(frame_gap * 2)
+            time.sleep(frame_gap * 2)
+            if len(scans) != before:
+                failures.append(f"{label}: Tastatureingabe als Scan durchgelassen: {scans[before:]}")
+            if [c for c, _ in scans[:codes]] != expected:
+                failures.append(f"{label}: Codes verfälscht")
+
+            stats = scanner.stats()["framing"]
+            loop.call_soon_threadsafe(scanner.stop)
+            latencies.sort()
+            if latencies:
+                lines.append(f"{label:<20} {latencies[len(latencies) // 2] * 1000:8.1f} {latencies[-1] * 1000:8.1f}   "
+                             f"{stats['rejected']['slow']:>4} {stats['rejected']['short']:>4}   "
+                             f"{stats.get('key_ms', {}).get('p50', 0):>6.1f}")
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+    print(f"{codes} Codes je Fall, {SCANNER_KEY * 1000:.0f} ms je Taste, frame_gap {frame_gap * 1000:.0f} ms")
+    print(f"{'Abschluss':<20} {'p50 ms':>8} {'max ms':>8}   {'lgs.':>4} {'kurz':>4}   {'Taste ms':>6}")
+    for line in lines:
+        print(line)
+    print("p50/max: letzte Taste → Code gemeldet; lgs./kurz: verworfene Tastatureingaben")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Scan-Framing prüfen")
+    parser.add_argument("--codes", type=int, default=20)
+    parser.add_argument("--frame-gap", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.codes, args.frame_gap)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
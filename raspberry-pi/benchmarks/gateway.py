@@ -0,0 +1,302 @@
+"""
+Gateway check – peer Pis behind one site gateway (emp_scanner.gateway) against the stub server.
+
+  Config     every peer polls its config every POLL_SEC: directly each poll is one server
+             GET, through the gateway one GET ?ids= for all peers per config TTL
+  Heartbeat  v2 heartbeats of all peers: directly one POST each, through the gateway one
+             array per batch window – every peer still gets its ack
+  Scan       scan latency directly and through the gateway
+  Offline    server unreachable → the gateway's ticket store decides for the peers
+             (shared offline cache), grants recorded per peer device; peers without
+             re-entry decide themselves
+  Failover   gateway stopped, hanging (read timeout) or answering 5xx → peers go to the
+             server directly
+  Secret     peers send gateway_secret, not the account token; a wrong secret is rejected
+             (peer goes to the server directly), the account token as secret is refused
+  Legacy     server without the gateway endpoints → heartbeats forwarded per device
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.gateway [--peers 10] [--seconds 3]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emp_scanner.api_client import ApiClient
+from emp_scanner.breaker import CircuitBreaker
+from emp_scanner.gateway import Gateway, GatewayRoute
+from emp_scanner.sync import TicketSync
+from emp_scanner.sysinfo import SystemSampler
+from emp_scanner.ticket_store import TicketStore
+
+from benchmarks.stub_server import StubServer
+
+POLL_SEC = 0.3
+HEARTBEAT_SEC = 1.0
+CONFIG_TTL = 0.5
+BATCH_WINDOW = 0.5
+BREAKER_OPEN = 1.0
+GATEWAY_ID = 1
+PEER_BASE = 101
+TICKETS = ["1000001", "1000002", "1000003"]
+SECRET = "standort-geheimnis"
+GET = "GET /api/devices/pi"
+POST = "POST /api/devices/pi"
+
+
+def _peers(server: StubServer, count: int, sampler: SystemSampler, gateway: Gateway | None,
+           secret: str = SECRET) -> list[ApiClient]:
+    """One ApiClient (own connection pool) per peer Pi, optionally behind the gateway."""
+    return [ApiClient(server.url, "bench", PEER_BASE + i, sampler=sampler,
+                      gateway=GatewayRoute(f"http://127.0.0.1:{gateway.port}", secret) if gateway else None)
+            for i in range(count)]
+
+
+def _gateway(server: StubServer, store: TicketStore | None = None) -> Gateway:
+    api = ApiClient(server.url, "bench", GATEWAY_ID, breaker=CircuitBreaker(open_seconds=BREAKER_OPEN))
+    gateway = Gateway(api, 0, SECRET, host="127.0.0.1", store=store, batch_window=BATCH_WINDOW,
+                      config_ttl=CONFIG_TTL)
+    gateway.start()
+    return gateway
+
+
+class _BadGateway(BaseHTTPRequestHandler):
+    """Gateway, das den Server nicht erreicht und nicht selbst entscheidet."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.send_response(502)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def _broken_gateways(server: StubServer, sampler: SystemSampler) -> list[tuple[str, dict, dict]]:
+    """Scan über ein hängendes und ein 5xx-Gateway: (Fall, Ergebnis, Route)."""
+    hanging = socket.socket()
+    hanging.bind(("127.0.0.1", 0))
+    hanging.listen(8)  # nimmt Verbindungen an (Backlog), antwortet nie
+    failing = ThreadingHTTPServer(("127.0.0.1", 0), _BadGateway)
+    threading.Thread(target=failing.serve_forever, daemon=True).start()
+    results = []
+    try:
+        for case, port in (("hängt", hanging.getsockname()[1]), ("5xx", failing.server_address[1])):
+            api = ApiClient(server.url, "bench", PEER_BASE, sampler=sampler,
+                            gateway=GatewayRoute(f"http://127.0.0.1:{port}", SECRET))
+            try:
+                resp = api._request("scan", "POST", "/api/devices/pi/scan",
+                                    json={"code": TICKETS[0], "deviceId": PEER_BASE}, timeout=(0.5, 0.5))
+                result = resp.json() if resp.status_code == 200 else {"status": resp.status_code}
+            except Exception as e:
+                result = {"error": type(e).__name__}
+            results.append((case, result, api.gateway.stats()))
+            api.connection.close()
+    finally:
+        hanging.close()
+        failing.shutdown()
+        failing.server_close()
+    return results
+
+
+def _loops(peers: list[ApiClient], fn, interval: float, seconds: float) -> list[int]:
+    """fn(api) every interval seconds per peer (random phase); returns successful calls per peer."""
+    ok = [0] * len(peers)
+    deadline = time.monotonic() + seconds
+
+    def _loop(i: int, api: ApiClient):
+        time.sleep(random.uniform(0, interval))
+        while time.monotonic() < deadline:
+            if fn(api) is not None:
+                ok[i] += 1
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=_loop, args=(i, api)) for i, api in enumerate(peers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ok
+
+
+def _counted(server: StubServer, key: str, run) -> tuple[int, object]:
+    before = server.requests.get(key, 0)
+    result = run()
+    return server.requests.get(key, 0) - before, result
+
+
+def _acked(peers: list[ApiClient], server: StubServer) -> int:
+    """Peers whose last heartbeat the server acknowledged and stored."""
+    return sum(1 for api in peers
+               if api._heartbeat.seq and api._heartbeat.snapshot()["acked"] == api._heartbeat.seq
+               and (server.system_infos.get(api.device_id) or {}).get("heartbeat", {}).get("seq") == api._heartbeat.seq)
+
+
+def _scan_p50(peers: list[ApiClient], scans: int) -> tuple[float, int]:
+    latencies, granted = [], 0
+    for i in range(scans):
+        api = peers[i % len(peers)]
+        start = time.monotonic()
+        result = api.validate_scan(TICKETS[i % len(TICKETS)])
+        latencies.append(time.monotonic() - start)
+        granted += bool(result.get("granted")) and not result.get("offline")
+    return statistics.median(latencies) * 1000, granted
+
+
+def run(count: int, seconds: float) -> int:
+    failures = []
+    workdir = tempfile.mkdtemp(prefix="emp-gateway-")
+    sampler = SystemSampler()
+    server = StubServer(latency=0.01, tickets=TICKETS).start()
+    results = {}
+    try:
+        store = TicketStore(os.path.join(workdir, "tickets.db"))
+        gateway = _gateway(server, store)
+        TicketSync(gateway.api, store).run_once()
+        store.set_device(server.config(GATEWAY_ID))
+
+        for mode in ("direkt", "Gateway"):
+            peers = _peers(server, count, sampler, gateway if mode == "Gateway" else None)
+            gets, polls = _counted(server, GET, lambda: _loops(peers, lambda api: api.get_config(), POLL_SEC, seconds))
+            posts, beats = _counted(server, POST, lambda: _loops(peers, lambda api: api.send_heartbeat(),
+                                                                HEARTBEAT_SEC, seconds))
+            p50, granted = _scan_p50(peers, 30)
+            results[mode] = {"gets": gets, "polls": sum(polls), "posts": posts, "beats": sum(beats),
+                             "acked": _acked(peers, server), "p50": p50, "granted": granted}
+            for api in peers:
+                api.connection.close()
+
+        # Server weg: Ticketbestand des Gateways entscheidet für die Peers
+        peers = _peers(server, count, sampler, gateway)
+        server.outage = True
+        offline = [peers[i % count].validate_scan(code) for i, code in enumerate(TICKETS + ["2000001"])]
+        server.outage = False
+        shared = [r.get("granted") for r in offline if r.get("gateway") and r.get("offline")]
+        with store._lock:
+            grant_devices = {r[0] for r in store._db.execute("SELECT device_id FROM granted")}
+        # Ohne Wiedereintritt kennt nur der Peer seine früheren Eintritte
+        server.device["pis_again"] = 0
+        time.sleep(max(CONFIG_TTL, BREAKER_OPEN) + 0.1)
+        peers[1].get_config()
+        server.outage = True
+        no_reentry = peers[1].validate_scan(TICKETS[0])
+        server.outage = False
+        server.device["pis_again"] = 1
+
+        # Falsches Geheimnis: Gateway lehnt ab, Peer geht direkt zum Server
+        rejected = gateway.counts["rejected"]
+        stranger = _peers(server, 1, sampler, gateway, secret="falsch")[0]
+        wrong = stranger.validate_scan(TICKETS[0])
+        wrong_route = stranger.gateway.stats()
+        wrong_rejected = gateway.counts["rejected"] - rejected
+        stranger.connection.close()
+        # Account-Token als Geheimnis: Gateway startet nicht
+        token_refused = not Gateway(gateway.api, 0, gateway.api.api_token, host="127.0.0.1").start()
+
+        broken = _broken_gateways(server, sampler)
+
+        # Gateway weg: Peers gehen direkt zum Server
+        gateway.stop()
+        start = time.monotonic()
+        failover = peers[0].validate_scan(TICKETS[0])
+        failover_ms = (time.monotonic() - start) * 1000
+        again = peers[0].validate_scan(TICKETS[1])
+        route = peers[0].gateway.stats()
+        for api in peers:
+            api.connection.close()
+        gateway.api.connection.close()
+        store.close()
+    finally:
+        server.stop()
+
+    # Älterer Server ohne ?ids= / Heartbeat-Arrays
+    legacy = StubServer(tickets=TICKETS)
+    legacy.batch_api = False
+    legacy.start()
+    try:
+        gateway = _gateway(legacy)
+        peers = _peers(legacy, 3, sampler, gateway)
+        for _ in range(2):
+            _loops(peers, lambda api: api.send_heartbeat(), 0.01, 0.01)
+        legacy_acked = _acked(peers, legacy)
+        legacy_arrays = sum(1 for hb in legacy.heartbeats if isinstance(hb, list))
+        legacy_batch_api = gateway.batch_api
+        gateway.stop()
+    finally:
+        legacy.stop()
+        sampler.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    direct, via = results["direkt"], results["Gateway"]
+    for mode, r in results.items():
+        if r["acked"] != count:
+            failures.append(f"{mode}: nur {r['acked']} von {count} Heartbeats bestätigt")
+        if r["polls"] < count * (seconds / POLL_SEC - 2):
+            failures.append(f"{mode}: nur {r['polls']} Config-Abrufe beantwortet")
+        if r["granted"] != 30:
+            failures.append(f"{mode}: {30 - r['granted']} Scans ohne Freigabe")
+    # Erster Abruf eines neuen Peers geht immer zum Server, danach ein Abruf je TTL für alle
+    if via["gets"] > count + seconds / CONFIG_TTL + 2:
+        failures.append(f"Config: {via['gets']} Server-Abrufe über das Gateway bei TTL {CONFIG_TTL} s")
+    if via["posts"] * 2 > direct["posts"]:
+        failures.append("Heartbeat: Gateway halbiert die Server-Aufrufe nicht")
+    if shared != [True, True, True, False]:
+        failures.append(f"Offline: Gateway-Entscheidungen {shared} statt [True, True, True, False]")
+    if not grant_devices or any(d < PEER_BASE for d in grant_devices):
+        failures.append(f"Offline: Freigaben unter Gerät {sorted(grant_devices)} statt unter den Peers")
+    if no_reentry.get("gateway") or not no_reentry.get("offline"):
+        failures.append("Offline: Gateway entscheidet für Peer ohne Wiedereintritt")
+    if not failover.get("granted") or failover.get("offline") or not again.get("granted"):
+        failures.append("Ausfall Gateway: Scan nicht direkt am Server geprüft")
+    if route["outages"] != 1 or route["fallbacks"] != 1:
+        failures.append(f"Ausfall Gateway: {route}")
+    for case, result, stats in broken:
+        if not result.get("granted") or stats["up"] or stats["fallbacks"] != 1:
+            failures.append(f"Gateway {case}: Scan nicht direkt am Server geprüft ({result}, {stats})")
+    if wrong_rejected != 1 or not wrong.get("granted") or wrong.get("gateway") or wrong_route["fallbacks"] != 1:
+        failures.append(f"Geheimnis: falsches Geheimnis nicht abgelehnt ({wrong_rejected} abgelehnt, {wrong_route})")
+    if not token_refused:
+        failures.append("Geheimnis: Gateway mit dem API-Token als Geheimnis gestartet")
+    if legacy_acked != 3 or legacy_arrays or legacy_batch_api is not False:
+        failures.append(f"Älterer Server: {legacy_acked}/3 bestätigt, {legacy_arrays} Arrays gesendet")
+
+    print(f"{count} Peers, {seconds:.0f} s, Config-Poll {POLL_SEC} s (Gateway-TTL {CONFIG_TTL} s), "
+          f"Heartbeat {HEARTBEAT_SEC} s (Sammelfenster {BATCH_WINDOW} s)")
+    for mode, r in results.items():
+        print(f"  {mode:8} Server-GET {r['gets']:4} für {r['polls']:4} Abrufe   Server-POST {r['posts']:3} für "
+              f"{r['beats']:3} Heartbeats ({r['acked']}/{count} bestätigt)   Scan p50 {r['p50']:5.1f} ms")
+    print(f"Server nicht erreichbar  Gateway-Bestand entscheidet: {shared}")
+    print(f"Falsches Geheimnis  abgelehnt {wrong_rejected}, Scan direkt am Server, Route {wrong_route}")
+    print(f"Gateway gestoppt  Scan direkt am Server nach {failover_ms:.1f} ms, Route {route}")
+    for case, result, stats in broken:
+        print(f"Gateway {case:5}  Scan direkt am Server: {bool(result.get('granted'))}, Route {stats}")
+    print(f"Älterer Server  {legacy_acked}/3 Heartbeats einzeln weitergeleitet und bestätigt")
+    for failure in failures:
+        print("FEHLER:", failure)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Peers über ein Standort-Gateway gegen direkten Serverzugriff")
+    parser.add_argument("--peers", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    return run(args.peers, args.seconds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Heartbeat protocol check against the stub server – v2 deltas, resync and v1 fallback.
+
+Runs the real ApiClient + SystemSampler, verifies after every heartbeat that the
+state the server reconstructed equals what the client sent, and compares bytes on
+the wire with full v1 heartbeats.
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.heartbeat [--count 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+
+from emp_scanner.api_client import ApiClient
+from emp_scanner.sysinfo import SystemSampler
+
+from benchmarks.stub_server import StubServer
+
+
+def _server_state(server: StubServer) -> dict:
+    return {k: v for k, v in (server.system_info or {}).items() if k != "heartbeat"}
+
+
+def _client_state(api: ApiClient) -> dict:
+    return json.loads(json.dumps(api._heartbeat._acked))
+
+
+def run(count: int) -> int:
+    failures = []
+    sampler = SystemSampler()
+    server = StubServer().start()
+    try:
+        api = ApiClient(server.url, "bench", 1, sampler=sampler)
+        configs = 0
+        for i in range(count):
+            sampler.sample()
+            if api.send_heartbeat(task=0, extra={"latency": {"total": {"n": i}}}):
+                configs += 1
+            if _server_state(server) != _client_state(api):
+                failures.append(f"v2: Stand nach Heartbeat {i + 1} weicht ab")
+        v2_bytes = list(server.heartbeat_bytes)
+        gets = server.requests.get("GET /api/devices/pi", 0)
+        full = len(json.dumps([{"pis_id": 1, "pis_task": 0, "pis_update": 0,
+                                "system_info": _client_state(api)}]).encode())
+
+        # Server verliert seinen Stand → resync, danach wieder vollständig + Deltas
+        server.system_info = None
+        api.send_heartbeat(task=0)
+        api.send_heartbeat(task=0)
+        api.send_heartbeat(task=0)
+        if api._heartbeat.resyncs != 1 or _server_state(server) != _client_state(api):
+            failures.append("resync: Stand nach Wiederherstellung weicht ab")
+
+        # Task-Wechsel kommt mit der Heartbeat-Antwort
+        server.device["pis_task"] = 2
+        config = api.send_heartbeat(task=0)
+        if not config or config.get("pis_task") != 2:
+            failures.append("v2: Konfiguration fehlt in der Heartbeat-Antwort")
+        server.device["pis_task"] = 0
+
+        # Alter Server ohne v2 → Fallback auf v1 + GET
+        server.heartbeat_v2 = False
+        legacy = ApiClient(server.url, "bench", 1, sampler=sampler)
+        config = legacy.send_heartbeat(task=0)
+        if not legacy._heartbeat.legacy or not config:
+            failures.append("v1: Fallback fehlgeschlagen")
+    finally:
+        server.stop()
+        sampler.close()
+
+    print(f"Heartbeats v2:      {count} (Konfiguration in {configs} Antworten, {gets} GET)")
+    print(f"Erster (komplett):  {v2_bytes[0]} Bytes")
+    if len(v2_bytes) > 1:
+        deltas = v2_bytes[1:]
+        print(f"Folgende (Delta):   Ø {sum(deltas) / len(deltas):.0f} Bytes, max {max(deltas)}")
+    print(f"v1 zum Vergleich:   {full} Bytes + GET pro Heartbeat")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Heartbeat-Protokoll gegen Stub-Server prüfen")
+    parser.add_argument("--count", type=int, default=20)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.count)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
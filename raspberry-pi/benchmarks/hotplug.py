@@ -0,0 +1,114 @@
+"""
+Scanner hotplug check – reconnect latency after unplug/replug, inotify vs. polling.
+
+Runs ScannerInput (auto-detect, event-loop mode) on a temporary /dev/input with a
+fake sysfs. Each cycle unplugs the scanner and plugs it back in under a new
+eventX, then measures node creation → scanner grabbed and checks that a code
+typed afterwards arrives. Devices plugged while the scanner is connected must not
+be opened (no re-enumeration).
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.hotplug [--cycles 5] [--mice 8]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from emp_scanner.scanner import ScannerInput
+
+from benchmarks.fakes import FakeInputDir, install_fake_evdev
+
+
+def _wait(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.001)
+    return False
+
+
+def run_mode(hotplug: bool, cycles: int, mice: int, failures: list) -> dict:
+    root = tempfile.mkdtemp(prefix="emp-hotplug-")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    label = "inotify" if hotplug else "Polling"
+    try:
+        devices = FakeInputDir(root)
+        for i in range(mice):
+            devices.plug(name=f"Bench Mouse {i}", vendor=0x046D, product=0xC000 + i, mouse=True)
+        scanner_dev = devices.plug()
+        scans: list[str] = []
+        scanner = ScannerInput(scans.append, device_path="auto", hotplug=hotplug, input_dir=devices.dev_dir)
+        loop.call_soon_threadsafe(scanner.start, loop)
+        if not _wait(lambda: scanner.stats()["connected"], 5):
+            failures.append(f"{label}: Scanner beim Start nicht gefunden")
+            return {}
+
+        latencies = []
+        for cycle in range(cycles):
+            devices.unplug(scanner_dev)
+            _wait(lambda: not scanner.stats()["connected"], 2)
+            time.sleep(0.2)
+            t_plug = time.monotonic()
+            scanner_dev = devices.plug()
+            if not _wait(lambda: (scanner.connected_at or 0) >= t_plug, 15):
+                failures.append(f"{label}: Zyklus {cycle + 1} nicht wieder verbunden")
+                break
+            latencies.append(scanner.connected_at - t_plug)
+            scanner_dev.type_code(f"4711{cycle:04d}")
+            if not _wait(lambda: f"4711{cycle:04d}" in scans, 2):
+                failures.append(f"{label}: Scan nach Zyklus {cycle + 1} nicht angekommen")
+
+        probes = scanner.probes
+        for i in range(3):
+            devices.plug(name=f"Bench Keyboard {i}", vendor=0x04D9, product=0x1600 + i)
+        time.sleep(0.3)
+        if scanner.probes != probes:
+            failures.append(f"{label}: neue Geräte trotz verbundenem Scanner geöffnet")
+
+        loop.call_soon_threadsafe(scanner.stop)
+        stats = scanner.stats()
+        latencies.sort()
+        return {
+            "mode": label,
+            "median_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+            "reconnects": stats["reconnects"],
+            "probes": probes,
+        }
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Scanner-Hotplug: Wiederverbindung messen")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--mice", type=int, default=8, help="weitere Eingabegeräte (werden bei der Suche geöffnet)")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    install_fake_evdev()
+
+    failures: list[str] = []
+    results = [run_mode(True, args.cycles, args.mice, failures), run_mode(False, args.cycles, args.mice, failures)]
+    print(f"{args.cycles} Zyklen Abziehen/Einstecken, {args.mice} weitere Eingabegeräte")
+    print(f"{'Modus':<8} {'Median ms':>10} {'max ms':>10} {'Wiederverb.':>12} {'geöffnet':>9}")
+    for r in results:
+        if r.get("median_ms") is not None:
+            print(f"{r['mode']:<8} {r['median_ms']:>10.1f} {r['max_ms']:>10.1f} {r['reconnects']:>12} {r['probes']:>9}")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Actuator isolation check – relay latency with network/telemetry load in the main process.
+
+The same grant sequence runs twice while the main process is loaded the way a
+busy scanner is (Python threads holding the GIL, cyclic garbage → GC pauses,
+subprocess forks like git/vcgencmd):
+
+  in-process   RelayController + Sequencer in this process (actuator_process off)
+  split        ActuatorClient: relay in the actuator process (actuator_process on)
+
+  Command   call → relay switched (t_on); split: sent → switched in the child
+  Timeout   relay off after duration; lag = off - (on + duration)
+  Restart   actuator process killed during NOT-AUF → next command restarts it,
+            relay open again
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.isolation [--grants 100] [--load-threads 3] [--rt-priority 0]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+from emp_scanner.actuator import ActuatorClient
+from emp_scanner.relay import RelayController
+from emp_scanner.sequencer import Sequencer
+
+from benchmarks.fakes import install_fake_gpio
+
+LANE = {"relay_pin": 24, "led_green_pin": 22, "led_red_pin": 23, "buzzer_pin": 18}
+DURATION = 0.05
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+class Load:
+    """GIL-Last, Garbage mit Zyklen und Forks wie im belasteten Hauptprozess."""
+
+    def __init__(self, threads: int):
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._spin, daemon=True) for _ in range(threads)]
+        self._threads.append(threading.Thread(target=self._garbage, daemon=True))
+        self._threads.append(threading.Thread(target=self._fork, daemon=True))
+
+    def __enter__(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+
+    def _spin(self):
+        while not self._stop.is_set():
+            sum(i * i for i in range(20000))
+
+    def _garbage(self):
+        while not self._stop.is_set():
+            for _ in range(2000):
+                a, b = [], []
+                a.append(b)
+                b.append(a)
+
+    def _fork(self):
+        while not self._stop.is_set():
+            subprocess.run(["true"])
+            time.sleep(0.05)
+
+
+def _drive(grant, grants: int) -> list[float]:
+    latencies = []
+    for _ in range(grants):
+        t0 = time.monotonic()
+        t_on = grant()
+        if t_on is not None:
+            latencies.append(t_on - t0)
+        time.sleep(DURATION + 0.02)
+    return latencies
+
+
+def run(grants: int, load_threads: int, rt_priority: int) -> int:
+    failures = []
+
+    # ─── in-process ───────────────────────────────────────────────────────────
+    install_fake_gpio()
+    seq = Sequencer()
+    relay = RelayController(LANE["relay_pin"], LANE["led_green_pin"], LANE["led_red_pin"],
+                            LANE["buzzer_pin"], duration=DURATION, sequencer=seq)
+    try:
+        with Load(load_threads):
+            local = _drive(relay.grant, grants)
+        local_stats = relay.stats()
+    finally:
+        relay.cleanup()
+        seq.stop()
+
+    # ─── split ────────────────────────────────────────────────────────────────
+    client = ActuatorClient([dict(LANE, duration=DURATION, door={})], gpio_backend="sim",
+                            rt_priority=rt_priority)
+    if not client.start():
+        print("FEHLER: Aktor-Prozess nicht gestartet")
+        return 1
+    remote = client.relay(0)
+    try:
+        with Load(load_threads):
+            split = _drive(remote.grant, grants)
+        split_stats = remote.stats()
+
+        # ─── Restart ──────────────────────────────────────────────────────────
+        remote.emergency_open()
+        client._proc.kill()
+        client._proc.wait()
+        time.sleep(0.1)
+        restart_stats = remote.stats()
+        if restart_stats.get("restarts") != 1 or not restart_stats.get("relay_on"):
+            failures.append(f"Restart: NOT-AUF nach Neustart nicht wiederhergestellt ({restart_stats})")
+        remote.close()
+    finally:
+        client.stop()
+
+    if len(split) != grants:
+        failures.append(f"Split: {grants - len(split)} Freigaben ohne Antwort")
+    if split_stats.get("lag_p99_ms", 0) > local_stats["lag_p99_ms"] and split_stats["lag_p99_ms"] > 1:
+        failures.append("Split: Timeout-Verzug im Aktor-Prozess höher als im Hauptprozess")
+
+    print(f"Last: {load_threads} Rechen-Threads, Garbage-Zyklen, Forks; Aktor-Prozess "
+          f"{split_stats.get('mode', '?')}")
+    print(f"{'':12} {'Befehl p50':>11} {'p99':>9} {'max':>9}   {'Timeout p50':>11} {'p99':>9} {'max':>9}")
+    print(f"{'in-process':12} {_pct(local, 0.5):8.3f} ms {_pct(local, 0.99):6.3f} ms "
+          f"{max(local, default=0) * 1000:6.3f} ms   {local_stats['lag_p50_ms'] or 0:8.3f} ms "
+          f"{local_stats['lag_p99_ms'] or 0:6.3f} ms {local_stats['max_lag_ms']:6.3f} ms")
+    print(f"{'split':12} {split_stats.get('ipc_p50_ms') or 0:8.3f} ms {split_stats.get('ipc_p99_ms') or 0:6.3f} ms "
+          f"{split_stats.get('ipc_max_ms') or 0:6.3f} ms   {split_stats.get('lag_p50_ms') or 0:8.3f} ms "
+          f"{split_stats.get('lag_p99_ms') or 0:6.3f} ms {split_stats.get('max_lag_ms', 0):6.3f} ms")
+    print(f"Rundlauf split (Hauptprozess) p50 {_pct(split, 0.5):.3f} ms, p99 {_pct(split, 0.99):.3f} ms; "
+          f"verspätet >5 ms: in-process {local_stats['late']}, split {split_stats.get('late')}")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Aktor-Prozess gegen Relais im Hauptprozess")
+    parser.add_argument("--grants", type=int, default=100)
+    parser.add_argument("--load-threads", type=int, default=3)
+    parser.add_argument("--rt-priority", type=int, default=0)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.grants, args.load_threads, args.rt_priority)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
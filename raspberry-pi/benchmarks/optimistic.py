@@ -0,0 +1,184 @@
+"""
+Optimistic grant check – local grant before the server answers, reconciliation afterwards.
+
+Runs the benchmark lane (benchmarks.run.Bench: synthetic scanner, simulated GPIO,
+stub server with --latency) once without and once with optimistic grants:
+
+  Latency     valid tickets: scan → relay without vs. with optimistic grant
+  Mismatch    ticket invalidated on the server after the last sync: relay opens,
+              the server denies → reconciliation event in the journal, a repeated
+              scan within the replay window is denied
+  Ineligible  validity type not in optimistic_validity_types → server decides
+  Stale       last sync older than optimistic_max_age → server decides
+  Offline     server unreachable → local grant journaled like an offline scan
+  Sources     optimistic_sources [] (every source), null (EMP Access tickets only) and
+              an explicit list
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.optimistic [--scans 10] [--latency 0.15]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+import time
+
+from emp_scanner.optimistic import MISMATCH_CODE, OptimisticGrants, optimistic_options
+from emp_scanner.sync import TicketSync
+
+from benchmarks import run as bench_run
+from benchmarks.stub_server import StubServer
+
+GAP = 0.3
+# optimistic_sources → berechtigte Quellen (None = in EMP Access angelegt)
+SOURCES = [
+    ([], {None, "EMP_CONTROL", "ETICKET"}),
+    (None, {None}),
+    (["EMP_CONTROL"], {"EMP_CONTROL"}),
+]
+
+
+def _scan_latency(bench: bench_run.Bench, code: str) -> tuple[float | None, bool | None]:
+    """Scan one code, wait for its actuation; (latency, granted)."""
+    before = len(bench.actuated.get(code, []))
+    bench.scan(code)
+    t_in = bench.injected[-1][1]
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        events = bench.actuated.get(code, [])
+        if len(events) > before:
+            t_on, granted = events[before]
+            return t_on - t_in, granted
+        time.sleep(0.002)
+    return None, None
+
+
+def _journal(bench: bench_run.Bench) -> list[dict]:
+    journal = bench.app.lanes[0].journal
+    journal.flush()
+    return journal.read_unacked(1000)
+
+
+def _p50(values: list[float]) -> float:
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] * 1000 if values else float("nan")
+
+
+def _sources() -> list[str]:
+    """optimistic_sources aus der Konfiguration → berechtigte Ticket-Quellen."""
+    failures = []
+    for value, expected in SOURCES:
+        grants = OptimisticGrants(**optimistic_options({"optimistic_grant": True, "optimistic_sources": value}))
+        eligible = {source for source in (None, "EMP_CONTROL", "ETICKET")
+                    if grants.eligible({"validity_type": "DATE_RANGE", "source": source})}
+        if eligible != expected:
+            failures.append(f"Quellen: optimistic_sources {value!r} berechtigt {eligible} statt {expected}")
+    return failures
+
+
+def run(scans: int, latency: float) -> int:
+    failures = _sources()
+    codes = [f"1{i:07d}" for i in range(scans)]
+    server = StubServer(latency=latency, tickets=codes + ["1900001", "1900002", "1900003", "1900004"]).start()
+    workdir = tempfile.mkdtemp(prefix="emp-optimistic-")
+    results = {}
+    try:
+        for optimistic in (False, True):
+            args = bench_run.parse_args(["--optimistic"] if optimistic else [])
+            bench = bench_run.Bench(server, workdir, f"opt{int(optimistic)}", args)
+            try:
+                latencies = []
+                for code in codes:
+                    latencies.append(_scan_latency(bench, code)[0])
+                    time.sleep(GAP)
+                bench.drain()
+                results[optimistic] = latencies
+                if not optimistic:
+                    continue
+                lane = bench.app.lanes[0]
+                stats = lane.optimistic.stats()
+                if stats["granted"] != scans or stats["confirmed"] != scans:
+                    failures.append(f"Latenz: {stats['granted']} optimistisch, {stats['confirmed']} bestätigt "
+                                    f"statt {scans}")
+
+                # ─── Mismatch ─────────────────────────────────────────────────
+                ticket_id = next(t["id"] for t in server.tickets.values() if t["qrCode"] == "1900001")
+                server.put_ticket("1900001", status="INVALID", ticket_id=ticket_id)
+                lat, granted = _scan_latency(bench, "1900001")
+                bench.drain()
+                if not granted or lat is None or lat > latency:
+                    failures.append("Mismatch: keine sofortige Freigabe aus dem lokalen Bestand")
+                if lane.optimistic.stats()["mismatch"] != 1:
+                    failures.append("Mismatch: Widerspruch des Servers nicht gezählt")
+                events = [r for r in _journal(bench) if r["code"] == MISMATCH_CODE]
+                if len(events) != 1 or events[0]["ticket_id"] != ticket_id:
+                    failures.append(f"Mismatch: Abgleich-Ereignis im Journal fehlt ({events})")
+                time.sleep(float(args.dedupe_window) + 0.1)
+                _, granted = _scan_latency(bench, "1900001")
+                if granted:
+                    failures.append("Mismatch: wiederholter Scan trotz Widerspruch freigegeben")
+                mismatch_ms = lat * 1000 if lat is not None else float("nan")
+
+                # ─── Ineligible ───────────────────────────────────────────────
+                server.put_ticket("1900002", ticket_id=next(
+                    t["id"] for t in server.tickets.values() if t["qrCode"] == "1900002"), validity_type="DURATION")
+                TicketSync(bench.app.api, bench.app.store).run_once()
+                before = lane.optimistic.stats()["granted"]
+                lat, granted = _scan_latency(bench, "1900002")
+                if not granted or lane.optimistic.stats()["granted"] != before or (lat or 0) < latency:
+                    failures.append("Ineligible: DURATION-Ticket optimistisch freigegeben")
+
+                # ─── Stale ────────────────────────────────────────────────────
+                synced_at = bench.app.store.synced_at
+                bench.app.store.synced_at = time.time() - lane.optimistic.max_age - 1
+                lat, granted = _scan_latency(bench, "1900003")
+                bench.app.store.synced_at = synced_at
+                if not granted or lane.optimistic.stats()["stale"] != 1 or (lat or 0) < latency:
+                    failures.append("Stale: veralteter Bestand optimistisch freigegeben")
+
+                # ─── Offline ──────────────────────────────────────────────────
+                server.failure_mode = "503"
+                server.outage = True
+                lat, granted = _scan_latency(bench, "1900004")
+                bench.drain()
+                server.outage = False
+                if not granted or (lat or latency) >= latency:
+                    failures.append("Offline: keine sofortige Freigabe")
+                if lane.optimistic.stats()["unconfirmed"] != 1:
+                    failures.append("Offline: unbestätigte Freigabe nicht gezählt")
+                if not any(r["code"] == "1900004" and r["result"] == "GRANTED" for r in _journal(bench)):
+                    failures.append("Offline: lokale Freigabe nicht im Journal")
+                final = lane.optimistic.stats()
+            finally:
+                bench.close()
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Server-Latenz {latency * 1000:.0f} ms, {scans} gültige Tickets")
+    print(f"Scan → Relais p50   ohne {_p50(results.get(False, [])):7.1f} ms   "
+          f"optimistisch {_p50(results.get(True, [])):7.1f} ms")
+    print(f"Widerspruch         Relais nach {mismatch_ms:.1f} ms, Server-Bestätigung p50 "
+          f"{final['confirm_p50_ms']} ms")
+    print(f"Zähler              optimistisch {final['granted']}, bestätigt {final['confirmed']}, "
+          f"Widerspruch {final['mismatch']}, unbestätigt {final['unconfirmed']}, veraltet {final['stale']}")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Optimistische Freigabe und Abgleich prüfen")
+    parser.add_argument("--scans", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.15)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.scans, args.latency)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
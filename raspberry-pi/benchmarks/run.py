@@ -0,0 +1,404 @@
+"""
+End-to-end latency benchmark: synthetic HID scanner → ScannerInput → ScanPipeline
+→ ApiClient (local stub server) → RelayController (simulated GPIO backend with timestamps).
+Scanner input runs on the asyncio runtime, relay timers on the actuator sequencer, like in production.
+
+Measured per scan: first synthetic key event → relay (grant) or red LED (deny) on,
+taken from the same time.monotonic() clock as the simulated GPIO.
+
+Scenarios:
+  burst   unique codes at a fixed rate (Einlass-Andrang)
+  held    RFID-Karten, die auf dem Leser liegen bleiben (Wiederholungen alle 100 ms)
+  repeat  jeder Code ein zweites Mal nach dedupe_window (Ablehnungen werden lokal wiederholt)
+  outage  Server fällt im mittleren Drittel aus (Circuit Breaker + Offline-Prüfung)
+  lanes   zwei Durchgänge abwechselnd, Server antwortet für Durchgang #2 um --slow-lane s
+          verzögert – Durchgang #1 darf davon nicht ausgebremst werden
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.run                       # all scenarios, text report
+  python -m benchmarks.run -s burst --scans 500 --rate 50 --latency 0.05
+  python -m benchmarks.run --json > baseline.json
+  python -m benchmarks.run -s burst --latency 0.2 --optimistic   # lokale Freigabe, Server bestätigt danach
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from emp_scanner import VERSION
+from emp_scanner.api_client import ApiClient
+from emp_scanner.breaker import CircuitBreaker
+from emp_scanner.journal import ScanJournal
+from emp_scanner.main import EmpScanner
+from emp_scanner.lane import Lane
+from emp_scanner.optimistic import OptimisticGrants
+from emp_scanner.relay import RelayController
+from emp_scanner.sequencer import Sequencer
+from emp_scanner.runtime import Runtime
+from emp_scanner.scanner import ScannerInput
+from emp_scanner.sync import TicketSync
+from emp_scanner.ticket_store import TicketStore
+
+from benchmarks.fakes import FakeInputDevice, install_fake_evdev, install_fake_gpio
+from benchmarks.stub_server import GRANT_PREFIX, StubServer
+
+SCENARIOS = ("burst", "held", "repeat", "outage", "lanes")
+DRAIN_TIMEOUT = 60.0
+
+RELAY_PIN, LED_GREEN, LED_RED, BUZZER = 24, 27, 22, 23
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Bench:
+    """Scanner lanes wired to the stub server and fake hardware (one lane unless lanes > 1)."""
+
+    def __init__(self, server: StubServer, workdir: str, name: str, args, lanes: int = 1):
+        self.gpio = install_fake_gpio()
+        install_fake_evdev()
+
+        self.loop = asyncio.new_event_loop()
+        self.runtime = Runtime(self.loop)
+        threading.Thread(target=self.loop.run_forever, name="bench-loop", daemon=True).start()
+
+        self.app = EmpScanner()
+        self.app.runtime = self.runtime
+        self.app.config._data.update({
+            "server_url": server.url, "api_token": "bench", "device_id": 1,
+            "offline_policy": args.offline_policy, "metrics_port": 0,
+            "scan_dedupe_window": args.dedupe_window, "scan_replay_window": args.replay_window,
+            "scan_queue_size": args.queue_size,
+        })
+        self.app.api = ApiClient(
+            server.url, "bench", 1,
+            breaker=CircuitBreaker(failure_threshold=args.breaker_failures, open_seconds=args.breaker_open),
+        )
+        self.app.store = TicketStore(os.path.join(workdir, f"{name}.db"))
+        TicketSync(self.app.api, self.app.store).run_once()
+        self.app._running = True
+
+        self.actuated: dict[str, list[tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+        self.devices: list[FakeInputDevice] = []
+        self.scanners: list[ScannerInput] = []
+        self.sequencer = Sequencer()
+        for i in range(lanes):
+            device_id = i + 1
+            relay = RelayController(RELAY_PIN + 10 * i, LED_GREEN + 10 * i, LED_RED + 10 * i, BUZZER + 10 * i,
+                                    duration=0.05, sequencer=self.sequencer)
+            lane = Lane(
+                self.app, device_id=device_id,
+                api=self.app.api if i == 0 else self.app.api.for_device(device_id),
+                relay=relay,
+                journal=ScanJournal(device_id=device_id, path=os.path.join(workdir, f"journal-{name}-{i}")),
+                primary=i == 0, label=f"#{device_id}" if lanes > 1 else "",
+                optimistic=OptimisticGrants() if getattr(args, "optimistic", False) else None,
+            )
+            lane.device = {"pis_in": None, "pis_out": None, "pis_again": 1}
+            lane.pipeline._actuate = self._timed(lane._actuate)
+            lane.pipeline.start()
+            self.app.lanes.append(lane)
+
+            path = f"/dev/input/bench-{name}-{i}"
+            self.devices.append(FakeInputDevice.open(path))
+            scanner = ScannerInput(lane._handle_scan, device_path=path, timestamps=True)
+            self.scanners.append(scanner)
+            self.loop.call_soon_threadsafe(scanner.start, self.loop)
+        self.app.relay = self.app.lanes[0].relay
+
+        self.injected: list[tuple[str, float]] = []
+        self.lane_of: dict[str, int] = {}
+
+    def _timed(self, actuate):
+        def timed_actuate(code: str, result: dict):
+            t_on = actuate(code, result)
+            with self._lock:
+                self.actuated.setdefault(code, []).append((t_on, bool(result.get("granted"))))
+            return t_on
+        return timed_actuate
+
+    def scan(self, code: str, inter_key: float = 0.0, lane: int = 0):
+        self.lane_of[code] = lane
+        self.injected.append((code, self.devices[lane].type_code(code, inter_key)))
+
+    def stats(self) -> dict:
+        """Pipeline counters summed over all lanes."""
+        total: dict = {}
+        for lane in self.app.lanes:
+            for key, value in lane.pipeline.stats().items():
+                if isinstance(value, dict):
+                    stage = total.setdefault(key, {})
+                    for k, v in value.items():
+                        stage[k] = stage.get(k, 0) + v
+                else:
+                    total[key] = total.get(key, 0) + value
+        return total
+
+    def drain(self):
+        """Wait until the scanners have emitted everything and all stages are idle."""
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while time.monotonic() < deadline:
+            stats = self.stats()
+            in_flight = sum(
+                s["received"] - s["processed"] - s["dropped"] - s["errors"]
+                for s in (stats["dedupe"], stats["validate"], stats["actuate"], stats.get("confirm"))
+                if s is not None
+            )
+            if stats["submitted"] >= len(self.injected) and in_flight == 0:
+                return
+            time.sleep(0.01)
+        print("WARNUNG: Pipeline nach %.0f s nicht leer" % DRAIN_TIMEOUT, file=sys.stderr)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._stop_loop(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        for lane in self.app.lanes:
+            lane.stop()
+            lane.close()
+        self.sequencer.stop()
+        self.app.store.close()
+
+    async def _stop_loop(self):
+        for scanner in self.scanners:
+            scanner.stop()
+        await self.runtime.shutdown()
+
+    def report(self, name: str, t_start: float, t_end: float) -> dict:
+        """Match each actuation to the first injection of its code that precedes it."""
+        latencies = []
+        per_lane: dict[int, list[float]] = {}
+        granted = denied = 0
+        injected_by_code: dict[str, list[float]] = {}
+        for code, t in self.injected:
+            injected_by_code.setdefault(code, []).append(t)
+        with self._lock:
+            for code, events in self.actuated.items():
+                starts = injected_by_code.get(code, [])
+                for t_on, ok in events:
+                    granted += ok
+                    denied += not ok
+                    before = [t for t in starts if t <= t_on]
+                    if before:
+                        # Die Aktion gehört zur frühesten noch nicht zugeordneten Eingabe
+                        t_in = before[0]
+                        starts.remove(t_in)
+                        latencies.append(t_on - t_in)
+                        per_lane.setdefault(self.lane_of.get(code, 0), []).append(t_on - t_in)
+        latencies.sort()
+        stats = self.stats()
+        duration = max(t_end - t_start, 1e-9)
+        actuations = granted + denied
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            "scenario": name,
+            "injected": len(self.injected),
+            "actuated": actuations,
+            "granted": granted,
+            "denied": denied,
+            "suppressed": stats["suppressed"],
+            "replayed": stats["replayed"],
+            "dropped": sum(stats[s]["dropped"] for s in ("dedupe", "validate", "actuate")),
+            "errors": sum(stats[s]["errors"] for s in ("dedupe", "validate", "actuate")),
+            "offline_journaled": sum(lane.journal.pending_count() for lane in self.app.lanes),
+            "duration_s": round(duration, 3),
+            "scans_per_s": round(actuations / duration, 2),
+            "latency_ms": {
+                "min": ms(latencies[0] if latencies else None),
+                "p50": ms(percentile(latencies, 0.50)),
+                "p95": ms(percentile(latencies, 0.95)),
+                "p99": ms(percentile(latencies, 0.99)),
+                "max": ms(latencies[-1] if latencies else None),
+            },
+            "lanes_p50_ms": {
+                lane.label or "#1": ms(percentile(sorted(per_lane.get(i, [])), 0.50))
+                for i, lane in enumerate(self.app.lanes)
+            },
+            "spans_ms": self.app.latency.summary(),
+            "breaker": self.app.api.breaker.snapshot(),
+            "optimistic": self.app.lanes[0].optimistic.stats() if self.app.lanes[0].optimistic else None,
+        }
+
+
+# ─── Scenarios ────────────────────────────────────────────────────────────────
+
+def _code(i: int, deny_every: int) -> str:
+    prefix = "9" if deny_every and i % deny_every == deny_every - 1 else GRANT_PREFIX
+    return f"{prefix}{i:07d}"
+
+
+def scenario_burst(bench: Bench, args):
+    interval = 1.0 / args.rate
+    for i in range(args.scans):
+        t_next = time.monotonic() + interval
+        bench.scan(_code(i, args.deny_every), args.inter_key)
+        time.sleep(max(0.0, t_next - time.monotonic()))
+
+
+def scenario_held(bench: Bench, args):
+    """Each card lies on the reader for hold_s, the reader repeats every 100 ms."""
+    repeat = 0.1
+    for card in range(args.cards):
+        code = _code(card, args.deny_every)
+        t_end = time.monotonic() + args.hold
+        while time.monotonic() < t_end:
+            bench.scan(code, args.inter_key)
+            time.sleep(repeat)
+        time.sleep(args.dedupe_window + 0.2)
+
+
+def scenario_repeat(bench: Bench, args):
+    """Each card twice: second read after dedupe_window, inside replay_window."""
+    gap = args.dedupe_window + 0.3
+    for card in range(args.cards):
+        code = _code(card, args.deny_every)
+        bench.scan(code, args.inter_key)
+        time.sleep(gap)
+        bench.scan(code, args.inter_key)
+        time.sleep(0.2)
+
+
+def scenario_outage(bench: Bench, server: StubServer, args):
+    interval = 1.0 / args.rate
+    third = max(1, args.scans // 3)
+    server.failure_mode = args.failure_mode
+    for i in range(args.scans):
+        if i == third:
+            server.outage = True
+        elif i == 2 * third:
+            server.outage = False
+        t_next = time.monotonic() + interval
+        bench.scan(_code(i, args.deny_every), args.inter_key)
+        time.sleep(max(0.0, t_next - time.monotonic()))
+
+
+def scenario_lanes(bench: Bench, server: StubServer, args):
+    """Two passages scanned alternately, the server is slow for lane #2 only."""
+    server.slow_devices = {2: args.slow_lane}
+    interval = 1.0 / args.rate
+    for i in range(args.scans):
+        t_next = time.monotonic() + interval
+        bench.scan(_code(i, args.deny_every), args.inter_key, lane=i % 2)
+        time.sleep(max(0.0, t_next - time.monotonic()))
+
+
+def run_scenario(name: str, args) -> dict:
+    codes = [_code(i, 0) for i in range(max(args.scans, args.cards))]
+    server = StubServer(args.latency, args.jitter, args.failure_rate, args.failure_mode, tickets=codes).start()
+    workdir = tempfile.mkdtemp(prefix="emp-bench-")
+    bench = Bench(server, workdir, name, args, lanes=2 if name == "lanes" else 1)
+    try:
+        t_start = time.monotonic()
+        if name == "burst":
+            scenario_burst(bench, args)
+        elif name == "held":
+            scenario_held(bench, args)
+        elif name == "repeat":
+            scenario_repeat(bench, args)
+        elif name == "lanes":
+            scenario_lanes(bench, server, args)
+        else:
+            scenario_outage(bench, server, args)
+        bench.drain()
+        t_end = max((t for events in bench.actuated.values() for t, _ in events), default=time.monotonic())
+        result = bench.report(name, t_start, t_end)
+        result["server_scans"] = server.requests.get("POST /api/devices/pi/scan", 0)
+        return result
+    finally:
+        bench.close()
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_report(results: list[dict], args) -> str:
+    lines = [
+        f"EMP Access Scanner v{VERSION} – Latenz-Benchmark",
+        f"Server-Latenz {args.latency * 1000:.0f} ms ± {args.jitter * 1000:.0f} ms, "
+        f"Fehlerquote {args.failure_rate:.0%}, Ausfallmodus {args.failure_mode}",
+        "",
+        f"{'Szenario':<8} {'Scans':>6} {'Akt.':>5} {'Dup.':>5} {'Wdh.':>5} {'Verw.':>5} {'Server':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'Scans/s':>8}",
+    ]
+    for r in results:
+        lat = r["latency_ms"]
+
+        def col(v):
+            return f"{v:8.1f}" if v is not None else f"{'-':>8}"
+
+        lines.append(
+            f"{r['scenario']:<8} {r['injected']:>6} {r['actuated']:>5} {r['suppressed']:>5} {r['replayed']:>5} "
+            f"{r['dropped']:>5} {r['server_scans']:>6} "
+            f"{col(lat['p50'])} {col(lat['p95'])} {col(lat['p99'])} {col(lat['max'])} {r['scans_per_s']:>8.1f}"
+        )
+    lines.append("")
+    lines.append("Akt. = Relais/LED geschaltet, Dup. = Dedupe unterdrückt, Wdh. = Entscheidung lokal wiederholt,")
+    lines.append("Verw. = Queue-Überlauf, Server = Scan-Anfragen am Server")
+    for r in results:
+        if len(r["lanes_p50_ms"]) > 1:
+            lines.append(f"{r['scenario']}: p50 je Durchgang " + ", ".join(
+                f"{label} {v:.1f} ms" if v is not None else f"{label} -" for label, v in r["lanes_p50_ms"].items()))
+        if r["optimistic"]:
+            o = r["optimistic"]
+            lines.append(f"{r['scenario']}: optimistisch {o['granted']}, bestätigt {o['confirmed']}, "
+                         f"Widerspruch {o['mismatch']}, unbestätigt {o['unconfirmed']}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="EMP Access Scan-to-Relay Benchmark")
+    parser.add_argument("-s", "--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--scans", type=int, default=200, help="Scans für burst/outage")
+    parser.add_argument("--rate", type=float, default=20.0, help="Scans pro Sekunde für burst/outage")
+    parser.add_argument("--cards", type=int, default=5, help="Karten im held-Szenario")
+    parser.add_argument("--hold", type=float, default=1.5, help="Liegedauer pro Karte (s)")
+    parser.add_argument("--deny-every", type=int, default=10, help="jeder n-te Code ist ungültig (0 = keiner)")
+    parser.add_argument("--inter-key", type=float, default=0.0, help="Abstand zwischen Tastenevents (s)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Server-Antwortzeit (s)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="± Jitter (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-mode", choices=("503", "drop", "hang"), default="hang")
+    parser.add_argument("--offline-policy", choices=("local", "deny", "grant"), default="local")
+    parser.add_argument("--dedupe-window", type=float, default=1.0)
+    parser.add_argument("--replay-window", type=float, default=3.0, help="0 = jede Wiederholung zum Server")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--slow-lane", type=float, default=0.3, help="Zusatzverzögerung für Durchgang #2 (s)")
+    parser.add_argument("--breaker-failures", type=int, default=3)
+    parser.add_argument("--breaker-open", type=float, default=15.0)
+    parser.add_argument("--optimistic", action="store_true", help="optimistische Freigabe aus dem Ticketbestand")
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON ausgeben")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = [run_scenario(name, args) for name in names]
+    if args.json:
+        print(json.dumps({"version": VERSION, "args": vars(args), "results": results}, indent=2))
+    else:
+        print(format_report(results, args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
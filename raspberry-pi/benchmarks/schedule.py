@@ -0,0 +1,307 @@
+"""
+Scheduler check – merged polls, backoff in outages, fleet spread, adaptive intervals, budget.
+
+Compares the scheduler (emp_scanner.scheduler) with independent fixed loops
+(Runtime.every, as before) against the stub server, with intervals scaled down
+so one run takes about a minute:
+
+  Merge     task poll (fallback mode) + heartbeat: GETs within one poll interval
+            of a heartbeat are redundant – the heartbeat answer carries the config
+  Outage    server answers 503 for --outage seconds: requests sent, and time from
+            recovery to the first successful poll
+  Fleet     --fleet devices start at the same moment: most heartbeats in any 100 ms
+  Adaptive  heartbeat interval normal, quiet (no activity) and after dashboard activity
+  Budget    task poll far below its budget interval → runs per minute stay in budget
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.schedule [--outage 8] [--fleet 20]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+
+from emp_scanner.api_client import ApiClient
+from emp_scanner.runtime import Runtime
+from emp_scanner.scheduler import REQUEST_BUDGET, Job, Scheduler
+from emp_scanner.sysinfo import SystemSampler
+from emp_scanner.task_channel import POLL, TaskChannel
+
+from benchmarks.stub_server import StubServer
+
+POLL_SEC = 0.3
+HEARTBEAT_SEC = 1.5
+MERGE_SEC = 6.0
+GET = "GET /api/devices/pi"
+POST = "POST /api/devices/pi"
+
+
+class Device:
+    """ApiClient + task channel in polling mode, jobs either as fixed loops or in a scheduler."""
+
+    sampler: SystemSampler | None = None
+
+    def __init__(self, server: StubServer, device_id: int = 1):
+        if Device.sampler is None:
+            # Heartbeats kopieren nur den letzten Stand, wie im Dienst
+            Device.sampler = SystemSampler()
+        self.api = ApiClient(server.url, "bench", device_id, sampler=Device.sampler)
+        self.tasks = TaskChannel(self.api, on_config=lambda config: None, poll_interval=1)
+        self.tasks.mode = POLL
+        self.tasks._poll_since = time.monotonic()
+        self.heartbeats: list[float] = []
+
+    def heartbeat(self) -> bool:
+        self.heartbeats.append(time.monotonic())
+        return self.api.send_heartbeat() is not None
+
+    def jobs(self, poll: float | None = POLL_SEC, heartbeat: float = HEARTBEAT_SEC, **heartbeat_options) -> list[Job]:
+        jobs = [Job("Heartbeat", self.heartbeat, heartbeat, endpoint="heartbeat", covers=("Task-Poll",),
+                    **heartbeat_options)]
+        if poll is not None:
+            jobs.append(Job("Task-Poll", self.tasks.poll_once, poll, endpoint="config"))
+        return jobs
+
+
+class Loop:
+    """Event loop + runtime in a background thread."""
+
+    def __init__(self, workers: int = 4):
+        self.loop = asyncio.new_event_loop()
+        self.rt = Runtime(self.loop, workers=workers)
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def call(self, fn, *args):
+        async def _call():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(_call(), self.loop).result(5)
+
+    def fixed(self, jobs: list[Job]):
+        """Previous behaviour: one Runtime.every per job, no jitter, no backoff."""
+        for job in jobs:
+            self.call(self.rt.every, job.name, job.fn, job.interval)
+
+    def scheduled(self, jobs: list[Job], **options) -> Scheduler:
+        # Intervalle sind verkürzt – das Budget nur im Budget-Szenario begrenzen
+        options.setdefault("budget", {endpoint: 100000 for endpoint in REQUEST_BUDGET})
+        scheduler = Scheduler(**options)
+        self.call(scheduler.start, self.rt)
+        for job in jobs:
+            scheduler.add(job)
+        return scheduler
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.rt.shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _log(server: StubServer, start: float, keys=(GET, POST)) -> list[tuple[float, str]]:
+    with server._lock:
+        return [(t, k) for t, k in server.request_log if t >= start and k in keys]
+
+
+def _redundant(log: list[tuple[float, str]]) -> int:
+    """GETs within one poll interval of a heartbeat POST."""
+    posts = [t for t, k in log if k == POST]
+    return sum(1 for t, k in log if k == GET and any(abs(t - p) < POLL_SEC * 0.9 for p in posts))
+
+
+def _peak(times: list[float], window: float = 0.1) -> int:
+    times = sorted(times)
+    peak, j = 0, 0
+    for i, t in enumerate(times):
+        while times[j] < t - window:
+            j += 1
+        peak = max(peak, i - j + 1)
+    return peak
+
+
+def _run_for(seconds: float, setup) -> tuple:
+    loop = Loop(workers=32)
+    try:
+        start = time.monotonic()
+        result = setup(loop)
+        time.sleep(seconds)
+        return start, result
+    finally:
+        loop.close()
+
+
+def merge() -> dict:
+    out = {}
+    for mode in ("fixed", "scheduler"):
+        server = StubServer(latency=0.01).start()
+        try:
+            device = Device(server)
+            start, _ = _run_for(MERGE_SEC, lambda loop: loop.fixed(device.jobs()) if mode == "fixed"
+                                else loop.scheduled(device.jobs(), start_spread=0))
+            log = _log(server, start)
+            out[mode] = {"get": sum(k == GET for _, k in log), "post": sum(k == POST for _, k in log),
+                         "redundant": _redundant(log)}
+        finally:
+            server.stop()
+    return out
+
+
+def outage(seconds: float) -> dict:
+    out = {}
+    for mode in ("fixed", "scheduler"):
+        server = StubServer(latency=0.01, failure_mode="503").start()
+        server.outage = True
+        try:
+            device = Device(server)
+
+            def setup(loop):
+                if mode == "fixed":
+                    loop.fixed(device.jobs())
+                else:
+                    loop.scheduled(device.jobs(), start_spread=0, min_backoff=POLL_SEC, max_backoff=2.0)
+
+            loop = Loop(workers=8)
+            try:
+                start = time.monotonic()
+                setup(loop)
+                time.sleep(seconds)
+                sent = len(_log(server, start))
+                server.outage = False
+                back = time.monotonic()
+                recovered = None
+                while time.monotonic() - back < 5 and recovered is None:
+                    time.sleep(0.02)
+                    with server._lock:
+                        ok = [t for t, k in server.request_log[-4:] if t > back and k in (GET, POST)]
+                    recovered = ok[0] - back if ok else None
+            finally:
+                loop.close()
+            out[mode] = {"sent": sent, "recovered": recovered}
+        finally:
+            server.stop()
+    return out
+
+
+def fleet(devices: int) -> dict:
+    out = {}
+    for mode in ("fixed", "scheduler"):
+        server = StubServer(latency=0.01).start()
+        try:
+            fleet_devices = [Device(server, i + 1) for i in range(devices)]
+
+            def setup(loop):
+                for device in fleet_devices:
+                    if mode == "fixed":
+                        loop.fixed(device.jobs(poll=None, heartbeat=2.0))
+                    else:
+                        loop.scheduled(device.jobs(poll=None, heartbeat=2.0), start_spread=2.0)
+
+            start, _ = _run_for(6.0, setup)
+            posts = [t for t, k in _log(server, start, (POST,))]
+            out[mode] = {"peak": _peak(posts), "heartbeats": len(posts)}
+        finally:
+            server.stop()
+    return out
+
+
+def adaptive() -> dict:
+    server = StubServer(latency=0.005).start()
+    loop = Loop()
+    try:
+        device = Device(server)
+        scheduler = loop.scheduled(device.jobs(poll=None, heartbeat=0.4, fast=0.15, adaptive=True, max_interval=1.0),
+                                   start_spread=0, quiet_after=2.5, quiet_factor=4, fast_window=1.5)
+
+        def median_gap(since: float, until: float) -> float:
+            times = [t for t in device.heartbeats if since <= t <= until]
+            gaps = [b - a for a, b in zip(times, times[1:])]
+            return statistics.median(gaps) if gaps else float("nan")
+
+        t0 = time.monotonic()
+        time.sleep(2.4)
+        normal = median_gap(t0, time.monotonic())
+        time.sleep(0.8)
+        t1 = time.monotonic()
+        time.sleep(4.0)
+        quiet = median_gap(t1, time.monotonic())
+        mode_quiet = scheduler.mode()
+        scheduler.activity(fast=True)
+        t2 = time.monotonic()
+        time.sleep(1.4)
+        fast = median_gap(t2, time.monotonic())
+        return {"normal": normal, "quiet": quiet, "fast": fast, "mode_quiet": mode_quiet}
+    finally:
+        loop.close()
+        server.stop()
+
+
+def budget() -> dict:
+    server = StubServer(latency=0.005).start()
+    loop = Loop()
+    try:
+        device = Device(server)
+        start = time.monotonic()
+        scheduler = loop.scheduled([Job("Task-Poll", device.tasks.poll_once, 0.02, endpoint="config")],
+                                   budget={"config": 60}, start_spread=0)
+        time.sleep(4.0)
+        gets = len(_log(server, start, (GET,)))
+        return {"gets": gets, "throttled": scheduler.jobs[0].counts["throttled"], "seconds": 4.0}
+    finally:
+        loop.close()
+        server.stop()
+
+
+def run(outage_sec: float, devices: int) -> int:
+    failures = []
+    m = merge()
+    if m["scheduler"]["redundant"] > 0:
+        failures.append(f"Zusammenlegen: {m['scheduler']['redundant']} doppelte Abrufe neben dem Heartbeat")
+    if m["scheduler"]["get"] >= m["fixed"]["get"]:
+        failures.append("Zusammenlegen: nicht weniger Abrufe als mit festen Schleifen")
+    o = outage(outage_sec)
+    if o["scheduler"]["sent"] * 2 > o["fixed"]["sent"]:
+        failures.append("Ausfall: Backoff spart weniger als die Hälfte der Anfragen")
+    if o["scheduler"]["recovered"] is None or o["scheduler"]["recovered"] > 2.5:
+        failures.append(f"Ausfall: erste Anfrage nach Wiederkehr erst nach {o['scheduler']['recovered']} s")
+    f = fleet(devices)
+    if f["scheduler"]["peak"] * 2 > f["fixed"]["peak"]:
+        failures.append("Flotte: Spitze nicht mindestens halbiert")
+    a = adaptive()
+    if not (a["fast"] < a["normal"] * 0.6 and a["quiet"] > a["normal"] * 1.8 and a["mode_quiet"] == "quiet"):
+        failures.append(f"Adaptiv: Intervalle {a}")
+    b = budget()
+    if b["gets"] > 60 * b["seconds"] / 60 + 60 + 1 or not b["throttled"]:
+        failures.append(f"Budget: {b['gets']} Abrufe in {b['seconds']:.0f} s bei 60/min")
+
+    print(f"Zusammenlegen ({MERGE_SEC:.0f} s, Poll {POLL_SEC} s, Heartbeat {HEARTBEAT_SEC} s)")
+    for mode, r in m.items():
+        print(f"  {mode:10} GET {r['get']:3}  POST {r['post']:2}  GET neben Heartbeat {r['redundant']}")
+    print(f"Ausfall ({outage_sec:.0f} s 503)")
+    for mode, r in o.items():
+        rec = f"{r['recovered']:.2f} s" if r["recovered"] is not None else "–"
+        print(f"  {mode:10} Anfragen {r['sent']:4}  erste Anfrage nach Wiederkehr {rec}")
+    print(f"Flotte ({devices} Geräte, gleichzeitiger Start)")
+    for mode, r in f.items():
+        print(f"  {mode:10} Heartbeats {r['heartbeats']:3}  max. in 100 ms {r['peak']}")
+    print(f"Adaptiv (Heartbeat 0.4 s)  normal {a['normal']:.2f} s, ruhig {a['quiet']:.2f} s, "
+          f"nach Dashboard {a['fast']:.2f} s")
+    print(f"Budget (Poll 20 ms, 60/min)  {b['gets']} Abrufe in {b['seconds']:.0f} s, {b['throttled']}× gedrosselt")
+    for failure in failures:
+        print("FEHLER:", failure)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Scheduler gegen feste Schleifen")
+    parser.add_argument("--outage", type=float, default=8.0)
+    parser.add_argument("--fleet", type=int, default=20)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    return run(args.outage, args.fleet)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
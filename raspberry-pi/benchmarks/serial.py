@@ -0,0 +1,155 @@
+"""
+Serial scanner check – framing over a pty, latency against the evdev backend, hotplug.
+
+Runs SerialScannerInput (event-loop mode) against FakeSerialScanner: codes in one
+write, split across writes and several per write, a reader without terminator,
+4 KB of garbage and unplug/replug under a new ttyACM name. Then the same codes go
+through the evdev backend (ScannerInput + KeyDecoder) for comparison.
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.serial [--codes 500]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from emp_scanner.scanner import ScannerInput
+from emp_scanner.serial_input import SerialScannerInput
+
+from benchmarks.fakes import FakeInputDevice, FakeSerialScanner, install_fake_evdev
+
+
+def _wait(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.0005)
+    return False
+
+
+def _p50(values: list[float]) -> float:
+    values = sorted(values)
+    return values[len(values) // 2] * 1000 if values else float("nan")
+
+
+def _latencies(scans: list, send, codes: list[str]) -> list[float]:
+    out = []
+    for i, code in enumerate(codes):
+        t = send(code)
+        if not _wait(lambda: len(scans) > i, 2):
+            break
+        out.append(scans[i][1] - t)
+    return out
+
+
+def run(count: int) -> int:
+    failures = []
+    lines = []
+    root = tempfile.mkdtemp(prefix="emp-serial-")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    codes = [f"Q{i:09d}-Ab" for i in range(count)]
+    try:
+        reader = FakeSerialScanner(link=os.path.join(root, "ttyACM0"))
+        scans: list[tuple[str, float]] = []
+        serial = SerialScannerInput(lambda code, _f, _e: scans.append((code, time.monotonic())),
+                                    device_path="serial", timestamps=True, dev_dir=root)
+        loop.call_soon_threadsafe(serial.start, loop)
+        if not _wait(lambda: serial.stats()["connected"], 2):
+            failures.append("Seriell: Leser nicht gefunden")
+            return 1
+
+        t0 = time.process_time()
+        serial_lat = _latencies(scans, reader.type_code, codes)
+        serial_cpu = time.process_time() - t0
+        if [c for c, _ in scans] != codes:
+            failures.append("Seriell: Codes verfälscht")
+
+        # Zerteilt, mehrere je Schreibvorgang, ohne Terminator, Müll
+        scans.clear()
+        reader.write(b"SPLIT-")
+        time.sleep(0.01)
+        reader.write(b"0001\r\nMULTI-1\r\nMULTI-2\nMUL")
+        reader.write(b"TI-3\r\n")
+        _wait(lambda: len(scans) >= 4, 1)
+        reader.write(b"\x00" * 5000 + b"\r\n")
+        time.sleep(0.05)
+        reader.type_code("NACH-MUELL")
+        reader.type_code("OHNE-ENDE", terminator=False)
+        _wait(lambda: len(scans) >= 6, 1)
+        expected = ["SPLIT-0001", "MULTI-1", "MULTI-2", "MULTI-3", "NACH-MUELL", "OHNE-ENDE"]
+        got = [c for c, _ in scans]
+        if got != expected:
+            failures.append(f"Seriell: Framing falsch: {got}")
+        stats = serial.stats()
+        rejected = stats["framing"]["rejected"]
+        if rejected["overflow"] != 1 or rejected["garbage"] != 1 or stats["framing"]["frames"]["gap"] != 1:
+            failures.append(f"Seriell: Zähler falsch: {stats['framing']}")
+
+        # Abziehen und unter neuem Namen wieder einstecken
+        reader.unplug()
+        _wait(lambda: not serial.stats()["connected"], 1)
+        t_plug = time.monotonic()
+        reader = FakeSerialScanner(link=os.path.join(root, "ttyACM1"))
+        if _wait(lambda: serial.stats()["connected"], 5):
+            lines.append(f"Wiederverbindung (ttyACM0 → ttyACM1): {(serial.connected_at - t_plug) * 1000:.1f} ms")
+            scans.clear()
+            reader.type_code("WIEDER-DA")
+            if not _wait(lambda: scans and scans[0][0] == "WIEDER-DA", 1):
+                failures.append("Seriell: kein Scan nach Wiederverbindung")
+        else:
+            failures.append("Seriell: nicht wieder verbunden")
+        loop.call_soon_threadsafe(serial.stop)
+        reader.unplug()
+
+        # Vergleich: dieselben Codes über evdev (Tastatur-Emulation)
+        install_fake_evdev()
+        path = "/dev/input/serial-bench"
+        dev = FakeInputDevice.open(path)
+        key_scans: list[tuple[str, float]] = []
+        hid = ScannerInput(lambda code, _f, _e: key_scans.append((code, time.monotonic())),
+                           device_path=path, timestamps=True, hotplug=False)
+        loop.call_soon_threadsafe(hid.start, loop)
+        time.sleep(0.05)
+        t0 = time.process_time()
+        hid_lat = _latencies(key_scans, dev.type_code, codes)
+        hid_cpu = time.process_time() - t0
+        loop.call_soon_threadsafe(hid.stop)
+        if [c for c, _ in key_scans] != codes:
+            failures.append("evdev: Codes verfälscht")
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{count} Codes à {len(codes[0])} Zeichen")
+    print(f"{'Backend':<8} {'p50 ms':>8} {'CPU µs/Code':>12}")
+    print(f"{'seriell':<8} {_p50(serial_lat):>8.3f} {serial_cpu / count * 1e6:>12.0f}")
+    print(f"{'evdev':<8} {_p50(hid_lat):>8.3f} {hid_cpu / count * 1e6:>12.0f}")
+    print("(CPU inkl. Erzeugen der Testeingaben; evdev: je Zeichen 2–4 Events)")
+    for line in lines:
+        print(line)
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Seriellen Scanner über pty prüfen")
+    parser.add_argument("--codes", type=int, default=500)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.codes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Local stub of the EMP Access device API for benchmarks – no database, TLS optional (certfile).
+
+Endpoints (same paths and payloads as the real server):
+  GET  /api/devices/pi            device config (ETag / 304); ?ids=1,2 configs of several devices
+  POST /api/devices/pi            heartbeat v1 (array) and v2 (delta, gzip, config in response),
+                                  array of v2 heartbeats (gateway)
+  GET  /api/devices/pi/events     long-poll (returns "unchanged" after wait)
+  POST /api/devices/pi/scan       codes starting with GRANT_PREFIX are granted (not if the
+                                  ticket with that code is INVALID)
+  GET  /api/devices/pi/tickets    snapshot (?after=) or delta since cursor (?since=&sinceId=)
+  POST /api/devices/pi/scans      batch upload of offline scans
+
+Latency, jitter and failures are configurable at runtime:
+  latency / jitter   seconds added to every response
+  failure_rate       share of requests answered with failure_mode
+  failure_mode       "503" (HTTP error), "drop" (close connection), "hang" (never answer in time)
+  outage             True → every request fails with failure_mode
+  heartbeat_v2       False → behaves like a server before heartbeat v2 (400 for object bodies)
+  batch_api          False → behaves like a server before the gateway endpoints (?ids=, v2 arrays)
+  slow_devices       {deviceId: seconds} extra scan latency for single devices (multi-lane)
+  connect_delay      seconds added once per new connection (handshake round trips of a real link)
+  idle_timeout       keep-alive connections idle longer than this are closed (like a load balancer)
+
+Tickets can be changed while running (put_ticket / delete_ticket); every change
+stamps updatedAt, so the delta sync sees it like on the real server. Every device id
+gets the same config (with its own pis_id) and its own stored system_info.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import random
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GRANT_PREFIX = "1"
+HANG_SECONDS = 30
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def merge_patch(target, patch):
+    """JSON Merge Patch (RFC 7386) – same as mergePatch in src/lib/pi-heartbeat.ts."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+class StubServer:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 failure_mode: str = "drop", device_id: int = 1, tickets: list[str] | None = None,
+                 certfile: str | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.outage = False
+        self.heartbeat_v2 = True
+        self.batch_api = True
+        self.slow_devices: dict[int, float] = {}
+        self.connect_delay = 0.0
+        self.idle_timeout: float | None = None
+        self.connections = 0
+        self.device = {
+            "pis_id": device_id, "pis_name": "Bench", "pis_type": "RASPBERRY_PI",
+            "pis_in": None, "pis_out": None, "pis_active": 1, "pis_task": 0,
+            "pis_again": 1, "pis_firmware": None,
+        }
+        self.tickets: dict[int, dict] = {}
+        # Aufruf zwischen Cursor und erster Snapshot-Seite (gleichzeitige Änderung am Server)
+        self.snapshot_hook = None
+        # GRANTED-Scans (Gerät, Ticket) für den Wiedereintritt – Scan-ID = Position + 1
+        self.grants: list[tuple[int, int]] = []
+        self._changes = 0
+        self.requests: dict[str, int] = {}
+        self.request_log: list[tuple[float, str]] = []
+        self.scans: list[dict] = []
+        self.heartbeats: list[dict] = []
+        self.heartbeat_bytes: list[int] = []
+        self.system_infos: dict[int, dict | None] = {}
+        self._lock = threading.Lock()
+        for code in tickets or []:
+            self.put_ticket(code)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True,
+                                                      do_handshake_on_connect=False)
+            self.scheme = "https"
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def system_info(self) -> dict | None:
+        """Stored system_info of the stub's own device."""
+        return self.system_infos.get(self.device["pis_id"])
+
+    @system_info.setter
+    def system_info(self, value: dict | None):
+        self.system_infos[self.device["pis_id"]] = value
+
+    def config(self, device_id: int | None = None) -> dict:
+        return self.device if device_id in (None, self.device["pis_id"]) else dict(self.device, pis_id=device_id)
+
+    def count(self, key: str):
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_log.append((time.monotonic(), key))
+
+    def apply_heartbeat(self, hb: dict) -> dict:
+        """Server side of heartbeat v2 (mirrors applyHeartbeat in src/lib/pi-heartbeat.ts)."""
+        device_id = hb["pis_id"]
+        stored = self.system_infos.get(device_id)
+        if hb["base"] == 0:
+            merged = hb.get("system_info") or {}
+        else:
+            marker = (stored or {}).get("heartbeat") or {}
+            if marker.get("boot") != hb["boot"] or marker.get("seq") != hb["base"]:
+                return {"resync": True, "config": self.config(device_id), "etag": self.etag(device_id).strip('"')}
+            merged = merge_patch(stored, hb.get("system_info") or {})
+        self.system_infos[device_id] = dict(merged, heartbeat={"boot": hb["boot"], "seq": hb["seq"]})
+        if self.device["pis_task"] == 1 and hb["pis_task"] == 0:
+            self.device["pis_task"] = 0
+        return {"ack": hb["seq"], "config": self.config(device_id), "etag": self.etag(device_id).strip('"')}
+
+    def put_ticket(self, code: str, status: str = "VALID", ticket_id: int | None = None,
+                   validity_type: str = "DATE_RANGE") -> int:
+        """Insert or update a ticket (new updatedAt). Returns its id."""
+        with self._lock:
+            if ticket_id is None:
+                ticket_id = max(self.tickets, default=0) + 1
+            self._changes += 1
+            stamp = (EPOCH + timedelta(milliseconds=self._changes)).isoformat(timespec="milliseconds")
+            self.tickets[ticket_id] = {
+                "id": ticket_id, "name": code, "qrCode": code, "status": status,
+                "validityType": validity_type, "areaIds": [],
+                "updatedAt": stamp.replace("+00:00", "Z"),
+            }
+            return ticket_id
+
+    def delete_ticket(self, ticket_id: int):
+        """Hard delete – invisible to the delta query, only the count reveals it."""
+        with self._lock:
+            self.tickets.pop(ticket_id, None)
+
+    def grant(self, device_id: int, ticket_id: int):
+        """GRANTED-Scan eines Tickets an einem Gerät (für den Ticket-Abgleich)."""
+        with self._lock:
+            self.grants.append((device_id, ticket_id))
+
+    def _granted_since(self, query: dict, after: int) -> dict:
+        """Seite der Freigaben ab Scan-Index after – nur Tickets, die hier noch gelten (wie die Route)."""
+        limit = int(query.get("limit", ["2000"])[0])
+        devices = {int(query.get("id", ["1"])[0])}
+        devices.update(int(d) for d in (query.get("devices", [""])[0]).split(",") if d)
+        scans = [(i + 1, g) for i, g in enumerate(self.grants[after:], start=after)
+                 if g[0] in devices and self.tickets.get(g[1], {}).get("status", "INVALID") != "INVALID"][:limit]
+        pairs = dict.fromkeys(g for _, g in scans)
+        return {
+            "grantedScans": [{"deviceId": d, "ticketId": t} for d, t in pairs],
+            "grantedTicketIds": [t for d, t in pairs if d == int(query.get("id", ["1"])[0])],
+            "grantedCursor": scans[-1][0] if scans else after,
+            "grantedHasMore": len(scans) == limit,
+        }
+
+    def ticket_page(self, query: dict) -> dict:
+        """Server side of GET /api/devices/pi/tickets (mirrors the route)."""
+        limit = int(query.get("limit", ["2000"])[0])
+        with self._lock:
+            rows = sorted(self.tickets.values(), key=lambda t: (t["updatedAt"], t["id"]))
+            relevant = [t for t in rows if t["status"] != "INVALID"]
+            since = query.get("since", [None])[0]
+            if since:
+                cursor = (since, int(query.get("sinceId", ["0"])[0]))
+                changed = [t for t in rows if (t["updatedAt"], t["id"]) > cursor][:limit]
+                last = changed[-1] if changed else None
+                body = {
+                    "tickets": [t for t in changed if t["status"] != "INVALID"],
+                    "deleted": [t["id"] for t in changed if t["status"] == "INVALID"],
+                    "cursor": {"updatedAt": last["updatedAt"], "id": last["id"]} if last
+                    else {"updatedAt": cursor[0], "id": cursor[1]},
+                    "hasMore": len(changed) == limit,
+                    **self._granted_since(query, int(query.get("grantedAfter", ["0"])[0])),
+                }
+                if not body["hasMore"]:
+                    body["total"] = len(relevant)
+                return body
+            after = int(query.get("after", ["0"])[0])
+            # Cursor vor dem Lesen der Seite (wie die Route)
+            newest = rows[-1] if rows and not after else None
+        if not after and self.snapshot_hook:
+            self.snapshot_hook()
+        with self._lock:
+            relevant = [t for t in self.tickets.values() if t["status"] != "INVALID"]
+            page = sorted((t for t in relevant if t["id"] > after), key=lambda t: t["id"])[:limit]
+            body = {"tickets": page}
+            if not after:
+                body.update({
+                    "device": self.device, **self._granted_since(query, 0),
+                    "localValidation": True, "total": len(relevant),
+                    "cursor": {"updatedAt": newest["updatedAt"], "id": newest["id"]} if newest else None,
+                })
+            return body
+
+    def etag(self, device_id: int | None = None) -> str:
+        config = json.dumps(self.config(device_id), sort_keys=True)
+        return '"%s"' % hashlib.sha1(config.encode()).hexdigest()[:16]
+
+    # ─── Request handling ─────────────────────────────────────────────────────
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Header und Body gehen getrennt raus – ohne TCP_NODELAY kostet das 40 ms Delayed-ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                self.timeout = stub.idle_timeout
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                if stub.connect_delay:
+                    time.sleep(stub.connect_delay)
+                if isinstance(self.connection, ssl.SSLSocket):
+                    # Handshake im Handler-Thread, nicht im accept()-Thread des Servers
+                    self.connection.do_handshake()
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _send(self, code: int, body=None, headers: dict | None = None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _inject(self) -> bool:
+                """Latency + failure injection. Returns False if the request was failed."""
+                delay = stub.latency + (random.uniform(-stub.jitter, stub.jitter) if stub.jitter else 0)
+                if delay > 0:
+                    time.sleep(delay)
+                if stub.outage or (stub.failure_rate and random.random() < stub.failure_rate):
+                    stub.count("failed")
+                    if stub.failure_mode == "503":
+                        self._send(503, {"error": "Service Unavailable"})
+                    elif stub.failure_mode == "hang":
+                        time.sleep(HANG_SECONDS)
+                        self.close_connection = True
+                    else:
+                        self.close_connection = True
+                    return False
+                return True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query, keep_blank_values=True)
+                stub.count("GET " + url.path)
+                if not self._inject():
+                    return
+                if url.path == "/api/devices/pi" and "ids" in query:
+                    if not stub.batch_api:
+                        self._send(400, {"error": "Missing id parameter"})
+                        return
+                    ids = [int(i) for i in query["ids"][0].split(",") if i]
+                    self._send(200, {"devices": [{"id": i, "config": stub.config(i), "etag": stub.etag(i).strip('"')}
+                                                 for i in ids]})
+                elif url.path == "/api/devices/pi":
+                    device_id = int(query.get("id", ["0"])[0]) or None
+                    etag = stub.etag(device_id)
+                    if self.headers.get("If-None-Match") == etag:
+                        self._send(304, None, {"ETag": etag})
+                    else:
+                        self._send(200, stub.config(device_id), {"ETag": etag})
+                elif url.path == "/api/devices/pi/events":
+                    cursor = query.get("cursor", [""])[0]
+                    device_id = int(query.get("id", ["0"])[0]) or None
+                    etag = stub.etag(device_id).strip('"')
+                    if cursor != etag:
+                        self._send(200, {"changed": True, "cursor": etag, "config": stub.config(device_id),
+                                         "waited": 0})
+                    else:
+                        wait = min(float(query.get("wait", ["1"])[0]), 1.0)
+                        time.sleep(wait)
+                        self._send(200, {"changed": False, "cursor": etag, "waited": int(wait * 1000)})
+                elif url.path == "/api/devices/pi/tickets":
+                    self._send(200, stub.ticket_page(query))
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                stub.count("POST " + url.path)
+                raw = self._body()
+                wire_bytes = len(raw)
+                if not self._inject():
+                    return
+                if self.headers.get("Content-Encoding") == "gzip":
+                    raw = gzip.decompress(raw)
+                body = json.loads(raw or b"null")
+                if url.path == "/api/devices/pi/scan":
+                    code = str(body.get("code", ""))
+                    delay = stub.slow_devices.get(body.get("deviceId"))
+                    if delay:
+                        time.sleep(delay)
+                    granted = code.startswith(GRANT_PREFIX) or code == "__DASHBOARD_OPEN__"
+                    message = "Zutritt gewährt" if granted else "Ticket nicht gefunden"
+                    with stub._lock:
+                        if any(t["qrCode"] == code and t["status"] == "INVALID" for t in stub.tickets.values()):
+                            granted, message = False, "Ticket ungültig"
+                        stub.scans.append({"code": code, "granted": granted, "ts": time.time(),
+                                           "device": body.get("deviceId")})
+                    self._send(200, {"granted": granted, "message": message})
+                elif url.path == "/api/devices/pi":
+                    with stub._lock:
+                        stub.heartbeat_bytes.append(wire_bytes)
+                    if isinstance(body, list) and body and stub.batch_api and all(
+                            isinstance(hb, dict) and hb.get("v") == 2 for hb in body):
+                        with stub._lock:
+                            stub.heartbeats.extend(body)
+                            results = [dict(stub.apply_heartbeat(hb), pis_id=hb["pis_id"]) for hb in body]
+                        self._send(200, {"results": results})
+                    elif isinstance(body, list):
+                        with stub._lock:
+                            stub.heartbeats.extend(body)
+                            if body and body[0].get("system_info"):
+                                stub.system_info = body[0]["system_info"]
+                        self._send(200, {"results": [{"pis_id": stub.device["pis_id"], "updated": True}]})
+                    elif not stub.heartbeat_v2:
+                        self._send(400, {"error": "Invalid body"})
+                    else:
+                        with stub._lock:
+                            stub.heartbeats.append(body)
+                            answer = stub.apply_heartbeat(body)
+                        self._send(200, answer)
+                elif url.path == "/api/devices/pi/scans":
+                    with stub._lock:
+                        stub.scans.extend({"code": s["code"], "granted": s["result"] == "GRANTED",
+                                           "ts": s["ts"], "key": s["key"]} for s in body["scans"])
+                    self._send(200, {"inserted": len(body["scans"]), "duplicates": 0})
+                else:
+                    self._send(404, {"error": "Not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EMP Access API stub")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-mode", default="drop", choices=("503", "drop", "hang"))
+    args = parser.parse_args()
+    server = StubServer(args.latency, args.jitter, args.failure_rate, args.failure_mode).start()
+    print(f"Stub läuft auf {server.url} – Strg+C beendet")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,209 @@
+"""
+Ticket sync check against the stub server – delta, tombstones, hard deletes, resumable snapshot,
+changes made on the server while a snapshot is read, re-entry per device (two lanes, pis_again 0),
+granted scans in pages and only for tickets still valid.
+
+Runs the real ApiClient + TicketSync on a temporary TicketStore and verifies after
+every step that the local mirror equals the tickets the server considers valid.
+
+Usage (from raspberry-pi/):
+  python -m benchmarks.sync [--tickets 5000] [--page 500]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from emp_scanner.api_client import ApiClient
+from emp_scanner.sync import TicketSync
+from emp_scanner.ticket_store import TicketStore
+
+from benchmarks.stub_server import StubServer
+
+
+def _server_rows(server: StubServer) -> dict:
+    return {t["id"]: (t["qrCode"], t["status"]) for t in server.tickets.values() if t["status"] != "INVALID"}
+
+
+def _local_rows(store: TicketStore) -> dict:
+    with store._lock:
+        rows = store._db.execute("SELECT id, qr_code, status FROM tickets").fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def _timed(sync: TicketSync, server: StubServer) -> tuple[bool, float, int]:
+    before = server.requests.get("GET /api/devices/pi/tickets", 0)
+    start = time.perf_counter()
+    ok = sync.run_once()
+    return ok, (time.perf_counter() - start) * 1000, server.requests.get("GET /api/devices/pi/tickets", 0) - before
+
+
+def _reentry(server: StubServer, workdir: str) -> list[str]:
+    """
+    Two lanes (#1, #2) on one store, no re-entry: a ticket that entered on #1 may still
+    enter on #2 offline, one that entered on #2 before the outage (synced grant) may not.
+    """
+    failures = []
+    server.device["pis_again"] = 0
+    ids = sorted(i for i, t in server.tickets.items() if t["status"] == "VALID")[:3]
+    codes = [server.tickets[i]["qrCode"] for i in ids]
+    server.grant(2, ids[1])
+    store = TicketStore(os.path.join(workdir, "lanes.db"))
+    try:
+        sync = TicketSync(ApiClient(server.url, "bench", 1), store, devices=[2])
+        sync.run_once()
+        server.grant(2, ids[2])
+        sync.run_once()
+        lane2 = dict(store._device, pis_id=2)
+        if not store.decide(codes[0])["granted"] or not store.decide(codes[0], device=lane2)["granted"]:
+            failures.append("Wiedereintritt: Eintritt an #1 sperrt Durchgang #2")
+        if store.decide(codes[0])["granted"]:
+            failures.append("Wiedereintritt: zweiter Eintritt an #1 freigegeben")
+        for code, step in ((codes[1], "Snapshot"), (codes[2], "Delta")):
+            if store.decide(code, device=lane2)["granted"]:
+                failures.append(f"Wiedereintritt: Eintritt an #2 vor dem Ausfall ({step}) nicht bekannt")
+    finally:
+        store.close()
+        server.device["pis_again"] = 1
+    return failures
+
+
+def _grant_pages(workdir: str) -> list[str]:
+    """
+    More granted scans than one page: after a single sync run every entered ticket is
+    blocked (rest of the snapshot's grants via delta), grants of an INVALID ticket stay out.
+    """
+    failures = []
+    server = StubServer(tickets=[f"7{i:07d}" for i in range(6)]).start()
+    store = TicketStore(os.path.join(workdir, "grants.db"))
+    try:
+        server.device["pis_again"] = 0
+        ids = sorted(server.tickets)
+        server.put_ticket(server.tickets[ids[-1]]["qrCode"], "INVALID", ticket_id=ids[-1])
+        for ticket_id in ids:
+            server.grant(1, ticket_id)
+        sync = TicketSync(ApiClient(server.url, "bench", 1), store, page_size=2)
+        sync.run_once()
+        with store._lock:
+            granted = {r[0] for r in store._db.execute("SELECT ticket_id FROM granted")}
+        if granted != set(ids[:-1]):
+            failures.append(f"Freigaben-Seiten: erwartet {ids[:-1]}, lokal {sorted(granted)}")
+        server.grant(1, ids[0])
+        for ticket_id in ids[1:4]:
+            server.grant(1, ticket_id)
+        before = store.cursor["granted"]
+        sync.run_once()
+        if store.cursor["granted"] != len(server.grants) or before >= store.cursor["granted"]:
+            failures.append(f"Freigaben-Seiten: Delta-Cursor {store.cursor['granted']} statt {len(server.grants)}")
+    finally:
+        store.close()
+        server.stop()
+    return failures
+
+
+def run(tickets: int, page: int) -> int:
+    failures = []
+    lines = []
+    workdir = tempfile.mkdtemp(prefix="emp-sync-")
+    server = StubServer(tickets=[f"1{i:07d}" for i in range(tickets)]).start()
+    try:
+        api = ApiClient(server.url, "bench", 1)
+        store = TicketStore(os.path.join(workdir, "tickets.db"))
+        sync = TicketSync(api, store, page_size=page)
+
+        def check(step: str, ok: bool, ms: float, requests: int):
+            lines.append(f"{step:<32} {ms:8.1f} ms  {requests:3d} Anfragen  {sync.last_changed:6d} Zeilen")
+            if not ok or _local_rows(store) != _server_rows(server):
+                failures.append(f"{step}: lokaler Bestand weicht ab")
+
+        check("Snapshot (leer)", *_timed(sync, server))
+
+        check("Delta ohne Änderungen", *_timed(sync, server))
+
+        for i in range(1, tickets, 100):
+            server.put_ticket(server.tickets[i]["qrCode"], "REDEEMED", ticket_id=i)
+        for i in range(2, tickets, 250):
+            server.put_ticket(server.tickets[i]["qrCode"], "INVALID", ticket_id=i)
+        for i in range(20):
+            server.put_ticket(f"9{i:07d}")
+        check("Delta (Änderungen + Tombstones)", *_timed(sync, server))
+        if sync.mode != "delta":
+            failures.append("Delta: unerwarteter Snapshot")
+
+        server.delete_ticket(3)
+        ok, ms, requests = _timed(sync, server)
+        check("Hartes Löschen → Snapshot", ok, ms, requests)
+        if sync.snapshots != 2:
+            failures.append("Hartes Löschen: kein Snapshot nach Anzahl-Abweichung")
+
+        # Snapshot bricht nach der ersten Seite ab und wird beim nächsten Lauf fortgesetzt
+        store.reset_cursor()
+        calls = {"n": 0}
+        get_tickets = api.get_tickets
+
+        def flaky(*args, **kwargs):
+            calls["n"] += 1
+            return None if calls["n"] > 1 else get_tickets(*args, **kwargs)
+
+        api.get_tickets = flaky
+        if sync.run_once() or store.snapshot_progress() is None:
+            failures.append("Abbruch: Fortschritt nicht gespeichert")
+        api.get_tickets = get_tickets
+        server.put_ticket("80000000")
+        check("Snapshot fortgesetzt", *_timed(sync, server))
+        if sync.resumed != 1:
+            failures.append("Abbruch: Snapshot nicht fortgesetzt")
+
+        # Ticket wird eingelöst, während der Server die erste Snapshot-Seite liest – die Anzahl bleibt
+        # gleich, nur der Delta-Sync ab dem Cursor des Snapshots holt die Änderung
+        store.reset_cursor()
+        valid = next(t for t in server.tickets.values() if t["status"] == "VALID")
+
+        def redeem():
+            server.snapshot_hook = None
+            server.put_ticket(valid["qrCode"], "REDEEMED", ticket_id=valid["id"])
+
+        server.snapshot_hook = redeem
+        sync.run_once()
+        check("Änderung während Snapshot", *_timed(sync, server))
+
+        store.set_device(dict(server.device, pis_in=7))
+        if store.cursor is not None:
+            failures.append("Bereichswechsel: Cursor nicht verworfen")
+
+        stats = sync.stats()
+        store.close()
+        failures += _reentry(server, workdir)
+        failures += _grant_pages(workdir)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Tickets: {tickets}, Seitengröße {page}")
+    for line in lines:
+        print(line)
+    print(f"Heartbeat: {stats}")
+    for f in failures:
+        print("FEHLER:", f)
+    print("OK" if not failures else f"{len(failures)} Fehler")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ticket-Sync gegen Stub-Server prüfen")
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=500)
+    args = parser.parse_args(argv)
+    if args.tickets <= args.page:
+        parser.error("--tickets muss größer als --page sein (Abbruch nach der ersten Seite)")
+    logging.getLogger().setLevel(logging.ERROR)
+    return run(args.tickets, args.page)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
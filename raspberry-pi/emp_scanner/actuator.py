@@ -0,0 +1,452 @@
+"""
+Actuator process – relay, LEDs, buzzer and door inputs isolated from network and telemetry.
+
+With config actuator_process the GPIO belongs to a small child process
+(python -m emp_scanner.actuator). It only runs the sequencer, the relay
+controllers and the door monitors, and never imports requests, SQLite or the
+updater. TLS handshakes, the system sampler, git/subprocess forks and GC pauses
+of the main process therefore can no longer delay a relay timeout.
+
+  actuator_rt_priority  > 0: SCHED_FIFO with this priority (needs root, like the service)
+  actuator_mlock        mlockall – no page faults on the actuation path
+
+The child is set up before its threads start (they inherit the policy). After
+setup it collects and freezes its objects (gc.freeze), so later collections have
+almost nothing to scan.
+
+Protocol: one AF_UNIX SOCK_SEQPACKET socket pair, one JSON object per message.
+  main → actuator  {"id", "op", "lane", "t", ...}   t = time.monotonic() when sent
+  actuator → main  {"id", "t_on"} / {"id", "stats"} replies, {"op": "event", ...} door events
+Both sides use CLOCK_MONOTONIC, so t_on can go straight into the latency metrics.
+The child measures command latency (sent → switched) and timeout lag and
+reports them in the heartbeat (system_info.actuator).
+
+If the child dies it is restarted on the next command (the kernel frees its GPIO
+lines), and a NOT-AUF that was active is applied again.
+"""
+from __future__ import annotations
+
+import ctypes
+import gc
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+from emp_scanner.metrics import Histogram
+from emp_scanner.sequencer import LAG_BUCKETS, LATE_SEC
+
+logger = logging.getLogger("emp.relay")
+
+REPLY_TIMEOUT = 0.2
+START_TIMEOUT = 5.0
+RETRY_SEC = 2.0
+MCL_CURRENT, MCL_FUTURE = 1, 2
+MAX_MESSAGE = 65536
+
+# Befehle ohne Antwort; grant/deny/unlock antworten mit t_on, stats mit den Zählern
+ASYNC_OPS = ("scan_beep", "startup_sound", "emergency_open", "close", "door_granted", "door_free")
+
+
+def _ms(value: Optional[float], limit: float) -> Optional[float]:
+    return round(min(value, limit) * 1000, 3) if value is not None else None
+
+
+# ─── Hauptprozess ─────────────────────────────────────────────────────────────
+
+class ActuatorClient:
+    """Startet den Aktor-Prozess und stellt je Durchgang Stellvertreter für Relais und Tür bereit."""
+
+    def __init__(self, lanes: list[dict], gpio_backend: str = "auto", gpio_chip: str = "auto",
+                 rt_priority: int = 0, mlock: bool = False):
+        self.lanes = lanes
+        self.init = {"op": "init", "lanes": lanes, "gpio_backend": gpio_backend, "gpio_chip": gpio_chip,
+                     "rt_priority": int(rt_priority), "mlock": bool(mlock),
+                     "log_level": logging.getLogger().getEffectiveLevel()}
+        self._sock: Optional[socket.socket] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._retry_at = 0.0
+        self.restarts = 0
+        self.emergency: set[int] = set()
+        self.doors: dict[int, RemoteDoor] = {}
+
+    def start(self) -> bool:
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self._proc = subprocess.Popen(
+                [sys.executable, "-m", "emp_scanner.actuator", str(child.fileno())],
+                pass_fds=(child.fileno(),),
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+        except OSError as e:
+            logger.error("Aktor-Prozess nicht startbar: %s", e)
+            parent.close()
+            return False
+        finally:
+            child.close()
+        parent.settimeout(START_TIMEOUT)
+        try:
+            parent.send(json.dumps(self.init).encode())
+            ready = json.loads(parent.recv(MAX_MESSAGE) or b"{}")
+        except (OSError, ValueError) as e:
+            ready = {"error": str(e)}
+        if not ready.get("ready"):
+            logger.error("Aktor-Prozess nicht bereit: %s", ready.get("error", "keine Antwort"))
+            parent.close()
+            self._kill()
+            return False
+        parent.settimeout(None)
+        self._sock = parent
+        threading.Thread(target=self._receive, args=(parent,), name="actuator-rx", daemon=True).start()
+        logger.info("Aktor-Prozess gestartet (pid %d, %s)", self._proc.pid, ready.get("mode", ""))
+        return True
+
+    def stop(self):
+        self._closed = True
+        if self._sock is not None:
+            try:
+                self._sock.send(b'{"op": "stop"}')
+            except OSError:
+                pass
+        if self._proc is not None:
+            try:
+                self._proc.wait(2)
+            except subprocess.TimeoutExpired:
+                self._kill()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def relay(self, lane: int) -> RemoteRelay:
+        return RemoteRelay(self, lane, float(self.lanes[lane]["duration"]))
+
+    def door(self, lane: int) -> Optional[RemoteDoor]:
+        if not self.lanes[lane].get("door"):
+            return None
+        door = self.doors[lane] = RemoteDoor(self, lane)
+        return door
+
+    # ─── Senden / Empfangen ───────────────────────────────────────────────────
+
+    def call(self, lane: int, op: str, **fields):
+        """Befehl senden; wartet auf die Antwort außer bei ASYNC_OPS. None bei Fehler/Timeout."""
+        if op == "emergency_open":
+            self.emergency.add(lane)
+        elif op in ("close", "grant", "deny"):
+            self.emergency.discard(lane)
+        if not self._ensure():
+            return None
+        msg_id = next(self._ids)
+        slot = None
+        if op not in ASYNC_OPS:
+            slot = [threading.Event(), None]
+            with self._lock:
+                self._pending[msg_id] = slot
+        data = json.dumps(dict(fields, id=msg_id, op=op, lane=lane, t=time.monotonic())).encode()
+        try:
+            with self._send_lock:
+                self._sock.send(data)
+        except OSError as e:
+            logger.error("Aktor-Prozess nicht erreichbar (%s)", e)
+            with self._lock:
+                self._pending.pop(msg_id, None)
+            return None
+        if slot is None:
+            return None
+        if not slot[0].wait(REPLY_TIMEOUT):
+            logger.warning("Aktor-Prozess antwortet nicht auf %s", op)
+        with self._lock:
+            self._pending.pop(msg_id, None)
+        return slot[1]
+
+    def _ensure(self) -> bool:
+        if self._sock is not None:
+            return True
+        with self._start_lock:
+            if self._sock is not None:
+                return True
+            if self._closed or time.monotonic() < self._retry_at:
+                return False
+            self._retry_at = time.monotonic() + RETRY_SEC
+            self._kill()
+            if not self.start():
+                return False
+            self.restarts += 1
+            for lane in self.emergency:
+                self._sock.send(json.dumps({"id": 0, "op": "emergency_open", "lane": lane,
+                                            "t": time.monotonic()}).encode())
+            return True
+
+    def _receive(self, sock: socket.socket):
+        while True:
+            try:
+                data = sock.recv(MAX_MESSAGE)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            try:
+                msg = json.loads(data)
+            except ValueError:
+                continue
+            if msg.get("op") == "event":
+                door = self.doors.get(msg["lane"])
+                if door is not None:
+                    door.emit(msg["kind"], msg["code"], msg.get("ticket_id"), msg.get("message", ""))
+                continue
+            with self._lock:
+                slot = self._pending.get(msg.get("id"))
+            if slot is not None:
+                slot[1] = msg
+                slot[0].set()
+        if not self._closed:
+            try:
+                code = self._proc.wait(1) if self._proc else None
+            except subprocess.TimeoutExpired:
+                code = None
+            logger.error("Aktor-Prozess beendet (Exit-Code %s) – Neustart beim nächsten Befehl", code)
+        if self._sock is sock:
+            self._sock = None
+        sock.close()
+
+    def _kill(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+
+class RemoteRelay:
+    """Stellvertreter für RelayController im Hauptprozess (gleiche Methoden, die Lane benutzt)."""
+
+    def __init__(self, client: ActuatorClient, lane: int, duration: float):
+        self.client = client
+        self.lane = lane
+        self.duration = duration
+
+    def _t_on(self, op: str) -> Optional[float]:
+        reply = self.client.call(self.lane, op)
+        return reply.get("t_on") if reply else None
+
+    def grant(self) -> Optional[float]:
+        return self._t_on("grant")
+
+    def deny(self) -> Optional[float]:
+        return self._t_on("deny")
+
+    def unlock(self) -> Optional[float]:
+        return self._t_on("unlock")
+
+    def scan_beep(self):
+        self.client.call(self.lane, "scan_beep")
+
+    def startup_sound(self):
+        self.client.call(self.lane, "startup_sound")
+
+    def emergency_open(self):
+        self.client.call(self.lane, "emergency_open")
+
+    def close(self):
+        self.client.call(self.lane, "close")
+
+    def stats(self) -> dict:
+        reply = self.client.call(self.lane, "stats")
+        stats = reply.get("stats", {}) if reply else {"error": "keine Antwort"}
+        return dict(stats, process=True, restarts=self.client.restarts)
+
+    def cleanup(self):
+        """Pins gibt der Aktor-Prozess beim Beenden frei."""
+
+
+class RemoteDoor:
+    """Stellvertreter für DoorMonitor; Ereignisse kommen vom Aktor-Prozess."""
+
+    def __init__(self, client: ActuatorClient, lane: int):
+        self.client = client
+        self.lane = lane
+        self.on_event: Optional[Callable[..., None]] = None
+        self._free = False
+
+    @property
+    def free(self) -> bool:
+        return self._free
+
+    @free.setter
+    def free(self, value: bool):
+        self._free = value
+        self.client.call(self.lane, "door_free", free=value)
+
+    def granted(self, code: str, ticket_id: Optional[int], t_on: Optional[float]):
+        self.client.call(self.lane, "door_granted", code=code, ticket_id=ticket_id, t_on=t_on)
+
+    def stats(self) -> dict:
+        reply = self.client.call(self.lane, "door_stats")
+        return reply.get("stats", {}) if reply else {}
+
+    def emit(self, kind: str, code: str, ticket_id: Optional[int], message: str):
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, code, ticket_id, message)
+            except Exception as e:
+                logger.error("Tür-Ereignis %s nicht erfasst: %s", kind, e)
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ─── Aktor-Prozess ────────────────────────────────────────────────────────────
+
+def _realtime(priority: int, mlock: bool) -> list[str]:
+    mode = []
+    if priority > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            mode.append(f"SCHED_FIFO {priority}")
+        except (OSError, AttributeError) as e:
+            logger.warning("SCHED_FIFO nicht möglich (%s) – normale Priorität", e)
+    if mlock:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0:
+            mode.append("mlockall")
+        else:
+            logger.warning("mlockall fehlgeschlagen (errno %d)", ctypes.get_errno())
+    return mode
+
+
+class _Actuator:
+    def __init__(self, sock: socket.socket, init: dict):
+        from emp_scanner.door import DoorMonitor
+        from emp_scanner.gpio import open_backend
+        from emp_scanner.relay import RelayController
+        from emp_scanner.sequencer import Sequencer
+
+        self.sock = sock
+        self.mode = _realtime(init.get("rt_priority", 0), init.get("mlock", False))
+        self.gpio = open_backend(init.get("gpio_backend", "auto"), init.get("gpio_chip", "auto"))
+        self.seq = Sequencer()
+        self.relays = []
+        self.doors = {}
+        for i, lane in enumerate(init["lanes"]):
+            relay = RelayController(lane["relay_pin"], lane["led_green_pin"], lane["led_red_pin"],
+                                    lane["buzzer_pin"], duration=lane["duration"], sequencer=self.seq,
+                                    gpio=self.gpio)
+            self.relays.append(relay)
+            if lane.get("door"):
+                door = DoorMonitor(relay, on_event=self._event_sender(i), **lane["door"])
+                door.start()
+                self.doors[i] = door
+        self.ipc = Histogram(LAG_BUCKETS)
+        self.ipc_max = 0.0
+        self.ipc_late = 0
+        self.seq.start()
+
+    def _event_sender(self, lane: int):
+        def send(kind: str, code: str, ticket_id: Optional[int], message: str):
+            self._send({"op": "event", "lane": lane, "kind": kind, "code": code,
+                        "ticket_id": ticket_id, "message": message})
+        return send
+
+    def _send(self, msg: dict):
+        try:
+            self.sock.send(json.dumps(msg).encode())
+        except OSError:
+            pass
+
+    def _observe(self, t_sent: float, t_on: float):
+        latency = t_on - t_sent
+        self.ipc.observe(latency)
+        self.ipc_max = max(self.ipc_max, latency)
+        if latency > LATE_SEC:
+            self.ipc_late += 1
+
+    def handle(self, msg: dict) -> bool:
+        op = msg.get("op")
+        if op == "stop":
+            return False
+        relay = self.relays[msg.get("lane", 0)]
+        door = self.doors.get(msg.get("lane", 0))
+        if op in ("grant", "deny", "unlock"):
+            t_on = getattr(relay, op)()
+            self._observe(msg["t"], t_on)
+            self._send({"id": msg["id"], "t_on": t_on})
+        elif op in ("scan_beep", "startup_sound", "emergency_open", "close"):
+            getattr(relay, op)()
+        elif op == "door_granted" and door is not None:
+            door.granted(msg["code"], msg.get("ticket_id"), msg.get("t_on") or time.monotonic())
+        elif op == "door_free" and door is not None:
+            door.free = bool(msg.get("free"))
+        elif op == "door_stats":
+            self._send({"id": msg["id"], "stats": door.stats() if door is not None else {}})
+        elif op == "stats":
+            stats = dict(relay.stats(), relay_on=relay.relay_on, mode=", ".join(self.mode) or "normal",
+                         ipc_p50_ms=_ms(self.ipc.percentile(0.5), self.ipc_max),
+                         ipc_p99_ms=_ms(self.ipc.percentile(0.99), self.ipc_max),
+                         ipc_max_ms=round(self.ipc_max * 1000, 3), ipc_late=self.ipc_late)
+            self._send({"id": msg["id"], "stats": stats})
+        return True
+
+    def close(self):
+        for door in self.doors.values():
+            door.close()
+        for relay in self.relays:
+            relay.cleanup()
+        self.seq.stop()
+
+
+def serve(fd: int) -> int:
+    # Beenden nur über "stop" bzw. Socket-Ende – sonst träfe SIGTERM/Strg+C den Prozess vor dem Hauptprozess
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sock = socket.socket(fileno=fd)
+    try:
+        init = json.loads(sock.recv(MAX_MESSAGE))
+        logging.getLogger().setLevel(init.get("log_level", logging.INFO))
+        actuator = _Actuator(sock, init)
+    except Exception as e:
+        logger.error("Aktor-Prozess: Initialisierung fehlgeschlagen: %s", e)
+        try:
+            sock.send(json.dumps({"ready": False, "error": str(e)}).encode())
+        except OSError:
+            pass
+        return 1
+    # Alles bis hierher bleibt liegen – spätere GC-Läufe müssen es nicht mehr durchsuchen
+    gc.collect()
+    gc.freeze()
+    sock.send(json.dumps({"ready": True, "mode": ", ".join(actuator.mode) or "normal"}).encode())
+    try:
+        while True:
+            data = sock.recv(MAX_MESSAGE)
+            if not data:
+                break   # Hauptprozess beendet
+            try:
+                if not actuator.handle(json.loads(data)):
+                    break
+            except Exception as e:
+                logger.error("Aktor-Befehl fehlgeschlagen: %s", e)
+    finally:
+        actuator.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    sys.exit(serve(int(sys.argv[1])))
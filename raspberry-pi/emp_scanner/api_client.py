@@ -1,65 +1,158 @@
 """
 Server communication – scan validation, heartbeat, config sync.
-All requests use the account API token for authentication.
+Requests to the server use the account API token for authentication.
+Scan, heartbeat and config calls can go through a site gateway (emp_scanner.gateway),
+which gets the site secret instead of the account token.
 """
 
 import time
 import logging
 import requests
-from typing import Optional
+from typing import Iterable, Optional
 
-from emp_scanner.sysinfo import collect_system_info
+from emp_scanner.sysinfo import SystemSampler, collect_system_info
+from emp_scanner.breaker import CircuitBreaker
+from emp_scanner.heartbeat import HeartbeatEncoder, encode_body
+from emp_scanner.connection import DEADLINES, KEEPALIVE_IDLE, ConnectionManager
+from emp_scanner.gateway import GATEWAY_CONNECT, GATEWAY_KINDS, GatewayRoute
 
 logger = logging.getLogger("emp.api")
 
-TIMEOUT_SCAN = 5
-TIMEOUT_HEARTBEAT = 10
+LONG_POLL_WAIT = 20
+POOL_SIZE = 10
 
 
 class ApiClient:
-    def __init__(self, server_url: str, api_token: str, device_id: int):
+    def __init__(self, server_url: str, api_token: str, device_id: int,
+                 breaker: Optional[CircuitBreaker] = None,
+                 sampler: Optional[SystemSampler] = None,
+                 connection: Optional[ConnectionManager] = None,
+                 pool_size: int = POOL_SIZE,
+                 keepalive_idle: float = KEEPALIVE_IDLE,
+                 gateway: Optional[GatewayRoute] = None):
         self.server_url = server_url
         self.api_token = api_token
         self.device_id = device_id
-        self._session = requests.Session()
-        self._session.headers.update({
-            "Authorization": f"Bearer {api_token}",
-            "Content-Type": "application/json",
-        })
+        self.breaker = breaker or CircuitBreaker()
+        self.sampler = sampler
+        self._config_etag: Optional[str] = None
+        self._config_cache: Optional[dict] = None
+        self._heartbeat = HeartbeatEncoder(device_id)
+        if connection is None:
+            connection = ConnectionManager(
+                headers={"Authorization": f"Bearer {api_token}", "Content-Type": "application/json"},
+                pool_size=pool_size,
+                keepalive_idle=keepalive_idle,
+            )
+        self.connection = connection
+        self.gateway = gateway
+
+    def for_device(self, device_id: int) -> "ApiClient":
+        """Client für einen weiteren Durchgang: eigene Geräte-ID und Heartbeat-Stand,
+        gemeinsamer Verbindungspool, Circuit Breaker, System-Info und Gateway."""
+        return ApiClient(self.server_url, self.api_token, device_id,
+                         breaker=self.breaker, sampler=self.sampler, connection=self.connection,
+                         gateway=self.gateway)
+
+    def _request(self, kind: str, method: str, path: str, **kwargs):
+        """
+        Request to path on the server – scan, heartbeat and config via the site gateway
+        (config gateway_url) while it answers, otherwise (and for everything else) directly.
+        """
+        gateway = self.gateway
+        if gateway is not None and kind in GATEWAY_KINDS and gateway.available():
+            connect, read = DEADLINES[kind]
+            # Gateway wartet selbst bis zu connect + read auf den Server
+            timeout = kwargs.get("timeout") or (GATEWAY_CONNECT, connect + read + 1)
+            try:
+                headers = dict(kwargs.get("headers") or {}, **gateway.headers)
+                resp = self.connection.request(kind, method, f"{gateway.url}{path}",
+                                               **dict(kwargs, timeout=timeout, headers=headers))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                gateway.failed(type(e).__name__)
+            else:
+                # 401/403: Geheimnis abgelehnt; 5xx: Gateway erreicht den Server nicht und entscheidet nicht selbst
+                if resp.status_code not in (401, 403) and resp.status_code < 500:
+                    gateway.succeeded()
+                    return resp
+                gateway.failed(f"HTTP {resp.status_code}")
+        return self.connection.request(kind, method, f"{self.server_url}{path}", **kwargs)
 
     def validate_scan(self, code: str) -> dict:
         """
         Send scanned code to server for validation.
         Returns: {"granted": bool, "message": str, "ticket"?: {...}}
+        Circuit open → returns the offline result immediately, without a network call.
         """
+        if not self.breaker.allow():
+            logger.info("Circuit offen – Scan-Prüfung übersprungen")
+            return {"granted": False, "message": "Server nicht erreichbar", "offline": True,
+                    "circuit_open": True}
+
+        start = time.monotonic()
         try:
-            resp = self._session.post(
-                f"{self.server_url}/api/devices/pi/scan",
+            resp = self._request(
+                "scan", "POST", "/api/devices/pi/scan",
                 json={"code": code, "deviceId": self.device_id},
-                timeout=TIMEOUT_SCAN,
             )
+            self._record(resp.status_code, start)
             if resp.status_code == 200:
                 return resp.json()
             logger.error("Scan-Validierung fehlgeschlagen: HTTP %d", resp.status_code)
         except requests.ConnectionError:
+            self.breaker.record_failure()
             logger.error("Server nicht erreichbar")
         except requests.Timeout:
+            self.breaker.record_failure()
             logger.error("Scan-Timeout")
         except Exception as e:
+            self.breaker.record_failure()
             logger.error("Scan-Fehler: %s", e)
 
         return {"granted": False, "message": "Server nicht erreichbar", "offline": True}
 
+    def _record(self, status_code: int, start: float):
+        """Feed a finished call into the breaker (5xx = failure, everything else = reachable)."""
+        if status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success(time.monotonic() - start)
+
+    def upload_scans(self, records: list[dict]) -> bool:
+        """
+        Offline erfasste Scans als Batch hochladen (POST /api/devices/pi/scans).
+        records: journal entries with idempotency key. Returns True if the server confirmed the batch.
+        """
+        try:
+            resp = self._request(
+                "upload", "POST", "/api/devices/pi/scans",
+                json={
+                    "deviceId": self.device_id,
+                    "scans": [{
+                        "key": r["key"],
+                        "code": r["code"],
+                        "ts": r["ts"],
+                        "result": r["result"],
+                        "ticketId": r.get("ticket_id"),
+                    } for r in records],
+                },
+            )
+            if resp.status_code == 200:
+                return True
+            logger.warning("Scan-Upload fehlgeschlagen: HTTP %d", resp.status_code)
+        except Exception as e:
+            logger.debug("Scan-Upload: %s", e)
+        return False
+
     def report_dashboard_open(self) -> bool:
         """
         Meldet eine Dashboard-Öffnung (Relais per Button) als gültigen Scan am Server.
         Wird vom Pi aufgerufen, nachdem task=1 ausgeführt wurde.
         """
         try:
-            resp = self._session.post(
-                f"{self.server_url}/api/devices/pi/scan",
+            resp = self._request(
+                "scan", "POST", "/api/devices/pi/scan",
                 json={"code": "__DASHBOARD_OPEN__", "deviceId": self.device_id},
-                timeout=TIMEOUT_SCAN,
             )
             return resp.status_code == 200
         except Exception as e:
@@ -72,14 +165,13 @@ class ApiClient:
         Verhindert, dass der Server task=1 weiter anzeigt und der Task-Poll mehrfach auslöst.
         """
         try:
-            resp = self._session.post(
-                f"{self.server_url}/api/devices/pi",
+            resp = self._request(
+                "heartbeat", "POST", "/api/devices/pi",
                 json=[{
                     "pis_id": self.device_id,
                     "pis_task": task,
                     "pis_update": int(time.time()),
                 }],
-                timeout=TIMEOUT_HEARTBEAT,
             )
             return resp.status_code == 200
         except Exception as e:
@@ -89,59 +181,171 @@ class ApiClient:
     def get_config(self) -> Optional[dict]:
         """
         Nur GET – Geräteconfig abrufen (z. B. für schnelles Task-Polling).
+        Bedingt per ETag/If-None-Match: bei 304 wird die zuletzt geladene Config geliefert.
         Returns device config or None.
         """
         try:
-            resp = self._session.get(
-                f"{self.server_url}/api/devices/pi",
-                params={"id": self.device_id},
-                timeout=TIMEOUT_HEARTBEAT,
-            )
-            if resp.status_code == 200:
-                return resp.json()
+            return self._fetch_config()
         except Exception as e:
+            self.breaker.record_failure()
             logger.debug("get_config: %s", e)
         return None
 
-    def send_heartbeat(self, task: int = 0) -> Optional[dict]:
+    def _fetch_config(self, kind: str = "config") -> Optional[dict]:
+        headers = {"If-None-Match": self._config_etag} if self._config_etag else {}
+        start = time.monotonic()
+        resp = self._request(
+            kind, "GET", "/api/devices/pi",
+            params={"id": self.device_id},
+            headers=headers,
+        )
+        self._record(resp.status_code, start)
+        if resp.status_code == 304 and self._config_cache is not None:
+            return self._config_cache
+        if resp.status_code == 200:
+            self._config_cache = resp.json()
+            self._config_etag = resp.headers.get("ETag")
+            return self._config_cache
+        return None
+
+    def wait_for_config(self, cursor: str, wait: int = LONG_POLL_WAIT) -> Optional[dict]:
         """
-        Send heartbeat with system info. Returns device config from server or None.
+        Long-Poll auf Konfigurationsänderungen (GET /api/devices/pi/events).
+        Returns {"changed": bool, "cursor": str, "config"?: {...}}, {"unsupported": True}
+        if the server has no push endpoint, or None on network errors.
         """
+        start = time.monotonic()
         try:
-            sys_info = collect_system_info()
-
-            self._session.post(
-                f"{self.server_url}/api/devices/pi",
-                json=[{
-                    "pis_id": self.device_id,
-                    "pis_task": task,
-                    "pis_update": int(time.time()),
-                    "system_info": sys_info,
-                }],
-                timeout=TIMEOUT_HEARTBEAT,
+            connect, read = DEADLINES["events"]
+            resp = self._request(
+                "events", "GET", "/api/devices/pi/events",
+                params={"id": self.device_id, "cursor": cursor, "wait": wait},
+                timeout=(connect, wait + read),
             )
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.debug("wait_for_config: %s", e)
+            return None
+        if resp.status_code == 404 and "json" not in resp.headers.get("Content-Type", ""):
+            # Älterer Server ohne Push-Endpunkt (Next.js-404-Seite statt JSON)
+            return {"unsupported": True}
+        if resp.status_code != 200:
+            self._record(resp.status_code, start)
+            return None
+        data = resp.json()
+        # Wartezeit am Server zählt nicht als Latenz
+        self._record(resp.status_code, start + data.get("waited", 0) / 1000.0)
+        if data.get("config"):
+            self._config_cache = data["config"]
+        return data
 
-            resp = self._session.get(
-                f"{self.server_url}/api/devices/pi",
-                params={"id": self.device_id},
-                timeout=TIMEOUT_HEARTBEAT,
+    def get_tickets(self, after: int = 0, limit: int = 2000, since: Optional[dict] = None,
+                    devices: Iterable[int] = ()) -> Optional[dict]:
+        """
+        Eine Seite des Ticket-Snapshots für dieses Gerät (sortiert nach ID, ab after),
+        oder mit since (Cursor {"updatedAt", "id", "granted"}) die Änderungen seit dem Cursor.
+        Snapshot: {"tickets", "device", "grantedScans", "localValidation", "cursor", "total"} (erste Seite).
+        Delta:    {"tickets", "deleted", "cursor", "hasMore", "grantedScans", "grantedCursor", "total"}.
+        grantedScans: [{"deviceId", "ticketId"}] für dieses Gerät und devices (weitere Durchgänge).
+        Returns None on failure.
+        """
+        params = {"id": self.device_id, "limit": limit}
+        if devices:
+            params["devices"] = ",".join(str(d) for d in devices)
+        if since is not None:
+            params.update(since=since["updatedAt"], sinceId=since["id"], grantedAfter=since.get("granted", 0))
+        else:
+            params["after"] = after
+        try:
+            resp = self._request(
+                "tickets", "GET", "/api/devices/pi/tickets",
+                params=params,
             )
             if resp.status_code == 200:
                 return resp.json()
+            logger.warning("Ticket-Download fehlgeschlagen: HTTP %d", resp.status_code)
+        except Exception as e:
+            logger.warning("Ticket-Download: %s", e)
+        return None
+
+    def send_heartbeat(self, task: int = 0, extra: Optional[dict] = None) -> Optional[dict]:
+        """
+        Send heartbeat with system info (plus extra runtime stats, e.g. pipeline counters).
+        Protocol v2 (delta + gzip, config in the response); v1 against older servers.
+        Returns device config from server or None.
+        """
+        try:
+            sys_info = self.sampler.snapshot() if self.sampler else collect_system_info()
+            sys_info["circuit"] = self.breaker.snapshot()
+            if extra:
+                sys_info.update(extra)
+
+            if self._heartbeat.legacy:
+                return self._send_heartbeat_v1(task, sys_info)
+
+            seq, payload = self._heartbeat.encode(task, sys_info, int(time.time()))
+            data, headers = encode_body(payload)
+            start = time.monotonic()
+            resp = self._request(
+                "heartbeat", "POST", "/api/devices/pi",
+                data=data,
+                headers=headers,
+            )
+            body = resp.json() if resp.status_code == 200 else None
+            if self._heartbeat.check_legacy(resp.status_code, body):
+                logger.info("Server ohne Heartbeat v2 – sende vollständige Heartbeats")
+                return self._send_heartbeat_v1(task, sys_info)
+            self._record(resp.status_code, start)
+            if body is None:
+                logger.warning("Heartbeat: HTTP %d", resp.status_code)
+                return None
+            self._heartbeat.bytes_sent += len(data)
+            config = self._heartbeat.on_response(seq, sys_info, body)
+            if config:
+                self._config_cache = config
+                self._config_etag = f'"{body["etag"]}"' if body.get("etag") else None
+            return config
         except requests.ConnectionError:
+            self.breaker.record_failure()
             logger.warning("Heartbeat: Server nicht erreichbar")
         except Exception as e:
             logger.warning("Heartbeat-Fehler: %s", e)
         return None
 
+    def _send_heartbeat_v1(self, task: int, sys_info: dict) -> Optional[dict]:
+        """Full heartbeat as array, uncompressed – for servers without v2."""
+        resp = self._request(
+            "heartbeat", "POST", "/api/devices/pi",
+            json=[{
+                "pis_id": self.device_id,
+                "pis_task": task,
+                "pis_update": int(time.time()),
+                "system_info": sys_info,
+            }],
+        )
+        self._heartbeat.bytes_sent += len(resp.request.body or b"")
+        return self._fetch_config()
+
     def test_connection(self) -> bool:
         """Quick connection test."""
         try:
-            resp = self._session.get(
-                f"{self.server_url}/api/devices/pi",
+            resp = self._request(
+                "probe", "GET", "/api/devices/pi",
                 params={"id": self.device_id},
-                timeout=5,
             )
             return resp.status_code == 200
         except Exception:
             return False
+
+    def keepalive(self):
+        """
+        Keep the pooled connection warm: refresh expired DNS entries and, once the
+        pool was idle for keepalive_idle seconds, send a conditional config GET (304).
+        """
+        self.connection.dns.refresh()
+        if not self.connection.idle():
+            return
+        try:
+            self._fetch_config("probe")
+        except Exception as e:
+            logger.debug("Keepalive: %s", e)
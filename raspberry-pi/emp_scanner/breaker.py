@@ -0,0 +1,98 @@
+"""
+Circuit breaker for server calls.
+
+closed     Normalbetrieb, Fehler und Latenz werden gezählt
+open       Server gilt als nicht erreichbar – Scan-Prüfung wird sofort
+           übersprungen (Offline-Policy statt 5 s Timeout am Drehkreuz)
+half_open  Nach open_seconds darf genau eine Probe raus; Erfolg schließt
+           den Breaker wieder, Fehler öffnet ihn erneut
+
+Background calls (task poll, heartbeat) report their outcome as well, so an
+outage is usually detected before the next guest scans.
+"""
+from __future__ import annotations
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, window: float = 30.0,
+                 open_seconds: float = 15.0, slow_call: float = 2.0):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.open_seconds = open_seconds
+        self.slow_call = slow_call
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures: list[float] = []
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._latency: float | None = None
+        self._trips = 0
+        self._short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go to the network now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self, latency: float):
+        """Successful call; a slow call counts as failure (the uplink is degraded)."""
+        with self._lock:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if latency > self.slow_call:
+                self._fail_locked()
+                return
+            self._failures.clear()
+            self._probe_in_flight = False
+            self._state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._fail_locked()
+
+    def _fail_locked(self):
+        now = time.monotonic()
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN:
+            self._trip(now)
+            return
+        self._failures = [t for t in self._failures if now - t < self.window]
+        self._failures.append(now)
+        if self._state == CLOSED and len(self._failures) >= self.failure_threshold:
+            self._trip(now)
+
+    def _trip(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._trips += 1
+
+    def snapshot(self) -> dict:
+        """Compact state for the heartbeat payload."""
+        with self._lock:
+            return {
+                "state": self._state,
+                "failures": len(self._failures),
+                "latency_ms": round(self._latency * 1000) if self._latency is not None else None,
+                "trips": self._trips,
+                "short_circuited": self._short_circuited,
+            }
@@ -0,0 +1,141 @@
+"""
+Compact on-disk code index – maps ticket codes (qrCode, rfidCode, barcode, uuid) to ticket ids.
+
+File layout (little-endian, opened with mmap, nothing is loaded into Python objects):
+
+  header   MAGIC, version, count, bits                      32 bytes
+  offsets  (2^bits + 1) × uint32 – start of each bucket (top `bits` bits of the hash)
+  hashes   count × uint64, sorted – blake2b-64 of the stored code
+  ids      count × uint32, ticket id for hashes[i]
+
+A lookup hashes the code, reads two offsets and binary-searches a bucket of a few
+entries – a handful of page reads, resident memory is whatever the kernel keeps
+cached. Hashes can collide, so callers verify the returned ids against the row.
+
+The file is written next to the target and swapped in with os.replace(), so a
+reader sees either the old or the new index, never a partial one.
+"""
+from __future__ import annotations
+
+import array
+import bisect
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+
+MAGIC = b"EMPIDX\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIII12x")
+CODE_COLUMNS = ("qr_code", "rfid_code", "barcode", "uuid")
+SIGN = 1 << 63
+
+
+def normalize_code(code: str) -> list[str]:
+    """Codes to try, same as the server route: whitespace removed, then raw (trimmed)."""
+    raw = code.strip()
+    compact = "".join(raw.split())
+    return [compact, raw] if compact != raw else [compact]
+
+
+def code_hash(code: str) -> int:
+    return int.from_bytes(hashlib.blake2b(code.encode(), digest_size=8).digest(), "little")
+
+
+def _sort_key(code: str) -> int:
+    """code_hash as signed 64-bit (SQLite integers are signed), order-preserving."""
+    return code_hash(code) - SIGN
+
+
+def _bits_for(count: int) -> int:
+    """~8 entries per bucket, offset table between 1 KB and 4 MB."""
+    return max(8, min(20, (count // 8).bit_length()))
+
+
+def build(db_path: str, target: str, table: str = "tickets") -> int:
+    """
+    Build the index for all codes in `table` and swap it in atomically.
+    Uses its own read connection (WAL snapshot) and lets SQLite sort on disk,
+    so memory stays at the two output arrays. Returns the number of entries.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.create_function("code_hash", 1, _sort_key)
+        union = " UNION ALL ".join(
+            f"SELECT code_hash({c}) AS h, id FROM {table} WHERE {c} IS NOT NULL AND {c} != ''"
+            for c in CODE_COLUMNS
+        )
+        hashes = array.array("Q")
+        ids = array.array("I")
+        for h, ticket_id in conn.execute(f"SELECT h, id FROM ({union}) ORDER BY h, id"):
+            hashes.append(h + SIGN)
+            ids.append(ticket_id)
+    finally:
+        conn.close()
+    write(target, hashes, ids)
+    return len(hashes)
+
+
+def write(target: str, hashes: array.array, ids: array.array):
+    """Write sorted hashes/ids as index file (tmp + fsync + os.replace)."""
+    count = len(hashes)
+    bits = _bits_for(count)
+    shift = 64 - bits
+    offsets = array.array("I", bytes(4 * ((1 << bits) + 1)))
+    for h in hashes:
+        offsets[(h >> shift) + 1] += 1
+    for i in range(1, len(offsets)):
+        offsets[i] += offsets[i - 1]
+    pad = -(HEADER.size + len(offsets) * 4) % 8
+
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, bits))
+        f.write(offsets.tobytes())
+        f.write(bytes(pad))
+        f.write(hashes.tobytes())
+        f.write(ids.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+
+
+class CodeIndex:
+    """Read-only view on an index file. Not thread-safe on its own (TicketStore holds its lock)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, bits = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"Kein gültiger Code-Index: {path}")
+        self.count = count
+        self._shift = 64 - bits
+        view = memoryview(self._mm)
+        start = HEADER.size
+        end = start + ((1 << bits) + 1) * 4
+        self._offsets = view[start:end].cast("I")
+        start = end + (-end % 8)
+        self._hashes = view[start:start + count * 8].cast("Q")
+        self._ids = view[start + count * 8:start + count * 12].cast("I")
+        self._view = view
+
+    def get(self, code: str) -> list[int]:
+        """Ticket ids whose stored code hashes like `code` (exact, no normalization)."""
+        h = code_hash(code)
+        bucket = h >> self._shift
+        lo, hi = self._offsets[bucket], self._offsets[bucket + 1]
+        i = bisect.bisect_left(self._hashes, h, lo, hi)
+        found = []
+        while i < hi and self._hashes[i] == h:
+            found.append(self._ids[i])
+            i += 1
+        return found
+
+    def close(self):
+        for view in (self._offsets, self._hashes, self._ids, self._view):
+            view.release()
+        self._mm.close()
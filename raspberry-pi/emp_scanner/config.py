@@ -20,12 +20,66 @@ DEFAULT = {
     "led_green_pin": 27,
     "led_red_pin": 22,
     "buzzer_pin": 23,
+    "gpio_backend": "auto",
+    "gpio_chip": "auto",
+    "actuator_process": False,
+    "actuator_rt_priority": 0,
+    "actuator_mlock": False,
+    "door_contact_pin": None,
+    "exit_button_pin": None,
+    "door_open_level": 1,
+    "door_tailgate_window": 3.0,
+    "door_debounce": 0.02,
+    "optimistic_grant": False,
+    "optimistic_validity_types": ["DATE_RANGE"],
+    "optimistic_sources": [],
+    "optimistic_max_age": 300,
     "heartbeat_interval": 30,
     "task_poll_interval": 3,
+    "task_push": False,
     "update_check_interval": 300,
     "scanner_device": "auto",
+    "offline_validation": True,
+    "ticket_sync_interval": 60,
+    "ticket_full_sync_interval": 86400,
+    "journal_upload_interval": 10,
+    "offline_policy": "local",
+    "breaker_failures": 3,
+    "breaker_open_seconds": 15,
+    "breaker_slow_call": 2.0,
+    "http_keepalive_idle": 15,
+    "request_budget": {},
+    "schedule_max_backoff": 300,
+    "schedule_quiet_after": 1800,
+    "schedule_quiet_factor": 4,
+    "gateway_port": 0,
+    "gateway_host": "0.0.0.0",
+    "gateway_url": "",
+    "gateway_secret": "",
+    "gateway_batch_window": 2.0,
+    "scan_dedupe_window": 1.0,
+    "scan_replay_window": 3.0,
+    "scan_queue_size": 16,
+    "scan_frame_gap": 0.1,
+    "scan_max_key_interval": 0.04,
+    "scan_min_length": 4,
+    "scan_frame_length": 0,
+    "scanner_baudrate": 9600,
+    "scanner_terminators": "\r\n",
+    "metrics_port": 9108,
+    "lanes": [],
 }
 
+# Felder je Durchgang; fehlende Werte kommen aus der obersten Ebene
+LANE_KEYS = (
+    "device_id", "scanner_device", "relay_pin", "relay_duration",
+    "led_green_pin", "led_red_pin", "buzzer_pin",
+    "scan_frame_gap", "scan_max_key_interval", "scan_min_length", "scan_frame_length",
+    "scanner_baudrate", "scanner_terminators",
+    "door_contact_pin", "exit_button_pin", "door_open_level", "door_tailgate_window", "door_debounce",
+    "optimistic_grant", "optimistic_validity_types", "optimistic_sources", "optimistic_max_age",
+)
+
 
 class Config:
     def __init__(self):
@@ -54,6 +108,24 @@ class Config:
     def is_configured(self) -> bool:
         return bool(self._data["server_url"] and self._data["api_token"] and self._data["device_id"])
 
+    def lane_specs(self) -> list[dict]:
+        """
+        Durchgänge dieses Geräts: config "lanes" (Mehrfach-Durchgang) oder
+        – ohne – ein Durchgang aus den Einzelwerten.
+        """
+        base = {k: self._data[k] for k in LANE_KEYS}
+        lanes = [dict(base, **lane) for lane in self._data.get("lanes") or []] or [base]
+        if len(lanes) > 1:
+            for key in ("device_id", "scanner_device", "relay_pin"):
+                values = [lane[key] for lane in lanes]
+                if len(set(values)) != len(values):
+                    logger.warning("Durchgänge teilen sich %s (%s) – bitte je Durchgang eigene Werte",
+                                   key, ", ".join(str(v) for v in values))
+            if any(lane["scanner_device"] == "auto" for lane in lanes):
+                logger.warning("scanner_device \"auto\" bei mehreren Durchgängen – feste Pfade "
+                               "(/dev/input/by-path/...) verwenden")
+        return lanes
+
     def apply_qr_config(self, qr_data: str) -> bool:
         """
         Parse a QR config JSON: {"url": "...", "token": "...", "id": 123}
@@ -0,0 +1,331 @@
+"""
+HTTP connection manager – one warm keep-alive connection to the server instead of
+a fresh TCP/TLS handshake after every idle period.
+
+  Deadlines   separate (connect, read) timeouts per endpoint kind: a scan gives up
+              on an unreachable server after 2 s instead of waiting the full read
+              deadline, the ticket download may read for 30 s
+  Keepalive   keepalive() (job every http_keepalive_idle / 3 s) sends a cheap
+              conditional config GET (ETag → 304) once nothing else used the
+              connection for http_keepalive_idle seconds, before the server or a
+              NAT/load balancer closes it; TCP keepalive detects dead peers
+  DNS         cached per host (TTL from dnspython if installed, else DNS_TTL);
+              expired entries are still used and refreshed by the keepalive job,
+              a failed connect moves the address to the back (IPv4 first)
+  TLS         one SSLContext for all connections: the CA bundle is loaded once
+              (not per handshake) and the last session per host is offered again
+              (session resumption → abbreviated handshake)
+
+Every new connection records DNS, TCP and TLS durations (stats() → heartbeat
+system_info.connection, prometheus() → /metrics).
+
+DNS cache, timing and the shared CA bundle hook into private urllib3 attributes
+(HTTPConnection._dns_host, ConnectionCls of the pools, ca_certs of the pool),
+tested with the urllib3 version pinned in requirements.txt. Without them the
+adapter falls back to plain pooling (still with the shared SSLContext).
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from emp_scanner.metrics import Histogram
+
+try:
+    import dns.resolver as dns_resolver
+except ImportError:
+    dns_resolver = None
+
+logger = logging.getLogger("emp.api")
+
+# (connect, read) in Sekunden je Endpunkt
+DEADLINES = {
+    "scan": (2.0, 5.0),
+    "heartbeat": (3.0, 10.0),
+    "config": (3.0, 10.0),
+    "events": (3.0, 10.0),     # + Long-Poll-Wartezeit
+    "tickets": (3.0, 30.0),
+    "upload": (3.0, 10.0),
+    "probe": (2.0, 5.0),
+}
+DNS_TTL = 300.0
+DNS_MIN_TTL = 30.0
+KEEPALIVE_IDLE = 15.0
+
+# Handshake-Phasen in Sekunden
+HANDSHAKE_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+PHASES = ("dns", "tcp", "tls")
+
+# TCP-Keepalive: tote Verbindung nach 30 s Ruhe + 3 × 10 s erkennen
+SOCKET_OPTIONS = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+for _name, _value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+    if hasattr(socket, _name):
+        SOCKET_OPTIONS.append((socket.IPPROTO_TCP, getattr(socket, _name), _value))
+
+
+class DnsCache:
+    """Host → addresses with expiry; stale entries are served and refreshed later."""
+
+    def __init__(self, ttl: float = DNS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[list[str], float]] = {}
+        self.counts = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def resolve(self, host: str, port: int) -> str:
+        if _is_address(host):
+            return host
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is not None:
+                self.counts["hits"] += 1
+                return entry[0][0]
+            self.counts["misses"] += 1
+        return self._lookup(host, port)
+
+    def refresh(self):
+        """Look up expired entries again (keepalive job, off the scan path)."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [host for host, (_, expires) in self._entries.items() if expires <= now]
+        for host in expired:
+            try:
+                self._lookup(host, 443)
+                with self._lock:
+                    self.counts["refreshes"] += 1
+            except OSError as e:
+                with self._lock:
+                    self.counts["errors"] += 1
+                logger.debug("DNS-Aktualisierung %s: %s", host, e)
+
+    def failed(self, host: str, address: str):
+        """Connect to address failed: try the next address, with none left look up again."""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None or address not in entry[0]:
+                return
+            addresses = [a for a in entry[0] if a != address]
+            if addresses:
+                self._entries[host] = (addresses + [address], entry[1])
+            else:
+                del self._entries[host]
+
+    def _lookup(self, host: str, port: int) -> str:
+        addresses, ttl = [], self.ttl
+        if dns_resolver is not None:
+            try:
+                answer = dns_resolver.resolve(host, "A")
+                addresses, ttl = [r.address for r in answer], max(float(answer.rrset.ttl), DNS_MIN_TTL)
+            except Exception as e:
+                logger.debug("dnspython %s: %s – nutze getaddrinfo", host, e)
+        if not addresses:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            # IPv4 zuerst – viele Pi-Netze haben IPv6-Adressen ohne Route nach außen
+            infos.sort(key=lambda info: info[0] != socket.AF_INET)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[host] = (addresses, time.monotonic() + ttl)
+        return addresses[0]
+
+
+def _is_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+class _ResumingContext(ssl.SSLContext):
+    """SSLContext that offers the last TLS session of the host on every new connection."""
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if session is None and server_hostname:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+
+
+class ConnectionManager:
+    def __init__(self, headers: Optional[dict] = None, pool_size: int = 10,
+                 keepalive_idle: float = KEEPALIVE_IDLE, verify=True):
+        """verify: True (bundle as requests picks it) or path of a CA file, loaded once into the SSLContext."""
+        self.keepalive_idle = float(keepalive_idle)
+        self.dns = DnsCache()
+        self.ssl_context = _ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.ssl_context.sessions = {}
+        if verify is True:
+            verify = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or DEFAULT_CA_BUNDLE_PATH
+        self.ca_file = verify
+        self.ssl_context.load_verify_locations(verify)
+        self._lock = threading.Lock()
+        self._last_use = time.monotonic()
+        self.phases = {phase: Histogram(HANDSHAKE_BUCKETS) for phase in PHASES}
+        self.counts = {"requests": 0, "connects": 0, "connect_errors": 0, "tls_handshakes": 0,
+                       "tls_resumed": 0, "probes": 0}
+        self.session = requests.Session()
+        adapter = _Adapter(self, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def request(self, kind: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Request with the (connect, read) deadline of the endpoint kind (timeout= overrides)."""
+        kwargs.setdefault("timeout", DEADLINES[kind])
+        with self._lock:
+            self.counts["requests"] += 1
+            if kind == "probe":
+                self.counts["probes"] += 1
+            if kind != "events":
+                # Long-Poll hält nur seine eigene Verbindung offen, nicht die für Scans
+                self._last_use = time.monotonic()
+        return self.session.request(method, url, **kwargs)
+
+    def idle(self) -> bool:
+        """True if no request used the pool for keepalive_idle seconds (probe due)."""
+        with self._lock:
+            return self.keepalive_idle > 0 and time.monotonic() - self._last_use >= self.keepalive_idle
+
+    def close(self):
+        self.session.close()
+
+    # ─── Metriken ─────────────────────────────────────────────────────────────
+
+    def _observe(self, phase: str, value: float):
+        with self._lock:
+            self.phases[phase].observe(value)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def stats(self) -> dict:
+        """Heartbeat summary: counters and handshake phases in ms."""
+        with self._lock:
+            stats = dict(self.counts)
+            for phase, h in self.phases.items():
+                if h.count:
+                    stats[phase] = {"n": h.count, "avg": round(h.sum / h.count * 1000, 1),
+                                    "p99": round(h.percentile(0.99) * 1000, 1)}
+        stats["dns_cache"] = dict(self.dns.counts)
+        return stats
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP emp_http_handshake_seconds Duration of DNS lookup, TCP connect and TLS handshake",
+            "# TYPE emp_http_handshake_seconds histogram",
+        ]
+        with self._lock:
+            for phase, h in self.phases.items():
+                cumulative = 0
+                for upper, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'emp_http_handshake_seconds_bucket{{phase="{phase}",le="{upper}"}} {cumulative}')
+                lines.append(f'emp_http_handshake_seconds_bucket{{phase="{phase}",le="+Inf"}} {h.count}')
+                lines.append(f'emp_http_handshake_seconds_sum{{phase="{phase}"}} {h.sum:.6f}')
+                lines.append(f'emp_http_handshake_seconds_count{{phase="{phase}"}} {h.count}')
+            counts = dict(self.counts)
+        counts.update({f"dns_{k}": v for k, v in self.dns.counts.items()})
+        lines += [
+            "# HELP emp_http_events_total HTTP client events (requests, connects, TLS resumptions, DNS cache)",
+            "# TYPE emp_http_events_total counter",
+        ]
+        lines += [f'emp_http_events_total{{event="{k}"}} {v}' for k, v in counts.items()]
+        return "\n".join(lines) + "\n"
+
+
+# ─── urllib3-Anbindung ────────────────────────────────────────────────────────
+
+class _Adapter(HTTPAdapter):
+    def __init__(self, manager: ConnectionManager, **kwargs):
+        self.manager = manager
+        self.timed = False
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("ssl_context", self.manager.ssl_context)
+        pool_kwargs.setdefault("socket_options", SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.timed = _urllib3_internals() and isinstance(getattr(self.poolmanager, "pool_classes_by_scheme", None), dict)
+        if not self.timed:
+            logger.warning("urllib3 %s: interne Schnittstellen fehlen – normales Pooling ohne DNS-Cache "
+                           "und Handshake-Messung", getattr(urllib3, "__version__", "?"))
+            return
+        http, https = _connection_classes(self.manager)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("Pool", (HTTPConnectionPool,), {"ConnectionCls": http}),
+            "https": type("Pool", (HTTPSConnectionPool,), {"ConnectionCls": https}),
+        }
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if not self.timed or not hasattr(conn, "ca_certs") or not hasattr(conn, "ca_cert_dir"):
+            return
+        if verify is True or verify == self.manager.ca_file:
+            # CA-Bündel steckt schon im gemeinsamen Kontext – nicht bei jedem Handshake neu parsen
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+
+def _urllib3_internals() -> bool:
+    """Private urllib3 attributes the timed connections rely on are present."""
+    try:
+        return (hasattr(HTTPConnection("localhost"), "_dns_host")
+                and all(hasattr(pool, "ConnectionCls") for pool in (HTTPConnectionPool, HTTPSConnectionPool)))
+    except Exception:
+        return False
+
+
+def _connection_classes(manager: ConnectionManager) -> tuple[type, type]:
+    class TimedConnection(HTTPConnection):
+        def _new_conn(self):
+            t0 = time.monotonic()
+            host = self._dns_host
+            address = manager.dns.resolve(host, self.port)
+            t1 = time.monotonic()
+            # urllib3 leitet self.host aus _dns_host ab (SNI, Zertifikat) – nur für connect ersetzen
+            self._dns_host = address
+            try:
+                sock = super()._new_conn()
+            except Exception:
+                manager.dns.failed(host, address)
+                manager._count("connect_errors")
+                raise
+            finally:
+                self._dns_host = host
+            self._t_connected = time.monotonic()
+            manager._count("connects")
+            manager._observe("dns", t1 - t0)
+            manager._observe("tcp", self._t_connected - t1)
+            return sock
+
+    class TimedHTTPSConnection(TimedConnection, HTTPSConnection):
+        def connect(self):
+            super().connect()
+            manager._observe("tls", time.monotonic() - self._t_connected)
+            manager._count("tls_handshakes")
+            if getattr(self.sock, "session_reused", False):
+                manager._count("tls_resumed")
+
+        def getresponse(self, *args, **kwargs):
+            response = super().getresponse(*args, **kwargs)
+            # TLS 1.3: das Session-Ticket kommt erst nach dem Handshake
+            session = getattr(self.sock, "session", None)
+            if session is not None and session.has_ticket:
+                manager.ssl_context.sessions[self.host] = session
+            return response
+
+    return TimedConnection, TimedHTTPSConnection
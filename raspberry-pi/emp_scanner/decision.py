@@ -0,0 +1,155 @@
+"""
+Local access decision – mirrors the checks of POST /api/devices/pi/scan.
+Used when the server cannot be reached: the ticket comes from the local
+ticket store, the result has the same shape as the server response.
+
+Order of checks (identical to the server route):
+  1. Ticket vorhanden?
+  2. Status INVALID / PROTECTED
+  3. startDate / endDate (ganze Tage, UTC)
+  4. TIME_SLOT (Europe/Berlin)
+  5. DURATION ab firstScanAt
+  6. Bereich erlaubt?
+  7. Wiedereintritt?
+"""
+from __future__ import annotations
+
+import calendar
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    BERLIN = ZoneInfo("Europe/Berlin")
+except Exception:  # Python < 3.9 oder fehlende tzdata
+    BERLIN = None
+
+DAY = 86400
+
+
+def _last_sunday_utc(year: int, month: int) -> float:
+    """Epoch of the last Sunday of the month, 01:00 UTC (EU DST switch)."""
+    last_day = calendar.monthrange(year, month)[1]
+    dt = datetime(year, month, last_day, 1, 0, tzinfo=timezone.utc)
+    dt -= timedelta(days=(dt.weekday() + 1) % 7)
+    return dt.timestamp()
+
+
+def berlin_minutes(now: float) -> int:
+    """Minutes since local midnight in Europe/Berlin."""
+    if BERLIN is not None:
+        local = datetime.fromtimestamp(now, BERLIN)
+    else:
+        year = datetime.fromtimestamp(now, timezone.utc).year
+        summer = _last_sunday_utc(year, 3) <= now < _last_sunday_utc(year, 10)
+        local = datetime.fromtimestamp(now, timezone(timedelta(hours=2 if summer else 1)))
+    return local.hour * 60 + local.minute
+
+
+def _slot_minutes(value: str) -> int | None:
+    try:
+        h, m = value.split(":")
+        return int(h) * 60 + int(m)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _deny(message: str, ticket: dict | None = None, result: str = "DENIED") -> dict:
+    out = {"granted": False, "message": message, "result": result, "local": True}
+    if ticket:
+        out["ticket_id"] = ticket["id"]
+    return out
+
+
+def evaluate(ticket: dict | None, device: dict, granted_here: bool,
+             now: float | None = None) -> dict:
+    """
+    Decide a scan locally.
+    ticket: row from TicketStore (None if not found)
+    device: {"pis_in", "pis_out", "pis_again"} from the device config
+    granted_here: ticket already has a GRANTED scan on this device
+    Returns {"granted", "message", "result", "local": True, "ticket_id"?, "ticket"?}
+    """
+    if now is None:
+        now = time.time()
+
+    if ticket is None:
+        return _deny("Ticket nicht gefunden")
+
+    status = ticket.get("status")
+    if status == "INVALID":
+        return _deny("Ticket ungültig", ticket)
+    if status == "PROTECTED":
+        return _deny("Ticket gesperrt", ticket, result="PROTECTED")
+
+    # Datumsgrenzen: Start 00:00:00.000 UTC, Ende 23:59:59.999 UTC
+    start = ticket.get("start_date")
+    if start is not None and now < start - start % DAY:
+        return _deny("Ticket noch nicht gültig", ticket)
+    end = ticket.get("end_date")
+    if end is not None and now > end - end % DAY + DAY - 0.001:
+        return _deny("Ticket abgelaufen", ticket)
+
+    v_type = ticket.get("validity_type") or "DATE_RANGE"
+
+    if v_type == "TIME_SLOT" and ticket.get("slot_start") and ticket.get("slot_end"):
+        slot_start = _slot_minutes(ticket["slot_start"])
+        slot_end = _slot_minutes(ticket["slot_end"])
+        if slot_start is not None and slot_end is not None:
+            current = berlin_minutes(now)
+            if current < slot_start or current > slot_end:
+                return _deny(f"Zeitslot {ticket['slot_start']}–{ticket['slot_end']} Uhr", ticket)
+
+    if v_type == "DURATION" and ticket.get("duration_minutes"):
+        first_scan = ticket.get("first_scan_at")
+        if first_scan is not None and now > first_scan + ticket["duration_minutes"] * 60:
+            return _deny("Zeitgültigkeit abgelaufen", ticket)
+
+    is_employee = ticket.get("source") == "EMP_CONTROL"
+
+    device_areas = [a for a in (device.get("pis_in"), device.get("pis_out")) if a]
+    if device_areas:
+        ticket_areas = list(ticket.get("area_ids") or [])
+        if ticket.get("access_area_id"):
+            ticket_areas.insert(0, ticket["access_area_id"])
+        if ticket_areas and not any(a in device_areas for a in ticket_areas):
+            return _deny("Resource nicht erlaubt", ticket)
+
+    if not device.get("pis_again") and not is_employee and granted_here:
+        return _deny("Kein Wiedereintritt", ticket)
+
+    return {
+        "granted": True,
+        "message": "Zutritt gewährt",
+        "result": "GRANTED",
+        "local": True,
+        "ticket_id": ticket["id"],
+        "ticket": {
+            "name": ticket.get("name"),
+            "firstName": ticket.get("first_name"),
+            "lastName": ticket.get("last_name"),
+        },
+    }
+
+
+def state_after_grant(ticket: dict, device: dict, now: float) -> dict:
+    """
+    Ticket fields to update after a local GRANTED scan (same as the server route):
+    VALID → REDEEMED (firstScanAt bei DURATION), Ausgangsscan mit Wiedereinlass → VALID.
+    """
+    is_employee = ticket.get("source") == "EMP_CONTROL"
+    v_type = ticket.get("validity_type") or "DATE_RANGE"
+    pis_out = device.get("pis_out")
+    is_exit_scan = pis_out is not None and ticket.get("access_area_id") == pis_out
+
+    if ticket.get("status") == "VALID" and not is_employee:
+        update = {"status": "REDEEMED"}
+        if v_type == "DURATION" and ticket.get("first_scan_at") is None:
+            update["first_scan_at"] = now
+        return update
+    if ticket.get("status") == "REDEEMED" and is_exit_scan and ticket.get("service_allow_reentry"):
+        update = {"status": "VALID"}
+        if v_type == "DURATION":
+            update["first_scan_at"] = None
+        return update
+    return {}
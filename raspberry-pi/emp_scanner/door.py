@@ -0,0 +1,174 @@
+"""
+Door contact and exit button – edge events instead of polling, tailgating detection.
+
+Optional per lane (door_contact_pin, exit_button_pin). The GPIO backend reports
+edges with their own timestamps (gpiochip: kernel), nothing is polled.
+
+  grant → door opens → door closes   relay closes at once (relock) instead of
+                                      waiting out relay_duration
+  more openings after one grant       within door_tailgate_window of the last
+                                      closing: tailgating (one per extra passage)
+  opening without grant               forced (no scan, no exit button, no NOT-AUF)
+  exit button                         relay opens without LED/tone (unlock)
+
+Events go to on_event(kind, code, ticket_id, message); the lane journals them, so
+they reach the server with the scan records (POST /api/devices/pi/scans).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Optional
+
+from emp_scanner.relay import RelayController
+
+logger = logging.getLogger("emp.door")
+
+EXIT_CODE = "__EXIT_BUTTON__"
+TAILGATE_CODE = "__DOOR_TAILGATE__"
+FORCED_CODE = "__DOOR_FORCED__"
+OPEN_GRACE = 0.5   # s nach Relais-Ende, in denen die Tür noch als freigegeben gilt (Schlossmechanik)
+
+# Konfigurationswerte → DoorMonitor-Argumente (config / lanes)
+DOOR_KEYS = {
+    "door_contact_pin": "contact_pin",
+    "exit_button_pin": "exit_pin",
+    "door_open_level": "open_level",
+    "door_tailgate_window": "tailgate_window",
+    "door_debounce": "debounce",
+}
+
+
+def door_options(values: dict) -> dict:
+    """DoorMonitor-Argumente aus Konfigurationswerten, {} ohne Türkontakt und Taster."""
+    if values.get("door_contact_pin") is None and values.get("exit_button_pin") is None:
+        return {}
+    return {arg: values[key] for key, arg in DOOR_KEYS.items() if values.get(key) is not None}
+
+
+class DoorMonitor:
+    """
+    Türkontakt (Pull-up; open_level = Pegel bei offener Tür, Reed-Kontakt nach GND: 1)
+    und Ausgangstaster (Pull-up, gedrückt = 0) eines Durchgangs.
+    """
+
+    def __init__(self, relay: RelayController, contact_pin: Optional[int] = None,
+                 exit_pin: Optional[int] = None, open_level: int = 1, tailgate_window: float = 3.0,
+                 debounce: float = 0.02, on_event: Optional[Callable[..., None]] = None, gpio=None):
+        self.relay = relay
+        self.gpio = gpio or relay.gpio
+        self.contact_pin = contact_pin
+        self.exit_pin = exit_pin
+        self.open_level = bool(open_level)
+        self.tailgate_window = tailgate_window
+        self.debounce = debounce
+        self.on_event = on_event
+        self.free = False
+        self._lock = threading.Lock()
+        self._watch = None
+        self._open = False
+        self._grant: Optional[dict] = None
+        self.counts = {"passages": 0, "tailgates": 0, "forced": 0, "exits": 0, "relocks": 0}
+        self._cycle_total = 0.0
+        self._saved_total = 0.0
+
+    def start(self):
+        pins = [p for p in (self.contact_pin, self.exit_pin) if p is not None]
+        try:
+            self._watch = self.gpio.watch(pins, self._on_edge, debounce=self.debounce, pull_up=True)
+            levels = self._watch.levels()
+        except Exception as e:
+            logger.error("Türkontakt/Taster nicht verfügbar (%s) – Relais läuft nur auf Zeit", e)
+            self._watch = None
+            return
+        if self.contact_pin is not None:
+            self._open = levels.get(self.contact_pin) == self.open_level
+        logger.info("Türüberwachung aktiv (Kontakt=%s, Taster=%s, Tür %s)",
+                    self.contact_pin, self.exit_pin, "offen" if self._open else "zu")
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None
+
+    # ─── Freigaben ────────────────────────────────────────────────────────────
+
+    def granted(self, code: str, ticket_id: Optional[int], t_on: float):
+        """Nach relay.grant(): die nächste Türöffnung gehört zu dieser Freigabe."""
+        with self._lock:
+            self._grant = {"code": code, "ticket_id": ticket_id, "t": t_on, "passages": 0,
+                           "until": t_on + self.relay.duration + OPEN_GRACE}
+
+    def stats(self) -> dict:
+        with self._lock:
+            cycles = self.counts["passages"]
+            return dict(
+                self.counts,
+                open=self._open,
+                cycle_ms=round(self._cycle_total / cycles * 1000) if cycles else None,
+                relay_saved_ms=round(self._saved_total * 1000),
+            )
+
+    # ─── Flanken ──────────────────────────────────────────────────────────────
+
+    def _on_edge(self, pin: int, level: bool, t: float):
+        """Aus dem Event-Thread des GPIO-Backends."""
+        events = []
+        with self._lock:
+            if pin == self.contact_pin:
+                is_open = level == self.open_level
+                if is_open != self._open:
+                    self._open = is_open
+                    (self._on_open if is_open else self._on_close)(t, events)
+            elif pin == self.exit_pin and not level:
+                self._on_exit(events)
+        for event in events:
+            self._emit(*event)
+
+    def _on_open(self, t: float, events: list):
+        grant = self._grant
+        if grant is not None and t <= grant["until"]:
+            grant["passages"] += 1
+            grant["open"] = True
+            if grant["passages"] == 1:
+                self.counts["passages"] += 1
+            elif grant["code"] != EXIT_CODE:
+                self.counts["tailgates"] += 1
+                logger.warning("Mehrfachdurchgang: %d. Öffnung nach einer Freigabe", grant["passages"])
+                events.append(("tailgate", TAILGATE_CODE, grant["ticket_id"],
+                               f"{grant['passages']}. Durchgang nach Freigabe {grant['code'][:40]}"))
+            return
+        if self.free:
+            return
+        self.counts["forced"] += 1
+        logger.warning("Tür ohne Freigabe geöffnet")
+        events.append(("forced", FORCED_CODE, None, "Tür ohne Freigabe geöffnet"))
+
+    def _on_close(self, t: float, events: list):
+        grant = self._grant
+        if grant is None or not grant.pop("open", False):
+            return   # Öffnung gehörte nicht zur Freigabe (ohne Freigabe / NOT-AUF)
+        if grant["passages"] == 1:
+            self._cycle_total += t - grant["t"]
+            if self.relay.relay_on and not self.free:
+                # Tür ist durch – Relais nicht bis relay_duration offen lassen
+                self.relay.relock()
+                self.counts["relocks"] += 1
+                self._saved_total += max(0.0, grant["t"] + self.relay.duration - t)
+        grant["until"] = t + self.tailgate_window
+
+    def _on_exit(self, events: list):
+        self.counts["exits"] += 1
+        t_on = self.relay.unlock()
+        self._grant = {"code": EXIT_CODE, "ticket_id": None, "t": t_on, "passages": 0,
+                       "until": t_on + self.relay.duration + OPEN_GRACE}
+        logger.info("Ausgangstaster – Relais geöffnet für %.1fs", self.relay.duration)
+        events.append(("exit", EXIT_CODE, None, "Ausgangstaster"))
+
+    def _emit(self, kind: str, code: str, ticket_id: Optional[int], message: str):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(kind, code, ticket_id, message)
+        except Exception as e:
+            logger.error("Tür-Ereignis %s nicht erfasst: %s", kind, e)
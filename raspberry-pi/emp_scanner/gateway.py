@@ -0,0 +1,488 @@
+"""
+Site gateway – one Pi answers the device API for the other Pis of a venue and
+bundles their traffic on its own warm server connection (one uplink, many Pis).
+
+Gateway (config gateway_port, bound to gateway_host), plain HTTP on the local network:
+  GET  /api/devices/pi?id=N    config polls of all peers → one upstream GET ?ids=…
+                               (every peer seen in the last PEER_TTL seconds) at most
+                               every config_ttl seconds, answered from the cache (ETag/304)
+  POST /api/devices/pi         v2 heartbeats collected for batch_window seconds → one
+                               upstream POST with an array; v1 bodies (older peers,
+                               task confirmations) are forwarded at once
+  POST /api/devices/pi/scan    forwarded at once; server unreachable → decision from the
+                               gateway's ticket store (shared offline cache) for peers
+                               with the same areas and re-entry allowed, marked offline
+                               so the peer journals it
+  anything else                404 – long-poll, ticket sync and journal upload of the
+                               peers go to the server directly
+
+Peers authenticate with a site secret (config gateway_secret) that is never the account
+token – the account token stays on the way to the server (HTTPS), the gateway forwards
+with its own. Without a secret the gateway does not start. A server without the
+gateway endpoints (GET ?ids=, array of v2 heartbeats) is detected once; the gateway
+then forwards per device.
+
+Peer (config gateway_url + gateway_secret): GatewayRoute sends scan, heartbeat and config
+calls to the gateway with the secret instead of the account token; a refused or timed-out
+connection, a rejected secret or a 5xx answer sends the call and the following ones straight
+to the server for GATEWAY_RETRY seconds.
+"""
+from __future__ import annotations
+
+import gzip
+import hmac
+import json
+import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from emp_scanner.heartbeat import encode_body
+
+logger = logging.getLogger("emp.gateway")
+
+BATCH_WINDOW = 2.0
+CONFIG_TTL = 2.0
+MAX_BATCH = 50
+MAX_IDS = 100
+PEER_TTL = 60.0
+HEARTBEAT_WAIT = 15.0
+
+GATEWAY_RETRY = 60.0
+GATEWAY_CONNECT = 0.5
+# Endpunkte, die Peers über das Gateway abwickeln
+GATEWAY_KINDS = ("scan", "heartbeat", "config", "probe")
+
+CONFIG_PATH = "/api/devices/pi"
+SCAN_PATH = "/api/devices/pi/scan"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class _Pending:
+    """A peer heartbeat waiting for its batch."""
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.done = threading.Event()
+        self.status = 502
+        self.body: dict = {"error": "Server nicht erreichbar"}
+
+    def finish(self, status: int, body: dict):
+        self.status = status
+        self.body = body
+        self.done.set()
+
+
+class Gateway:
+    def __init__(self, api, port: int, secret: str, host: str = "0.0.0.0", store=None,
+                 batch_window: float = BATCH_WINDOW, config_ttl: float = CONFIG_TTL):
+        self.api = api
+        self.port = port
+        self.secret = secret
+        self.host = host
+        self.store = store
+        self.batch_window = batch_window
+        self.config_ttl = config_ttl
+        # None = noch unbekannt, False = Server ohne ?ids= / Heartbeat-Arrays
+        self.batch_api: Optional[bool] = None
+        self._lock = threading.Lock()
+        self._configs: dict[int, tuple[dict, str, float]] = {}
+        self._peers: dict[int, float] = {}
+        self._refreshing: Optional[threading.Event] = None
+        self._batch: list[_Pending] = []
+        self._batch_cond = threading.Condition()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._connections: set = set()
+        self.counts = {"config": 0, "config_cached": 0, "config_upstream": 0, "heartbeats": 0,
+                       "batches": 0, "scans": 0, "scans_local": 0, "forwarded": 0, "rejected": 0}
+
+    # ─── HTTP ─────────────────────────────────────────────────────────────────
+
+    def start(self) -> bool:
+        if not self.secret:
+            logger.error("Gateway nicht gestartet: gateway_secret fehlt")
+            return False
+        if hmac.compare_digest(self.secret.encode(), (self.api.api_token or "").encode()):
+            logger.error("Gateway nicht gestartet: gateway_secret darf nicht das API-Token des Kontos sein")
+            return False
+        gateway = self
+        token = f"Bearer {self.secret}".encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with gateway._lock:
+                    gateway._connections.add(self.connection)
+
+            def finish(self):
+                with gateway._lock:
+                    gateway._connections.discard(self.connection)
+                super().finish()
+
+            def _send(self, code: int, body: Optional[bytes], headers: Optional[dict] = None):
+                data = body or b""
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _json(self, code: int, body: dict, headers: Optional[dict] = None):
+                self._send(code, json.dumps(body).encode(), dict(headers or {}, **JSON_HEADERS))
+
+            def _authorized(self) -> bool:
+                if hmac.compare_digest(self.headers.get("Authorization", "").encode(), token):
+                    return True
+                gateway.counts["rejected"] += 1
+                self._json(401, {"error": "Unauthorized"})
+                return False
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != CONFIG_PATH:
+                    self.send_error(404)
+                    return
+                if not self._authorized():
+                    return
+                try:
+                    device_id = int(parse_qs(url.query).get("id", [""])[0])
+                except ValueError:
+                    self._json(400, {"error": "Missing id parameter"})
+                    return
+                entry = gateway.config(device_id)
+                if entry is None:
+                    self._json(502, {"error": "Server nicht erreichbar"})
+                elif self.headers.get("If-None-Match") == entry[1]:
+                    self._send(304, None, {"ETag": entry[1]})
+                else:
+                    self._json(200, entry[0], {"ETag": entry[1]})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                if path not in (CONFIG_PATH, SCAN_PATH):
+                    self._body()
+                    self.send_error(404)
+                    return
+                raw = self._body()
+                if not self._authorized():
+                    return
+                try:
+                    if raw[:2] == b"\x1f\x8b":
+                        raw = gzip.decompress(raw)
+                    body = json.loads(raw)
+                except (OSError, ValueError):
+                    self._json(400, {"error": "Invalid body"})
+                    return
+                if path == SCAN_PATH:
+                    if not isinstance(body, dict):
+                        self._json(400, {"error": "Invalid body"})
+                        return
+                    self._json(*gateway.scan(body, raw))
+                elif isinstance(body, dict) and body.get("v") == 2:
+                    self._json(*gateway.heartbeat(body))
+                else:
+                    self._json(*gateway.forward(raw))
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error("Gateway auf Port %d nicht verfügbar: %s", self.port, e)
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info("Gateway für Peers: http://%s:%d", self.host, self.port)
+        return True
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        # Keep-Alive-Verbindungen der Peers schließen – sie wechseln sofort zum Server
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # ─── Upstream ─────────────────────────────────────────────────────────────
+
+    def _upstream(self, kind: str, method: str, path: str, **kwargs):
+        """Request to the server over the gateway's connection; None if unreachable."""
+        breaker = self.api.breaker
+        if not breaker.allow():
+            return None
+        start = time.monotonic()
+        try:
+            resp = self.api.connection.request(kind, method, f"{self.api.server_url}{path}", **kwargs)
+        except Exception as e:
+            breaker.record_failure()
+            logger.debug("Gateway → Server: %s", e)
+            return None
+        if resp.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(time.monotonic() - start)
+        return resp
+
+    def _seen(self, device_id) -> None:
+        if isinstance(device_id, int):
+            with self._lock:
+                self._peers[device_id] = time.monotonic()
+
+    def _store_config(self, device_id: int, config: Optional[dict], etag: Optional[str], stamp: float):
+        if config and etag:
+            etag = etag.strip('"')
+            with self._lock:
+                self._configs[device_id] = (config, f'"{etag}"', stamp)
+
+    # ─── Config ───────────────────────────────────────────────────────────────
+
+    def config(self, device_id: int) -> Optional[tuple[dict, str]]:
+        """(config, ETag) of a peer, at most config_ttl seconds old; None if the server is unreachable."""
+        self.counts["config"] += 1
+        self._seen(device_id)
+        deadline = time.monotonic() + HEARTBEAT_WAIT
+        while time.monotonic() < deadline:
+            with self._lock:
+                cached = self._configs.get(device_id)
+                if cached and time.monotonic() - cached[2] < self.config_ttl:
+                    self.counts["config_cached"] += 1
+                    return cached[0], cached[1]
+                flight = self._refreshing
+                leader = flight is None
+                if leader:
+                    flight = self._refreshing = threading.Event()
+            if not leader:
+                # Abfrage eines anderen Peers läuft – deren Ergebnis abwarten, ohne eigenes
+                # Ergebnis nicht mit 502 antworten (der Peer wiche sonst auf den Server aus)
+                flight.wait(max(deadline - time.monotonic(), 0))
+                continue
+            try:
+                self._refresh(device_id)
+            finally:
+                with self._lock:
+                    self._refreshing = None
+                flight.set()
+            with self._lock:
+                cached = self._configs.get(device_id)
+            if cached and time.monotonic() - cached[2] < self.config_ttl:
+                return cached[0], cached[1]
+            return None
+        return None
+
+    def _refresh(self, device_id: int):
+        """One upstream call for all recently seen peers (per device on older servers)."""
+        now = time.monotonic()
+        with self._lock:
+            ids = [device_id] + sorted(d for d, t in self._peers.items() if now - t < PEER_TTL and d != device_id)
+        if self.batch_api is not False:
+            self.counts["config_upstream"] += 1
+            resp = self._upstream("config", "GET", CONFIG_PATH, params={"ids": ",".join(map(str, ids[:MAX_IDS]))})
+            if resp is None or resp.status_code >= 500:
+                return
+            data = _json(resp)
+            if resp.status_code == 200 and isinstance(data, dict) and "devices" in data:
+                if self.batch_api is None:
+                    logger.info("Gateway: Server bündelt Abfragen (%d Geräte)", len(ids))
+                self.batch_api = True
+                for entry in data["devices"]:
+                    self._store_config(entry["id"], entry.get("config"), entry.get("etag"), now)
+                return
+            logger.info("Gateway: Server ohne Sammelabfrage – Abfragen je Gerät")
+            self.batch_api = False
+        with self._lock:
+            cached = self._configs.get(device_id)
+        headers = {"If-None-Match": cached[1]} if cached else {}
+        self.counts["config_upstream"] += 1
+        resp = self._upstream("config", "GET", CONFIG_PATH, params={"id": device_id}, headers=headers)
+        if resp is None:
+            return
+        if resp.status_code == 304 and cached:
+            self._store_config(device_id, cached[0], cached[1], now)
+        elif resp.status_code == 200:
+            self._store_config(device_id, _json(resp), resp.headers.get("ETag"), now)
+
+    # ─── Heartbeat ────────────────────────────────────────────────────────────
+
+    def heartbeat(self, payload: dict) -> tuple[int, dict]:
+        """Queue a v2 heartbeat; the first one of a batch sends it after batch_window seconds."""
+        self.counts["heartbeats"] += 1
+        self._seen(payload.get("pis_id"))
+        pending = _Pending(payload)
+        with self._batch_cond:
+            self._batch.append(pending)
+            leader = len(self._batch) == 1
+            if len(self._batch) >= MAX_BATCH:
+                self._batch_cond.notify_all()
+            if leader:
+                self._batch_cond.wait_for(lambda: len(self._batch) >= MAX_BATCH, self.batch_window)
+                batch, self._batch = self._batch, []
+        if leader:
+            self._send_batch(batch)
+        if not pending.done.wait(HEARTBEAT_WAIT):
+            return 504, {"error": "Gateway-Timeout"}
+        return pending.status, pending.body
+
+    def _send_batch(self, batch: list[_Pending]):
+        try:
+            if self.batch_api is None:
+                self._refresh(batch[0].payload.get("pis_id"))
+            if self.batch_api:
+                for i in range(0, len(batch), MAX_BATCH):
+                    self._send_array(batch[i:i + MAX_BATCH])
+            else:
+                for pending in batch:
+                    self._send_single(pending)
+        except Exception as e:
+            logger.warning("Gateway-Heartbeat-Fehler: %s", e)
+        finally:
+            for pending in batch:
+                if not pending.done.is_set():
+                    pending.done.set()
+
+    def _send_array(self, chunk: list[_Pending]):
+        data, headers = encode_body([p.payload for p in chunk])
+        self.counts["batches"] += 1
+        resp = self._upstream("heartbeat", "POST", CONFIG_PATH, data=data, headers=headers)
+        body = _json(resp) if resp is not None else None
+        results = body.get("results") if isinstance(body, dict) else None
+        if resp is None or resp.status_code != 200 or not isinstance(results, list) or len(results) != len(chunk):
+            if resp is not None:
+                logger.warning("Gateway-Heartbeats: HTTP %d", resp.status_code)
+            return
+        now = time.monotonic()
+        for pending, result in zip(chunk, results):
+            result.pop("pis_id", None)
+            status = result.pop("status", 200)
+            self._store_config(pending.payload.get("pis_id"), result.get("config"), result.get("etag"), now)
+            pending.finish(status, result)
+
+    def _send_single(self, pending: _Pending):
+        data, headers = encode_body(pending.payload)
+        resp = self._upstream("heartbeat", "POST", CONFIG_PATH, data=data, headers=headers)
+        if resp is None:
+            return
+        body = _json(resp)
+        if not isinstance(body, dict):
+            body = {"error": f"HTTP {resp.status_code}"}
+        elif resp.status_code == 200:
+            self._store_config(pending.payload.get("pis_id"), body.get("config"), body.get("etag"),
+                               time.monotonic())
+        pending.finish(resp.status_code, body)
+
+    def forward(self, raw: bytes) -> tuple[int, dict]:
+        """v1 heartbeat / task confirmation: unchanged to the server."""
+        self.counts["forwarded"] += 1
+        resp = self._upstream("heartbeat", "POST", CONFIG_PATH, data=raw,
+                              headers=JSON_HEADERS)
+        if resp is None:
+            return 502, {"error": "Server nicht erreichbar"}
+        body = _json(resp)
+        return resp.status_code, body if isinstance(body, dict) else {"error": f"HTTP {resp.status_code}"}
+
+    # ─── Scan ─────────────────────────────────────────────────────────────────
+
+    def scan(self, body: dict, raw: bytes) -> tuple[int, dict]:
+        self.counts["scans"] += 1
+        device_id = body.get("deviceId")
+        self._seen(device_id)
+        resp = self._upstream("scan", "POST", SCAN_PATH, data=raw, headers=JSON_HEADERS)
+        if resp is not None and resp.status_code < 500:
+            result = _json(resp)
+            return resp.status_code, result if isinstance(result, dict) else {"error": f"HTTP {resp.status_code}"}
+        result = self._local_decision(device_id, str(body.get("code", "")))
+        if result is None:
+            return 502, {"error": "Server nicht erreichbar"}
+        return 200, result
+
+    def _local_decision(self, device_id, code: str) -> Optional[dict]:
+        """
+        Shared offline cache: the gateway's ticket store decides for peers with the same
+        areas – only with re-entry allowed, the peers' own earlier entries are not in it
+        (the peer then decides itself). Grants are recorded under the peer's device.
+        """
+        store = self.store
+        if store is None or not store.local_validation or not code or code.startswith("__"):
+            return None
+        with self._lock:
+            cached = self._configs.get(device_id)
+        device = {k: cached[0].get(k) for k in ("pis_id", "pis_in", "pis_out", "pis_again")} if cached else None
+        if not device or not store.serves(device):
+            return None
+        if not device.get("pis_again"):
+            logger.info("Gateway: Gerät #%s ohne Wiedereintritt – Offline-Entscheidung beim Peer", device_id)
+            return None
+        try:
+            result = store.decide(code, device=device)
+        except Exception as e:
+            logger.warning("Gateway-Offline-Prüfung fehlgeschlagen: %s", e)
+            return None
+        self.counts["scans_local"] += 1
+        logger.info("Gateway: Offline-Entscheidung für Gerät #%s (lokaler Ticketbestand)", device_id)
+        return dict(result, offline=True, gateway=True)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            peers = sum(1 for t in self._peers.values() if now - t < PEER_TTL)
+        return dict(self.counts, peers=peers, batch_api=self.batch_api)
+
+
+def _json(resp):
+    try:
+        return resp.json()
+    except ValueError:
+        return None
+
+
+class GatewayRoute:
+    """Peer side: gateway base URL while it answers; otherwise requests go to the server."""
+
+    def __init__(self, url: str, secret: str, retry: float = GATEWAY_RETRY):
+        self.url = url.rstrip("/")
+        # ersetzt das API-Token des Kontos – das geht nie unverschlüsselt ins lokale Netz
+        self.headers = {"Authorization": f"Bearer {secret}"}
+        self.retry = retry
+        self._down_until = 0.0
+        self.requests = 0
+        self.fallbacks = 0
+        self.outages = 0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def succeeded(self):
+        self.requests += 1
+        if self._down_until:
+            self._down_until = 0.0
+            logger.info("Gateway %s wieder erreichbar", self.url)
+
+    def failed(self, reason):
+        self.fallbacks += 1
+        if not self._down_until:
+            self.outages += 1
+            logger.warning("Gateway %s nicht erreichbar (%s) – direkt zum Server, neuer Versuch in %.0f s",
+                           self.url, reason, self.retry)
+        self._down_until = time.monotonic() + self.retry
+
+    def stats(self) -> dict:
+        return {"url": self.url, "up": self.available(), "requests": self.requests,
+                "fallbacks": self.fallbacks, "outages": self.outages}
@@ -0,0 +1,540 @@
+"""
+GPIO backends for RelayController.
+
+  gpiochip  /dev/gpiochipN character device, GPIO uAPI v2 (what libgpiod v2 uses) via
+            ioctl – no extra package, works on Pi 5 and current kernels. All pins of a
+            controller are one line request, so relay + both LEDs switch with a single
+            GPIO_V2_LINE_SET_VALUES ioctl. Buzzer: software PWM thread on its line.
+  rpi       RPi.GPIO (deprecated on newer kernels, not available on Pi 5)
+  sim       pure Python, records (time.monotonic, pin, state) per write and
+            (time.monotonic, pin, freq) per buzzer change – benchmarks and tests
+
+Interface (all backends):
+  claim(pins)     pins as outputs, low
+  write(values)   {pin: bool} – one batch, as far as the backend allows
+  pwm(pin, freq)  object with start(duty) / ChangeFrequency(freq) / stop()
+  release(pins)   outputs low, lines freed
+  watch(pins, on_edge, debounce, pull_up)
+                  inputs with edge events (door contact, exit button), no polling:
+                  on_edge(pin, level, t_monotonic) from a backend thread; returns a
+                  handle with levels() and close()
+
+get_backend() returns the process-wide backend ("auto": rpi → gpiochip → sim – existing
+installations keep RPi.GPIO and its buzzer PWM in C; gpiochip where it is
+missing or unusable, e.g. on the Pi 5).
+"""
+from __future__ import annotations
+
+import ctypes
+import fcntl
+import glob
+import logging
+import os
+import select
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("emp.relay")
+
+CONSUMER = b"emp-scanner"
+BACKENDS = ("auto", "gpiochip", "rpi", "sim")
+# Pin für die RPi.GPIO-Probe ("auto"): nur Funktion lesen, nichts belegen
+RPI_PROBE_PIN = 4
+
+# ─── GPIO uAPI v2 (linux/gpio.h) ──────────────────────────────────────────────
+
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+GPIO_V2_LINE_FLAG_OUTPUT = 1 << 3
+GPIO_V2_LINE_FLAG_EDGE_RISING = 1 << 4
+GPIO_V2_LINE_FLAG_EDGE_FALLING = 1 << 5
+GPIO_V2_LINE_FLAG_BIAS_PULL_UP = 1 << 8
+GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN = 1 << 9
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE = 3
+GPIO_V2_LINE_EVENT_RISING_EDGE = 1
+
+
+class _LineAttribute(ctypes.Structure):
+    _fields_ = [("id", ctypes.c_uint32), ("padding", ctypes.c_uint32), ("value", ctypes.c_uint64)]
+
+
+class _LineConfigAttribute(ctypes.Structure):
+    _fields_ = [("attr", _LineAttribute), ("mask", ctypes.c_uint64)]
+
+
+class _LineConfig(ctypes.Structure):
+    _fields_ = [
+        ("flags", ctypes.c_uint64),
+        ("num_attrs", ctypes.c_uint32),
+        ("padding", ctypes.c_uint32 * 5),
+        ("attrs", _LineConfigAttribute * GPIO_V2_LINE_NUM_ATTRS_MAX),
+    ]
+
+
+class _LineRequest(ctypes.Structure):
+    _fields_ = [
+        ("offsets", ctypes.c_uint32 * GPIO_V2_LINES_MAX),
+        ("consumer", ctypes.c_char * 32),
+        ("config", _LineConfig),
+        ("num_lines", ctypes.c_uint32),
+        ("event_buffer_size", ctypes.c_uint32),
+        ("padding", ctypes.c_uint32 * 5),
+        ("fd", ctypes.c_int32),
+    ]
+
+
+class _LineValues(ctypes.Structure):
+    _fields_ = [("bits", ctypes.c_uint64), ("mask", ctypes.c_uint64)]
+
+
+class _LineEvent(ctypes.Structure):
+    _fields_ = [
+        ("timestamp_ns", ctypes.c_uint64),    # CLOCK_MONOTONIC wie time.monotonic()
+        ("id", ctypes.c_uint32),
+        ("offset", ctypes.c_uint32),
+        ("seqno", ctypes.c_uint32),
+        ("line_seqno", ctypes.c_uint32),
+        ("padding", ctypes.c_uint32 * 6),
+    ]
+
+
+class _ChipInfo(ctypes.Structure):
+    _fields_ = [("name", ctypes.c_char * 32), ("label", ctypes.c_char * 32), ("lines", ctypes.c_uint32)]
+
+
+def _iowr(nr: int, size: int) -> int:
+    return (3 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+
+GPIO_GET_CHIPINFO_IOCTL = (2 << 30) | (ctypes.sizeof(_ChipInfo) << 16) | (0xB4 << 8) | 0x01
+GPIO_V2_GET_LINE_IOCTL = _iowr(0x07, ctypes.sizeof(_LineRequest))
+GPIO_V2_LINE_GET_VALUES_IOCTL = _iowr(0x0E, ctypes.sizeof(_LineValues))
+GPIO_V2_LINE_SET_VALUES_IOCTL = _iowr(0x0F, ctypes.sizeof(_LineValues))
+
+
+def chip_label(path: str) -> Optional[str]:
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+    except OSError:
+        return None
+    try:
+        info = _ChipInfo()
+        fcntl.ioctl(fd, GPIO_GET_CHIPINFO_IOCTL, info, True)
+        return info.label.decode(errors="replace")
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def find_gpiochip() -> Optional[str]:
+    """Chip of the 40-pin header: pinctrl-rp1 (Pi 5) / pinctrl-bcm* (Pi ≤ 4), else gpiochip0."""
+    chips = sorted(glob.glob("/dev/gpiochip*"), key=lambda p: (len(p), p))
+    for path in chips:
+        label = chip_label(path) or ""
+        if label.startswith(("pinctrl-rp1", "pinctrl-bcm")):
+            return path
+    return chips[0] if chips else None
+
+
+# ─── Backends ─────────────────────────────────────────────────────────────────
+
+class SimulatedGpio:
+    """Keine Hardware: merkt sich Zustände und Zeitstempel (Benchmarks, Tests, Entwicklungsrechner)."""
+
+    name = "sim"
+
+    def __init__(self):
+        self.transitions: list[tuple[float, int, int]] = []
+        self.pwm_log: list[tuple[float, int, int]] = []
+        self.state: dict[int, int] = {}
+        self.writes = 0
+        self.inputs: dict[int, bool] = {}
+        self._watches: list[_SimWatch] = []
+        self._lock = threading.Lock()
+
+    def claim(self, pins: list[int]):
+        with self._lock:
+            for pin in pins:
+                self.state[pin] = 0
+
+    def write(self, values: dict[int, bool]):
+        t = time.monotonic()
+        with self._lock:
+            self.writes += 1
+            for pin, state in values.items():
+                self.state[pin] = int(state)
+                self.transitions.append((t, pin, int(state)))
+
+    def pwm(self, pin: int, freq: int) -> _SimPWM:
+        return _SimPWM(self, pin, freq)
+
+    def release(self, pins: list[int]):
+        with self._lock:
+            for pin in pins:
+                self.state.pop(pin, None)
+
+    def watch(self, pins: list[int], on_edge, debounce: float = 0.0, pull_up: bool = True) -> _SimWatch:
+        watch = _SimWatch(self, list(pins), on_edge)
+        with self._lock:
+            for pin in pins:
+                self.inputs.setdefault(pin, pull_up)
+            self._watches.append(watch)
+        return watch
+
+    def set_input(self, pin: int, level: bool):
+        """Pegel an einem Eingang setzen (Tür, Taster); löst wie die Hardware nur bei Flanken aus."""
+        t = time.monotonic()
+        with self._lock:
+            changed = self.inputs.get(pin) != level
+            self.inputs[pin] = level
+            watches = [w for w in self._watches if pin in w.pins] if changed else []
+        for watch in watches:
+            watch.on_edge(pin, level, t)
+
+    def rising_edges(self, pin: int) -> list[float]:
+        with self._lock:
+            return [t for t, p, v in self.transitions if p == pin and v]
+
+    def tones(self, pin: int) -> list[tuple[float, int]]:
+        """(time, freq) per buzzer step, freq 0 = stopped."""
+        with self._lock:
+            return [(t, f) for t, p, f in self.pwm_log if p == pin]
+
+
+class _SimPWM:
+    def __init__(self, gpio: SimulatedGpio, pin: int, freq: int):
+        self.gpio = gpio
+        self.pin = pin
+        self.freq = freq
+
+    def _log(self, freq: int):
+        with self.gpio._lock:
+            self.gpio.pwm_log.append((time.monotonic(), self.pin, freq))
+
+    def start(self, duty: float):
+        self._log(self.freq)
+
+    def ChangeFrequency(self, freq: int):
+        self.freq = freq
+        self._log(freq)
+
+    def stop(self):
+        self._log(0)
+
+
+class _SimWatch:
+    def __init__(self, gpio: SimulatedGpio, pins: list[int], on_edge):
+        self.gpio = gpio
+        self.pins = pins
+        self.on_edge = on_edge
+
+    def levels(self) -> dict[int, bool]:
+        with self.gpio._lock:
+            return {pin: self.gpio.inputs[pin] for pin in self.pins}
+
+    def close(self):
+        with self.gpio._lock:
+            if self in self.gpio._watches:
+                self.gpio._watches.remove(self)
+
+
+class RPiGpio:
+    """RPi.GPIO; output() mit Listen schreibt alle Pins eines Aufrufs."""
+
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        self.GPIO = GPIO
+
+    def probe(self):
+        """Liest die Funktion eines Pins – ohne passenden SoC (Pi 5) scheitert RPi.GPIO erst hier."""
+        self.GPIO.gpio_function(RPI_PROBE_PIN)
+
+    def claim(self, pins: list[int]):
+        for pin in pins:
+            self.GPIO.setup(pin, self.GPIO.OUT, initial=self.GPIO.LOW)
+
+    def write(self, values: dict[int, bool]):
+        self.GPIO.output(list(values), [self.GPIO.HIGH if v else self.GPIO.LOW for v in values.values()])
+
+    def pwm(self, pin: int, freq: int):
+        return self.GPIO.PWM(pin, freq)
+
+    def release(self, pins: list[int]):
+        self.GPIO.cleanup(list(pins))
+
+    def watch(self, pins: list[int], on_edge, debounce: float = 0.0, pull_up: bool = True) -> _RPiWatch:
+        return _RPiWatch(self.GPIO, list(pins), on_edge, debounce, pull_up)
+
+
+class _RPiWatch:
+    """add_event_detect(BOTH): RPi.GPIO ruft aus seinem Event-Thread zurück."""
+
+    def __init__(self, GPIO, pins: list[int], on_edge, debounce: float, pull_up: bool):
+        self.GPIO = GPIO
+        self.pins = pins
+        pud = GPIO.PUD_UP if pull_up else GPIO.PUD_DOWN
+        for pin in pins:
+            GPIO.setup(pin, GPIO.IN, pull_up_down=pud)
+            GPIO.add_event_detect(pin, GPIO.BOTH, bouncetime=max(1, int(debounce * 1000)),
+                                  callback=lambda ch: on_edge(ch, bool(GPIO.input(ch)), time.monotonic()))
+
+    def levels(self) -> dict[int, bool]:
+        return {pin: bool(self.GPIO.input(pin)) for pin in self.pins}
+
+    def close(self):
+        for pin in self.pins:
+            try:
+                self.GPIO.remove_event_detect(pin)
+            except Exception:
+                pass
+        self.GPIO.cleanup(self.pins)
+
+
+class GpioChip:
+    """/dev/gpiochipN über GPIO uAPI v2. Eine Line-Request (eigener fd) je claim()."""
+
+    name = "gpiochip"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+        self._lines: dict[int, tuple[int, int]] = {}     # pin → (request fd, bit)
+        self._pwms: dict[int, _SoftPWM] = {}
+        self.writes = 0
+        logger.info("GPIO über %s (%s)", path, chip_label(path) or "?")
+
+    def claim(self, pins: list[int]):
+        pins = list(dict.fromkeys(pins))
+        req = _LineRequest()
+        for i, pin in enumerate(pins):
+            req.offsets[i] = pin
+        req.consumer = CONSUMER
+        req.config.flags = GPIO_V2_LINE_FLAG_OUTPUT
+        req.num_lines = len(pins)
+        fcntl.ioctl(self._fd, GPIO_V2_GET_LINE_IOCTL, req, True)
+        for i, pin in enumerate(pins):
+            self._lines[pin] = (req.fd, i)
+
+    def write(self, values: dict[int, bool]):
+        batches: dict[int, list[int]] = {}
+        for pin, state in values.items():
+            fd, bit = self._lines[pin]
+            masks = batches.setdefault(fd, [0, 0])
+            masks[1] |= 1 << bit
+            if state:
+                masks[0] |= 1 << bit
+        for fd, (bits, mask) in batches.items():
+            fcntl.ioctl(fd, GPIO_V2_LINE_SET_VALUES_IOCTL, _LineValues(bits, mask))
+            self.writes += 1
+
+    def pwm(self, pin: int, freq: int) -> _SoftPWM:
+        pwm = self._pwms.get(pin)
+        if pwm is None:
+            pwm = self._pwms[pin] = _SoftPWM(self, pin, freq)
+        else:
+            pwm.ChangeFrequency(freq)
+        return pwm
+
+    def release(self, pins: list[int]):
+        for pin in pins:
+            pwm = self._pwms.pop(pin, None)
+            if pwm is not None:
+                pwm.close()
+        owned = [p for p in pins if p in self._lines]
+        if owned:
+            try:
+                self.write({p: False for p in owned})
+            except OSError:
+                pass
+        fds = {self._lines.pop(p)[0] for p in owned}
+        for fd in fds:
+            if not any(f == fd for f, _ in self._lines.values()):
+                os.close(fd)
+
+    def watch(self, pins: list[int], on_edge, debounce: float = 0.0, pull_up: bool = True) -> _ChipWatch:
+        return _ChipWatch(self._fd, list(dict.fromkeys(pins)), on_edge, debounce, pull_up)
+
+
+class _ChipWatch:
+    """
+    Eingänge als eigene Line-Request mit Flankenerkennung und Entprellung im Kernel.
+    Ein Thread wartet per select auf den fd; Zeitstempel kommen vom Kernel (Flanke, nicht Lesezeit).
+    """
+
+    def __init__(self, chip_fd: int, pins: list[int], on_edge, debounce: float, pull_up: bool):
+        self.pins = pins
+        self.on_edge = on_edge
+        req = _LineRequest()
+        for i, pin in enumerate(pins):
+            req.offsets[i] = pin
+        req.consumer = CONSUMER
+        req.config.flags = (GPIO_V2_LINE_FLAG_INPUT | GPIO_V2_LINE_FLAG_EDGE_RISING | GPIO_V2_LINE_FLAG_EDGE_FALLING
+                            | (GPIO_V2_LINE_FLAG_BIAS_PULL_UP if pull_up else GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN))
+        if debounce > 0:
+            req.config.num_attrs = 1
+            req.config.attrs[0].attr.id = GPIO_V2_LINE_ATTR_ID_DEBOUNCE
+            req.config.attrs[0].attr.value = int(debounce * 1e6)
+            req.config.attrs[0].mask = (1 << len(pins)) - 1
+        req.num_lines = len(pins)
+        fcntl.ioctl(chip_fd, GPIO_V2_GET_LINE_IOCTL, req, True)
+        self.fd = req.fd
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="gpio-events", daemon=True)
+        self._thread.start()
+
+    def levels(self) -> dict[int, bool]:
+        values = _LineValues(0, (1 << len(self.pins)) - 1)
+        fcntl.ioctl(self.fd, GPIO_V2_LINE_GET_VALUES_IOCTL, values, True)
+        return {pin: bool(values.bits >> i & 1) for i, pin in enumerate(self.pins)}
+
+    def _run(self):
+        size = ctypes.sizeof(_LineEvent)
+        while True:
+            try:
+                ready, _, _ = select.select([self.fd, self._wake_r], [], [])
+            except (OSError, ValueError):
+                return
+            if self._wake_r in ready:
+                return
+            try:
+                data = os.read(self.fd, size * 16)
+            except OSError as e:
+                logger.warning("GPIO-Eingänge: %s", e)
+                return
+            for offset in range(0, len(data) - size + 1, size):
+                event = _LineEvent.from_buffer_copy(data, offset)
+                try:
+                    self.on_edge(event.offset, event.id == GPIO_V2_LINE_EVENT_RISING_EDGE,
+                                 event.timestamp_ns / 1e9)
+                except Exception as e:
+                    logger.error("Fehler bei GPIO-Flanke (Pin %d): %s", event.offset, e)
+
+    def close(self):
+        os.write(self._wake_w, b"x")
+        self._thread.join(1)
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            os.close(fd)
+
+
+class _SoftPWM:
+    """Rechteck per Software auf einer Leitung (wie RPi.GPIO.PWM). Ein Thread je Buzzer, schläft ohne Ton."""
+
+    def __init__(self, chip: GpioChip, pin: int, freq: int):
+        self.chip = chip
+        self.pin = pin
+        self.freq = freq
+        self._duty = 0.5
+        self._active = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, duty: float):
+        with self._cond:
+            self._duty = max(0.0, min(duty, 100.0)) / 100
+            self._active = True
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"pwm-{self.pin}", daemon=True)
+                self._thread.start()
+
+    def ChangeFrequency(self, freq: int):
+        with self._cond:
+            self.freq = freq
+
+    def stop(self):
+        with self._cond:
+            self._active = False
+
+    def close(self):
+        with self._cond:
+            self._active = False
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        t_next = time.monotonic()
+        while True:
+            with self._cond:
+                if not self._active:
+                    self._write(False)
+                    while not self._active and not self._closed:
+                        self._cond.wait()
+                    t_next = time.monotonic()
+                if self._closed:
+                    return
+                period = 1.0 / max(self.freq, 1)
+                high = period * self._duty
+            # Flanken relativ zum Periodenanfang, damit die Tonhöhe nicht driftet
+            self._write(True)
+            time.sleep(max(0.0, t_next + high - time.monotonic()))
+            self._write(False)
+            t_next += period
+            time.sleep(max(0.0, t_next - time.monotonic()))
+
+    def _write(self, state: bool):
+        try:
+            self.chip.write({self.pin: state})
+        except (OSError, KeyError):
+            self._active = False
+
+
+def open_backend(name: str = "auto", chip: str = "auto"):
+    """
+    Backend by name; "auto" tries RPi.GPIO, then gpiochip, then the simulation.
+    RPi.GPIO counts only if it can access the pins (probe) and never on the RP1
+    (Pi 5), where it imports but cannot switch anything.
+    """
+    if name not in BACKENDS:
+        logger.warning("Unbekanntes GPIO-Backend %r – verwende auto", name)
+        name = "auto"
+    path = find_gpiochip() if chip == "auto" else chip
+    rp1 = name == "auto" and path is not None and (chip_label(path) or "").startswith("pinctrl-rp1")
+    if rp1:
+        logger.info("GPIO-Chip pinctrl-rp1 (Pi 5) – RPi.GPIO übersprungen")
+    elif name in ("auto", "rpi"):
+        try:
+            backend = RPiGpio()
+            if name == "auto":
+                backend.probe()
+            logger.info("RPi.GPIO geladen")
+            return backend
+        except Exception as e:
+            logger.log(logging.INFO if name == "auto" else logging.WARNING,
+                       "RPi.GPIO nicht verfügbar (%s)", e)
+    if name in ("auto", "gpiochip"):
+        try:
+            if path is None:
+                raise OSError("kein /dev/gpiochip*")
+            return GpioChip(path)
+        except OSError as e:
+            logger.warning("gpiochip nicht verfügbar (%s)", e)
+    logger.warning("GPIO-Simulation aktiv – Relais/LED/Buzzer werden nicht geschaltet")
+    return SimulatedGpio()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend(name: str = "auto", chip: str = "auto"):
+    """Process-wide backend, opened on first use (all lanes share the chip)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = open_backend(name, chip)
+        return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (e.g. SimulatedGpio in benchmarks)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,107 @@
+"""
+Heartbeat protocol v2 – delta-encoded, gzip-compressed, config in the response.
+
+  POST /api/devices/pi   {v: 2, pis_id, pis_task, pis_update, boot, seq, base, system_info}
+
+  boot         random id per process start – the server's stored state belongs to one session
+  seq          running number of this heartbeat
+  base         seq of the last snapshot the server acknowledged (0 = system_info is complete)
+  system_info  JSON Merge Patch (RFC 7386) against that snapshot – static fields
+               (model, OS, kernel …) only go out once per session or when they change
+
+  Response: {ack: seq, config, etag} or {resync: true, config, etag} → next heartbeat complete.
+  A server without v2 rejects the object body (400/415/500) or answers {results: [...]} –
+  until the first ack the client then falls back to v1 (uncompressed array + GET config).
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import uuid
+from typing import Optional
+
+GZIP_MIN_BYTES = 256
+LEGACY_STATUS = (400, 415, 500)
+
+
+def merge_diff(old: dict, new: dict) -> dict:
+    """Merge patch that turns old into new (null = key removed)."""
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            sub = merge_diff(old[key], value)
+            if sub:
+                patch[key] = sub
+        elif old[key] != value:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def encode_body(payload) -> tuple[bytes, dict]:
+    """JSON body, gzip-compressed from GZIP_MIN_BYTES on. Returns (data, extra headers)."""
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    if len(data) < GZIP_MIN_BYTES:
+        return data, {}
+    return gzip.compress(data), {"Content-Encoding": "gzip"}
+
+
+class HeartbeatEncoder:
+    def __init__(self, device_id: int):
+        self.device_id = device_id
+        self.boot = uuid.uuid4().hex[:16]
+        self.seq = 0
+        self.legacy = False
+        self.confirmed = False
+        self._acked: Optional[dict] = None
+        self._acked_seq = 0
+        self.bytes_sent = 0
+        self.resyncs = 0
+
+    def encode(self, task: int, system_info: dict, now: int) -> tuple[int, dict]:
+        """Returns (seq, payload). system_info must not be mutated afterwards (kept as base)."""
+        self.seq += 1
+        if self._acked is None:
+            base, info = 0, system_info
+        else:
+            base, info = self._acked_seq, merge_diff(self._acked, system_info)
+        return self.seq, {
+            "v": 2,
+            "pis_id": self.device_id,
+            "pis_task": task,
+            "pis_update": now,
+            "boot": self.boot,
+            "seq": self.seq,
+            "base": base,
+            "system_info": info,
+        }
+
+    def check_legacy(self, status: int, body) -> bool:
+        """True (and switch to v1) if the server evidently does not speak v2."""
+        if self.confirmed:
+            return False
+        if status in LEGACY_STATUS or (
+            status == 200 and (not isinstance(body, dict) or ("ack" not in body and "resync" not in body))
+        ):
+            self.legacy = True
+        return self.legacy
+
+    def on_response(self, seq: int, system_info: dict, body: dict) -> Optional[dict]:
+        """Process a v2 answer. Returns the device config carried in the response."""
+        self.confirmed = True
+        if body.get("ack") == seq:
+            self._acked = system_info
+            self._acked_seq = seq
+        elif body.get("resync"):
+            self.resyncs += 1
+            self._acked = None
+            self._acked_seq = 0
+        return body.get("config")
+
+    def snapshot(self) -> dict:
+        return {"seq": self.seq, "acked": self._acked_seq, "legacy": self.legacy,
+                "bytes": self.bytes_sent, "resyncs": self.resyncs}
@@ -0,0 +1,144 @@
+"""
+Scanner hotplug – inotify on /dev/input and device fingerprints from sysfs.
+
+Instead of opening every /dev/input/event* node every few seconds, ScannerInput
+waits on an inotify fd for new or changed nodes. udev creates the node first and
+sets owner/mode afterwards (IN_ATTRIB), so a node that cannot be opened yet is
+tried again on its next event.
+
+A fingerprint (vendor, product, phys, name) of the connected scanner is kept.
+When a node appears it is compared via the sysfs text files of that one node,
+without opening it, so a replugged scanner is grabbed again within milliseconds,
+even under a new eventX.
+"""
+from __future__ import annotations
+
+import ctypes
+import logging
+import os
+import select
+import struct
+from typing import Optional
+
+logger = logging.getLogger("emp.scanner")
+
+INPUT_DIR = "/dev/input"
+SYSFS_INPUT = "/sys/class/input"
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_ATTRIB | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+
+def list_input_devices(directory: str = INPUT_DIR) -> list[str]:
+    """event*-Knoten wie evdev.list_devices(), aber ohne evdev und in stabiler Reihenfolge."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    nodes = [os.path.join(directory, n) for n in names if n.startswith("event")]
+    return sorted(nodes, key=lambda p: (len(p), p))
+
+
+def _read_sysfs(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def fingerprint_of(path: str) -> Optional[tuple]:
+    """(vendor, product, phys, name) of an event node from sysfs, None if unknown."""
+    base = os.path.join(SYSFS_INPUT, os.path.basename(os.path.realpath(path)), "device")
+    vendor = _read_sysfs(os.path.join(base, "id", "vendor"))
+    product = _read_sysfs(os.path.join(base, "id", "product"))
+    if vendor is None or product is None:
+        return None
+    try:
+        return (int(vendor, 16), int(product, 16),
+                _read_sysfs(os.path.join(base, "phys")) or "", _read_sysfs(os.path.join(base, "name")) or "")
+    except ValueError:
+        return None
+
+
+def fingerprint_of_device(dev) -> tuple:
+    """Same tuple from an open evdev InputDevice."""
+    info = getattr(dev, "info", None)
+    return (getattr(info, "vendor", 0), getattr(info, "product", 0),
+            getattr(dev, "phys", "") or "", dev.name or "")
+
+
+class InputWatcher:
+    """
+    inotify on /dev/input (plus the directory of a fixed device path, e.g. by-id).
+    fd can go to loop.add_reader; read() returns the paths that were created or
+    changed, None if events were lost (overflow) – then the caller enumerates.
+    """
+
+    def __init__(self, directories: list[str]):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self._dirs: dict[int, str] = {}
+        for directory in dict.fromkeys(directories):
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = directory
+        if not self._dirs:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"{directories[0]} nicht überwachbar")
+        self.alive = True
+
+    @classmethod
+    def create(cls, directories: list[str]) -> Optional[InputWatcher]:
+        """None where inotify is unavailable (no Linux, no /dev/input yet) → caller polls."""
+        try:
+            return cls(directories)
+        except (OSError, AttributeError) as e:
+            logger.info("Hotplug-Erkennung nicht verfügbar (%s) – Scanner wird periodisch gesucht", e)
+            return None
+
+    def read(self) -> Optional[list[str]]:
+        paths: list[str] = []
+        lost = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    lost = True
+                elif mask & IN_IGNORED:
+                    # Verzeichnis entfernt – Watch ist tot
+                    self._dirs.pop(wd, None)
+                    self.alive = bool(self._dirs)
+                    lost = True
+                elif name and wd in self._dirs:
+                    paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return None if lost else list(dict.fromkeys(paths))
+
+    def wait(self, timeout: float) -> Optional[list[str]]:
+        """Blocking variant for thread mode: [] after timeout without events."""
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except (OSError, ValueError):
+            return []   # während stop() geschlossen
+        return self.read() if ready else []
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.alive = False
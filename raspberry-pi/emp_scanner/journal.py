@@ -0,0 +1,218 @@
+"""
+Offline scan journal – append-only log of scans the server has not recorded.
+
+Scans decided while the server was unreachable are appended here and
+uploaded in batches (POST /api/devices/pi/scans) once it is back. Each
+record carries a monotonic sequence number; journal id + seq form the
+idempotency key, so a retried batch never creates duplicate Scan rows.
+
+Writes are group-committed: appends only go to an in-memory buffer, a
+flusher thread writes the buffer with one write + fsync per interval to
+keep SD-card wear low.
+
+Layout (raspberry-pi/journal/):
+  id                 random journal id (part of the idempotency key)
+  acked              highest sequence number confirmed by the server
+  scans-<seq>.log    JSON lines, new segment every SEGMENT_BYTES
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+logger = logging.getLogger("emp.journal")
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "journal")
+
+SEGMENT_BYTES = 256 * 1024
+FLUSH_INTERVAL = 0.5
+FLUSH_MAX_RECORDS = 64
+UPLOAD_BATCH = 200
+
+
+def _write_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ScanJournal:
+    def __init__(self, device_id: int, path: str = JOURNAL_DIR,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.device_id = device_id
+        self.path = path
+        self.flush_interval = flush_interval
+        os.makedirs(path, exist_ok=True)
+
+        id_file = os.path.join(path, "id")
+        if not os.path.exists(id_file):
+            _write_atomic(id_file, uuid.uuid4().hex[:12])
+        with open(id_file) as f:
+            self.journal_id = f.read().strip()
+
+        self._acked = 0
+        acked_file = os.path.join(path, "acked")
+        if os.path.exists(acked_file):
+            with open(acked_file) as f:
+                self._acked = int(f.read().strip() or 0)
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending: list[dict] = []
+        self._seq = max(self._acked, self._last_written_seq())
+        self._segment: Optional[str] = None
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    # ─── Segments ─────────────────────────────────────────────────────────────
+
+    def _segments(self) -> list[tuple[int, str]]:
+        """[(first_seq, path)] sorted by first sequence number."""
+        out = []
+        for name in os.listdir(self.path):
+            if name.startswith("scans-") and name.endswith(".log"):
+                try:
+                    out.append((int(name[6:-4]), os.path.join(self.path, name)))
+                except ValueError:
+                    continue
+        return sorted(out)
+
+    def _read_segment(self, path: str) -> list[dict]:
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Abgeschnittene letzte Zeile nach Stromausfall
+                    logger.warning("Defekter Journal-Eintrag in %s übersprungen", path)
+        return records
+
+    def _last_written_seq(self) -> int:
+        segments = self._segments()
+        if not segments:
+            return 0
+        records = self._read_segment(segments[-1][1])
+        return records[-1]["seq"] if records else segments[-1][0] - 1
+
+    # ─── Append / group commit ────────────────────────────────────────────────
+
+    def append(self, code: str, result: str, ticket_id: Optional[int] = None,
+               message: str = "", ts: Optional[float] = None) -> int:
+        """Record one scan event. Cheap (buffer only); returns its sequence number."""
+        with self._cond:
+            self._seq += 1
+            self._pending.append({
+                "seq": self._seq,
+                "key": f"{self.journal_id}-{self._seq}",
+                "code": code,
+                "device": self.device_id,
+                "ts": round(ts if ts is not None else time.time(), 3),
+                "result": result,
+                "ticket_id": ticket_id,
+                "message": message,
+            })
+            if len(self._pending) >= FLUSH_MAX_RECORDS:
+                self._cond.notify()
+            return self._seq
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.flush_interval)
+                if not self._running and not self._pending:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write all buffered records with a single write + fsync."""
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+            data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch)
+            try:
+                if self._segment is None or os.path.getsize(self._segment) >= SEGMENT_BYTES:
+                    self._segment = os.path.join(self.path, f"scans-{batch[0]['seq']}.log")
+                with open(self._segment, "a") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logger.error("Journal-Schreibfehler: %s", e)
+                with self._lock:
+                    self._pending = batch + self._pending
+
+    # ─── Upload side ──────────────────────────────────────────────────────────
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._seq - self._acked
+
+    def read_unacked(self, limit: int = UPLOAD_BATCH) -> list[dict]:
+        """Oldest unconfirmed records (from disk; call flush() first)."""
+        out: list[dict] = []
+        for first_seq, path in self._segments():
+            for record in self._read_segment(path):
+                if record["seq"] > self._acked:
+                    out.append(record)
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def ack(self, upto_seq: int):
+        """Server confirmed everything up to upto_seq – persist and drop old segments."""
+        with self._lock:
+            if upto_seq <= self._acked:
+                return
+            self._acked = upto_seq
+        _write_atomic(os.path.join(self.path, "acked"), str(upto_seq))
+        segments = self._segments()
+        for i, (first_seq, path) in enumerate(segments):
+            next_first = segments[i + 1][0] if i + 1 < len(segments) else None
+            # Segment komplett bestätigt: alle Einträge liegen vor dem nächsten Segment (≤ acked)
+            if next_first is not None and next_first - 1 <= upto_seq and path != self._segment:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._flusher.join(timeout=2)
+        self.flush()
+
+
+def upload_pending(api, journal: ScanJournal) -> int:
+    """
+    Lädt alle offenen Journal-Einträge in Batches hoch.
+    Returns number of records confirmed by the server; stops at the first failure.
+    """
+    journal.flush()
+    uploaded = 0
+    while True:
+        batch = journal.read_unacked()
+        if not batch:
+            break
+        if not api.upload_scans(batch):
+            break
+        journal.ack(batch[-1]["seq"])
+        uploaded += len(batch)
+        if len(batch) < UPLOAD_BATCH:
+            break
+    if uploaded:
+        logger.info("Offline-Scans hochgeladen: %d", uploaded)
+    return uploaded
@@ -0,0 +1,333 @@
+"""
+Lane – one passage: scanner, scan pipeline, relay/LEDs/buzzer and task state of one device ID.
+
+Without "lanes" in config.json there is exactly one lane built from the top-level
+values. With "lanes" one process drives several passages (e.g. double turnstile):
+all scanners are read on the same event loop, every lane has its own pipeline
+threads, so a slow validation on one lane never stalls another. HTTP connection
+pool, circuit breaker, ticket store and system sampler are shared.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Optional
+
+from emp_scanner.api_client import ApiClient
+from emp_scanner.journal import ScanJournal, upload_pending
+from emp_scanner.optimistic import MISMATCH_CODE, OptimisticGrants
+from emp_scanner.pipeline import ScanPipeline
+from emp_scanner.relay import RelayController
+from emp_scanner.runtime import Runtime
+from emp_scanner.scanner import create_scanner_input
+from emp_scanner.scheduler import Job, Scheduler
+from emp_scanner.task_channel import POLL, PUSH, TaskChannel
+
+logger = logging.getLogger("emp.main")
+
+DEVICE_KEYS = ("pis_id", "pis_in", "pis_out", "pis_again")
+
+# Intervalle nach Dashboard-Aktivität bzw. Obergrenzen in ruhigen Phasen (Sekunden);
+# der Server zeigt ein Gerät ohne Heartbeat seit 5 min als offline
+FAST_POLL = 2.0
+FAST_HEARTBEAT = 10.0
+QUIET_MAX_POLL = 30.0
+QUIET_MAX_HEARTBEAT = 120.0
+
+
+class _LaneLog(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        return (f"[{self.extra['lane']}] {msg}" if self.extra["lane"] else msg), kwargs
+
+
+class Lane:
+    def __init__(self, app, device_id: int, api: ApiClient, relay: RelayController,
+                 scanner_device: str = "auto", journal: Optional[ScanJournal] = None,
+                 primary: bool = True, label: str = "", scanner_options: Optional[dict] = None,
+                 door=None, optimistic: Optional[OptimisticGrants] = None):
+        self.app = app
+        self.config = app.config
+        self.device_id = device_id
+        self.api = api
+        self.relay = relay
+        self.scanner_device = scanner_device
+        self.journal = journal
+        self.primary = primary
+        self.label = label
+        self.scanner_options = scanner_options
+        # DoorMonitor oder – mit Aktor-Prozess – dessen Stellvertreter (emp_scanner.actuator)
+        self.door = door
+        if door is not None:
+            door.on_event = self._on_door_event
+        self.optimistic = optimistic
+        self.device: dict = {}
+        self.scanner = None
+        self.tasks: Optional[TaskChannel] = None
+        self._current_task = 0
+        self.log = _LaneLog(logger, {"lane": label})
+        self.pipeline = ScanPipeline(
+            validate=self._decide,
+            actuate=self._actuate,
+            dedupe_window=float(self.config.scan_dedupe_window),
+            queue_size=int(self.config.scan_queue_size),
+            recorder=app.latency,
+            replay_window=float(getattr(self.config, "scan_replay_window", 3.0)),
+            confirm=self._confirm if optimistic else None,
+            unconfirmed=self._unconfirmed if optimistic else None,
+        )
+
+    def start(self, rt: Runtime, scheduler: Scheduler):
+        """Pipeline, Scanner (add_reader auf dem Event-Loop) und die Jobs dieses Durchgangs."""
+        self.pipeline.start()
+        self.scanner = create_scanner_input(
+            on_scan=self._handle_scan,
+            device_path=self.scanner_device,
+            timestamps=True,
+            options=self.scanner_options,
+        )
+        self.scanner.start(rt.loop)
+        if self.door:
+            self.door.start()
+        self.tasks = TaskChannel(
+            self.api,
+            on_config=self._apply_device_config,
+            poll_interval=int(getattr(self.config, "task_poll_interval", 3)),
+            push=bool(getattr(self.config, "task_push", False)),
+        )
+        # Long-Poll hält seinen Request selbst offen; im Polling-Modus ersetzt ein fälliger
+        # Heartbeat (Config in der Antwort) die Abfrage
+        scheduler.add(Job("Long-Poll", self.tasks.push_once, 0, endpoint="events", lane=self.label,
+                          enabled=lambda: self.tasks.mode == PUSH, spread=False))
+        scheduler.add(Job("Task-Poll", self.tasks.poll_once, lambda: self.tasks.poll_interval,
+                          endpoint="config", lane=self.label, fast=FAST_POLL, adaptive=True,
+                          max_interval=QUIET_MAX_POLL, enabled=lambda: self.tasks.mode == POLL))
+        scheduler.add(Job("Heartbeat", self._heartbeat_once, lambda: self.config.heartbeat_interval,
+                          endpoint="heartbeat", lane=self.label, covers=("Task-Poll",), fast=FAST_HEARTBEAT,
+                          adaptive=True, max_interval=QUIET_MAX_HEARTBEAT))
+        if self.journal:
+            scheduler.add(Job("Journal-Upload", self._journal_upload_once,
+                              lambda: self.config.journal_upload_interval, endpoint="upload", lane=self.label))
+
+    def stop(self):
+        if self.scanner:
+            self.scanner.stop()
+        self.pipeline.stop()
+
+    def close(self):
+        if self.door:
+            self.door.close()
+        self.relay.cleanup()
+        if self.journal:
+            self.journal.close()
+
+    # ─── Scans ────────────────────────────────────────────────────────────────
+
+    def _handle_scan(self, code: str, t_first: float | None = None, t_enter: float | None = None):
+        """Scanner-Callback: nur in die Pipeline stellen, blockiert nie."""
+        self.pipeline.submit(code, t_first, t_enter)
+        if self.app.scheduler:
+            self.app.scheduler.activity()
+
+    def _decide(self, code: str) -> dict | None:
+        """Validate-Stufe: Server-/Offline-Entscheidung. None = Scan ignoriert."""
+        self.log.info("Scan: %s", code[:40] + ("..." if len(code) > 40 else ""))
+
+        if code.startswith("{") and self.config.apply_qr_config(code):
+            # Neustart über systemd (Restart=always), sys.exit wirkt im Worker-Thread nicht
+            self.log.info("Neue Konfiguration übernommen – Neustart...")
+            self.app._stop()
+            return None
+
+        if self._current_task == 2:
+            self.log.info("NOT-AUF aktiv – Zutritt ohne Prüfung")
+            return {"granted": True, "message": "NOT-AUF aktiv"}
+
+        if self._current_task == 3:
+            self.log.info("Gerät gesperrt – Scan abgelehnt")
+            return {"granted": False, "message": "Gerät gesperrt"}
+
+        if self.optimistic:
+            result = self._optimistic_decision(code)
+            if result is not None:
+                return result
+
+        result = self.api.validate_scan(code)
+        if result.get("offline"):
+            result = self._offline_decision(code, result)
+            if self.journal:
+                self.journal.append(
+                    code,
+                    result.get("result", "GRANTED" if result.get("granted") else "DENIED"),
+                    ticket_id=result.get("ticket_id"),
+                    message=result.get("message", ""),
+                )
+        return result
+
+    def _actuate(self, code: str, result: dict) -> float | None:
+        """Actuate-Stufe: Relais, LEDs, Buzzer. Returns time.monotonic() of relay/LED on."""
+        message = result.get("message", "")
+        if result.get("granted", False):
+            self.log.info("GRANTED: %s", message)
+            ticket = result.get("ticket") or {}
+            if ticket.get("firstName") or ticket.get("lastName"):
+                self.log.info("  Ticket: %s %s", ticket.get("firstName", ""), ticket.get("lastName", ""))
+            t_on = self.relay.grant()
+            if self.door:
+                self.door.granted(code, result.get("ticket_id") or ticket.get("id"), t_on)
+            return t_on
+        self.log.info("DENIED: %s", message)
+        return self.relay.deny()
+
+    def _offline_decision(self, code: str, result: dict) -> dict:
+        """
+        Offline-Policy (config offline_policy):
+          local  – lokaler Ticketbestand entscheidet (ohne Bestand: ablehnen)
+          deny   – immer ablehnen
+          grant  – immer öffnen (z. B. Notausgang, Veranstaltung mit Einlasspersonal)
+        Weitere Durchgänge nutzen den gemeinsamen Bestand nur bei gleichem Bereich.
+        Hat das Gateway schon aus seinem Bestand entschieden, gilt dessen Entscheidung.
+        """
+        policy = self.config.offline_policy
+        if policy == "grant":
+            self.log.info("Offline-Policy: Freigabe ohne Prüfung")
+            return {"granted": True, "message": "Offline-Freigabe", "result": "GRANTED"}
+        if result.get("gateway"):
+            if policy == "local":
+                self.log.info("Offline-Entscheidung (Ticketbestand des Gateways)")
+                return result
+            result = {"granted": False, "message": "Server nicht erreichbar", "offline": True}
+        store = self.app.store
+        if policy == "local" and store and store.local_validation:
+            if self.primary:
+                self.log.info("Offline-Entscheidung (lokaler Ticketbestand)")
+                return store.decide(code)
+            if store.serves(self.device):
+                self.log.info("Offline-Entscheidung (lokaler Ticketbestand)")
+                return store.decide(code, device=self.device)
+            self.log.warning("Ticketbestand gilt für einen anderen Bereich – keine Offline-Prüfung")
+        return result
+
+    def _optimistic_decision(self, code: str) -> dict | None:
+        """Sofortige Freigabe aus dem lokalen Ticketbestand; None → Server entscheidet."""
+        store = self.app.store
+        if store is None:
+            return None
+        if self.primary:
+            result = self.optimistic.decide(store, code)
+        elif store.serves(self.device):
+            result = self.optimistic.decide(store, code, device=self.device)
+        else:
+            return None
+        if result is not None:
+            self.log.info("Optimistische Freigabe (lokaler Ticketbestand) – Server bestätigt im Hintergrund")
+        return result
+
+    def _confirm(self, code: str, result: dict) -> dict | None:
+        """Confirm-Stufe: Server-Prüfung einer optimistischen Freigabe (legt den Scan am Server an)."""
+        t_start = time.monotonic()
+        server = self.api.validate_scan(code)
+        outcome = self.optimistic.reconcile(server, time.monotonic() - t_start)
+        if outcome == "unconfirmed":
+            self._journal_local_grant(code, result)
+            return None
+        if outcome == "mismatch":
+            message = server.get("message", "")
+            self.log.warning("Server widerspricht optimistischer Freigabe: %s", message)
+            if self.journal:
+                self.journal.append(MISMATCH_CODE, "GRANTED", ticket_id=result.get("ticket_id"),
+                                    message=f"Optimistisch geöffnet, Server: {message}")
+        return server
+
+    def _unconfirmed(self, code: str, result: dict):
+        self.optimistic.dropped()
+        self._journal_local_grant(code, result)
+
+    def _journal_local_grant(self, code: str, result: dict):
+        """Optimistische Freigabe ohne Server-Bestätigung – wie ein Offline-Scan hochladen."""
+        if self.journal:
+            self.journal.append(code, "GRANTED", ticket_id=result.get("ticket_id"),
+                                message=result.get("message", ""), ts=result.get("ts"))
+
+    # ─── Tasks / Heartbeat ────────────────────────────────────────────────────
+
+    def _heartbeat_once(self) -> bool:
+        try:
+            extra = {"pipeline": self.pipeline.stats(), "latency": self.app.latency.summary()}
+            if self.scanner:
+                extra["scanner"] = self.scanner.stats()
+            if self.primary and self.app.sync:
+                extra["sync"] = self.app.sync.stats()
+            if self.primary:
+                extra["actuator"] = self.relay.stats()
+                extra["connection"] = self.api.connection.stats()
+            if self.door:
+                extra["door"] = self.door.stats()
+            if self.optimistic:
+                extra["optimistic"] = self.optimistic.stats()
+            if self.primary and self.app.scheduler:
+                extra["schedule"] = self.app.scheduler.stats()
+            if self.primary and (self.app.gateway or self.api.gateway):
+                extra["gateway"] = (self.app.gateway or self.api.gateway).stats()
+            if self.label:
+                extra["lane"] = self.label
+            device_config = self.api.send_heartbeat(task=self._current_task, extra=extra)
+            if device_config:
+                self._apply_device_config(device_config)
+            return device_config is not None
+        except Exception as e:
+            self.log.warning("Heartbeat-Fehler: %s", e)
+            return False
+
+    def _apply_device_config(self, device_config: dict):
+        new_task = device_config.get("pis_task", 0)
+        if new_task != self._current_task:
+            self.log.info("Task geändert: %d → %d", self._current_task, new_task)
+            if self.app.scheduler:
+                self.app.scheduler.activity(fast=True)
+            self._apply_task(new_task)
+        if device_config.get("pis_active") == 0 and self._current_task != 3:
+            self.log.warning("Gerät vom Server deaktiviert")
+            self._apply_task(3)
+        self.device = {k: device_config.get(k) for k in DEVICE_KEYS}
+        if self.primary and self.app.store:
+            self.app.store.set_device(device_config)
+
+    def _journal_upload_once(self) -> bool:
+        """Lädt offline erfasste Scans hoch, sobald der Server wieder erreichbar ist."""
+        try:
+            if self.journal and self.journal.pending_count():
+                return upload_pending(self.api, self.journal) > 0
+        except Exception as e:
+            self.log.warning("Journal-Upload-Fehler: %s", e)
+            return False
+        return True
+
+    def _on_door_event(self, kind: str, code: str, ticket_id: int | None, message: str):
+        """Tür-Ereignisse (Mehrfachdurchgang, Aufbruch, Ausgangstaster) gehen mit den Scans ins Journal."""
+        if self.journal:
+            self.journal.append(code, "GRANTED" if kind == "exit" else "DENIED",
+                                ticket_id=ticket_id, message=message)
+
+    def _apply_task(self, task: int):
+        self._current_task = task
+        self.pipeline.clear_replay()
+        if self.door:
+            self.door.free = task == 2
+        if task == 1:
+            self.log.info("Task: Einmal öffnen")
+            t_on = self.relay.grant()
+            if self.door:
+                self.door.granted("__DASHBOARD_OPEN__", None, t_on)
+            self._current_task = 0
+            if not self.api.report_dashboard_open() and self.journal:
+                self.journal.append("__DASHBOARD_OPEN__", "GRANTED", message="Dashboard-Öffnung")
+            self.api.report_task_completed(0)
+        elif task == 2:
+            self.log.warning("Task: NOT-AUF")
+            self.relay.emergency_open()
+        elif task == 3:
+            self.log.warning("Task: Deaktiviert")
+            self.relay.close()
+        elif task == 0:
+            self.log.info("Task: Reset/Idle")
+            self.relay.close()
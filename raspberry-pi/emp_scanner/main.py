@@ -6,24 +6,53 @@ Workflow:
 2. Play startup sound
 3. Start scanner input (USB HID)
 4. On scan -> beep -> validate with server -> relay + valid/invalid sound
-5. Background: heartbeat + task polling every 30s
-6. Background: auto-update check every 5 min
-7. Background: systemd watchdog ping every 30s
+   (server unreachable -> local decision from the ticket store, scan journaled)
+5. Background: task channel (conditional polling, long-poll with task_push)
+   + heartbeat every 30s – server jobs share one scheduler (emp_scanner.scheduler)
+6. Background: ticket delta sync for offline validation every ticket_sync_interval
+   (60 s), full snapshot every ticket_full_sync_interval (daily) or on mismatch
+7. Background: upload journaled offline scans in batches
+8. Background: auto-update check every 5 min
+9. Background: systemd watchdog ping every 30s
+
+Input, timers and background jobs run on one asyncio loop (emp_scanner.runtime);
+blocking HTTP/SQLite/git calls go to a small IO pool, scans through the
+threaded scan pipeline. Sleeps are cancellable – shutdown takes effect at once.
+
+Scanner, pipeline, relay and task state of a passage live in a Lane
+(emp_scanner.lane); config "lanes" runs several passages in one process.
+
+Site gateway (emp_scanner.gateway): with gateway_port this Pi answers config polls,
+heartbeats and scans of the other Pis of the venue; with gateway_url a Pi sends
+them there (falls back to the server directly). Both sides need gateway_secret.
 """
 from __future__ import annotations
 
-import signal
+import asyncio
 import sys
-import time
 import logging
-import threading
 import os
 
 from emp_scanner import VERSION
 from emp_scanner.config import Config
-from emp_scanner.scanner import ScannerInput
+from emp_scanner.scanner import create_scanner_input
+from emp_scanner.actuator import ActuatorClient
+from emp_scanner.door import DoorMonitor, door_options
+from emp_scanner.optimistic import OptimisticGrants, optimistic_options
+from emp_scanner.gpio import get_backend
 from emp_scanner.relay import RelayController
+from emp_scanner.sequencer import Sequencer
 from emp_scanner.api_client import ApiClient
+from emp_scanner.breaker import CircuitBreaker
+from emp_scanner.gateway import Gateway, GatewayRoute
+from emp_scanner.sync import TicketSync
+from emp_scanner.ticket_store import TicketStore
+from emp_scanner.journal import JOURNAL_DIR, ScanJournal
+from emp_scanner.lane import Lane
+from emp_scanner.metrics import LatencyRecorder, MetricsServer
+from emp_scanner.runtime import IO_WORKERS, Runtime
+from emp_scanner.scheduler import Job, Scheduler
+from emp_scanner.sysinfo import SAMPLE_INTERVAL, SLOW_INTERVAL, SystemSampler
 from emp_scanner.updater import check_and_update, restart_service
 
 logging.basicConfig(
@@ -33,6 +62,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger("emp.main")
 
+WATCHDOG_INTERVAL = 30
+QUIET_MAX_SYNC = 600
+POOL_PER_LANE = 4
+POOL_GATEWAY = 8
+
 
 def _sd_notify(state: str):
     """Send notification to systemd (if running under systemd)."""
@@ -54,246 +88,303 @@ class EmpScanner:
     def __init__(self):
         self.config = Config()
         self.relay: RelayController | None = None
+        self.sequencer: Sequencer | None = None
+        self.actuator: ActuatorClient | None = None
         self.api: ApiClient | None = None
-        self.scanner: ScannerInput | None = None
+        self.store: TicketStore | None = None
+        self.sync: TicketSync | None = None
+        self.lanes: list[Lane] = []
         self._running = False
-        self._current_task = 0
-        self._scan_lock = threading.Lock()
+        self.latency = LatencyRecorder()
+        self.metrics: MetricsServer | None = None
+        self.runtime: Runtime | None = None
+        self.scheduler: Scheduler | None = None
+        self.gateway: Gateway | None = None
+        self.sampler: SystemSampler | None = None
 
     def start(self):
         logger.info("═══════════════════════════════════════")
         logger.info("  EMP Access Scanner v%s", VERSION)
         logger.info("═══════════════════════════════════════")
 
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            pass
+
+    async def _main(self):
+        # Ein Long-Poll je Durchgang belegt einen IO-Thread
+        workers = IO_WORKERS + len(self.config.lane_specs()) - 1
+        self.runtime = Runtime(asyncio.get_running_loop(), workers=workers)
+        rt = self.runtime
         self._running = True
-        signal.signal(signal.SIGTERM, self._shutdown)
-        signal.signal(signal.SIGINT, self._shutdown)
+        rt.install_signal_handlers(self._shutdown)
 
         # systemd Type=notify: sofort READY melden, damit der Dienst nicht als fehlgeschlagen gilt
         _sd_notify("READY=1")
 
-        # Init relay/buzzer/LEDs
-        self.relay = RelayController(
-            relay_pin=self.config.relay_pin,
-            led_green=self.config.led_green_pin,
-            led_red=self.config.led_red_pin,
-            buzzer_pin=self.config.buzzer_pin,
-            duration=self.config.relay_duration,
-        )
+        try:
+            await self._run(rt)
+        finally:
+            await rt.shutdown()
+            self._cleanup()
+
+    async def _run(self, rt: Runtime):
+        # Init relay/buzzer/LEDs je Durchgang – Timeouts und Buzzer-Schritte aller Durchgänge
+        # laufen in einem Aktor-Thread, mit actuator_process in einem eigenen Prozess
+        specs = self.config.lane_specs()
+        relays, doors = None, None
+        if self.config.actuator_process:
+            relays, doors = self._start_actuator(specs)
+        if relays is None:
+            relays, doors = self._local_actuators(specs)
+        self.relay = relays[0]
 
         self.relay.startup_sound()
-        time.sleep(1)
+        await rt.sleep(1)
 
         if not self.config.is_configured:
             logger.info("Keine Konfiguration – warte auf Konfigurations-QR-Code...")
             _sd_notify("READY=1")
-            self._wait_for_config()
+            await self._wait_for_config(rt)
 
+        if not rt.running:
+            return
         if not self.config.is_configured:
             logger.error("Keine Konfiguration vorhanden – beende")
             sys.exit(1)
-
-        # Init API client
+        # Konfigurations-QR kann die Geräte-ID gerade erst gesetzt haben
+        specs = self.config.lane_specs()
+
+        # System-Info im Hintergrund sammeln – der Heartbeat kopiert nur den letzten Stand
+        self.sampler = await rt.run_blocking(SystemSampler)
+
+        # Init API client – weitere Durchgänge teilen Verbindungspool und Circuit Breaker
+        gateway_port = int(self.config.gateway_port)
+        route = None
+        if self.config.gateway_url and not gateway_port:
+            if self.config.gateway_secret:
+                route = GatewayRoute(self.config.gateway_url, self.config.gateway_secret)
+            else:
+                logger.error("gateway_url ohne gateway_secret – Anfragen gehen direkt zum Server")
         self.api = ApiClient(
             server_url=self.config.server_url,
             api_token=self.config.api_token,
-            device_id=self.config.device_id,
+            device_id=specs[0]["device_id"],
+            breaker=CircuitBreaker(
+                failure_threshold=int(self.config.breaker_failures),
+                open_seconds=float(self.config.breaker_open_seconds),
+                slow_call=float(self.config.breaker_slow_call),
+            ),
+            sampler=self.sampler,
+            pool_size=POOL_PER_LANE * len(specs) + (POOL_GATEWAY if gateway_port else 0),
+            keepalive_idle=float(self.config.http_keepalive_idle),
+            gateway=route,
         )
 
         logger.info("Server: %s", self.config.server_url)
-        logger.info("Gerät:  #%d", self.config.device_id)
+        if route:
+            logger.info("Gateway: %s", route.url)
+        logger.info("Gerät:  %s", ", ".join(f"#{spec['device_id']}" for spec in specs))
 
-        if self.api.test_connection():
+        if await rt.run_blocking(self.api.test_connection):
             logger.info("Serververbindung OK")
         else:
             logger.warning("Server nicht erreichbar – starte trotzdem")
 
-        # Start scanner input
-        self.scanner = ScannerInput(
-            on_scan=self._handle_scan,
-            device_path=self.config.scanner_device,
+        if self.config.offline_validation:
+            try:
+                self.store = TicketStore()
+                self.sync = TicketSync(
+                    self.api, self.store,
+                    full_interval=float(getattr(self.config, "ticket_full_sync_interval", 86400)),
+                    devices=[spec["device_id"] for spec in specs[1:]],
+                )
+                logger.info("Lokaler Ticketbestand: %d Tickets", self.store.stats()["tickets"])
+            except Exception as e:
+                logger.error("Ticket-Store nicht verfügbar: %s – keine Offline-Prüfung", e)
+
+        # Gateway für die anderen Pis des Standorts – Ticketbestand dient als gemeinsamer Offline-Cache
+        if gateway_port:
+            gateway = Gateway(self.api, gateway_port, self.config.gateway_secret,
+                              host=self.config.gateway_host, store=self.store,
+                              batch_window=float(self.config.gateway_batch_window))
+            if await rt.run_blocking(gateway.start):
+                self.gateway = gateway
+
+        # Durchgänge: je Scanner eine eigene Scan-Pipeline (Eingabe → Dedupe → Prüfung → Relais)
+        multi = len(specs) > 1
+        for i, (spec, relay, door) in enumerate(zip(specs, relays, doors)):
+            device_id = spec["device_id"]
+            journal = None
+            try:
+                journal = ScanJournal(device_id=device_id,
+                                      path=JOURNAL_DIR if i == 0 else f"{JOURNAL_DIR}-{device_id}")
+                if journal.pending_count():
+                    logger.info("Offline-Journal #%d: %d Scans noch nicht hochgeladen",
+                                device_id, journal.pending_count())
+            except Exception as e:
+                logger.error("Scan-Journal nicht verfügbar: %s – Offline-Scans gehen verloren", e)
+            optimistic = optimistic_options(spec)
+            self.lanes.append(Lane(
+                self,
+                device_id=device_id,
+                api=self.api if i == 0 else self.api.for_device(device_id),
+                relay=relay,
+                scanner_device=spec["scanner_device"],
+                journal=journal,
+                primary=i == 0,
+                label=f"#{device_id}" if multi else "",
+                scanner_options=spec,
+                door=door,
+                optimistic=OptimisticGrants(**optimistic) if optimistic is not None else None,
+            ))
+
+        if int(self.config.metrics_port):
+            self.metrics = MetricsServer(lambda: self.latency.prometheus() + self.api.connection.prometheus(),
+                                         int(self.config.metrics_port))
+            self.metrics.start()
+
+        # Server-Jobs aller Durchgänge in einem Scheduler (Zusammenlegen, Jitter, Backoff, Budget)
+        self.scheduler = Scheduler(
+            budget=self.config.request_budget,
+            max_backoff=float(self.config.schedule_max_backoff),
+            quiet_after=float(self.config.schedule_quiet_after),
+            quiet_factor=float(self.config.schedule_quiet_factor),
         )
-        self.scanner.start()
+        self.scheduler.start(rt)
+
+        # Scanner über loop.add_reader, Task-Kanal, Heartbeat und Journal-Upload je Durchgang
+        for lane in self.lanes:
+            lane.start(rt, self.scheduler)
         logger.info("Scanner bereit – warte auf Scans...")
 
         # Tell systemd we're ready
         _sd_notify("READY=1")
 
-        # Background threads: Task-Poll schnell (3s), Heartbeat mit System-Info seltener (30s)
-        threading.Thread(target=self._task_poll_loop, daemon=True).start()
-        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
-        threading.Thread(target=self._update_loop, daemon=True).start()
-        threading.Thread(target=self._watchdog_loop, daemon=True).start()
-
-        # Main thread keeps running
+        # Gemeinsame Hintergrund-Jobs auf dem Event-Loop; HTTP/SQLite/git laufen im IO-Pool
+        rt.every("System-Info", self.sampler.sample, SAMPLE_INTERVAL,
+                 initial_delay=SAMPLE_INTERVAL, blocking=False)
+        rt.every("System-Info (vcgencmd)", self.sampler.sample_slow, SLOW_INTERVAL,
+                 initial_delay=SLOW_INTERVAL)
+        if self.sync:
+            self.scheduler.add(Job("Ticket-Sync", self._ticket_sync_once, lambda: self.config.ticket_sync_interval,
+                                   endpoint="tickets", adaptive=True, max_interval=QUIET_MAX_SYNC))
+        if self.api.connection.keepalive_idle > 0:
+            idle = self.api.connection.keepalive_idle
+            self.scheduler.add(Job("Keepalive", self.api.keepalive, idle / 3, endpoint="config",
+                                   initial_delay=idle))
+        self.scheduler.add(Job("Update", self._update_once, lambda: self.config.update_check_interval,
+                               initial_delay=60))
+        rt.every("Watchdog", lambda: _sd_notify("WATCHDOG=1"), WATCHDOG_INTERVAL, blocking=False)
+
+        await rt.wait_stopped()
+
+    def _local_actuators(self, specs: list[dict]) -> tuple[list, list]:
+        self.sequencer = Sequencer()
+        gpio = get_backend(self.config.gpio_backend, self.config.gpio_chip)
+        relays, doors = [], []
+        for spec in specs:
+            relay = RelayController(
+                relay_pin=spec["relay_pin"],
+                led_green=spec["led_green_pin"],
+                led_red=spec["led_red_pin"],
+                buzzer_pin=spec["buzzer_pin"],
+                duration=spec["relay_duration"],
+                sequencer=self.sequencer,
+                gpio=gpio,
+            )
+            options = door_options(spec)
+            relays.append(relay)
+            doors.append(DoorMonitor(relay, **options) if options else None)
+        return relays, doors
+
+    def _start_actuator(self, specs: list[dict]) -> tuple[list | None, list | None]:
+        """GPIO im Aktor-Prozess; None → Relais im eigenen Prozess wie bisher."""
+        lanes = [
+            dict({key: spec[key] for key in ("relay_pin", "led_green_pin", "led_red_pin", "buzzer_pin")},
+                 duration=spec["relay_duration"], door=door_options(spec))
+            for spec in specs
+        ]
+        client = ActuatorClient(
+            lanes,
+            gpio_backend=self.config.gpio_backend,
+            gpio_chip=self.config.gpio_chip,
+            rt_priority=int(self.config.actuator_rt_priority),
+            mlock=bool(self.config.actuator_mlock),
+        )
+        if not client.start():
+            logger.error("Aktor-Prozess nicht verfügbar – Relais laufen im Hauptprozess")
+            return None, None
+        self.actuator = client
+        return ([client.relay(i) for i in range(len(specs))],
+                [client.door(i) for i in range(len(specs))])
+
+    def _ticket_sync_once(self) -> bool:
+        """Gleicht den Ticketbestand für die Offline-Prüfung ab (alle ticket_sync_interval s)."""
         try:
-            while self._running:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            pass
-        finally:
-            self._cleanup()
+            return not self.sync or self.sync.run_once()
+        except Exception as e:
+            logger.warning("Ticket-Sync-Fehler: %s", e)
+            return False
 
-    def _handle_scan(self, code: str):
-        if not self._scan_lock.acquire(blocking=False):
-            return
+    def _update_once(self):
         try:
-            self._process_scan(code)
-        finally:
-            self._scan_lock.release()
-
-    def _process_scan(self, code: str):
-        logger.info("Scan: %s", code[:40] + ("..." if len(code) > 40 else ""))
-
-        if code.startswith("{") and self.config.apply_qr_config(code):
-            logger.info("Neue Konfiguration übernommen – Neustart...")
-            self._cleanup()
-            sys.exit(0)
-
-        if not self.api:
-            logger.warning("Nicht konfiguriert – Scan ignoriert")
-            return
-
-        if self._current_task == 2:
-            logger.info("NOT-AUF aktiv – Zutritt ohne Prüfung")
-            if self.relay:
-                self.relay.grant()
-            return
-
-        if self._current_task == 3:
-            logger.info("Gerät gesperrt – Scan abgelehnt")
-            if self.relay:
-                self.relay.deny()
-            return
-
-        result = self.api.validate_scan(code)
-        granted = result.get("granted", False)
-        message = result.get("message", "")
-
-        if granted:
-            logger.info("GRANTED: %s", message)
-            ticket = result.get("ticket", {})
-            if ticket.get("firstName") or ticket.get("lastName"):
-                logger.info("  Ticket: %s %s", ticket.get("firstName", ""), ticket.get("lastName", ""))
-            if self.relay:
-                self.relay.grant()
-        else:
-            logger.info("DENIED: %s", message)
-            if self.relay:
-                self.relay.deny()
-
-    def _task_poll_loop(self):
-        """Schnelles Polling nur für Task (alle 3s), damit Dashboard-Button schnell wirkt."""
-        interval = max(1, int(getattr(self.config, "task_poll_interval", 3)))
-        while self._running:
-            try:
-                if self.api:
-                    device_config = self.api.get_config()
-                    if device_config:
-                        new_task = device_config.get("pis_task", 0)
-                        if new_task != self._current_task:
-                            logger.info("Task geändert: %d → %d", self._current_task, new_task)
-                            self._apply_task(new_task)
-                        if device_config.get("pis_active") == 0 and self._current_task != 3:
-                            logger.warning("Gerät vom Server deaktiviert")
-                            self._apply_task(3)
-            except Exception as e:
-                logger.debug("Task-Poll: %s", e)
-            for _ in range(interval):
-                if not self._running:
-                    return
-                time.sleep(1)
-
-    def _heartbeat_loop(self):
-        while self._running:
-            try:
-                if self.api:
-                    device_config = self.api.send_heartbeat(task=self._current_task)
-                    if device_config:
-                        new_task = device_config.get("pis_task", 0)
-                        if new_task != self._current_task:
-                            logger.info("Task geändert: %d → %d", self._current_task, new_task)
-                            self._apply_task(new_task)
-                        if device_config.get("pis_active") == 0 and self._current_task != 3:
-                            logger.warning("Gerät vom Server deaktiviert")
-                            self._apply_task(3)
-            except Exception as e:
-                logger.warning("Heartbeat-Fehler: %s", e)
-
-            for _ in range(int(self.config.heartbeat_interval)):
-                if not self._running:
-                    return
-                time.sleep(1)
-
-    def _apply_task(self, task: int):
-        self._current_task = task
-        if not self.relay:
-            return
-        if task == 1:
-            logger.info("Task: Einmal öffnen")
-            self.relay.grant()
-            self._current_task = 0
-            if self.api:
-                self.api.report_dashboard_open()
-                self.api.report_task_completed(0)
-        elif task == 2:
-            logger.warning("Task: NOT-AUF")
-            self.relay.emergency_open()
-        elif task == 3:
-            logger.warning("Task: Deaktiviert")
-            self.relay.close()
-        elif task == 0:
-            logger.info("Task: Reset/Idle")
-            self.relay.close()
-
-    def _update_loop(self):
-        time.sleep(60)
-        while self._running:
-            try:
-                if check_and_update():
-                    logger.info("Update installiert – starte neu...")
-                    restart_service()
-                    return
-            except Exception as e:
-                logger.warning("Update-Prüfung fehlgeschlagen: %s", e)
-
-            for _ in range(int(self.config.update_check_interval)):
-                if not self._running:
-                    return
-                time.sleep(1)
-
-    def _watchdog_loop(self):
-        """Ping systemd watchdog every 30s to prove we're alive."""
-        while self._running:
-            _sd_notify("WATCHDOG=1")
-            time.sleep(30)
-
-    def _wait_for_config(self):
-        setup_scanner = ScannerInput(
+            if check_and_update():
+                logger.info("Update installiert – starte neu...")
+                restart_service()
+        except Exception as e:
+            logger.warning("Update-Prüfung fehlgeschlagen: %s", e)
+
+    async def _wait_for_config(self, rt: Runtime):
+        spec = self.config.lane_specs()[0]
+        setup_scanner = create_scanner_input(
             on_scan=self._setup_scan,
-            device_path=self.config.scanner_device,
+            device_path=spec["scanner_device"],
+            options=spec,
         )
-        setup_scanner.start()
+        setup_scanner.start(rt.loop)
 
-        while not self.config.is_configured and self._running:
+        while not self.config.is_configured and rt.running:
             _sd_notify("WATCHDOG=1")
-            time.sleep(1)
+            await rt.sleep(1)
 
         setup_scanner.stop()
 
     def _setup_scan(self, code: str):
         self.config.apply_qr_config(code)
 
-    def _shutdown(self, signum, frame):
+    def _shutdown(self):
         logger.info("Shutdown-Signal empfangen")
+        self._stop()
+
+    def _stop(self):
         self._running = False
+        if self.runtime:
+            self.runtime.stop()
 
     def _cleanup(self):
         logger.info("Aufräumen...")
-        if self.scanner:
-            self.scanner.stop()
-        if self.relay:
+        for lane in self.lanes:
+            lane.stop()
+        if self.metrics:
+            self.metrics.stop()
+        if self.gateway:
+            self.gateway.stop()
+        for lane in self.lanes:
+            lane.close()
+        if not self.lanes and self.relay:
             self.relay.cleanup()
+        if self.sequencer:
+            self.sequencer.stop()
+        if self.actuator:
+            self.actuator.stop()
+        if self.store:
+            self.store.close()
+        if self.api:
+            self.api.connection.close()
+        if self.sampler:
+            self.sampler.close()
         logger.info("Beendet")
 
 
@@ -0,0 +1,157 @@
+"""
+Scan latency metrics – fixed-bucket histograms per pipeline span.
+
+Spans (all time.monotonic, seconds):
+  read      erster Tastendruck → Enter (Scanner-Übertragung)
+  queue     Enter → Beginn der Prüfung (Wartezeit in der Pipeline)
+  validate  Beginn → Ende der Prüfung (Server oder lokal)
+  actuate   Entscheidung → Relais/LED geschaltet
+  total     erster Tastendruck → Relais/LED geschaltet
+
+A compact p50/p95/p99 summary goes into the heartbeat (system_info.latency);
+the full histograms are served locally in Prometheus text format.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+logger = logging.getLogger("emp.metrics")
+
+# Bucket-Obergrenzen in Sekunden (letzter Bucket = +Inf)
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3,
+           0.5, 0.75, 1.0, 2.0, 5.0, 10.0)
+
+SPANS = ("read", "queue", "validate", "actuate", "total")
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate (linear interpolation inside the bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist = {span: Histogram() for span in SPANS}
+
+    def observe(self, span: str, value: Optional[float]):
+        if value is None or value < 0:
+            return
+        with self._lock:
+            self._hist[span].observe(value)
+
+    def observe_scan(self, t_first: Optional[float], t_enter: Optional[float],
+                     t_validate_start: Optional[float], t_validate_end: Optional[float],
+                     t_actuated: Optional[float]):
+        def span(a, b):
+            return b - a if a is not None and b is not None else None
+
+        self.observe("read", span(t_first, t_enter))
+        self.observe("queue", span(t_enter, t_validate_start))
+        self.observe("validate", span(t_validate_start, t_validate_end))
+        self.observe("actuate", span(t_validate_end, t_actuated))
+        self.observe("total", span(t_first if t_first is not None else t_enter, t_actuated))
+
+    def summary(self) -> dict:
+        """Compact heartbeat summary in ms: {span: {"n", "p50", "p95", "p99"}}."""
+        out = {}
+        with self._lock:
+            for span, h in self._hist.items():
+                if not h.count:
+                    continue
+                out[span] = {"n": h.count}
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                    out[span][name] = round(h.percentile(q) * 1000, 1)
+        return out
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP emp_scan_latency_seconds Scan-to-relay latency per pipeline span",
+            "# TYPE emp_scan_latency_seconds histogram",
+        ]
+        with self._lock:
+            for span, h in self._hist.items():
+                cumulative = 0
+                for upper, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'emp_scan_latency_seconds_bucket{{span="{span}",le="{upper}"}} {cumulative}')
+                lines.append(f'emp_scan_latency_seconds_bucket{{span="{span}",le="+Inf"}} {h.count}')
+                lines.append(f'emp_scan_latency_seconds_sum{{span="{span}"}} {h.sum:.6f}')
+                lines.append(f'emp_scan_latency_seconds_count{{span="{span}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Lokaler HTTP-Endpunkt /metrics (Prometheus-Textformat), nur auf 127.0.0.1.
+    render() liefert den kompletten Text – weitere Quellen werden vom Aufrufer angehängt.
+    """
+
+    def __init__(self, render: Callable[[], str], port: int, host: str = "127.0.0.1"):
+        self.render = render
+        self.port = port
+        self.host = host
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.warning("Metrics-Endpunkt auf Port %d nicht verfügbar: %s", self.port, e)
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info("Metrics: http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,107 @@
+"""
+Optimistic grant – open at once for tickets the local store already knows to be good,
+confirm with the server afterwards.
+
+Optional per lane (optimistic_grant). A scan is granted from the local ticket
+store without waiting for POST /api/devices/pi/scan when
+
+  - the store was synced within optimistic_max_age seconds,
+  - the local decision (decision.evaluate) grants,
+  - the ticket's validity type is in optimistic_validity_types and its source in
+    optimistic_sources (empty = every source; null = tickets created in EMP Access).
+
+Local denials always go to the server, which may know a newer state. The server
+call runs afterwards in the confirm stage of the pipeline and records the scan as
+usual. Outcomes:
+
+  confirmed    server grants too
+  mismatch     server denies (e.g. ticket invalidated seconds ago): logged, counted
+               and journaled as reconciliation event (__OPTIMISTIC_MISMATCH__);
+               a repeated scan within scan_replay_window is denied
+  unconfirmed  server unreachable (or confirm queue full): the local grant is journaled
+               like an offline scan
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+from emp_scanner.metrics import Histogram
+
+MISMATCH_CODE = "__OPTIMISTIC_MISMATCH__"
+
+# Konfigurationswerte → OptimisticGrants-Argumente (config / lanes)
+OPTIMISTIC_KEYS = {
+    "optimistic_validity_types": "validity_types",
+    "optimistic_sources": "sources",
+    "optimistic_max_age": "max_age",
+}
+
+
+def optimistic_options(values: dict) -> Optional[dict]:
+    """OptimisticGrants-Argumente aus Konfigurationswerten, None ohne optimistic_grant."""
+    if not values.get("optimistic_grant"):
+        return None
+    options = {arg: values[key] for key, arg in OPTIMISTIC_KEYS.items() if values.get(key) is not None}
+    if "optimistic_sources" in values and values["optimistic_sources"] is None:
+        # null = in EMP Access angelegte Tickets, die haben keine Quelle (source null)
+        options["sources"] = (None,)
+    return options
+
+
+class OptimisticGrants:
+    """Eligibility policy and reconciliation counters of one lane."""
+
+    def __init__(self, validity_types=("DATE_RANGE",), sources=(), max_age: float = 300.0):
+        self.validity_types = set(validity_types)
+        self.sources = set(sources)
+        self.max_age = float(max_age)
+        self._lock = threading.Lock()
+        self.counts = {"granted": 0, "confirmed": 0, "mismatch": 0, "unconfirmed": 0, "stale": 0}
+        self.confirm = Histogram()
+
+    def eligible(self, ticket: dict) -> bool:
+        if (ticket.get("validity_type") or "DATE_RANGE") not in self.validity_types:
+            return False
+        return not self.sources or ticket.get("source") in self.sources
+
+    def decide(self, store, code: str, device: Optional[dict] = None) -> Optional[dict]:
+        """Local grant marked optimistic (ts = scan time for the journal), None → ask the server."""
+        if store is None or not store.local_validation:
+            return None
+        if not store.synced_at or time.time() - store.synced_at > self.max_age:
+            with self._lock:
+                self.counts["stale"] += 1
+            return None
+        result = store.decide(code, device=device, only=self.eligible)
+        if result is None or not result["granted"]:
+            return None
+        with self._lock:
+            self.counts["granted"] += 1
+        return dict(result, optimistic=True, ts=time.time())
+
+    def reconcile(self, server: dict, elapsed: float) -> str:
+        """Server answer to an optimistic grant → "confirmed", "mismatch" or "unconfirmed"."""
+        if server.get("offline"):
+            outcome = "unconfirmed"
+        else:
+            outcome = "confirmed" if server.get("granted") else "mismatch"
+        with self._lock:
+            self.counts[outcome] += 1
+            if outcome != "unconfirmed":
+                self.confirm.observe(elapsed)
+        return outcome
+
+    def dropped(self):
+        """Confirmation dropped on overflow of the confirm stage – counts as unconfirmed."""
+        with self._lock:
+            self.counts["unconfirmed"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counts)
+            for name, q in (("confirm_p50_ms", 0.5), ("confirm_p99_ms", 0.99)):
+                value = self.confirm.percentile(q)
+                stats[name] = round(value * 1000, 1) if value is not None else None
+            return stats
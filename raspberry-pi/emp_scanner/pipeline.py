@@ -0,0 +1,307 @@
+"""
+Scan pipeline – input → dedupe → validate → actuate (→ confirm).
+
+Each stage runs in its own worker thread and is fed by a bounded queue with
+an explicit overflow policy, so reading codes never waits for the network:
+
+  input     submit() from the scanner thread, never blocks
+  dedupe    drops repeats of the same code within dedupe_window
+            (RFID-Karte liegt auf, QR doppelt gelesen); a later repeat within
+            replay_window replays a cached server denial straight to actuate –
+            no server request, no second Scan row. Grants are never replayed:
+            every opening is decided by the server (or the offline policy)
+  validate  server / offline decision (network, may take seconds)
+  actuate   relay, LEDs, buzzer
+  confirm   optional: server confirmation of optimistic local grants
+            (optimistic.py) after the relay has already opened
+
+Every item carries monotonic timestamps (first key, Enter, validate start/end,
+relay on); finished scans are handed to an optional LatencyRecorder.
+
+A dropped scan is always logged and counted – nothing disappears silently.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from emp_scanner.metrics import LatencyRecorder
+
+logger = logging.getLogger("emp.pipeline")
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+BLOCK_TIMEOUT = 0.5
+REPLAY_MAX_ENTRIES = 256
+_STOP = object()  # Ende-Marke in der Warteschlange, weckt den blockierten Worker
+
+
+class ScanItem:
+    __slots__ = ("code", "t_read", "t_first", "result", "t_validate_start", "t_validate_end")
+
+    def __init__(self, code: str, t_read: float, t_first: Optional[float] = None):
+        self.code = code
+        self.t_read = t_read
+        self.t_first = t_first
+        self.result: Optional[dict] = None
+        self.t_validate_start: Optional[float] = None
+        self.t_validate_end: Optional[float] = None
+
+
+class ReplayCache:
+    """Recent decisions per code, expiring after ttl seconds (monotonic clock)."""
+
+    def __init__(self, ttl: float, max_entries: int = REPLAY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code: str, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None or now - entry[0] >= self.ttl:
+                return None
+            return entry[1]
+
+    def put(self, code: str, result: dict, now: float):
+        with self._lock:
+            self._entries.pop(code, None)
+            self._entries[code] = (now, result)
+            while self._entries:
+                t, _ = next(iter(self._entries.values()))
+                if len(self._entries) <= self.max_entries and now - t < self.ttl:
+                    break
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _short(code: str) -> str:
+    return code[:40] + ("..." if len(code) > 40 else "")
+
+
+class Stage:
+    """One pipeline stage: bounded queue + worker thread + counters."""
+
+    def __init__(self, name: str, handler: Callable[[ScanItem], Optional[ScanItem]],
+                 maxsize: int = 16, overflow: str = DROP_OLDEST,
+                 on_drop: Optional[Callable[[ScanItem], None]] = None):
+        self.name = name
+        self.handler = handler
+        self.overflow = overflow
+        self.on_drop = on_drop
+        self.next: Optional[Stage] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def put(self, item: ScanItem):
+        if self._stopped:
+            return
+        self.received += 1
+        try:
+            if self.overflow == BLOCK:
+                self._queue.put(item, timeout=BLOCK_TIMEOUT)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == DROP_OLDEST:
+                try:
+                    old = self._queue.get_nowait()
+                    self._drop(old)
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    self._drop(item)
+            else:
+                self._drop(item)
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _drop(self, item: ScanItem):
+        self.dropped += 1
+        logger.warning("Pipeline %s voll – Scan verworfen: %s", self.name, _short(item.code))
+        if self.on_drop is not None:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logger.error("Pipeline %s: verworfenen Scan nicht erfasst: %s", self.name, e)
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name=f"scan-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        while True:
+            try:
+                self._queue.put_nowait(_STOP)
+                return
+            except queue.Full:
+                # Volle Warteschlange: die Ende-Marke ersetzt den ältesten Scan
+                try:
+                    self._drop(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                out = self.handler(item)
+                self.processed += 1
+                if out is not None and self.next is not None:
+                    self.next.put(out)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Pipeline %s: Fehler bei %s: %s", self.name, _short(item.code), e)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "depth": self._queue.qsize(),
+            "max_depth": self.max_depth,
+        }
+
+
+class ScanPipeline:
+    """
+    validate(code) -> result dict or None (scan ignored)
+    actuate(code, result) -> drives relay/LEDs/buzzer, returns time.monotonic() of actuation
+    confirm(code, result) -> server result for an optimistic grant (result["optimistic"])
+                             or None; unconfirmed(code, result) for one dropped on overflow
+    """
+
+    def __init__(self, validate: Callable[[str], Optional[dict]],
+                 actuate: Callable[[str, dict], Optional[float]],
+                 dedupe_window: float = 1.0, queue_size: int = 16,
+                 recorder: Optional[LatencyRecorder] = None, replay_window: float = 0.0,
+                 confirm: Optional[Callable[[str, dict], Optional[dict]]] = None,
+                 unconfirmed: Optional[Callable[[str, dict], None]] = None):
+        self._validate = validate
+        self._actuate = actuate
+        self._confirm = confirm
+        self._unconfirmed = unconfirmed
+        self.recorder = recorder
+        self.dedupe_window = dedupe_window
+        self._last_code: Optional[str] = None
+        self._last_time = 0.0
+        self.replay = ReplayCache(replay_window) if replay_window > 0 else None
+        self.submitted = 0
+        self.suppressed = 0
+        self.replayed = 0
+
+        self.dedupe = Stage("dedupe", self._dedupe_stage, maxsize=queue_size * 4, overflow=DROP_OLDEST)
+        self.validate = Stage("validate", self._validate_stage, maxsize=queue_size, overflow=DROP_OLDEST)
+        self.actuate = Stage("actuate", self._actuate_stage, maxsize=queue_size, overflow=DROP_OLDEST)
+        self.dedupe.next = self.validate
+        self.validate.next = self.actuate
+        self._stages = (self.dedupe, self.validate, self.actuate)
+        self.confirm: Optional[Stage] = None
+        if confirm is not None:
+            self.confirm = Stage("confirm", self._confirm_stage, maxsize=queue_size * 4,
+                                 overflow=DROP_OLDEST, on_drop=self._confirm_dropped)
+            self._stages += (self.confirm,)
+
+    def start(self):
+        for stage in self._stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self._stages:
+            stage.stop()
+
+    def submit(self, code: str, t_first: Optional[float] = None, t_enter: Optional[float] = None):
+        """Input stage – called from the scanner thread, never blocks."""
+        self.submitted += 1
+        self.dedupe.put(ScanItem(code, t_enter if t_enter is not None else time.monotonic(), t_first))
+
+    # ─── Stages ───────────────────────────────────────────────────────────────
+
+    def _dedupe_stage(self, item: ScanItem) -> Optional[ScanItem]:
+        if item.code == self._last_code and item.t_read - self._last_time < self.dedupe_window:
+            self._last_time = item.t_read
+            self.suppressed += 1
+            logger.debug("Doppelter Scan unterdrückt: %s", _short(item.code))
+            return None
+        self._last_code = item.code
+        self._last_time = item.t_read
+        cached = self.replay.get(item.code, item.t_read) if self.replay is not None else None
+        if cached is not None:
+            self.replayed += 1
+            logger.info("Wiederholter Scan – vorherige Entscheidung übernommen: %s", _short(item.code))
+            item.result = dict(cached, replayed=True)
+            item.t_validate_start = item.t_validate_end = time.monotonic()
+            self.actuate.put(item)
+            return None
+        return item
+
+    def _validate_stage(self, item: ScanItem) -> Optional[ScanItem]:
+        item.t_validate_start = time.monotonic()
+        item.result = self._validate(item.code)
+        item.t_validate_end = time.monotonic()
+        if item.result is None:
+            return None
+        if self.replay is not None and self._replayable(item.result):
+            self.replay.put(item.code, item.result, item.t_validate_end)
+        return item
+
+    @staticmethod
+    def _replayable(result: dict) -> bool:
+        """Nur Ablehnungen des Servers – keine Freigaben, keine Offline-/Circuit-Entscheidungen."""
+        return not result.get("granted") and not result.get("offline") and not result.get("circuit_open")
+
+    def clear_replay(self):
+        """Nach Task-/Konfigurationswechsel: alte Entscheidungen nicht mehr wiederholen."""
+        if self.replay is not None:
+            self.replay.clear()
+
+    def _actuate_stage(self, item: ScanItem) -> None:
+        t_actuated = self._actuate(item.code, item.result or {}) or time.monotonic()
+        if self.recorder:
+            self.recorder.observe_scan(
+                item.t_first, item.t_read, item.t_validate_start, item.t_validate_end, t_actuated
+            )
+        result = item.result or {}
+        if self.confirm is not None and result.get("optimistic") and not result.get("replayed"):
+            self.confirm.put(item)
+
+    def _confirm_stage(self, item: ScanItem) -> None:
+        result = self._confirm(item.code, item.result)
+        if result is not None and self.replay is not None and self._replayable(result):
+            # Server widerspricht – Wiederholungen nicht mehr optimistisch freigeben
+            self.replay.put(item.code, result, item.t_validate_end)
+
+    def _confirm_dropped(self, item: ScanItem):
+        if self._unconfirmed is not None:
+            self._unconfirmed(item.code, item.result)
+
+    def stats(self) -> dict:
+        out = {"submitted": self.submitted, "suppressed": self.suppressed, "replayed": self.replayed}
+        for stage in self._stages:
+            out[stage.name] = stage.stats()
+        return out
@@ -1,6 +1,8 @@
 """
 GPIO relay and PWM buzzer control.
 GPIO errors are non-fatal – the scanner keeps running without hardware feedback.
+Pins are switched through a backend from emp_scanner.gpio (RPi.GPIO, gpiochip or
+simulation); outputs that change together are written as one batch.
 
 Pin assignments (BCM):
   Relais:   GPIO 24
@@ -13,156 +15,195 @@ Buzzer patterns:
   scan:     500 → 1500 Hz         (0.2s each)
   valid:    Aufsteigend C5→E5→G5, kurze Töne, längerer Abschluss („positiv“, bestätigend)
   invalid:  Absteigend, tiefere Töne, doppelter Warnton („Fehler“, unmissverständlich)
+
+Relay/LED timeouts and buzzer steps run on the actuator sequencer (emp_scanner.sequencer):
+one thread, one monotonic timer heap, shared by all lanes. A decision tone cuts off a
+running tone; a scan beep never cuts off a decision tone.
 """
 from __future__ import annotations
 
-import threading
 import logging
 import time
+from typing import Optional
 
-logger = logging.getLogger("emp.relay")
+from emp_scanner.gpio import get_backend
+from emp_scanner.sequencer import PRIO_DECISION, PRIO_INFO, Sequencer, shared_sequencer
 
-# Try to import GPIO – fail gracefully on non-Pi or unsupported hardware
-GPIO = None
-HAS_GPIO = False
+logger = logging.getLogger("emp.relay")
 
-try:
-    import RPi.GPIO as _GPIO
-    _GPIO.setmode(_GPIO.BCM)
-    _GPIO.setwarnings(False)
-    GPIO = _GPIO
-    HAS_GPIO = True
-    logger.info("RPi.GPIO geladen")
-except Exception as e:
-    logger.warning("RPi.GPIO nicht verfügbar (%s) – GPIO-Simulation aktiv", e)
+DENY_LED_SECONDS = 1.5
 
 
 class RelayController:
     def __init__(self, relay_pin: int, led_green: int, led_red: int,
-                 buzzer_pin: int, duration: float = 1.0):
+                 buzzer_pin: int, duration: float = 1.0, sequencer: Optional[Sequencer] = None,
+                 gpio=None):
         self.relay_pin = relay_pin
         self.led_green = led_green
         self.led_red = led_red
         self.buzzer_pin = buzzer_pin
         self.duration = duration
-        self._lock = threading.Lock()
-        self._timer: threading.Timer | None = None
+        self.seq = sequencer or shared_sequencer()
+        # Ein Lock für alle Ausgänge: den des Sequencers (Timeouts und Tonschritte laufen dort)
+        self._lock = self.seq.lock
+        self._pwm = None
+        self._tone_priority = PRIO_INFO
+        self._tone_until = 0.0
+        self.preempted = 0
+        self.relay_on = False
         self._gpio_ok = False
-
-        if HAS_GPIO and GPIO is not None:
-            try:
-                GPIO.setup(relay_pin, GPIO.OUT, initial=GPIO.LOW)
-                GPIO.setup(led_green, GPIO.OUT, initial=GPIO.LOW)
-                GPIO.setup(led_red, GPIO.OUT, initial=GPIO.LOW)
-                GPIO.setup(buzzer_pin, GPIO.OUT, initial=GPIO.LOW)
-                self._gpio_ok = True
-                logger.info(
-                    "GPIO initialisiert (Relay=%d, Green=%d, Red=%d, Buzzer=%d)",
-                    relay_pin, led_green, led_red, buzzer_pin,
-                )
-            except Exception as e:
-                logger.error(
-                    "GPIO-Setup fehlgeschlagen: %s – Scanner läuft ohne Relais/LED/Buzzer", e
-                )
+        self.gpio = gpio or get_backend()
+
+        try:
+            self.gpio.claim([relay_pin, led_green, led_red, buzzer_pin])
+            self._gpio_ok = True
+            logger.info(
+                "GPIO initialisiert über %s (Relay=%d, Green=%d, Red=%d, Buzzer=%d)",
+                self.gpio.name, relay_pin, led_green, led_red, buzzer_pin,
+            )
+        except Exception as e:
+            logger.error(
+                "GPIO-Setup fehlgeschlagen: %s – Scanner läuft ohne Relais/LED/Buzzer", e
+            )
 
     # ─── Public actions ───────────────────────────────────────────────────────
 
     def startup_sound(self):
         """Kurze Aufwärtsmelodie – klingt nach „System online / bereit“."""
         # C5 → E5 → G5 → C6, letzter Ton länger = klarer Abschluss
-        self._buzzer_pattern([(523, 0.18), (659, 0.18), (784, 0.18), (1047, 0.4)])
+        self._tone([(523, 0.18), (659, 0.18), (784, 0.18), (1047, 0.4)], PRIO_INFO)
 
-    def grant(self):
-        """Open relay + valid sound + green LED."""
+    def grant(self) -> float:
+        """Open relay + valid sound + green LED. Returns time.monotonic() of relay-on."""
         with self._lock:
-            self._cancel_timer()
-            self._set(self.relay_pin, True)
-            self._set(self.led_green, True)
-            self._set(self.led_red, False)
+            relay = self.seq.claim((self, "relay"))
+            leds = self.seq.claim((self, "leds"))
+            self._set({self.relay_pin: True, self.led_green: True, self.led_red: False})
+            t_on = time.monotonic()
             logger.info("GRANTED – Relais geöffnet für %.1fs", self.duration)
-        # Gültig: aufsteigend, angenehm (C5–E5–G5), letzter Ton länger = Bestätigung
-        self._buzzer_pattern([(523, 0.12), (659, 0.12), (784, 0.22)])
-        with self._lock:
-            self._timer = threading.Timer(self.duration, self._close_relay)
-            self._timer.daemon = True
-            self._timer.start()
-
-    def deny(self):
-        """Red LED + invalid sound, no relay."""
+            # Gültig: aufsteigend, angenehm (C5–E5–G5), letzter Ton länger = Bestätigung
+            self._tone([(523, 0.12), (659, 0.12), (784, 0.22)], PRIO_DECISION)
+            self.seq.at(t_on + self.duration, (self, "relay"), relay, self._set, {self.relay_pin: False},
+                        priority=PRIO_DECISION)
+            self.seq.at(t_on + self.duration, (self, "leds"), leds, self._reset_leds, priority=PRIO_DECISION)
+        return t_on
+
+    def deny(self) -> float:
+        """Red LED + invalid sound, no relay. Returns time.monotonic() of LED-on."""
         with self._lock:
-            self._set(self.led_red, True)
-            self._set(self.led_green, False)
+            leds = self.seq.claim((self, "leds"))
+            self._set({self.led_red: True, self.led_green: False})
+            t_on = time.monotonic()
             logger.info("DENIED – Relais bleibt geschlossen")
-        # Ungültig: zwei kurze Warntöne + tiefer langer Ton (unmissverständlich „abgelehnt“)
-        self._buzzer_pattern([(480, 0.08), (480, 0.08), (320, 0.22)])
-        with self._lock:
-            self._timer = threading.Timer(1.5, self._reset_leds)
-            self._timer.daemon = True
-            self._timer.start()
+            # Ungültig: zwei kurze Warntöne + tiefer langer Ton (unmissverständlich „abgelehnt“)
+            self._tone([(480, 0.08), (480, 0.08), (320, 0.22)], PRIO_DECISION)
+            self.seq.at(t_on + DENY_LED_SECONDS, (self, "leds"), leds, self._reset_leds, priority=PRIO_DECISION)
+        return t_on
 
     def scan_beep(self):
         """Short scan acknowledgement: 500 → 1500 Hz"""
-        self._buzzer_pattern([(500, 0.2), (1500, 0.2)])
+        self._tone([(500, 0.2), (1500, 0.2)], PRIO_INFO)
 
     def emergency_open(self):
-        """Permanent open – NOT-AUF."""
+        """Permanent open – NOT-AUF. Offene Timeouts (Relais schließen, LEDs aus) verfallen."""
         with self._lock:
-            self._cancel_timer()
-            self._set(self.relay_pin, True)
-            self._set(self.led_green, True)
-            self._set(self.led_red, True)
+            self.seq.claim((self, "relay"))
+            self.seq.claim((self, "leds"))
+            self._set({self.relay_pin: True, self.led_green: True, self.led_red: True})
             logger.warning("NOT-AUF – Relais dauerhaft geöffnet")
 
     def close(self):
         with self._lock:
-            self._cancel_timer()
-            self._close_relay()
+            self.seq.claim((self, "relay"))
+            self.seq.claim((self, "leds"))
+            self._set({self.relay_pin: False, self.led_green: False, self.led_red: False})
+
+    def unlock(self) -> float:
+        """Relais für duration öffnen, ohne LED/Ton (Ausgangstaster). Returns time.monotonic() of relay-on."""
+        with self._lock:
+            relay = self.seq.claim((self, "relay"))
+            self._set({self.relay_pin: True})
+            t_on = time.monotonic()
+            self.seq.at(t_on + self.duration, (self, "relay"), relay, self._set, {self.relay_pin: False},
+                        priority=PRIO_DECISION)
+        return t_on
+
+    def relock(self):
+        """Relais sofort schließen (Tür ist durch); der LED-Timeout läuft weiter."""
+        with self._lock:
+            self.seq.claim((self, "relay"))
+            self._set({self.relay_pin: False})
+
+    def stats(self) -> dict:
+        """Sequencer-Zähler (gemeinsam für alle Durchgänge) und abgebrochene Töne."""
+        return dict(self.seq.stats(), preempted=self.preempted)
 
     # ─── PWM buzzer ───────────────────────────────────────────────────────────
 
-    def _buzzer_pattern(self, steps: list[tuple[int, float]]):
-        if not self._gpio_ok or GPIO is None:
+    def _tone(self, steps: list[tuple[int, float]], priority: int):
+        """
+        Muster als Befehl an den Sequencer. Ein neues Muster gleicher oder höherer
+        Priorität bricht ein laufendes ab; ein niedrigeres (Scan-Piep während einer
+        Entscheidung) wird verworfen.
+        """
+        if not self._gpio_ok:
             return
-        def _play():
-            try:
-                pwm = GPIO.PWM(self.buzzer_pin, steps[0][0])
-                pwm.start(50)
-                time.sleep(steps[0][1])
-                for freq, dur in steps[1:]:
-                    pwm.ChangeFrequency(freq)
-                    time.sleep(dur)
-                pwm.stop()
-            except Exception as e:
-                logger.debug("Buzzer-Fehler: %s", e)
-        threading.Thread(target=_play, daemon=True).start()
+        with self._lock:
+            now = time.monotonic()
+            if now < self._tone_until:
+                if priority < self._tone_priority:
+                    return
+                self.preempted += 1
+            gen = self.seq.claim((self, "tone"))
+            self._tone_priority = priority
+            self._tone_until = now + sum(d for _, d in steps)
+            self.seq.at(now, (self, "tone"), gen, self._tone_step, steps, 0, now, gen, priority=priority)
+
+    def _tone_step(self, steps: list[tuple[int, float]], i: int, t_step: float, gen: int):
+        """Läuft im Sequencer-Thread. Nächster Schritt relativ zum geplanten Zeitpunkt (keine Drift)."""
+        try:
+            if i >= len(steps):
+                if self._pwm is not None:
+                    self._pwm.stop()
+                return
+            freq, duration = steps[i]
+            if self._pwm is None:
+                self._pwm = self.gpio.pwm(self.buzzer_pin, freq)
+            else:
+                self._pwm.ChangeFrequency(freq)
+            if i == 0:
+                self._pwm.start(50)
+        except Exception as e:
+            logger.debug("Buzzer-Fehler: %s", e)
+            return
+        self.seq.at(t_step + duration, (self, "tone"), gen, self._tone_step, steps, i + 1, t_step + duration, gen,
+                    priority=self._tone_priority)
 
     # ─── Internal ─────────────────────────────────────────────────────────────
 
-    def _close_relay(self):
-        self._set(self.relay_pin, False)
-        self._reset_leds()
-
     def _reset_leds(self):
-        self._set(self.led_green, False)
-        self._set(self.led_red, False)
+        self._set({self.led_green: False, self.led_red: False})
 
-    def _cancel_timer(self):
-        if self._timer and self._timer.is_alive():
-            self._timer.cancel()
-        self._timer = None
-
-    def _set(self, pin: int, state: bool):
-        if self._gpio_ok and GPIO is not None:
+    def _set(self, values: dict[int, bool]):
+        """Alle Pins in einem Schreibzugriff (gpiochip: ein ioctl)."""
+        if self.relay_pin in values:
+            self.relay_on = values[self.relay_pin]
+        if self._gpio_ok:
             try:
-                GPIO.output(pin, GPIO.HIGH if state else GPIO.LOW)
+                self.gpio.write(values)
             except Exception as e:
-                logger.debug("GPIO output Fehler (Pin %d): %s", pin, e)
+                logger.debug("GPIO output Fehler (Pins %s): %s", list(values), e)
 
     def cleanup(self):
-        self._cancel_timer()
-        if self._gpio_ok and GPIO is not None:
+        with self._lock:
+            for slot in ("relay", "leds", "tone"):
+                self.seq.claim((self, slot))
+        if self._gpio_ok:
             try:
-                GPIO.cleanup()
+                if self._pwm is not None:
+                    self._pwm.stop()
+                # Nur die eigenen Pins – weitere Durchgänge laufen ggf. noch
+                self.gpio.release([self.relay_pin, self.led_green, self.led_red, self.buzzer_pin])
                 logger.info("GPIO aufgeräumt")
             except Exception:
                 pass
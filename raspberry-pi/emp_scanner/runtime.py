@@ -0,0 +1,139 @@
+"""
+asyncio runtime – one event loop for input, timers, background jobs and watchdog.
+
+  sleep()        cancellable: returns immediately when stop() is called
+  every()        periodic local job (system sampling, watchdog); server jobs go through
+                 the scheduler (emp_scanner.scheduler)
+  run_blocking() blocking calls (requests, sqlite, git) on a small pool of daemon threads,
+                 so a hanging HTTP request never blocks the loop or the shutdown
+
+The scan pipeline keeps its own worker threads (validate blocks on the network);
+relay/LED/buzzer timers run on the actuator sequencer (emp_scanner.sequencer).
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import signal
+import threading
+from typing import Callable, Optional, Union
+
+logger = logging.getLogger("emp.runtime")
+
+IO_WORKERS = 4
+
+
+class BlockingPool:
+    """Fixed pool of daemon threads – unlike ThreadPoolExecutor never joined at exit."""
+
+    def __init__(self, workers: int = IO_WORKERS, name: str = "emp-io"):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn: Callable, *args) -> concurrent.futures.Future:
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((fut, fn, args))
+        return fut
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fut, fn, args = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+class Runtime:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, workers: int = IO_WORKERS):
+        self.loop = loop or asyncio.get_event_loop()
+        self._pool = BlockingPool(workers)
+        self._stopped = self.loop.create_future()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @property
+    def running(self) -> bool:
+        return not self._stopped.done()
+
+    def stop(self):
+        """Thread-safe; wakes every sleep() at once."""
+        def _set():
+            if not self._stopped.done():
+                self._stopped.set_result(None)
+        self.loop.call_soon_threadsafe(_set)
+
+    def install_signal_handlers(self, callback: Callable[[], None]):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self.loop.add_signal_handler(sig, callback)
+            except (NotImplementedError, RuntimeError):
+                signal.signal(sig, lambda *_: self.loop.call_soon_threadsafe(callback))
+
+    async def sleep(self, seconds: float) -> bool:
+        """Sleep up to `seconds`; returns False if the runtime is stopping."""
+        if self.running and seconds > 0:
+            await asyncio.wait([self._stopped], timeout=seconds)
+        return self.running
+
+    async def wait_stopped(self):
+        await asyncio.wait([self._stopped])
+
+    async def run_blocking(self, fn: Callable, *args):
+        return await asyncio.wrap_future(self._pool.submit(fn, *args))
+
+    def spawn(self, name: str, coro) -> asyncio.Task:
+        task = self.loop.create_task(coro)
+        self._tasks[name] = task
+        return task
+
+    def every(self, name: str, fn: Callable[[], None], interval: Union[float, Callable[[], float]],
+              initial_delay: float = 0, blocking: bool = True) -> asyncio.Task:
+        """
+        Periodic job. fn runs in the pool (blocking=True) or directly in the loop thread.
+        interval may be a callable, so config changes apply from the next round.
+        """
+        async def _loop():
+            if not await self.sleep(initial_delay):
+                return
+            while self.running:
+                try:
+                    if blocking:
+                        await self.run_blocking(fn)
+                    else:
+                        fn()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("%s-Fehler: %s", name, e)
+                delay = interval() if callable(interval) else interval
+                if not await self.sleep(float(delay)):
+                    return
+
+        return self.spawn(name, _loop())
+
+    async def shutdown(self):
+        """Cancel all jobs; blocking calls still running in the pool are abandoned."""
+        self.stop()
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=2)
+        self._tasks.clear()
+        self._pool.close()
@@ -3,17 +3,26 @@ USB HID scanner input handler.
 Ein USB-Scanner liest sowohl QR-Codes als auch RFID-Karten (HID-Modus).
 Scanner emulieren Tastatureingaben und senden Enter nach jedem Code.
 Fallback auf stdin für Entwicklung/Test ohne Hardware.
+
+Mit Event-Loop (start(loop)) wird das evdev-Gerät per loop.add_reader gelesen –
+kein eigener Thread. Ist kein Scanner verbunden, meldet inotify auf /dev/input neue
+Geräte (emp_scanner.hotplug); ohne inotify wird wie bisher alle 5 s gesucht.
 """
 
 import logging
+import os
+import select
 import threading
 import time
+from collections import deque
 from typing import Callable, Optional
 
+from emp_scanner.hotplug import INPUT_DIR, InputWatcher, fingerprint_of, fingerprint_of_device, list_input_devices
+from emp_scanner.serial_input import SerialScannerInput, find_serial_scanner, is_serial_path, serial_options
+
 logger = logging.getLogger("emp.scanner")
 
 try:
-    import evdev
     from evdev import InputDevice, ecodes
     HAS_EVDEV = True
 except ImportError:
@@ -35,53 +44,274 @@ KEY_MAP_SHIFT = {
 }
 
 
-def find_scanner_device() -> Optional[str]:
-    """Auto-detect USB HID scanner (QR + RFID combo device)."""
-    if not HAS_EVDEV:
-        return None
+SCANNER_KEYWORDS = ("barcode", "scanner", "reader", "rfid", "hid",
+                    "symbol", "honeywell", "datalogic", "netum", "inateck")
+
+RETRY_SEC = 2   # Gerät da, aber (noch) nicht zu öffnen
+POLL_SEC = 5    # ohne Hotplug-Erkennung: erneute Suche
+
+KEYS_SHIFT = (42, 54)
+KEYS_ENTER = (28, 96)   # Enter, Keypad-Enter
+
+# Framing (config scan_frame_gap, scan_max_key_interval, scan_min_length, scan_frame_length)
+FRAME_GAP = 0.1           # s Ruhe beendet einen Code ohne Enter
+MAX_KEY_INTERVAL = 0.04   # s je Taste (Median); Scanner: 1–10 ms, Tastatur: >60 ms
+MIN_LENGTH = 4
+STATS_FRAMES = 200
+FRAMING_KEYS = {
+    "scan_frame_gap": "frame_gap",
+    "scan_max_key_interval": "max_key_interval",
+    "scan_min_length": "min_length",
+    "scan_frame_length": "frame_length",
+}
+
 
-    for path in evdev.list_devices():
+def framing_options(values: dict) -> dict:
+    """KeyDecoder-Argumente aus Konfigurationswerten (z. B. Config.lane_specs())."""
+    return {arg: values[key] for key, arg in FRAMING_KEYS.items() if values.get(key) is not None}
+
+
+def probe_device(path: str) -> bool:
+    """Öffnet einen event-Knoten und prüft, ob er wie ein Scanner aussieht."""
+    try:
+        dev = InputDevice(path)
+    except Exception:
+        return False
+    try:
+        caps = dev.capabilities(verbose=False)
+        if ecodes.EV_KEY not in caps:
+            return False
+        name_lower = dev.name.lower()
+        if any(kw in name_lower for kw in SCANNER_KEYWORDS):
+            logger.info("Scanner gefunden: %s (%s)", dev.name, path)
+            return True
+        # Mäuse ausschließen (haben EV_REL für Bewegung)
+        if ecodes.EV_REL in caps:
+            return False
+        # USB-HID-Tastaturgerät ohne Mausbewegung = wahrscheinlich Scanner
+        key_caps = caps.get(ecodes.EV_KEY, [])
+        if len(key_caps) >= 10 and dev.info.bustype == 3:
+            logger.info("USB-HID als Scanner erkannt: %s (%s)", dev.name, path)
+            return True
+        return False
+    except Exception:
+        return False
+    finally:
         try:
-            dev = InputDevice(path)
-            caps = dev.capabilities(verbose=False)
-            if ecodes.EV_KEY not in caps:
-                continue
-            name_lower = dev.name.lower()
-            scanner_keywords = ["barcode", "scanner", "reader", "rfid", "hid",
-                                "symbol", "honeywell", "datalogic", "netum", "inateck"]
-            if any(kw in name_lower for kw in scanner_keywords):
-                logger.info("Scanner gefunden: %s (%s)", dev.name, path)
-                return path
-            # Mäuse ausschließen (haben EV_REL für Bewegung)
-            if ecodes.EV_REL in caps:
-                continue
-            # USB-HID-Tastaturgerät ohne Mausbewegung = wahrscheinlich Scanner
-            key_caps = caps.get(ecodes.EV_KEY, [])
-            if len(key_caps) >= 10 and dev.info.bustype == 3:
-                logger.info("USB-HID als Scanner erkannt: %s (%s)", dev.name, path)
-                return path
+            dev.close()
         except Exception:
-            continue
+            pass
+
+
+def find_scanner_device(candidates: Optional[list] = None) -> Optional[str]:
+    """Auto-detect USB HID scanner (QR + RFID combo device) – among candidates or all event nodes."""
+    if not HAS_EVDEV:
+        return None
+    for path in candidates if candidates is not None else list_input_devices():
+        if probe_device(path):
+            return path
     return None
 
 
+def create_scanner_input(on_scan: Callable[..., None], device_path: str = "auto",
+                         timestamps: bool = False, options: Optional[dict] = None):
+    """
+    Backend zu scanner_device: "serial" oder /dev/tty…, /dev/serial/by-id/… → serieller Leser,
+    "auto" → HID-Scanner; nur wenn keiner da ist, aber ein serieller Leser, dieser.
+    options: Konfigurationswerte (Config.lane_specs()) für Framing und Baudrate.
+    """
+    options = options or {}
+    if is_serial_path(device_path):
+        return SerialScannerInput(on_scan, device_path, timestamps, **serial_options(options))
+    if device_path == "auto":
+        serial = find_serial_scanner()
+        if serial and not find_scanner_device():
+            logger.info("Kein HID-Scanner, serieller Leser gefunden: %s", serial)
+            return SerialScannerInput(on_scan, "serial", timestamps, **serial_options(options))
+    return ScannerInput(on_scan, device_path, timestamps, framing=framing_options(options))
+
+
+class KeyDecoder:
+    """
+    Framing: evdev key events → complete codes. feed() returns the finished scans
+    as (code, t_first_key, t_enter) tuples.
+
+    A frame ends with Enter, after frame_length characters (fixed-length readers
+    without suffix) or after frame_gap seconds without a key (expire(), driven by
+    the caller's timer). Key intervals come from the evdev event timestamps, so
+    loop or thread scheduling does not distort them. Frames typed slower than a
+    scanner (median interval > max_key_interval) or shorter than min_length are
+    dropped: a keyboard on the HID bus never reaches the server.
+    """
+
+    def __init__(self, frame_gap: float = FRAME_GAP, max_key_interval: float = MAX_KEY_INTERVAL,
+                 min_length: int = MIN_LENGTH, frame_length: int = 0):
+        self.frame_gap = frame_gap
+        self.max_key_interval = max_key_interval
+        self.min_length = min_length
+        self.frame_length = frame_length
+        self.buffer: list[str] = []
+        self.key_times: list[float] = []
+        self.shift = False
+        self.t_first: Optional[float] = None
+        self.t_last: Optional[float] = None
+        self.frames = {"enter": 0, "length": 0, "gap": 0}
+        self.rejected = {"slow": 0, "short": 0}
+        self._intervals: deque = deque(maxlen=STATS_FRAMES)
+
+    def feed(self, event) -> list:
+        if event.type != ecodes.EV_KEY:
+            return []
+
+        scancode = event.code
+        value = event.value  # 0=up, 1=down, 2=repeat
+
+        if value == 0:  # key up
+            if scancode in KEYS_SHIFT:
+                self.shift = False
+            return []
+        if value != 1:
+            return []
+        if scancode in KEYS_SHIFT:
+            self.shift = True
+            return []
+        if scancode in KEYS_ENTER:
+            scan = self._close("enter", time.monotonic())
+            return [scan] if scan else []
+
+        char = (KEY_MAP_SHIFT if self.shift else KEY_MAP).get(scancode)
+        if char is None and self.shift:
+            char = KEY_MAP.get(scancode, "").upper() or None
+        if not char:
+            return []
+        now = time.monotonic()
+        t_key = _event_time(event, now)
+        scans = []
+        if self.key_times and t_key - self.key_times[-1] > self.frame_gap:
+            # Lücke ohne Enter, Timer noch nicht gelaufen (z. B. Thread-Modus)
+            scan = self._close("gap", self.t_last)
+            if scan:
+                scans.append(scan)
+        if not self.buffer:
+            self.t_first = now
+        self.buffer.append(char)
+        self.key_times.append(t_key)
+        self.t_last = now
+        if self.frame_length and len(self.buffer) >= self.frame_length:
+            scan = self._close("length", now)
+            if scan:
+                scans.append(scan)
+        return scans
+
+    def reset(self):
+        """Offenen Frame verwerfen (Gerät neu verbunden)."""
+        self.buffer = []
+        self.key_times = []
+        self.shift = False
+        self.t_first = None
+        self.t_last = None
+
+    def deadline(self) -> Optional[float]:
+        """time.monotonic() at which the open frame ends by gap, None without one."""
+        return self.t_last + self.frame_gap if self.buffer else None
+
+    def expire(self, now: Optional[float] = None) -> Optional[tuple]:
+        """Close the open frame once frame_gap has passed since its last key."""
+        deadline = self.deadline()
+        if deadline is None or (now if now is not None else time.monotonic()) < deadline:
+            return None
+        return self._close("gap", self.t_last)
+
+    def _close(self, reason: str, t_end: float) -> Optional[tuple]:
+        scanned = "".join(self.buffer).strip()
+        times = self.key_times
+        t_first = self.t_first
+        self.buffer = []
+        self.key_times = []
+        self.t_first = None
+        self.t_last = None
+        if not scanned:
+            return None
+        intervals = sorted(b - a for a, b in zip(times, times[1:]))
+        median = intervals[len(intervals) // 2] if intervals else 0.0
+        if len(scanned) < self.min_length:
+            self.rejected["short"] += 1
+            logger.debug("Eingabe verworfen: %d Zeichen (min. %d)", len(scanned), self.min_length)
+            return None
+        if median > self.max_key_interval:
+            self.rejected["slow"] += 1
+            logger.warning("Eingabe verworfen: %.0f ms je Taste – zu langsam für einen Scanner (Tastatur?)",
+                           median * 1000)
+            return None
+        self.frames[reason] += 1
+        self._intervals.append(median)
+        return scanned, t_first, t_end
+
+    def stats(self) -> dict:
+        """Für den Heartbeat: Abschlussart, verworfene Eingaben, Tastenabstand (Median je Scan, ms)."""
+        intervals = sorted(self._intervals)
+        stats = {"frames": dict(self.frames), "rejected": dict(self.rejected)}
+        if intervals:
+            stats["key_ms"] = {
+                "p50": round(intervals[len(intervals) // 2] * 1000, 2),
+                "max": round(intervals[-1] * 1000, 2),
+            }
+        return stats
+
+
+def _event_time(event, fallback: float) -> float:
+    """Kernel-Zeitstempel des Events (Sekunden, nur für Abstände), sonst Empfangszeit."""
+    try:
+        return event.sec + event.usec / 1e6
+    except AttributeError:
+        return fallback
+
+
 class ScannerInput:
     """
     Liest QR-Codes und RFID-Karten von einem USB-HID-Scanner.
-    Ruft on_scan(code) für jeden vollständigen Scan auf.
+    Ruft on_scan(code) für jeden vollständigen Scan auf – mit timestamps=True
+    als on_scan(code, t_first_key, t_enter) (time.monotonic, t_first_key ggf. None).
     """
 
-    def __init__(self, on_scan: Callable[[str], None], device_path: str = "auto"):
+    def __init__(self, on_scan: Callable[..., None], device_path: str = "auto",
+                 timestamps: bool = False, hotplug: bool = True, input_dir: str = INPUT_DIR,
+                 framing: Optional[dict] = None):
         self.on_scan = on_scan
         self.device_path = device_path
+        self.timestamps = timestamps
+        self.hotplug = hotplug
+        self.input_dir = input_dir
         self._running = False
         self._thread: Optional[threading.Thread] = None
+        self._loop = None
+        self._dev = None
+        self._decoder = KeyDecoder(**(framing or {}))
+        self._gap_timer = None
+        self._watcher: Optional[InputWatcher] = None
+        self._watching = False
+        self._retry = None
+        self.path: Optional[str] = None
+        self.fingerprint: Optional[tuple] = None
+        self.connected_at: Optional[float] = None
+        self.reconnects = 0
+        self.probes = 0
 
-    def start(self):
+    def start(self, loop=None):
+        """Without loop: reader thread. With an asyncio loop: add_reader (call from the loop thread)."""
         self._running = True
 
         if HAS_EVDEV and self.device_path != "stdin":
-            path = self.device_path if self.device_path != "auto" else find_scanner_device()
+            if self.hotplug:
+                dirs = [self.input_dir]
+                if self.device_path != "auto":
+                    dirs.append(os.path.dirname(self.device_path))
+                self._watcher = InputWatcher.create(dirs)
+            if loop is not None:
+                self._loop = loop
+                self._attach()
+                return
+            path = self._find(None)
             if path:
                 self._thread = threading.Thread(target=self._evdev_loop, args=(path,), daemon=True)
                 self._thread.start()
@@ -98,70 +328,226 @@ class ScannerInput:
 
     def stop(self):
         self._running = False
+        self._detach()
+        self._unwatch()
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+
+    def stats(self) -> dict:
+        """Für den Heartbeat: verbunden, Wiederverbindungen, geöffnete Knoten bei der Suche."""
+        return {
+            "backend": "evdev",
+            "connected": self._dev is not None,
+            "hotplug": bool(self._watcher and self._watcher.alive),
+            "reconnects": self.reconnects,
+            "probes": self.probes,
+            "framing": self._decoder.stats(),
+        }
+
+    def _emit(self, code: str, t_first: Optional[float], t_enter: float):
+        if self.timestamps:
+            self.on_scan(code, t_first, t_enter)
+        else:
+            self.on_scan(code)
+
+    def _find(self, candidates: Optional[list]) -> Optional[str]:
+        """
+        Scanner-Pfad unter candidates (neue Knoten laut inotify) oder – bei None –
+        unter allen Knoten. Bekannter Scanner: Vergleich per sysfs, ohne zu öffnen.
+        """
+        if self.device_path != "auto":
+            if candidates is None:
+                return self.device_path
+            target = os.path.realpath(self.device_path)
+            hit = any(c == self.device_path or os.path.realpath(c) == target for c in candidates)
+            return self.device_path if hit else None
+        nodes = list_input_devices(self.input_dir) if candidates is None else [
+            c for c in candidates if os.path.basename(c).startswith("event")]
+        if self.fingerprint:
+            for path in nodes:
+                if fingerprint_of(path) == self.fingerprint:
+                    logger.info("Bekannter Scanner wieder da: %s", path)
+                    return path
+        for path in nodes:
+            self.probes += 1
+            if probe_device(path):
+                return path
+        return None
+
+    def _open(self, path: str):
+        dev = InputDevice(path)
+        try:
+            dev.grab()
+        except OSError:
+            dev.close()
+            raise
+        if self.connected_at is not None:
+            self.reconnects += 1
+        self.path = path
+        self.fingerprint = fingerprint_of_device(dev)
+        self.connected_at = time.monotonic()
+        logger.info("Scanner verbunden: %s", dev.name)
+        return dev
+
+    # ─── Event-Loop-Modus ─────────────────────────────────────────────────────
+
+    def _attach(self, candidates: Optional[list] = None):
+        self._cancel_retry()
+        if not self._running or self._dev is not None:
+            return
+        path = self._find(candidates)
+        if not path:
+            if not self._watch():
+                logger.info("Kein USB-Scanner – erneute Prüfung in %d s (Scanner einstecken)", POLL_SEC)
+                self._retry = self._loop.call_later(POLL_SEC, self._attach)
+            return
+        try:
+            dev = self._open(path)
+        except OSError as e:
+            # z. B. udev setzt die Rechte noch oder ein anderer Prozess hat das Gerät gegriffen
+            logger.warning("Scanner %s nicht verfügbar (%s) – neuer Versuch in %d s", path, e, RETRY_SEC)
+            self._watch()
+            self._retry = self._loop.call_later(RETRY_SEC, self._attach, [path])
+            return
+        self._unwatch()
+        self._dev = dev
+        self._decoder.reset()
+        self._loop.add_reader(dev.fd, self._on_readable)
+
+    def _watch(self) -> bool:
+        """Auf Hotplug-Ereignisse warten. False ohne inotify (→ Polling)."""
+        if not self._watcher or not self._watcher.alive:
+            return False
+        if not self._watching:
+            self._loop.add_reader(self._watcher.fd, self._on_hotplug)
+            self._watching = True
+        return True
+
+    def _unwatch(self):
+        """Scanner verbunden: keine Suche mehr, aufgelaufene Ereignisse verwerfen."""
+        if self._watching:
+            self._loop.remove_reader(self._watcher.fd)
+            self._watching = False
+        if self._watcher:
+            self._watcher.read()
+
+    def _on_hotplug(self):
+        candidates = self._watcher.read()
+        if candidates == []:
+            return
+        if not self._watcher.alive:
+            self._unwatch()
+        self._attach(candidates)
+
+    def _cancel_retry(self):
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+
+    def _detach(self):
+        self._cancel_retry()
+        if self._gap_timer is not None:
+            self._gap_timer.cancel()
+            self._gap_timer = None
+        if self._dev is None:
+            return
+        try:
+            self._loop.remove_reader(self._dev.fd)
+        except Exception:
+            pass
+        try:
+            self._dev.close()
+        except Exception:
+            pass
+        self._dev = None
+
+    def _on_readable(self):
+        try:
+            for event in self._dev.read():
+                for scan in self._decoder.feed(event):
+                    self._emit(*scan)
+            self._schedule_gap()
+        except BlockingIOError:
+            pass
+        except OSError:
+            logger.warning("Scanner getrennt – warte auf Wiederverbindung...")
+            self._detach()
+            # Der Knoten verschwindet gerade: ein Versuch auf dem alten Pfad, danach nur
+            # noch Hotplug-Ereignisse (ohne inotify: Suche wie bisher)
+            if self._watch():
+                self._retry = self._loop.call_later(RETRY_SEC, self._attach, [self.path])
+            else:
+                self._retry = self._loop.call_later(RETRY_SEC, self._attach)
+        except Exception as e:
+            logger.error("Scanner-Fehler: %s", e)
+
+    def _schedule_gap(self):
+        """Timer für Codes ohne Enter: feuert frame_gap nach der letzten Taste."""
+        deadline = self._decoder.deadline()
+        if deadline is None or self._gap_timer is not None:
+            return
+        self._gap_timer = self._loop.call_at(deadline, self._on_gap)
+
+    def _on_gap(self):
+        self._gap_timer = None
+        scan = self._decoder.expire()
+        if scan:
+            self._emit(*scan)
+        self._schedule_gap()
+
+    # ─── Thread-Modus ─────────────────────────────────────────────────────────
+
+    def _wait_for_device(self, timeout: float) -> Optional[str]:
+        """Blockiert bis zu timeout s auf ein Hotplug-Ereignis (ohne inotify: schlafen) und sucht dann."""
+        if self._watcher and self._watcher.alive:
+            candidates = self._watcher.wait(timeout)
+            return self._find(candidates) if candidates != [] else None
+        for _ in range(int(timeout)):
+            if not self._running:
+                return None
+            time.sleep(1)
+        return self._find(None)
 
     def _wait_and_evdev_loop(self):
         """Wartet auf USB-Scanner (z. B. nachträglich einstecken) und startet dann _evdev_loop."""
-        wait_sec = 5
+        wait_sec = POLL_SEC
+        logger.info("Kein USB-Scanner – warte auf Einstecken")
         while self._running:
-            path = find_scanner_device()
+            path = self._wait_for_device(wait_sec)
             if path:
                 logger.info("USB-Scanner erkannt, starte Lesen.")
                 self._evdev_loop(path)
                 return
-            logger.info("Kein USB-Scanner – erneute Prüfung in %d s (Scanner einstecken)", wait_sec)
-            for _ in range(wait_sec):
-                if not self._running:
-                    return
-                time.sleep(1)
 
     def _evdev_loop(self, path: str):
         """Read from USB HID device with auto-reconnect on disconnect/replug."""
-        use_auto_path = self.device_path == "auto"
-
         while self._running:
             try:
-                dev = InputDevice(path)
-                dev.grab()
-                logger.info("Scanner verbunden: %s", dev.name)
-                buffer = []
-                shift = False
-
-                for event in dev.read_loop():
-                    if not self._running:
-                        break
-                    if event.type != ecodes.EV_KEY:
-                        continue
-
-                    scancode = event.code
-                    value = event.value  # 0=up, 1=down, 2=repeat
-
-                    if value == 1:  # key down
-                        if scancode in (42, 54):
-                            shift = True
-                            continue
-                        if scancode == 28:  # Enter → Scan komplett
-                            scanned = "".join(buffer).strip()
-                            buffer.clear()
-                            if scanned:
-                                self.on_scan(scanned)
-                            continue
-                        char_map = KEY_MAP_SHIFT if shift else KEY_MAP
-                        char = char_map.get(scancode)
-                        if char:
-                            buffer.append(char.upper() if shift else char)
-                        shift = False
-                    elif value == 0:  # key up
-                        if scancode in (42, 54):
-                            shift = False
+                dev = self._open(path)
+                if self._watcher:
+                    self._watcher.read()
+                decoder = self._decoder
+                decoder.reset()
+
+                while self._running:
+                    deadline = decoder.deadline()
+                    timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else 1.0
+                    if select.select([dev.fd], [], [], timeout)[0]:
+                        try:
+                            for event in dev.read():
+                                for scan in decoder.feed(event):
+                                    self._emit(*scan)
+                        except BlockingIOError:
+                            pass
+                    scan = decoder.expire()
+                    if scan:
+                        self._emit(*scan)
 
             except OSError:
                 logger.warning("Scanner getrennt – warte auf Wiederverbindung...")
-                time.sleep(2)
-                if use_auto_path:
-                    # Nach Abziehen erscheint das Gerät oft unter neuem /dev/input/eventX
-                    new_path = find_scanner_device()
-                    if new_path:
-                        path = new_path
+                # Nach Abziehen erscheint das Gerät oft unter neuem /dev/input/eventX
+                path = self._wait_for_device(RETRY_SEC) or path
             except Exception as e:
                 logger.error("Scanner-Fehler: %s", e)
                 time.sleep(1)
@@ -173,7 +559,7 @@ class ScannerInput:
             try:
                 code = input("> ").strip()
                 if code:
-                    self.on_scan(code)
+                    self._emit(code, None, time.monotonic())
             except EOFError:
                 break
             except Exception:
@@ -0,0 +1,268 @@
+"""
+Poll scheduler – one loop for all periodic server work instead of independent
+fixed-interval loops per job.
+
+Jobs: long-poll / task poll, heartbeat and journal upload per lane; ticket sync,
+connection keepalive and update check once per device.
+
+  Merge      a job that delivers the device config (heartbeat) covers the task
+             poll of its lane: a poll coming due while the heartbeat is due within
+             one poll interval pulls the heartbeat forward instead of sending its
+             own GET, and a successful heartbeat restarts the poll interval
+  Jitter     every interval ±JITTER; the first run of a job is spread over up to
+             start_spread seconds, so a fleet restarting together does not send
+             in lockstep
+  Backoff    a failed run (job returns False or raises) doubles the wait up to
+             max_backoff, randomised between half and full step (no synchronised
+             retries after an outage); the first success resets it
+  Adaptive   activity(fast=True) (dashboard task, e.g. "Einmal öffnen") → jobs with
+             a fast interval use it for fast_window seconds; no scan and no
+             dashboard activity for quiet_after seconds (night) → adaptive jobs run
+             quiet_factor times slower, up to their max_interval
+  Budget     token bucket per lane and endpoint (runs per minute, config
+             request_budget); a job without a token waits for the next one
+
+Job runs go through Runtime.run_blocking (IO pool); a job never overlaps itself.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Optional, Union
+
+from emp_scanner.runtime import Runtime
+
+logger = logging.getLogger("emp.runtime")
+
+JITTER = 0.1
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+START_SPREAD = 10.0
+FAST_WINDOW = 120.0
+QUIET_AFTER = 1800.0
+QUIET_FACTOR = 4.0
+DISABLED_RECHECK = 1.0
+
+# Läufe je Minute und Endpunkt (je Durchgang)
+REQUEST_BUDGET = {"events": 20, "config": 40, "heartbeat": 10, "upload": 12, "tickets": 6}
+
+
+class Job:
+    """One periodic task; see the module docstring for covers/fast/adaptive."""
+
+    def __init__(self, name: str, fn: Callable[[], Optional[bool]], interval: Union[float, Callable[[], float]],
+                 endpoint: Optional[str] = None, lane: str = "", covers: tuple = (),
+                 fast: Optional[float] = None, adaptive: bool = False, max_interval: Optional[float] = None,
+                 enabled: Optional[Callable[[], bool]] = None, initial_delay: float = 0.0,
+                 spread: bool = True, blocking: bool = True):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.endpoint = endpoint
+        self.lane = lane
+        self.covers = tuple(covers)
+        self.fast = fast
+        self.adaptive = adaptive
+        self.max_interval = max_interval
+        self.enabled = enabled or (lambda: True)
+        self.initial_delay = initial_delay
+        self.spread = spread
+        self.blocking = blocking
+        self.due = 0.0
+        self.last_run = 0.0
+        self.running = False
+        self.failures = 0
+        self.counts = {"runs": 0, "failed": 0, "throttled": 0, "merged": 0}
+
+    @property
+    def key(self) -> str:
+        return f"{self.name} {self.lane}" if self.lane else self.name
+
+
+class _Bucket:
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.stamp = now
+
+    def take(self, now: float) -> float:
+        """0 if a token was taken, else seconds until the next one."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Scheduler:
+    def __init__(self, budget: Optional[dict] = None, max_backoff: float = MAX_BACKOFF,
+                 quiet_after: float = QUIET_AFTER, quiet_factor: float = QUIET_FACTOR,
+                 fast_window: float = FAST_WINDOW, start_spread: float = START_SPREAD,
+                 min_backoff: float = MIN_BACKOFF, rng: Optional[random.Random] = None):
+        self.budget = dict(REQUEST_BUDGET, **(budget or {}))
+        self.max_backoff = float(max_backoff)
+        self.quiet_after = float(quiet_after)
+        self.quiet_factor = max(1.0, float(quiet_factor))
+        self.fast_window = float(fast_window)
+        self.start_spread = float(start_spread)
+        self.min_backoff = float(min_backoff)
+        self.rng = rng or random.Random()
+        self.jobs: list[Job] = []
+        self._buckets: dict[tuple, _Bucket] = {}
+        self._last_activity = time.monotonic()
+        self._fast_until = 0.0
+        self._fast_pending = False
+        self._rt: Optional[Runtime] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def add(self, job: Job) -> Job:
+        now = time.monotonic()
+        spread = self.rng.uniform(0, min(self._interval(job, now), self.start_spread)) if job.spread else 0.0
+        job.due = now + job.initial_delay + spread
+        self.jobs.append(job)
+        self._notify()
+        return job
+
+    def start(self, rt: Runtime):
+        self._rt = rt
+        self._wake = asyncio.Event()
+        rt.spawn("Scheduler", self._loop())
+
+    def activity(self, fast: bool = False):
+        """Scan (fast=False) or dashboard interaction (fast=True); thread-safe."""
+        now = time.monotonic()
+        self._last_activity = now
+        if fast:
+            if now >= self._fast_until:
+                logger.info("Dashboard-Aktivität – schnelle Abfrage für %.0f s", self.fast_window)
+            self._fast_until = now + self.fast_window
+            self._fast_pending = True
+            self._notify()
+
+    def mode(self, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        if now < self._fast_until:
+            return "fast"
+        if now - self._last_activity >= self.quiet_after:
+            return "quiet"
+        return "normal"
+
+    def stats(self) -> dict:
+        jobs = {}
+        for job in self.jobs:
+            entry = {k: v for k, v in job.counts.items() if v}
+            if job.failures:
+                entry["backoff"] = job.failures
+            jobs[job.key] = entry
+        return {"mode": self.mode(), "jobs": jobs}
+
+    # ─── Loop ─────────────────────────────────────────────────────────────────
+
+    def _notify(self):
+        if self._rt is not None and self._wake is not None:
+            self._rt.loop.call_soon_threadsafe(self._wake.set)
+
+    async def _loop(self):
+        while self._rt.running:
+            self._wake.clear()
+            delay = self._tick(time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _tick(self, now: float) -> float:
+        """Launch due jobs; returns seconds until the next one is due."""
+        if self._fast_pending:
+            self._fast_pending = False
+            for job in self.jobs:
+                if job.fast is not None and not job.running:
+                    job.due = min(job.due, job.last_run + job.fast)
+        for job in self.jobs:
+            if job.running or job.due > now:
+                continue
+            if not job.enabled():
+                job.failures = 0
+                job.due = now + DISABLED_RECHECK
+                continue
+            cover = self._cover(job)
+            if cover is not None:
+                if cover.running:
+                    # Antwort des laufenden Heartbeats abwarten – sie bringt die Config mit
+                    job.due = now + self._interval(job, now)
+                    job.counts["merged"] += 1
+                    continue
+                if cover.due - now <= self._interval(job, now):
+                    job.counts["merged"] += 1
+                    job.due = now + self._interval(job, now)
+                    self._launch(cover, now)
+                    continue
+            self._launch(job, now)
+        pending = [job.due for job in self.jobs if not job.running]
+        return max(0.01, min(pending) - now) if pending else 60.0
+
+    def _cover(self, job: Job) -> Optional[Job]:
+        for other in self.jobs:
+            if other.lane == job.lane and job.name in other.covers and other.enabled():
+                return other
+        return None
+
+    def _interval(self, job: Job, now: float) -> float:
+        base = float(job.interval() if callable(job.interval) else job.interval)
+        if job.fast is not None and now < self._fast_until:
+            return min(base, job.fast)
+        if job.adaptive and now - self._last_activity >= self.quiet_after:
+            slow = base * self.quiet_factor
+            return max(base, min(slow, job.max_interval)) if job.max_interval else slow
+        return base
+
+    def _launch(self, job: Job, now: float):
+        if job.endpoint in self.budget:
+            key = (job.lane, job.endpoint)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.budget[job.endpoint], now)
+            wait = bucket.take(now)
+            if wait:
+                job.counts["throttled"] += 1
+                job.due = now + wait
+                return
+        job.running = True
+        job.last_run = now
+        self._rt.spawn(f"Job {job.key}", self._execute(job))
+
+    async def _execute(self, job: Job):
+        ok = False
+        try:
+            ok = await self._rt.run_blocking(job.fn) if job.blocking else job.fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("%s-Fehler: %s", job.key, e)
+            ok = False
+        finally:
+            job.running = False
+        self._finished(job, ok is not False, time.monotonic())
+        self._wake.set()
+
+    def _finished(self, job: Job, ok: bool, now: float):
+        job.counts["runs"] += 1
+        interval = self._interval(job, now)
+        if ok:
+            job.failures = 0
+            job.due = now + interval * self.rng.uniform(1 - JITTER, 1 + JITTER)
+            for other in self.jobs:
+                if other.lane == job.lane and other.name in job.covers and not other.running:
+                    other.due = max(other.due, now + self._interval(other, now))
+            return
+        job.counts["failed"] += 1
+        job.failures += 1
+        step = min(self.max_backoff, max(interval, self.min_backoff) * 2 ** min(job.failures, 16))
+        job.due = now + self.rng.uniform(step / 2, step)
+        if job.failures == 1 or job.failures % 10 == 0:
+            logger.info("%s fehlgeschlagen (%d×) – nächster Versuch in %.0f s", job.key, job.failures,
+                        job.due - now)
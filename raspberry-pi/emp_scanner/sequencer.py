@@ -0,0 +1,161 @@
+"""
+Actuator sequencer – one thread and one monotonic timer heap for relay, LEDs and buzzer.
+
+Every relay/LED timeout and every buzzer step is a command in the same heap,
+ordered by (deadline, -priority, sequence). The sequencer thread sleeps on a
+condition until the earliest deadline or a new command. All relay controllers
+(one per lane) share one sequencer, so the thread count stays fixed however
+many decisions, tones and lanes there are, and timeouts do not depend on how
+busy the event loop is.
+
+Commands belong to a slot (e.g. "relay", "leds", "tone" of one controller).
+Setting a slot again bumps its generation; commands of an older generation are
+dropped when they come due. A new decision therefore cuts off the running tone
+and replaces pending timeouts without searching the heap.
+
+Callbacks run under the sequencer lock. RelayController switches its outputs for
+a decision under the same lock in the caller thread (no thread hop on the scan
+latency path); only what happens later goes through the heap.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from emp_scanner.metrics import Histogram
+
+logger = logging.getLogger("emp.relay")
+
+PRIO_INFO = 0        # Startton, Scan-Piep
+PRIO_DECISION = 1    # Freigabe / Ablehnung
+PRIO_EMERGENCY = 2   # NOT-AUF, Reset
+
+# Verzug eines Befehls gegenüber seiner Deadline (Sekunden)
+LAG_BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+LATE_SEC = 0.005
+
+
+class Sequencer:
+    def __init__(self, name: str = "actuator"):
+        self.name = name
+        self.lock = threading.RLock()
+        self._cond = threading.Condition(self.lock)
+        self._heap: list = []
+        self._order = itertools.count()
+        self._generations: dict = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._closed = False
+        self.executed = 0
+        self.dropped = 0
+        self.max_lag = 0.0
+        self.late = 0
+        self.lag = Histogram(LAG_BUCKETS)
+
+    def start(self):
+        with self.lock:
+            if self._running or self._closed:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        with self.lock:
+            self._running = False
+            self._closed = True
+            self._heap.clear()
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ─── Slots ────────────────────────────────────────────────────────────────
+
+    def claim(self, slot) -> int:
+        """New generation for slot: all of its pending commands become stale."""
+        with self.lock:
+            gen = self._generations.get(slot, 0) + 1
+            self._generations[slot] = gen
+            return gen
+
+    def current(self, slot, gen: int) -> bool:
+        with self.lock:
+            return self._generations.get(slot, 0) == gen
+
+    def at(self, deadline: float, slot, gen: int, fn: Callable, *args, priority: int = PRIO_INFO):
+        """Run fn(*args) at time.monotonic() deadline, unless slot was claimed again meanwhile."""
+        with self.lock:
+            if self._closed:
+                return
+            entry = (deadline, -priority, next(self._order), slot, gen, fn, args)
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+        if not self._running:
+            self.start()
+
+    def after(self, delay: float, slot, gen: int, fn: Callable, *args, priority: int = PRIO_INFO):
+        self.at(time.monotonic() + delay, slot, gen, fn, *args, priority=priority)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "pending": len(self._heap),
+                "executed": self.executed,
+                "dropped": self.dropped,
+                "max_lag_ms": round(self.max_lag * 1000, 2),
+                "lag_p50_ms": _ms(self.lag.percentile(0.5), self.max_lag),
+                "lag_p99_ms": _ms(self.lag.percentile(0.99), self.max_lag),
+                "late": self.late,
+            }
+
+    # ─── Thread ───────────────────────────────────────────────────────────────
+
+    def _run(self):
+        with self.lock:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                deadline = self._heap[0][0]
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                _, _, _, slot, gen, fn, args = heapq.heappop(self._heap)
+                if self._generations.get(slot, 0) != gen:
+                    self.dropped += 1
+                    continue
+                lag = now - deadline
+                self.max_lag = max(self.max_lag, lag)
+                self.lag.observe(lag)
+                if lag > LATE_SEC:
+                    self.late += 1
+                self.executed += 1
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logger.debug("Aktor-Befehl fehlgeschlagen: %s", e)
+
+
+def _ms(value: Optional[float], limit: float) -> Optional[float]:
+    # Histogramm liefert die Bucket-Grenze – nie mehr als der gemessene Höchstwert
+    return round(min(value, limit) * 1000, 3) if value is not None else None
+
+
+_shared: Optional[Sequencer] = None
+_shared_lock = threading.Lock()
+
+
+def shared_sequencer() -> Sequencer:
+    """Process-wide sequencer for controllers created without one."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Sequencer()
+        return _shared
@@ -0,0 +1,344 @@
+"""
+Serial scanner input – readers in serial mode (USB CDC-ACM /dev/ttyACM*, USB-serial /dev/ttyUSB*).
+
+The reader sends the code as bytes followed by a terminator (usually CR/LF). No
+key translation is needed and the keyboard layout does not matter. The tty is
+read with os.readv into one preallocated bytearray. Terminators are found with a
+precompiled regex over that buffer, and only a finished code is copied out (as
+str for on_scan). Leftover bytes are moved to the front in place. Readers without
+a terminator are closed after frame_gap seconds of silence.
+
+Same interface as ScannerInput (start(loop), stop(), stats(), on_scan callback);
+emp_scanner.scanner.create_scanner_input picks the backend from scanner_device.
+"""
+from __future__ import annotations
+
+import asyncio
+import glob
+import logging
+import os
+import re
+import termios
+import threading
+import time
+import tty
+from typing import Callable, Optional
+
+from emp_scanner.hotplug import InputWatcher
+
+logger = logging.getLogger("emp.scanner")
+
+DEV_DIR = "/dev"
+BY_ID_DIR = "/dev/serial/by-id"
+SERIAL_PATTERNS = ("ttyACM*", "ttyUSB*")
+BUFFER_SIZE = 4096
+BAUDRATE = 9600
+TERMINATORS = "\r\n"
+RETRY_SEC = 2
+
+# Konfigurationswerte → SerialScannerInput-Argumente (config / lanes)
+SERIAL_KEYS = {
+    "scanner_baudrate": "baudrate",
+    "scanner_terminators": "terminators",
+    "scan_frame_gap": "frame_gap",
+    "scan_min_length": "min_length",
+}
+
+
+def is_serial_path(path: str) -> bool:
+    return path == "serial" or path.startswith(("/dev/tty", BY_ID_DIR))
+
+
+def find_serial_scanner(dev_dir: str = DEV_DIR) -> Optional[str]:
+    """First serial reader: stable /dev/serial/by-id link if present, else ttyACM*/ttyUSB*."""
+    links = sorted(glob.glob(os.path.join(BY_ID_DIR, "*"))) if dev_dir == DEV_DIR else []
+    if links:
+        return links[0]
+    for pattern in SERIAL_PATTERNS:
+        nodes = sorted(glob.glob(os.path.join(dev_dir, pattern)))
+        if nodes:
+            return nodes[0]
+    return None
+
+
+def serial_options(values: dict) -> dict:
+    """SerialScannerInput-Argumente aus Konfigurationswerten (z. B. Config.lane_specs())."""
+    return {arg: values[key] for key, arg in SERIAL_KEYS.items() if values.get(key) is not None}
+
+
+class SerialScannerInput:
+    """
+    Liest Codes von einem seriellen Scanner. device_path "serial" = automatisch
+    (erster ttyACM/ttyUSB, Hotplug über inotify auf /dev), sonst fester Pfad.
+    """
+
+    def __init__(self, on_scan: Callable[..., None], device_path: str = "serial",
+                 timestamps: bool = False, baudrate: int = BAUDRATE, terminators: str = TERMINATORS,
+                 frame_gap: float = 0.1, min_length: int = 1, hotplug: bool = True,
+                 dev_dir: str = DEV_DIR):
+        self.on_scan = on_scan
+        self.device_path = device_path
+        self.timestamps = timestamps
+        self.baudrate = int(baudrate)
+        self.frame_gap = frame_gap
+        self.min_length = min_length
+        self.hotplug = hotplug
+        self.dev_dir = dev_dir
+        self._terminator = re.compile(b"[" + re.escape(terminators.encode("latin-1")) + b"]")
+        self._buf = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buf)
+        self._filled = 0
+        self._fd: Optional[int] = None
+        self._loop = None
+        self._own_loop = False
+        self._running = False
+        self._watcher: Optional[InputWatcher] = None
+        self._watching = False
+        self._retry = None
+        self._gap_timer = None
+        self._t_first: Optional[float] = None
+        self._t_last: Optional[float] = None
+        self.path: Optional[str] = None
+        self.connected_at: Optional[float] = None
+        self.reconnects = 0
+        self.frames = {"terminator": 0, "gap": 0}
+        self.rejected = {"short": 0, "overflow": 0, "garbage": 0}
+        self.bytes_read = 0
+
+    def start(self, loop=None):
+        """With an asyncio loop: add_reader (call from the loop thread). Without: own loop thread."""
+        self._running = True
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._own_loop = True
+            threading.Thread(target=loop.run_forever, name="serial-scanner", daemon=True).start()
+            self._loop = loop
+            loop.call_soon_threadsafe(self._start_watch_and_attach)
+            return
+        self._loop = loop
+        self._start_watch_and_attach()
+
+    def _start_watch_and_attach(self):
+        if self.hotplug:
+            dirs = [self.dev_dir]
+            if self.device_path != "serial":
+                dirs.append(os.path.dirname(self.device_path))
+            elif os.path.isdir(BY_ID_DIR):
+                dirs.append(BY_ID_DIR)
+            self._watcher = InputWatcher.create(dirs)
+        self._attach()
+
+    def stop(self):
+        self._running = False
+        if self._loop is None:
+            return
+        if self._own_loop:
+            self._loop.call_soon_threadsafe(self._shutdown)
+        else:
+            self._shutdown()
+
+    def _shutdown(self):
+        self._close()
+        self._unwatch()
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+        if self._own_loop:
+            self._loop.stop()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "serial",
+            "connected": self._fd is not None,
+            "hotplug": bool(self._watcher and self._watcher.alive),
+            "reconnects": self.reconnects,
+            "bytes": self.bytes_read,
+            "framing": {"frames": dict(self.frames), "rejected": dict(self.rejected)},
+        }
+
+    # ─── Verbindung ───────────────────────────────────────────────────────────
+
+    def _find(self, candidates: Optional[list]) -> Optional[str]:
+        if self.device_path != "serial":
+            if candidates is None:
+                return self.device_path
+            target = os.path.realpath(self.device_path)
+            hit = any(c == self.device_path or os.path.realpath(c) == target for c in candidates)
+            return self.device_path if hit else None
+        if candidates is None:
+            return find_serial_scanner(self.dev_dir)
+        for path in candidates:
+            name = os.path.basename(path)
+            if path.startswith(BY_ID_DIR) or name.startswith(("ttyACM", "ttyUSB")):
+                return path
+        return None
+
+    def _open(self, path: str) -> int:
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            speed = getattr(termios, f"B{self.baudrate}", None)
+            if speed is not None:
+                attrs[4] = attrs[5] = speed
+            attrs[2] |= termios.CLOCAL | termios.CREAD
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+            termios.tcflush(fd, termios.TCIFLUSH)
+        except termios.error as e:
+            os.close(fd)
+            raise OSError(f"{path}: kein Terminal ({e})")
+        return fd
+
+    def _attach(self, candidates: Optional[list] = None):
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+        if not self._running or self._fd is not None:
+            return
+        path = self._find(candidates)
+        if path:
+            try:
+                fd = self._open(path)
+            except OSError as e:
+                logger.warning("Serieller Scanner %s nicht verfügbar (%s) – neuer Versuch in %d s",
+                               path, e, RETRY_SEC)
+                self._watch()
+                self._retry = self._loop.call_later(RETRY_SEC, self._attach, [path])
+                return
+            self._unwatch()
+            if self.connected_at is not None:
+                self.reconnects += 1
+            self._fd = fd
+            self._filled = 0
+            self._t_first = None
+            self.path = path
+            self.connected_at = time.monotonic()
+            self._loop.add_reader(fd, self._on_readable)
+            logger.info("Serieller Scanner verbunden: %s (%d Baud)", path, self.baudrate)
+            return
+        if not self._watch():
+            self._retry = self._loop.call_later(5, self._attach)
+        elif candidates is None:
+            logger.info("Kein serieller Scanner – warte auf Einstecken")
+
+    def _watch(self) -> bool:
+        if not self._watcher or not self._watcher.alive:
+            return False
+        if not self._watching:
+            self._loop.add_reader(self._watcher.fd, self._on_hotplug)
+            self._watching = True
+        return True
+
+    def _unwatch(self):
+        if self._watching:
+            self._loop.remove_reader(self._watcher.fd)
+            self._watching = False
+        if self._watcher:
+            self._watcher.read()
+
+    def _on_hotplug(self):
+        candidates = self._watcher.read()
+        if candidates == []:
+            return
+        if not self._watcher.alive:
+            self._unwatch()
+        self._attach(candidates)
+
+    def _close(self):
+        for handle in (self._retry, self._gap_timer):
+            if handle is not None:
+                handle.cancel()
+        self._retry = self._gap_timer = None
+        if self._fd is None:
+            return
+        try:
+            self._loop.remove_reader(self._fd)
+        except Exception:
+            pass
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+
+    # ─── Lesen / Framing ──────────────────────────────────────────────────────
+
+    def _on_readable(self):
+        try:
+            n = os.readv(self._fd, [self._view[self._filled:]])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            n = 0
+            logger.debug("Serieller Scanner: %s", e)
+        if n == 0:
+            # EOF/EIO: Gerät abgezogen
+            logger.warning("Serieller Scanner getrennt – warte auf Wiederverbindung...")
+            self._close()
+            if self._watch():
+                self._retry = self._loop.call_later(RETRY_SEC, self._attach, [self.path])
+            else:
+                self._retry = self._loop.call_later(RETRY_SEC, self._attach)
+            return
+        now = time.monotonic()
+        if self._filled == 0 or self._t_first is None:
+            self._t_first = now
+        self._t_last = now
+        self._filled += n
+        self.bytes_read += n
+        self._split(now)
+        if self._filled == len(self._buf):
+            # Kein Terminator in 4 KB – kein Scanner-Code, verwerfen
+            self.rejected["overflow"] += 1
+            logger.warning("Serieller Scanner: %d Bytes ohne Terminator verworfen", self._filled)
+            self._filled = 0
+            self._t_first = None
+        if self._filled and self._gap_timer is None:
+            self._gap_timer = self._loop.call_at(now + self.frame_gap, self._on_gap)
+
+    def _split(self, now: float):
+        """Alle vollständigen Codes im Puffer melden, Rest an den Anfang schieben."""
+        start = 0
+        match = self._terminator.search(self._buf, 0, self._filled)
+        while match is not None:
+            end = match.start()
+            if end > start:
+                self._frame(start, end, "terminator", now)
+            start = end + 1
+            match = self._terminator.search(self._buf, start, self._filled)
+        if start:
+            rest = self._filled - start
+            if rest:
+                self._buf[:rest] = bytes(self._view[start:self._filled])
+            self._filled = rest
+            self._t_first = now if rest else None
+
+    def _frame(self, start: int, end: int, reason: str, t_end: float):
+        code = str(self._view[start:end], "utf-8", "replace").strip()
+        t_first = self._t_first
+        self._t_first = None
+        if len(code) < max(1, self.min_length):
+            self.rejected["short"] += 1
+            return
+        if not code.isprintable():
+            # Steuerzeichen/Störungen auf der Leitung (z. B. falsche Baudrate)
+            self.rejected["garbage"] += 1
+            logger.warning("Serieller Scanner: nicht druckbare Zeichen verworfen (Baudrate %d?)", self.baudrate)
+            return
+        self.frames[reason] += 1
+        if self.timestamps:
+            self.on_scan(code, t_first, t_end)
+        else:
+            self.on_scan(code)
+
+    def _on_gap(self):
+        self._gap_timer = None
+        if not self._filled or self._t_last is None:
+            return
+        deadline = self._t_last + self.frame_gap
+        if time.monotonic() < deadline:
+            self._gap_timer = self._loop.call_at(deadline, self._on_gap)
+            return
+        # Leser ohne Terminator: Ruhe beendet den Code
+        self._frame(0, self._filled, "gap", self._t_last)
+        self._filled = 0
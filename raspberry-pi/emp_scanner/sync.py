@@ -0,0 +1,190 @@
+"""
+Ticket sync – keeps the local TicketStore in step with the server.
+
+  delta     GET /api/devices/pi/tickets?since=<updatedAt>&sinceId=<id>&grantedAfter=<scan id>&devices=<ids>
+            only rows changed since the persisted cursor; every page is applied in one
+            transaction together with the new cursor. Tickets no longer valid here
+            (INVALID, other area) arrive as tombstones in `deleted`.
+  snapshot  GET /api/devices/pi/tickets?after=<id> – full, paginated, resumable: pages land
+            in a staging table and progress survives restarts and network errors.
+
+A full snapshot runs when there is no cursor (first start, area or lanes changed), when
+the server's ticket count differs from the local one (hard-deleted tickets leave no
+tombstone) and every full_interval seconds as a safety net.
+
+Both modes carry the GRANTED scans (device, ticket) of this Pi's device and of the
+further lanes in `devices` – the offline re-entry check is per device, like the server's.
+The server sends them in pages (`grantedHasMore`); the rest follows with the delta.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Iterable, Optional
+
+from emp_scanner.ticket_store import TicketStore
+
+logger = logging.getLogger("emp.sync")
+
+PAGE_SIZE = 2000
+FULL_SYNC_INTERVAL = 24 * 3600
+
+
+class TicketSync:
+    def __init__(self, api, store: TicketStore, page_size: int = PAGE_SIZE,
+                 full_interval: float = FULL_SYNC_INTERVAL, devices: Iterable[int] = ()):
+        self.api = api
+        self.store = store
+        # weitere Durchgänge dieses Pi (eigene Geräte-IDs)
+        self.devices = sorted(set(devices) - {api.device_id})
+        store.set_grant_devices([api.device_id, *self.devices])
+        self.page_size = page_size
+        self.full_interval = full_interval
+        self.mode = "delta" if store.cursor else "snapshot"
+        self.grants_pending = False
+        self.deltas = 0
+        self.snapshots = 0
+        self.resumed = 0
+        self.failures = 0
+        self.rows_changed = 0
+        self.last_changed = 0
+        self.last_duration = 0.0
+
+    def run_once(self) -> bool:
+        """Ein Sync-Durchlauf (Delta, bei Bedarf voller Snapshot). Returns True on success."""
+        start = time.monotonic()
+        try:
+            if self._snapshot_due():
+                ok = self.snapshot()
+                if ok and self.grants_pending:
+                    # Freigaben über die erste Seite hinaus – seitenweise per Delta ab grantedCursor
+                    ok = self.delta() is not False
+            else:
+                ok = self.delta()
+                if ok is None:
+                    ok = self.snapshot()
+        except Exception as e:
+            logger.warning("Ticket-Sync fehlgeschlagen: %s", e)
+            ok = False
+        self.last_duration = time.monotonic() - start
+        if not ok:
+            self.failures += 1
+        self.store.ensure_index()
+        return ok
+
+    def _snapshot_due(self) -> bool:
+        if self.store.cursor is None or self.store.snapshot_progress() is not None:
+            return True
+        snapshot_at = self.store.snapshot_at
+        return bool(self.full_interval) and (snapshot_at is None or time.time() - snapshot_at > self.full_interval)
+
+    # ─── Delta ────────────────────────────────────────────────────────────────
+
+    def delta(self) -> Optional[bool]:
+        """
+        Pull changes since the cursor page by page. Returns True on success,
+        False on a failed request (applied pages stay, next round continues),
+        None if the local count no longer matches the server → full snapshot.
+        """
+        changed = 0
+        while True:
+            cursor = self.store.cursor
+            page = self.api.get_tickets(limit=self.page_size, since=cursor, devices=self.devices)
+            if page is None:
+                return False
+            next_cursor = dict(page.get("cursor") or cursor, granted=page.get("grantedCursor", cursor.get("granted", 0)))
+            changed += self.store.apply_changes(
+                page.get("tickets", []), page.get("deleted", []),
+                self._grants(page), next_cursor,
+            )
+            if not page.get("hasMore") and not page.get("grantedHasMore"):
+                break
+
+        self.grants_pending = False
+        self.mode = "delta"
+        self.deltas += 1
+        self.last_changed = changed
+        self.rows_changed += changed
+        if changed:
+            logger.info("Ticket-Delta: %d Änderungen übernommen", changed)
+
+        total = page.get("total")
+        if total is not None:
+            local = self.store.count()
+            if local != total:
+                logger.info("Ticketanzahl weicht ab (lokal %d, Server %d) – voller Snapshot", local, total)
+                self.store.reset_cursor()
+                return None
+        return True
+
+    # ─── Snapshot ─────────────────────────────────────────────────────────────
+
+    def snapshot(self) -> bool:
+        """
+        Full snapshot into the staging table, resuming an interrupted one.
+        Returns True on success; on any failed page the store stays unchanged.
+        """
+        self.mode = "snapshot"
+        progress = self.store.snapshot_progress()
+        if progress is not None:
+            self.resumed += 1
+            logger.info("Ticket-Snapshot wird fortgesetzt ab Ticket #%d (%d geladen)",
+                        progress["after"], progress["count"])
+        else:
+            first = self.api.get_tickets(after=0, limit=self.page_size, devices=self.devices)
+            if first is None:
+                return False
+            if "device" in first:
+                first["device"].setdefault("pis_id", self.api.device_id)
+            self.grants_pending = bool(first.get("grantedHasMore"))
+            progress = self.store.begin_snapshot(first, self._grants(first))
+            self.store.add_snapshot_page(progress, first.get("tickets", []))
+            if len(first.get("tickets", [])) < self.page_size:
+                return self._finish(progress)
+
+        while True:
+            page = self.api.get_tickets(after=progress["after"], limit=self.page_size)
+            if page is None:
+                logger.warning("Ticket-Snapshot unterbrochen nach Ticket #%d – lokaler Bestand unverändert",
+                               progress["after"])
+                return False
+            tickets = page.get("tickets", [])
+            self.store.add_snapshot_page(progress, tickets)
+            if len(tickets) < self.page_size:
+                return self._finish(progress)
+
+    def _grants(self, page: dict) -> list[tuple[int, int]]:
+        """(Gerät, Ticket) der neuen GRANTED-Scans einer Seite."""
+        grants = page.get("grantedScans")
+        if grants is None:
+            # Server ohne Freigaben je Gerät: nur die dieses Geräts
+            return [(self.api.device_id, i) for i in page.get("grantedTicketIds", [])]
+        return [(g["deviceId"], g["ticketId"]) for g in grants]
+
+    def _finish(self, progress: dict) -> bool:
+        count = self.store.finish_snapshot(progress)
+        self.snapshots += 1
+        self.last_changed = count
+        self.rows_changed += count
+        logger.info("Ticket-Snapshot: %d Tickets lokal gespeichert", count)
+        return True
+
+    def stats(self) -> dict:
+        """Für den Heartbeat: Modus, Alter des lokalen Bestands (lag) und Zeilenzahlen."""
+        synced_at = self.store.synced_at
+        progress = self.store.snapshot_progress()
+        stats = {
+            "mode": self.mode,
+            "lag": round(time.time() - synced_at) if synced_at else None,
+            "rows": self.store.count(),
+            "changed": self.last_changed,
+            "changed_total": self.rows_changed,
+            "deltas": self.deltas,
+            "snapshots": self.snapshots,
+            "resumed": self.resumed,
+            "failures": self.failures,
+            "ms": round(self.last_duration * 1000),
+        }
+        if progress is not None:
+            stats["pending"] = {"count": progress["count"], "total": progress["total"]}
+        return stats
@@ -1,17 +1,34 @@
 """
 Collect Raspberry Pi system information for heartbeat reports.
 All values are read from /proc and /sys – no external dependencies needed.
+
+SystemSampler samples in the background (runtime job) so a heartbeat only copies
+the last snapshot:
+  fast (every 5 s)   /proc/stat, /proc/meminfo, /proc/uptime, thermal zone, cpufreq,
+                     /proc/net/wireless – file descriptors stay open, read with pread
+  slow (every 60 s)  vcgencmd (GPU temperature, throttling), IP address, disk usage
+  static (once)      model, OS, kernel, Python
+CPU usage comes from the delta between two samples (no sleep), and rolling
+min/max/avg over the last 5 minutes are kept in array-backed ring buffers.
 """
 from __future__ import annotations
 
 import os
+import threading
 import time
 import socket
 import platform
 import logging
+from array import array
 
 logger = logging.getLogger("emp.sysinfo")
 
+SAMPLE_INTERVAL = 5
+SLOW_INTERVAL = 60
+WINDOW_SAMPLES = 60  # 5 min bei 5 s
+
+THROTTLE_SYSFS = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+
 
 def get_cpu_temp() -> float | None:
     """CPU temperature in °C from thermal zone."""
@@ -42,46 +59,57 @@ def get_cpu_usage() -> float | None:
     try:
         def read_stat():
             with open("/proc/stat") as f:
-                parts = f.readline().split()
-            return [int(x) for x in parts[1:]]
+                return _cpu_times(f.readline())
 
         s1 = read_stat()
         time.sleep(0.5)
         s2 = read_stat()
-
-        delta = [s2[i] - s1[i] for i in range(len(s1))]
-        total = sum(delta)
-        idle = delta[3] + (delta[4] if len(delta) > 4 else 0)
-        if total == 0:
-            return 0.0
-        return round((1 - idle / total) * 100, 1)
+        return _cpu_percent(s1, s2)
     except Exception:
         return None
 
 
+def _cpu_times(line: str) -> list[int]:
+    """First line of /proc/stat → jiffies per state."""
+    return [int(x) for x in line.split()[1:]]
+
+
+def _cpu_percent(s1: list[int], s2: list[int]) -> float:
+    delta = [s2[i] - s1[i] for i in range(len(s1))]
+    total = sum(delta)
+    idle = delta[3] + (delta[4] if len(delta) > 4 else 0)
+    if total == 0:
+        return 0.0
+    return round((1 - idle / total) * 100, 1)
+
+
 def get_memory() -> dict | None:
     """Memory info from /proc/meminfo. Returns MB values."""
     try:
-        info = {}
         with open("/proc/meminfo") as f:
-            for line in f:
-                parts = line.split()
-                key = parts[0].rstrip(":")
-                info[key] = int(parts[1])  # kB
-
-        total = info.get("MemTotal", 0)
-        available = info.get("MemAvailable", info.get("MemFree", 0))
-        used = total - available
-        return {
-            "total_mb": round(total / 1024),
-            "used_mb": round(used / 1024),
-            "available_mb": round(available / 1024),
-            "percent": round(used / total * 100, 1) if total > 0 else 0,
-        }
+            return _memory_from(f.read())
     except Exception:
         return None
 
 
+def _memory_from(text: str) -> dict:
+    info = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            info[parts[0].rstrip(":")] = int(parts[1])  # kB
+
+    total = info.get("MemTotal", 0)
+    available = info.get("MemAvailable", info.get("MemFree", 0))
+    used = total - available
+    return {
+        "total_mb": round(total / 1024),
+        "used_mb": round(used / 1024),
+        "available_mb": round(available / 1024),
+        "percent": round(used / total * 100, 1) if total > 0 else 0,
+    }
+
+
 def get_disk() -> dict | None:
     """Root filesystem disk usage."""
     try:
@@ -103,18 +131,29 @@ def get_uptime() -> dict | None:
     """System uptime from /proc/uptime."""
     try:
         with open("/proc/uptime") as f:
-            seconds = float(f.read().split()[0])
-        days = int(seconds // 86400)
-        hours = int((seconds % 86400) // 3600)
-        minutes = int((seconds % 3600) // 60)
-        return {
-            "seconds": int(seconds),
-            "formatted": f"{days}d {hours}h {minutes}m" if days > 0 else f"{hours}h {minutes}m",
-        }
+            return _uptime_from(f.read())
     except Exception:
         return None
 
 
+def _uptime_from(text: str) -> dict:
+    seconds = float(text.split()[0])
+    days = int(seconds // 86400)
+    hours = int((seconds % 86400) // 3600)
+    minutes = int((seconds % 3600) // 60)
+    return {
+        "seconds": int(seconds),
+        "formatted": f"{days}d {hours}h {minutes}m" if days > 0 else f"{hours}h {minutes}m",
+    }
+
+
+def _wifi_from(text: str) -> int | None:
+    lines = text.splitlines()
+    if len(lines) >= 3:
+        return int(float(lines[2].split()[3]))
+    return None
+
+
 def get_network() -> dict | None:
     """Network information – IP address and hostname."""
     try:
@@ -133,10 +172,7 @@ def get_network() -> dict | None:
         wifi_signal = None
         try:
             with open("/proc/net/wireless") as f:
-                lines = f.readlines()
-                if len(lines) >= 3:
-                    parts = lines[2].split()
-                    wifi_signal = int(float(parts[3]))
+                wifi_signal = _wifi_from(f.read())
         except Exception:
             pass
 
@@ -196,17 +232,20 @@ def get_throttle_state() -> dict | None:
             capture_output=True, text=True, timeout=3,
         )
         # Output: "throttled=0x0"
-        hex_val = int(result.stdout.strip().split("=")[1], 16)
-        return {
-            "undervoltage_now": bool(hex_val & 0x1),
-            "throttled_now": bool(hex_val & 0x4),
-            "undervoltage_occurred": bool(hex_val & 0x10000),
-            "throttled_occurred": bool(hex_val & 0x40000),
-        }
+        return _throttle_from(int(result.stdout.strip().split("=")[1], 16))
     except Exception:
         return None
 
 
+def _throttle_from(hex_val: int) -> dict:
+    return {
+        "undervoltage_now": bool(hex_val & 0x1),
+        "throttled_now": bool(hex_val & 0x4),
+        "undervoltage_occurred": bool(hex_val & 0x10000),
+        "throttled_occurred": bool(hex_val & 0x40000),
+    }
+
+
 def collect_system_info() -> dict:
     """Collect all available system information."""
     from emp_scanner import VERSION
@@ -258,3 +297,183 @@ def collect_system_info() -> dict:
         info["throttle"] = throttle
 
     return info
+
+
+# ─── Background sampler ──────────────────────────────────────────────────────
+
+class RingBuffer:
+    """Fixed-size float ring (array-backed) with min/max/avg."""
+
+    def __init__(self, size: int = WINDOW_SAMPLES):
+        self._data = array("d", [0.0] * size)
+        self._size = size
+        self._next = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self.count = min(self.count + 1, self._size)
+
+    def stats(self) -> dict | None:
+        if not self.count:
+            return None
+        values = self._data[:self.count] if self.count < self._size else self._data
+        return {
+            "min": round(min(values), 1),
+            "max": round(max(values), 1),
+            "avg": round(sum(values) / self.count, 1),
+        }
+
+
+class _ProcFile:
+    """/proc or /sys file kept open; read() re-reads from offset 0 with pread."""
+
+    def __init__(self, path: str, size: int = 4096):
+        self.path = path
+        self.size = size
+        try:
+            self.fd: int | None = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+
+    def read(self) -> str | None:
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, self.size, 0).decode(errors="replace")
+        except OSError:
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SystemSampler:
+    """
+    sample() – fast /proc and /sys reads (every SAMPLE_INTERVAL, runs in the loop thread)
+    sample_slow() – vcgencmd, IP, disk (every SLOW_INTERVAL, blocking → IO pool)
+    snapshot() – copy of the last result, same keys as collect_system_info()
+                 plus "window": rolling min/max/avg
+    """
+
+    TRENDS = ("cpu_temp", "cpu_usage", "memory_percent", "wifi_signal_dbm")
+
+    def __init__(self, window: int = WINDOW_SAMPLES):
+        self.window = window
+        self._files = {
+            "stat": _ProcFile("/proc/stat", 512),
+            "meminfo": _ProcFile("/proc/meminfo"),
+            "uptime": _ProcFile("/proc/uptime", 128),
+            "temp": _ProcFile("/sys/class/thermal/thermal_zone0/temp", 64),
+            "freq": _ProcFile("/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq", 64),
+            "wireless": _ProcFile("/proc/net/wireless", 1024),
+            "throttled": _ProcFile(THROTTLE_SYSFS, 64),
+        }
+        self._rings = {name: RingBuffer(window) for name in self.TRENDS}
+        self._prev_cpu: list[int] | None = None
+        self._lock = threading.Lock()
+        self._static = self._collect_static()
+        self._fast: dict = {}
+        self._slow: dict = {}
+        self._snapshot: dict = dict(self._static)
+        self.sample()
+        self.sample_slow()
+
+    @staticmethod
+    def _collect_static() -> dict:
+        from emp_scanner import VERSION
+
+        info: dict = {"scanner_version": VERSION}
+        model = get_pi_model()
+        if model:
+            info["model"] = model
+        info["os"] = get_os_info()
+        return info
+
+    def sample(self):
+        fast: dict = {}
+        wifi = None
+        try:
+            text = self._files["temp"].read()
+            if text:
+                fast["cpu_temp"] = round(int(text.strip()) / 1000.0, 1)
+            text = self._files["stat"].read()
+            if text:
+                times = _cpu_times(text.split("\n", 1)[0])
+                if self._prev_cpu is not None:
+                    fast["cpu_usage"] = _cpu_percent(self._prev_cpu, times)
+                self._prev_cpu = times
+            text = self._files["freq"].read()
+            if text:
+                fast["cpu_freq_mhz"] = int(text.strip()) // 1000
+            text = self._files["meminfo"].read()
+            if text:
+                fast["memory"] = _memory_from(text)
+            text = self._files["uptime"].read()
+            if text:
+                fast["uptime"] = _uptime_from(text)
+            text = self._files["wireless"].read()
+            if text:
+                wifi = _wifi_from(text)
+            text = self._files["throttled"].read()
+            if text:
+                fast["throttle"] = _throttle_from(int(text.strip(), 16))
+        except Exception as e:
+            logger.debug("System-Sample fehlgeschlagen: %s", e)
+
+        values = {
+            "cpu_temp": fast.get("cpu_temp"),
+            "cpu_usage": fast.get("cpu_usage"),
+            "memory_percent": (fast.get("memory") or {}).get("percent"),
+            "wifi_signal_dbm": wifi,
+        }
+        with self._lock:
+            for name, value in values.items():
+                if value is not None:
+                    self._rings[name].add(float(value))
+            if wifi is not None and "network" in self._slow:
+                self._slow = dict(self._slow, network=dict(self._slow["network"], wifi_signal_dbm=wifi))
+            self._fast = fast
+            self._publish()
+
+    def sample_slow(self):
+        slow: dict = {}
+        gpu_temp = get_gpu_temp()
+        if gpu_temp is not None:
+            slow["gpu_temp"] = gpu_temp
+        if self._files["throttled"].fd is None:
+            throttle = get_throttle_state()
+            if throttle:
+                slow["throttle"] = throttle
+        disk = get_disk()
+        if disk:
+            slow["disk"] = disk
+        network = get_network()
+        if network:
+            slow["network"] = network
+        with self._lock:
+            self._slow = slow
+            self._publish()
+
+    def _publish(self):
+        snap = dict(self._static)
+        snap.update(self._slow)
+        snap.update(self._fast)
+        window = {"seconds": self.window * SAMPLE_INTERVAL}
+        for name, ring in self._rings.items():
+            stats = ring.stats()
+            if stats:
+                window[name] = stats
+        snap["window"] = window
+        self._snapshot = snap
+
+    def snapshot(self) -> dict:
+        """O(1) for the caller: the snapshot is prepared by the sampler."""
+        return dict(self._snapshot)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
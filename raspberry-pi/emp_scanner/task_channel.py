@@ -0,0 +1,80 @@
+"""
+Task channel – delivers pis_task / pis_active changes from the dashboard.
+
+poll  Standard: bedingtes Polling (ETag/If-None-Match → 304) im Abstand
+      task_poll_interval.
+push  Nur mit task_push: Long-Poll auf /api/devices/pi/events, der Server antwortet,
+      sobald sich die Konfiguration ändert (Latenz ≈ RTT + Prüfabstand am Server),
+      sonst nach ~20 s ohne Änderung. Hat der Server keinen Push-Endpunkt oder
+      scheitert der Long-Poll wiederholt, fällt der Kanal auf Polling zurück und
+      versucht Push regelmäßig erneut.
+
+push_once() und poll_once() sind Jobs des Schedulers (emp_scanner.scheduler):
+je ein Durchlauf (blockierend), False bei Fehlern → Backoff mit Jitter. Aktiv
+ist jeweils der Job des aktuellen Modus.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger("emp.tasks")
+
+PUSH = "push"
+POLL = "poll"
+
+PUSH_RETRY_AFTER = 600
+PUSH_MAX_ERRORS = 3
+
+
+class TaskChannel:
+    def __init__(self, api, on_config: Callable[[dict], None], poll_interval: int = 3, push: bool = False):
+        self.api = api
+        self.on_config = on_config
+        self.poll_interval = max(1, int(poll_interval))
+        self.push = push
+        self.mode = PUSH if push else POLL
+        self._cursor = ""
+        self._errors = 0
+        self._poll_since = 0.0
+
+    def push_once(self) -> bool:
+        """One long-poll round. False on a failed request."""
+        try:
+            data = self.api.wait_for_config(self._cursor)
+        except Exception as e:
+            logger.debug("Task-Kanal: %s", e)
+            data = None
+        if data is None:
+            self._errors += 1
+            if self._errors >= PUSH_MAX_ERRORS:
+                self._fallback("Long-Poll wiederholt fehlgeschlagen")
+            return False
+        if data.get("unsupported"):
+            self._fallback("Server ohne Push-Endpunkt")
+            return True
+        self._errors = 0
+        self._cursor = data.get("cursor", self._cursor)
+        if data.get("changed") and data.get("config"):
+            self.on_config(data["config"])
+        return True
+
+    def poll_once(self) -> bool:
+        """One conditional poll (fallback mode). False on a failed request."""
+        device_config = self.api.get_config()
+        if device_config:
+            self.on_config(device_config)
+        if self.push and time.monotonic() - self._poll_since >= PUSH_RETRY_AFTER:
+            logger.info("Task-Kanal: versuche erneut Push")
+            self.mode = PUSH
+            self._errors = 0
+        return device_config is not None
+
+    def _fallback(self, reason: str):
+        logger.info("Task-Kanal: %s – bedingtes Polling (Basis %d s)", reason, self.poll_interval)
+        self.mode = POLL
+        self._poll_since = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"mode": self.mode, "errors": self._errors}
@@ -0,0 +1,488 @@
+"""
+Local ticket store – SQLite mirror of the account's tickets for this device.
+Filled from GET /api/devices/pi/tickets (see sync.py), used for offline decisions
+when the server cannot be reached.
+
+Codes are looked up in a memory-mapped code index (code_index.py, rebuilt after
+snapshots) plus a small overlay of tickets changed since the last build; the
+ticket row itself is then a primary-key read. Without an index (first start,
+build failed) the lookup falls back to the SQLite code indexes.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from emp_scanner import code_index
+from emp_scanner.code_index import CodeIndex, normalize_code
+from emp_scanner.decision import evaluate, state_after_grant
+
+logger = logging.getLogger("emp.tickets")
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tickets.db")
+
+EPOCH_ISO = "1970-01-01T00:00:00.000Z"
+
+# Geänderte Tickets seit dem letzten Index-Build, ab denen neu gebaut wird
+INDEX_OVERLAY_MAX = 2000
+
+# Geräteeinstellungen, nach denen der Bestand entscheidet (pis_id: Freigaben je Gerät)
+STORE_DEVICE_KEYS = ("pis_id", "pis_in", "pis_out", "pis_again")
+
+COLUMNS = (
+    "id", "name", "qr_code", "rfid_code", "barcode", "uuid", "status",
+    "validity_type", "start_date", "end_date", "slot_start", "slot_end",
+    "duration_minutes", "first_scan_at", "access_area_id", "area_ids",
+    "source", "service_allow_reentry", "first_name", "last_name",
+    "version", "updated_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    qr_code TEXT,
+    rfid_code TEXT,
+    barcode TEXT,
+    uuid TEXT,
+    status TEXT,
+    validity_type TEXT,
+    start_date REAL,
+    end_date REAL,
+    slot_start TEXT,
+    slot_end TEXT,
+    duration_minutes INTEGER,
+    first_scan_at REAL,
+    access_area_id INTEGER,
+    area_ids TEXT,
+    source TEXT,
+    service_allow_reentry INTEGER,
+    first_name TEXT,
+    last_name TEXT,
+    version INTEGER,
+    updated_at REAL
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS tickets_qr ON tickets(qr_code);
+CREATE INDEX IF NOT EXISTS tickets_rfid ON tickets(rfid_code);
+CREATE INDEX IF NOT EXISTS tickets_barcode ON tickets(barcode);
+CREATE INDEX IF NOT EXISTS tickets_uuid ON tickets(uuid);
+"""
+
+LOOKUP_SQL = (
+    "SELECT * FROM tickets WHERE qr_code = ? OR rfid_code = ? OR barcode = ? OR uuid = ? LIMIT 1"
+)
+
+
+def parse_time(value) -> Optional[float]:
+    """ISO timestamp from the API (e.g. 2026-02-27T00:00:00.000Z) → epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def ticket_row(t: dict) -> tuple:
+    """API ticket (camelCase) → row tuple in COLUMNS order."""
+    return (
+        t["id"],
+        t.get("name"),
+        t.get("qrCode"),
+        t.get("rfidCode"),
+        t.get("barcode"),
+        t.get("uuid"),
+        t.get("status"),
+        t.get("validityType"),
+        parse_time(t.get("startDate")),
+        parse_time(t.get("endDate")),
+        t.get("slotStart"),
+        t.get("slotEnd"),
+        t.get("validityDurationMinutes"),
+        parse_time(t.get("firstScanAt")),
+        t.get("accessAreaId"),
+        ",".join(str(a) for a in t.get("areaIds") or []),
+        t.get("source"),
+        1 if t.get("serviceAllowReentry") else 0,
+        t.get("firstName"),
+        t.get("lastName"),
+        t.get("version"),
+        parse_time(t.get("updatedAt")),
+    )
+
+
+class TicketStore:
+    """
+    Thread-safe SQLite ticket mirror. Scans run in the scanner thread,
+    sync runs in a background thread – one connection, guarded by a lock.
+    """
+
+    def __init__(self, path: str = DB_PATH, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + ".idx"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA.format(table="tickets") + INDEXES + """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS index_dirty (seq INTEGER PRIMARY KEY AUTOINCREMENT, ticket_id INTEGER);
+        """)
+        columns = [r[1] for r in self._db.execute("PRAGMA table_info(granted)")]
+        if columns and "device_id" not in columns:
+            # Ältere Version: Freigaben ohne Gerät – verwerfen und per Snapshot je Gerät neu laden
+            logger.info("Freigaben jetzt je Gerät – voller Ticket-Snapshot beim nächsten Sync")
+            self._db.execute("DROP TABLE granted")
+            self._set_meta("cursor", None)
+            self._set_meta("snapshot", None)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS granted (
+                device_id INTEGER, ticket_id INTEGER, PRIMARY KEY (device_id, ticket_id))
+        """)
+        self._device = self._get_meta("device", {})
+        self.local_validation = bool(self._get_meta("local_validation", True))
+        self.synced_at = self._get_meta("synced_at", None)
+        self.snapshot_at = self._get_meta("snapshot_at", None)
+        self._cursor = self._get_meta("cursor", None)
+        self._index: Optional[CodeIndex] = None
+        self._dirty: dict[int, tuple] = {}
+        self._overlay: dict[str, set] = {}
+        if os.path.exists(self.index_path):
+            try:
+                self._index = CodeIndex(self.index_path)
+            except (OSError, ValueError) as e:
+                logger.warning("Code-Index nicht lesbar – Lookup über SQLite: %s", e)
+        self._load_overlay([r[0] for r in self._db.execute("SELECT DISTINCT ticket_id FROM index_dirty")])
+
+    # ─── Meta ─────────────────────────────────────────────────────────────────
+
+    def _get_meta(self, key: str, default):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    def set_device(self, device_config: dict):
+        """Übernimmt Gerät, Bereiche und Wiedereintritt aus der Geräteconfig (nur bei Änderung gespeichert)."""
+        device = {k: device_config.get(k) for k in STORE_DEVICE_KEYS}
+        if device == self._device:
+            return
+        areas_changed = any(device[k] != self._device.get(k) for k in ("pis_id", "pis_in", "pis_out"))
+        with self._lock:
+            self._device = device
+            self._set_meta("device", device)
+            if areas_changed and self._cursor is not None:
+                # Anderes Gerät oder anderer Bereich → anderer Ticketbestand: Cursor verwerfen, voller Snapshot
+                logger.info("Gerät oder Bereich geändert – voller Ticket-Snapshot beim nächsten Sync")
+                self._cursor = None
+                self._set_meta("cursor", None)
+                self._set_meta("snapshot", None)
+
+    def set_grant_devices(self, device_ids: Iterable[int]):
+        """
+        Geräte (Durchgänge), deren GRANTED-Scans der Sync lädt. Kommt ein Gerät
+        hinzu, fehlen seine älteren Freigaben – voller Snapshot beim nächsten Sync.
+        """
+        device_ids = sorted(set(device_ids))
+        with self._lock:
+            if self._get_meta("grant_devices", None) == device_ids:
+                return
+            self._set_meta("grant_devices", device_ids)
+            if self._cursor is not None:
+                logger.info("Geräte geändert – voller Ticket-Snapshot beim nächsten Sync")
+                self._cursor = None
+                self._set_meta("cursor", None)
+                self._set_meta("snapshot", None)
+
+    # ─── Lookup / decision ────────────────────────────────────────────────────
+
+    def lookup(self, code: str) -> Optional[dict]:
+        with self._lock:
+            return self._lookup(code)
+
+    def _lookup(self, code: str) -> Optional[dict]:
+        for c in normalize_code(code):
+            if self._index is not None:
+                row = self._lookup_indexed(c)
+            else:
+                row = self._db.execute(LOOKUP_SQL, (c, c, c, c)).fetchone()
+            if row:
+                ticket = dict(row)
+                ticket["area_ids"] = [int(a) for a in (ticket["area_ids"] or "").split(",") if a]
+                return ticket
+        return None
+
+    def _lookup_indexed(self, code: str) -> Optional[sqlite3.Row]:
+        ids = set(self._overlay.get(code, ()))
+        ids.update(i for i in self._index.get(code) if i not in self._dirty)
+        for ticket_id in sorted(ids):
+            row = self._db.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+            # Hash-Kollision oder Code inzwischen geändert → nächster Kandidat
+            if row and code in (row["qr_code"], row["rfid_code"], row["barcode"], row["uuid"]):
+                return row
+        return None
+
+    def serves(self, device: dict) -> bool:
+        """True if the mirror was synced for the same areas (another lane of this Pi)."""
+        return bool(device) and all(device.get(k) == self._device.get(k) for k in ("pis_in", "pis_out"))
+
+    def decide(self, code: str, now: float | None = None, device: Optional[dict] = None,
+               only: Optional[Callable[[dict], bool]] = None) -> Optional[dict]:
+        """
+        Offline decision for a scanned code. Applies the ticket state change
+        locally (REDEEMED, firstScanAt, Wiedereintritt) so repeated scans
+        during an outage behave like online. device overrides the synced
+        device settings (another lane with the same areas); the re-entry
+        check uses the GRANTED scans of device["pis_id"] only. only: a grant
+        for a ticket it rejects is not applied, None is returned instead
+        (optimistic grants, see optimistic.py).
+        """
+        if now is None:
+            now = time.time()
+        device = device or self._device
+        device_id = device.get("pis_id")
+        with self._lock:
+            ticket = self._lookup(code)
+            granted_here = False
+            if ticket is not None:
+                granted_here = self._db.execute(
+                    "SELECT 1 FROM granted WHERE device_id = ? AND ticket_id = ?", (device_id, ticket["id"])
+                ).fetchone() is not None
+            result = evaluate(ticket, device, granted_here, now)
+            if result["granted"] and only is not None and not only(ticket):
+                return None
+            if result["granted"] and ticket is not None:
+                update = state_after_grant(ticket, device, now)
+                if update:
+                    sets = ", ".join(f"{k} = ?" for k in update)
+                    self._db.execute(
+                        f"UPDATE tickets SET {sets} WHERE id = ?", (*update.values(), ticket["id"])
+                    )
+                self._db.execute(
+                    "INSERT OR IGNORE INTO granted (device_id, ticket_id) VALUES (?, ?)", (device_id, ticket["id"])
+                )
+        return result
+
+    # ─── Sync state ───────────────────────────────────────────────────────────
+
+    @property
+    def cursor(self) -> Optional[dict]:
+        """Delta-Sync-Cursor {"updatedAt", "id", "granted"}; None = voller Snapshot nötig."""
+        return self._cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+    def reset_cursor(self):
+        """Erzwingt beim nächsten Sync einen vollen Snapshot."""
+        with self._lock:
+            self._cursor = None
+            self._set_meta("cursor", None)
+
+    def apply_changes(self, tickets: list[dict], deleted: list[int],
+                      grants: list[tuple[int, int]], cursor: dict) -> int:
+        """
+        Eine Delta-Seite in einer Transaktion: Upserts, Tombstones, neue
+        Freigaben (Gerät, Ticket) an den Geräten dieses Pi und der neue Cursor.
+        Returns rows changed.
+        """
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        rows = [ticket_row(t) for t in tickets]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(f"INSERT OR REPLACE INTO tickets VALUES ({placeholders})", rows)
+                self._db.executemany("DELETE FROM tickets WHERE id = ?", [(i,) for i in deleted])
+                changed_ids = [r[0] for r in rows] + list(deleted)
+                self._db.executemany("INSERT INTO index_dirty (ticket_id) VALUES (?)", [(i,) for i in changed_ids])
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO granted (device_id, ticket_id) VALUES (?, ?)", [tuple(g) for g in grants]
+                )
+                self._cursor = cursor
+                self._set_meta("cursor", cursor)
+                self.synced_at = time.time()
+                self._set_meta("synced_at", self.synced_at)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._load_overlay(changed_ids)
+            rebuild = self._index is not None and len(self._dirty) > INDEX_OVERLAY_MAX
+        if rebuild:
+            self.rebuild_index()
+        return len(rows) + len(deleted)
+
+    # ─── Code index ───────────────────────────────────────────────────────────
+
+    def _load_overlay(self, ticket_ids: Iterable[int]):
+        """Aktuelle Codes geänderter Tickets ins Overlay (ersetzt ihre Einträge im Index)."""
+        for ticket_id in ticket_ids:
+            for c in self._dirty.get(ticket_id, ()):
+                self._overlay[c].discard(ticket_id)
+            row = self._db.execute(
+                "SELECT qr_code, rfid_code, barcode, uuid FROM tickets WHERE id = ?", (ticket_id,)
+            ).fetchone()
+            codes = tuple(c for c in row if c) if row else ()
+            self._dirty[ticket_id] = codes
+            for c in codes:
+                self._overlay.setdefault(c, set()).add(ticket_id)
+
+    def rebuild_index(self) -> bool:
+        """
+        Build a fresh code index from the tickets table and swap it in.
+        Changes committed during the build stay in the overlay.
+        """
+        with self._lock:
+            seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM index_dirty").fetchone()[0]
+        start = time.monotonic()
+        try:
+            entries = code_index.build(self.path, self.index_path)
+            index = CodeIndex(self.index_path)
+        except Exception as e:
+            logger.warning("Code-Index konnte nicht gebaut werden – Lookup über SQLite: %s", e)
+            return False
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+            self._index = index
+            self._db.execute("DELETE FROM index_dirty WHERE seq <= ?", (seq,))
+            self._dirty.clear()
+            self._overlay.clear()
+            self._load_overlay([r[0] for r in self._db.execute("SELECT DISTINCT ticket_id FROM index_dirty")])
+        logger.info("Code-Index: %d Codes in %.0f ms", entries, (time.monotonic() - start) * 1000)
+        return True
+
+    def ensure_index(self):
+        """Baut den Index, falls er fehlt (erster Start, Update von einer Version ohne Index)."""
+        if self._index is None and self.count():
+            self.rebuild_index()
+
+    # ─── Snapshot ─────────────────────────────────────────────────────────────
+
+    def snapshot_progress(self) -> Optional[dict]:
+        """Stand eines abgebrochenen Snapshots (weiter ab progress["after"]) oder None."""
+        with self._lock:
+            progress = self._get_meta("snapshot", None)
+            if progress is None:
+                return None
+            staged = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets_new'"
+            ).fetchone()
+        return progress if staged else None
+
+    def begin_snapshot(self, first: dict, grants: Iterable = ()) -> dict:
+        """
+        Start a full snapshot from its first page and the (device, ticket)
+        grants it lists. Pages go into a staging table; progress is kept in
+        meta, so an interrupted download resumes with the next page instead
+        of starting over.
+        """
+        progress = {
+            "after": 0,
+            "count": 0,
+            "total": first.get("total"),
+            "cursor": first.get("cursor"),
+            "granted_cursor": first.get("grantedCursor", 0),
+            "granted": [list(g) for g in grants],
+            "device": {k: first.get("device", {}).get(k) for k in STORE_DEVICE_KEYS},
+            "local_validation": first.get("localValidation", True),
+        }
+        with self._lock:
+            self._db.executescript(
+                "DROP TABLE IF EXISTS tickets_new;" + SCHEMA.format(table="tickets_new")
+            )
+            self._set_meta("snapshot", progress)
+        return progress
+
+    def add_snapshot_page(self, progress: dict, tickets: list[dict]):
+        """Seite in die Staging-Tabelle, Fortschritt in derselben Transaktion."""
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        rows = [ticket_row(t) for t in tickets]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(f"INSERT OR REPLACE INTO tickets_new VALUES ({placeholders})", rows)
+                if rows:
+                    progress["after"] = rows[-1][0]
+                    progress["count"] += len(rows)
+                self._set_meta("snapshot", progress)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def finish_snapshot(self, progress: dict) -> int:
+        """Swap staging → tickets in one transaction; the delta sync continues from the snapshot cursor."""
+        cursor = progress["cursor"] or {"updatedAt": EPOCH_ISO, "id": 0}
+        cursor = dict(cursor, granted=progress["granted_cursor"])
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM tickets")
+                self._db.execute("INSERT INTO tickets SELECT * FROM tickets_new")
+                self._db.execute("DELETE FROM granted")
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO granted (device_id, ticket_id) VALUES (?, ?)",
+                    [tuple(g) for g in progress["granted"]],
+                )
+                self._device = progress["device"]
+                self._set_meta("device", self._device)
+                self.local_validation = progress["local_validation"]
+                self._set_meta("local_validation", self.local_validation)
+                self._cursor = cursor
+                self._set_meta("cursor", cursor)
+                self.synced_at = self.snapshot_at = time.time()
+                self._set_meta("synced_at", self.synced_at)
+                self._set_meta("snapshot_at", self.snapshot_at)
+                self._set_meta("snapshot", None)
+                self._db.execute("DELETE FROM index_dirty")
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("DROP TABLE IF EXISTS tickets_new")
+            # Alter Index passt nicht mehr zum Bestand: bis zum Neubau über SQLite
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._dirty.clear()
+            self._overlay.clear()
+        self.rebuild_index()
+        return progress["count"]
+
+    def abort_snapshot(self):
+        with self._lock:
+            self._set_meta("snapshot", None)
+            self._db.execute("DROP TABLE IF EXISTS tickets_new")
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+        return {
+            "tickets": count,
+            "synced_at": int(self.synced_at) if self.synced_at else None,
+            "index": self._index.count if self._index is not None else None,
+            "overlay": len(self._dirty),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._db.close()
+
@@ -0,0 +1,79 @@
+import { NextRequest, NextResponse } from "next/server";
+import { validateApiToken } from "@/lib/api-auth";
+import { piConfigEtag, piDeviceConfig } from "@/lib/pi-config";
+
+export const maxDuration = 30;
+
+const MAX_WAIT_MS = 25_000;
+const CHECK_INTERVAL_MS = 2_000;
+
+const CONFIG_SELECT = {
+  id: true,
+  name: true,
+  type: true,
+  accessIn: true,
+  accessOut: true,
+  isActive: true,
+  task: true,
+  allowReentry: true,
+  firmware: true,
+  updatedAt: true,
+} as const;
+
+/**
+ * Long-Poll für Task-/Aktiv-Änderungen am Raspberry Pi (nur mit task_push am Pi,
+ * Standard ist bedingtes Polling von GET /api/devices/pi).
+ * ?id=<deviceId>&cursor=<letzter Stempel>&wait=<Sekunden>
+ * Antwortet sofort, wenn sich die Konfiguration gegenüber cursor geändert hat,
+ * sonst spätestens nach wait Sekunden mit changed: false.
+ * Kein Push aus der Datenbank: geprüft wird alle 2 s nur updatedAt des Geräts
+ * (Primärschlüssel, eine Spalte), die Config wird nur nach einer Änderung neu geladen.
+ */
+export async function GET(request: NextRequest) {
+  const auth = await validateApiToken(request);
+  if ("error" in auth) return auth.error;
+
+  const params = request.nextUrl.searchParams;
+  const deviceId = Number(params.get("id"));
+  if (!params.get("id") || isNaN(deviceId)) {
+    return NextResponse.json({ error: "Missing id parameter" }, { status: 400 });
+  }
+  const cursor = params.get("cursor") ?? "";
+  const wait = Math.min(Math.max(Number(params.get("wait") || "20") * 1000, 0), MAX_WAIT_MS);
+
+  const { db } = auth;
+  const started = Date.now();
+
+  let device = await db.device.findFirst({
+    where: { id: deviceId, type: "RASPBERRY_PI" },
+    select: CONFIG_SELECT,
+  });
+
+  while (true) {
+    if (!device) {
+      return NextResponse.json({ error: "Device not found" }, { status: 404 });
+    }
+    const config = piDeviceConfig(device);
+    const etag = piConfigEtag(config);
+    const waited = Date.now() - started;
+    if (etag !== cursor) {
+      return NextResponse.json({ changed: true, cursor: etag, config, waited });
+    }
+    if (waited + CHECK_INTERVAL_MS >= wait || request.signal.aborted) {
+      return NextResponse.json({ changed: false, cursor: etag, waited });
+    }
+    await new Promise((resolve) => setTimeout(resolve, CHECK_INTERVAL_MS));
+
+    const stamp = await db.device.findFirst({
+      where: { id: deviceId, type: "RASPBERRY_PI" },
+      select: { updatedAt: true },
+    });
+    // Heartbeats ändern updatedAt ebenfalls – der ETag-Vergleich oben filtert sie heraus
+    if (!stamp || stamp.updatedAt.getTime() !== device.updatedAt.getTime()) {
+      device = await db.device.findFirst({
+        where: { id: deviceId, type: "RASPBERRY_PI" },
+        select: CONFIG_SELECT,
+      });
+    }
+  }
+}
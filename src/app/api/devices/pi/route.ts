@@ -1,11 +1,22 @@
 import { NextRequest, NextResponse } from "next/server";
 import { validateApiToken } from "@/lib/api-auth";
-import { piStatusSchema } from "@/lib/validators";
+import type { tenantClient } from "@/lib/prisma";
+import { piHeartbeatSchema, piStatusSchema } from "@/lib/validators";
+import { piConfigEtag, piDeviceConfig } from "@/lib/pi-config";
+import { applyHeartbeat, readJsonBody } from "@/lib/pi-heartbeat";
+
+/** Höchstzahl Geräte je Gateway-Abfrage (?ids=) bzw. Heartbeats je Array */
+const MAX_BATCH = 100;
 
 export async function GET(request: NextRequest) {
   const auth = await validateApiToken(request);
   if ("error" in auth) return auth.error;
 
+  const ids = request.nextUrl.searchParams.get("ids");
+  if (ids) {
+    return gatewayConfigs(auth.db, ids);
+  }
+
   const piId = request.nextUrl.searchParams.get("id");
   if (!piId) {
     return NextResponse.json({ error: "Missing id parameter" }, { status: 400 });
@@ -20,24 +31,49 @@ export async function GET(request: NextRequest) {
     return NextResponse.json({ error: "Device not found" }, { status: 404 });
   }
 
-  return NextResponse.json({
-    pis_id: device.id,
-    pis_name: device.name,
-    pis_type: device.type,
-    pis_in: device.accessIn,
-    pis_out: device.accessOut,
-    pis_active: device.isActive ? 1 : 0,
-    pis_task: device.task,
-    pis_again: device.allowReentry ? 1 : 0,
-    pis_firmware: device.firmware,
-  });
+  const config = piDeviceConfig(device);
+  const etag = `"${piConfigEtag(config)}"`;
+  // Bedingtes Polling: unveränderte Konfiguration → 304 ohne Body
+  if (request.headers.get("if-none-match") === etag) {
+    return new NextResponse(null, { status: 304, headers: { ETag: etag } });
+  }
+
+  return NextResponse.json(config, { headers: { ETag: etag } });
 }
 
 export async function POST(request: NextRequest) {
   const auth = await validateApiToken(request);
   if ("error" in auth) return auth.error;
 
-  const body = await request.json();
+  let body: unknown;
+  try {
+    body = await readJsonBody(request);
+  } catch {
+    return NextResponse.json({ error: "Invalid body" }, { status: 400 });
+  }
+
+  if (!Array.isArray(body)) {
+    const { status, result } = await heartbeatV2(auth.db, body);
+    return NextResponse.json(result, { status });
+  }
+
+  // Gateway-Pi: Heartbeats v2 mehrerer Geräte in einem Aufruf, Antworten in derselben Reihenfolge
+  if (body.length && body.every((hb) => (hb as { v?: unknown } | null)?.v === 2)) {
+    if (body.length > MAX_BATCH) {
+      return NextResponse.json({ error: "Too many heartbeats" }, { status: 400 });
+    }
+    const results = [];
+    for (const hb of body) {
+      const { status, result } = await heartbeatV2(auth.db, hb);
+      results.push({
+        pis_id: (hb as { pis_id?: unknown }).pis_id,
+        ...(status === 200 ? {} : { status }),
+        ...result,
+      });
+    }
+    return NextResponse.json({ results });
+  }
+
   const parsed = piStatusSchema.safeParse(body);
   if (!parsed.success) {
     return NextResponse.json({ error: "Invalid body" }, { status: 400 });
@@ -71,3 +107,75 @@ export async function POST(request: NextRequest) {
 
   return NextResponse.json({ results });
 }
+
+type Db = ReturnType<typeof tenantClient>;
+
+/**
+ * Gateway-Pi: Konfigurationen mehrerer Geräte in einem Aufruf (?ids=1,2,3).
+ * Antwort {devices: [{id, config, etag}]} – unbekannte IDs fehlen.
+ */
+async function gatewayConfigs(db: Db, ids: string) {
+  const idList = [...new Set(ids.split(",").map(Number))].filter((id) => Number.isInteger(id) && id > 0);
+  if (!idList.length || idList.length > MAX_BATCH) {
+    return NextResponse.json({ error: "Invalid ids parameter" }, { status: 400 });
+  }
+  const devices = await db.device.findMany({
+    where: { id: { in: idList }, type: "RASPBERRY_PI" },
+  });
+  return NextResponse.json({
+    devices: devices.map((device) => {
+      const config = piDeviceConfig(device);
+      return { id: device.id, config, etag: piConfigEtag(config) };
+    }),
+  });
+}
+
+/**
+ * Heartbeat v2 (ein Objekt statt Array, optional gzip):
+ * system_info ist ein Merge-Patch gegen den zuletzt bestätigten Stand `base` (0 = vollständig).
+ * Antwort enthält die Gerätekonfiguration – der Pi braucht kein zusätzliches GET.
+ */
+async function heartbeatV2(db: Db, body: unknown): Promise<{ status: number; result: Record<string, unknown> }> {
+  const parsed = piHeartbeatSchema.safeParse(body);
+  if (!parsed.success) {
+    return { status: 400, result: { error: "Invalid body" } };
+  }
+  const hb = parsed.data;
+
+  const current = await db.device.findFirst({
+    where: { id: hb.pis_id, type: "RASPBERRY_PI" },
+    select: { task: true, systemInfo: true },
+  });
+  if (!current) {
+    return { status: 404, result: { error: "Device not found" } };
+  }
+
+  const data: Record<string, unknown> = {
+    lastUpdate: new Date(hb.pis_update * 1000),
+  };
+  const systemInfo = applyHeartbeat(current.systemInfo, hb);
+  if (systemInfo) {
+    data.systemInfo = systemInfo;
+  }
+  // Wie v1: Task 1 (Einmal öffnen) zurücksetzen, wenn der Pi pis_task: 0 bestätigt
+  if (current.task === 1 && hb.pis_task === 0) {
+    data.task = 0;
+  }
+  await db.device.updateMany({
+    where: { id: hb.pis_id, type: "RASPBERRY_PI" },
+    data,
+  });
+
+  const device = await db.device.findFirst({
+    where: { id: hb.pis_id, type: "RASPBERRY_PI" },
+  });
+  const config = device ? piDeviceConfig(device) : null;
+  return {
+    status: 200,
+    result: {
+      ...(systemInfo ? { ack: hb.seq } : { resync: true }),
+      config,
+      etag: config ? piConfigEtag(config) : null,
+    },
+  };
+}
@@ -234,6 +234,7 @@ export async function POST(request: NextRequest) {
     granted: true,
     message: "Zutritt gewährt",
     ticket: {
+      id: ticket.id,
       name: ticket.name,
       firstName: ticket.firstName,
       lastName: ticket.lastName,
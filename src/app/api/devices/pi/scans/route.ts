@@ -0,0 +1,120 @@
+import { NextRequest, NextResponse } from "next/server";
+import { validateApiToken } from "@/lib/api-auth";
+import { piScanBatchSchema } from "@/lib/validators";
+
+/**
+ * Platzhalter-Codes vom Raspberry Pi: Dashboard-Öffnung, Tür-Ereignisse (Türkontakt/Ausgangstaster)
+ * und optimistische Freigaben, denen der Server nachträglich widersprochen hat
+ */
+const EVENT_CODES = new Map<string, string>([
+  ["__DASHBOARD_OPEN__", "Dashboard-Öffnung"],
+  ["__EXIT_BUTTON__", "Ausgangstaster"],
+  ["__DOOR_TAILGATE__", "Mehrfachdurchgang"],
+  ["__DOOR_FORCED__", "Tür ohne Freigabe geöffnet"],
+  ["__OPTIMISTIC_MISMATCH__", "Optimistische Freigabe widerrufen"],
+]);
+
+/**
+ * Batch-Upload offline erfasster Scans vom Raspberry Pi.
+ * Jeder Scan trägt einen Idempotenz-Schlüssel – wiederholte Batches legen keine doppelten Scans an.
+ * Offline gewährte Tickets durchlaufen dieselben Übergänge wie in /api/devices/pi/scan
+ * (VALID → REDEEMED, Ausgangsscan mit Wiedereinlass REDEEMED → VALID). Ticket-IDs des Pi zählen
+ * nur, wenn das Ticket zum Konto gehört.
+ */
+export async function POST(request: NextRequest) {
+  const auth = await validateApiToken(request);
+  if ("error" in auth) return auth.error;
+
+  const body = await request.json();
+  const parsed = piScanBatchSchema.safeParse(body);
+  if (!parsed.success) {
+    return NextResponse.json({ error: "Invalid body" }, { status: 400 });
+  }
+
+  const { db } = auth;
+  const accountId = auth.account.id;
+  const { deviceId, scans } = parsed.data;
+
+  const device = await db.device.findFirst({
+    where: { id: deviceId, accountId, type: "RASPBERRY_PI" },
+    select: { id: true, accessOut: true },
+  });
+  if (!device) return NextResponse.json({ error: "Device not found" }, { status: 404 });
+
+  const keyOf = (key: string) => `${deviceId}:${key}`;
+  const existing = await db.scan.findMany({
+    where: { clientKey: { in: scans.map((s) => keyOf(s.key)) } },
+    select: { clientKey: true },
+  });
+  const seen = new Set(existing.map((s) => s.clientKey));
+  const fresh = scans.filter((s) => !seen.has(keyOf(s.key)));
+
+  const ticketIds = [...new Set(fresh.map((s) => s.ticketId).filter((id): id is number => !!id))];
+  const tickets = ticketIds.length
+    ? await db.ticket.findMany({
+        where: { id: { in: ticketIds }, accountId },
+        select: {
+          id: true,
+          status: true,
+          validityType: true,
+          firstScanAt: true,
+          source: true,
+          accessAreaId: true,
+          service: { select: { allowReentry: true } },
+        },
+      })
+    : [];
+  const ticketById = new Map(tickets.map((t) => [t.id, t]));
+
+  if (fresh.length) {
+    await db.scan.createMany({
+      data: fresh.map((s) => ({
+        code: EVENT_CODES.get(s.code) ?? s.code,
+        deviceId,
+        scanTime: new Date(s.ts * 1000),
+        result: s.result,
+        ticketId: s.ticketId && ticketById.has(s.ticketId) ? s.ticketId : null,
+        clientKey: keyOf(s.key),
+        accountId,
+      })),
+      skipDuplicates: true,
+    });
+  }
+
+  // Offline gewährte Scans je Ticket in Scan-Reihenfolge nachspielen (wie die Online-Prüfung)
+  const grants = fresh
+    .filter((s) => s.result === "GRANTED" && s.ticketId && ticketById.has(s.ticketId))
+    .sort((a, b) => a.ts - b.ts);
+  const updates = new Map<number, Record<string, unknown>>();
+  for (const s of grants) {
+    const ticket = ticketById.get(s.ticketId!)!;
+    const isEmployee = ticket.source === "EMP_CONTROL";
+    const vType = ticket.validityType ?? "DATE_RANGE";
+    const isExitScan = device.accessOut != null && ticket.accessAreaId === device.accessOut;
+    const updateData: Record<string, unknown> = {};
+    if (ticket.status === "VALID" && !isEmployee) {
+      updateData.status = "REDEEMED";
+      if (vType === "DURATION" && !ticket.firstScanAt) {
+        updateData.firstScanAt = new Date(s.ts * 1000);
+      }
+    } else if (ticket.status === "REDEEMED" && isExitScan && ticket.service?.allowReentry) {
+      // Ausgangsscan + Service erlaubt Wiedereinlass: Gültigkeit zurücksetzen
+      updateData.status = "VALID";
+      if (vType === "DURATION") {
+        updateData.firstScanAt = null;
+      }
+    } else {
+      continue;
+    }
+    Object.assign(ticket, updateData);
+    updates.set(ticket.id, { ...updates.get(ticket.id), ...updateData });
+  }
+  for (const [id, data] of updates) {
+    await db.ticket.update({ where: { id }, data });
+  }
+
+  return NextResponse.json({
+    inserted: fresh.length,
+    duplicates: scans.length - fresh.length,
+  });
+}
@@ -0,0 +1,206 @@
+import { NextRequest, NextResponse } from "next/server";
+import type { Prisma } from "@prisma/client";
+import { validateApiToken } from "@/lib/api-auth";
+import { isBinarytecConfigured } from "@/lib/binarytec";
+
+const MAX_PAGE = 5000;
+
+const TICKET_SELECT = {
+  id: true,
+  name: true,
+  qrCode: true,
+  rfidCode: true,
+  barcode: true,
+  uuid: true,
+  status: true,
+  validityType: true,
+  startDate: true,
+  endDate: true,
+  slotStart: true,
+  slotEnd: true,
+  validityDurationMinutes: true,
+  firstScanAt: true,
+  accessAreaId: true,
+  source: true,
+  firstName: true,
+  lastName: true,
+  version: true,
+  updatedAt: true,
+  service: { select: { allowReentry: true } },
+  ticketAreas: { select: { accessAreaId: true } },
+} as const;
+
+/**
+ * Ticketbestand für die Offline-Prüfung auf dem Raspberry Pi.
+ * Enthält nur Tickets, die an diesem Gerät gelten können (Bereich passt oder kein Bereich)
+ * und nicht INVALID sind.
+ *
+ * Snapshot:  ?id=<deviceId>&after=<letzte ID>&limit=<n>  – seitenweise nach ID.
+ *            Die erste Seite liefert zusätzlich Gerätedaten, Wiedereintritts-Status, Anzahl
+ *            und den Sync-Cursor zum Zeitpunkt des Snapshots.
+ * Delta:     ?id=<deviceId>&since=<updatedAt>&sinceId=<id>&grantedAfter=<Scan-ID>&limit=<n>
+ *            – alle seit dem Cursor geänderten Tickets des Mandanten, nach (updatedAt, id).
+ *            Nicht (mehr) relevante Tickets kommen als Tombstone in `deleted`.
+ *            Gelöschte Tickets erkennt der Pi an `total` (nur auf der letzten Seite).
+ * Freigaben: `grantedScans` ({deviceId, ticketId}) für dieses Gerät und die weiteren Durchgänge
+ *            des Pi (?devices=<id>,<id>) – der Wiedereintritt gilt je Gerät.
+ *            `grantedTicketIds` (nur dieses Gerät) für ältere Pis.
+ *            Nur Scans von Tickets, die hier noch gelten können (relevant, nicht abgelaufen),
+ *            seitenweise nach Scan-ID: bei `grantedHasMore` holt der Pi den Rest per Delta
+ *            ab `grantedCursor`.
+ */
+export async function GET(request: NextRequest) {
+  const auth = await validateApiToken(request);
+  if ("error" in auth) return auth.error;
+
+  const params = request.nextUrl.searchParams;
+  const deviceId = Number(params.get("id"));
+  if (!params.get("id") || isNaN(deviceId)) {
+    return NextResponse.json({ error: "Missing id parameter" }, { status: 400 });
+  }
+  const after = Number(params.get("after") || "0");
+  const limit = Math.min(Number(params.get("limit") || "2000"), MAX_PAGE);
+  const since = params.get("since");
+
+  const { db } = auth;
+  const accountId = auth.account.id;
+
+  const device = await db.device.findFirst({
+    where: { id: deviceId, accountId, type: "RASPBERRY_PI" },
+  });
+  if (!device) return NextResponse.json({ error: "Device not found" }, { status: 404 });
+
+  const deviceAreas = [device.accessIn, device.accessOut].filter(Boolean) as number[];
+  const areaFilter = deviceAreas.length
+    ? {
+        OR: [
+          { accessAreaId: { in: deviceAreas } },
+          { ticketAreas: { some: { accessAreaId: { in: deviceAreas } } } },
+          { accessAreaId: null, ticketAreas: { none: {} } },
+        ],
+      }
+    : {};
+  const relevantWhere = { accountId, status: { not: "INVALID" as const }, ...areaFilter };
+
+  type Row = Prisma.TicketGetPayload<{ select: typeof TICKET_SELECT }>;
+  const toApi = ({ service, ticketAreas, ...t }: Row) => ({
+    ...t,
+    serviceAllowReentry: service?.allowReentry ?? false,
+    areaIds: ticketAreas.map((ta) => ta.accessAreaId),
+  });
+  const isRelevant = (t: Row) =>
+    t.status !== "INVALID" &&
+    (!deviceAreas.length ||
+      (t.accessAreaId != null && deviceAreas.includes(t.accessAreaId)) ||
+      t.ticketAreas.some((ta) => deviceAreas.includes(ta.accessAreaId)) ||
+      (t.accessAreaId == null && t.ticketAreas.length === 0));
+
+  // Weitere Durchgänge desselben Pi – nur Geräte dieses Kontos
+  const laneIds = (params.get("devices") || "")
+    .split(",")
+    .map(Number)
+    .filter((id) => id && !isNaN(id) && id !== deviceId);
+  const lanes = laneIds.length
+    ? await db.device.findMany({
+        where: { id: { in: laneIds }, accountId, type: "RASPBERRY_PI" },
+        select: { id: true },
+      })
+    : [];
+  const grantDevices = [deviceId, ...lanes.map((d) => d.id)];
+
+  const grantedSince = async (afterScanId: number) => {
+    const scans = await db.scan.findMany({
+      where: {
+        deviceId: { in: grantDevices },
+        result: "GRANTED",
+        id: { gt: afterScanId },
+        ticket: {
+          is: { AND: [relevantWhere, { OR: [{ endDate: null }, { endDate: { gte: new Date() } }] }] },
+        },
+      },
+      orderBy: { id: "asc" },
+      take: limit,
+      select: { id: true, deviceId: true, ticketId: true },
+    });
+    const pairs = new Map(scans.map((s) => [`${s.deviceId}:${s.ticketId}`, s]));
+    return {
+      grantedScans: [...pairs.values()].map((s) => ({ deviceId: s.deviceId, ticketId: s.ticketId })),
+      grantedTicketIds: [...new Set(scans.filter((s) => s.deviceId === deviceId).map((s) => s.ticketId))],
+      grantedCursor: scans.length ? scans[scans.length - 1].id : afterScanId,
+      grantedHasMore: scans.length === limit,
+    };
+  };
+
+  if (since) {
+    const sinceDate = new Date(since);
+    const sinceId = Number(params.get("sinceId") || "0");
+    if (isNaN(sinceDate.getTime())) {
+      return NextResponse.json({ error: "Invalid since parameter" }, { status: 400 });
+    }
+    const changed = await db.ticket.findMany({
+      where: {
+        accountId,
+        OR: [{ updatedAt: { gt: sinceDate } }, { updatedAt: sinceDate, id: { gt: sinceId } }],
+      },
+      orderBy: [{ updatedAt: "asc" }, { id: "asc" }],
+      take: limit,
+      select: TICKET_SELECT,
+    });
+    const last = changed[changed.length - 1];
+    const hasMore = changed.length === limit;
+    const body: Record<string, unknown> = {
+      tickets: changed.filter(isRelevant).map(toApi),
+      deleted: changed.filter((t) => !isRelevant(t)).map((t) => t.id),
+      cursor: last ? { updatedAt: last.updatedAt, id: last.id } : { updatedAt: sinceDate, id: sinceId },
+      hasMore,
+      ...(await grantedSince(Number(params.get("grantedAfter") || "0"))),
+    };
+    if (!hasMore) {
+      body.total = await db.ticket.count({ where: relevantWhere });
+    }
+    return NextResponse.json(body);
+  }
+
+  // Cursor vor dem Lesen der Seiten: Änderungen während des Snapshots holt der nächste Delta-Sync
+  const newest = !after
+    ? await db.ticket.findFirst({
+        where: { accountId },
+        orderBy: [{ updatedAt: "desc" }, { id: "desc" }],
+        select: { id: true, updatedAt: true },
+      })
+    : null;
+
+  const tickets = await db.ticket.findMany({
+    where: { ...relevantWhere, id: { gt: isNaN(after) ? 0 : after } },
+    orderBy: { id: "asc" },
+    take: limit,
+    select: TICKET_SELECT,
+  });
+
+  const body: Record<string, unknown> = {
+    tickets: tickets.map(toApi),
+  };
+
+  // Gerätedaten, Wiedereintritts-Status und Sync-Cursor nur mit der ersten Seite
+  if (!after) {
+    const { grantedScans, grantedTicketIds, grantedCursor, grantedHasMore } = await grantedSince(0);
+    body.cursor = newest ? { updatedAt: newest.updatedAt, id: newest.id } : null;
+    body.grantedCursor = grantedCursor;
+    body.grantedHasMore = grantedHasMore;
+    body.total = await db.ticket.count({ where: relevantWhere });
+    body.device = {
+      pis_id: device.id,
+      pis_in: device.accessIn,
+      pis_out: device.accessOut,
+      pis_again: device.allowReentry ? 1 : 0,
+    };
+    body.grantedScans = grantedScans;
+    body.grantedTicketIds = grantedTicketIds;
+    body.localValidation = !(await isBinarytecConfigured(
+      db as Parameters<typeof isBinarytecConfigured>[0],
+      accountId
+    ));
+  }
+
+  return NextResponse.json(body);
+}
@@ -18,6 +18,26 @@ type DbWithApiConfig = {
 
 export type BinarytecCheckResult = { valid: true } | { valid: false } | null;
 
+async function loadBinarytecConfig(db: DbWithApiConfig, accountId: number) {
+  const config = await db.apiConfig.findFirst({
+    where: { accountId, provider: "BINARYTEC" },
+  });
+  if (!config?.token?.trim() || !config.baseUrl?.trim()) return null;
+
+  const extraConfig = config.extraConfig ? JSON.parse(config.extraConfig) : {};
+  const resourceId = extraConfig.resourceId ?? extraConfig.resource_id;
+  if (resourceId == null || String(resourceId).trim() === "") return null;
+
+  return { config: { ...config, baseUrl: config.baseUrl }, resourceId };
+}
+
+/**
+ * True, wenn Binarytec die Ticketprüfung übernimmt (dann keine lokale Prüfung auf dem Pi).
+ */
+export async function isBinarytecConfigured(db: DbWithApiConfig, accountId: number): Promise<boolean> {
+  return (await loadBinarytecConfig(db, accountId)) !== null;
+}
+
 /**
  * Prüft bei Binarytec, ob der Scan-Code (acNumber) an der Ressource (resourceId) Zutritt hat.
  * @returns { valid: true } wenn gültig, { valid: false } wenn ungültig, null wenn nicht konfiguriert oder resourceId fehlt
@@ -27,14 +47,9 @@ export async function checkBinarytec(
   accountId: number,
   scan: string
 ): Promise<BinarytecCheckResult> {
-  const config = await db.apiConfig.findFirst({
-    where: { accountId, provider: "BINARYTEC" },
-  });
-  if (!config?.token?.trim() || !config.baseUrl?.trim()) return null;
-
-  const extraConfig = config.extraConfig ? JSON.parse(config.extraConfig) : {};
-  const resourceId = extraConfig.resourceId ?? extraConfig.resource_id;
-  if (resourceId == null || String(resourceId).trim() === "") return null;
+  const binarytec = await loadBinarytecConfig(db, accountId);
+  if (!binarytec) return null;
+  const { config, resourceId } = binarytec;
 
   const baseUrl = config.baseUrl.replace(/\/$/, "");
   const url = `${baseUrl}/api/v1/raspi/access-controls/check-access`;
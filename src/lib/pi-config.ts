@@ -0,0 +1,36 @@
+import { createHash } from "crypto";
+
+type PiDevice = {
+  id: number;
+  name: string;
+  type: string;
+  accessIn: number | null;
+  accessOut: number | null;
+  isActive: boolean;
+  task: number;
+  allowReentry: boolean;
+  firmware: string | null;
+};
+
+/** Gerätekonfiguration im Format des Pi-Clients (GET /api/devices/pi). */
+export function piDeviceConfig(device: PiDevice) {
+  return {
+    pis_id: device.id,
+    pis_name: device.name,
+    pis_type: device.type,
+    pis_in: device.accessIn,
+    pis_out: device.accessOut,
+    pis_active: device.isActive ? 1 : 0,
+    pis_task: device.task,
+    pis_again: device.allowReentry ? 1 : 0,
+    pis_firmware: device.firmware,
+  };
+}
+
+/**
+ * Stabiler Versionsstempel der Konfiguration – dient als ETag und als Cursor im Long-Poll.
+ * Ändert sich nur, wenn sich die für den Pi relevanten Felder ändern (nicht bei jedem Heartbeat).
+ */
+export function piConfigEtag(config: ReturnType<typeof piDeviceConfig>): string {
+  return createHash("sha1").update(JSON.stringify(config)).digest("hex").slice(0, 16);
+}
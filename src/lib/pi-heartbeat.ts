@@ -0,0 +1,48 @@
+import { gunzipSync } from "zlib";
+import type { NextRequest } from "next/server";
+
+type JsonObject = Record<string, unknown>;
+
+function isObject(value: unknown): value is JsonObject {
+  return typeof value === "object" && value !== null && !Array.isArray(value);
+}
+
+/** JSON-Body lesen – gzip-komprimiert (Content-Encoding oder Magic Bytes) oder unkomprimiert. */
+export async function readJsonBody(request: NextRequest): Promise<unknown> {
+  const raw = Buffer.from(await request.arrayBuffer());
+  const gzipped =
+    request.headers.get("content-encoding")?.toLowerCase() === "gzip" ||
+    (raw.length > 2 && raw[0] === 0x1f && raw[1] === 0x8b);
+  return JSON.parse((gzipped ? gunzipSync(raw) : raw).toString("utf8"));
+}
+
+/** JSON Merge Patch (RFC 7386): Objekte rekursiv zusammenführen, null löscht den Schlüssel. */
+export function mergePatch(target: unknown, patch: unknown): unknown {
+  if (!isObject(patch)) return patch;
+  const result: JsonObject = isObject(target) ? { ...target } : {};
+  for (const [key, value] of Object.entries(patch)) {
+    if (value === null) delete result[key];
+    else result[key] = mergePatch(result[key], value);
+  }
+  return result;
+}
+
+/**
+ * Wendet einen Heartbeat-v2 auf die gespeicherte systemInfo an.
+ * Der bestätigte Stand wird in systemInfo.heartbeat = { boot, seq } vermerkt.
+ * null = Basis passt nicht (z. B. Stand zurückgesetzt, Antwort verloren) → Pi muss komplett senden.
+ */
+export function applyHeartbeat(
+  stored: unknown,
+  hb: { boot: string; seq: number; base: number; system_info?: JsonObject }
+): JsonObject | null {
+  let next: unknown;
+  if (hb.base === 0) {
+    next = hb.system_info ?? {};
+  } else {
+    const marker = isObject(stored) && isObject(stored.heartbeat) ? stored.heartbeat : null;
+    if (!marker || marker.boot !== hb.boot || marker.seq !== hb.base) return null;
+    next = mergePatch(stored, hb.system_info ?? {});
+  }
+  return { ...(next as JsonObject), heartbeat: { boot: hb.boot, seq: hb.seq } };
+}
@@ -28,6 +28,33 @@ export const piStatusSchema = z.array(
   })
 );
 
+/** Heartbeat v2: system_info als JSON-Merge-Patch gegen den vom Server bestätigten Stand `base`. */
+export const piHeartbeatSchema = z.object({
+  v: z.literal(2),
+  pis_id: z.coerce.number().int(),
+  pis_task: z.coerce.number().int(),
+  pis_update: z.coerce.number().int(),
+  boot: z.string().min(1).max(64),
+  seq: z.number().int().positive(),
+  base: z.number().int().min(0),
+  system_info: z.record(z.string(), z.unknown()).optional(),
+});
+
+export const piScanBatchSchema = z.object({
+  deviceId: z.coerce.number().int(),
+  scans: z
+    .array(
+      z.object({
+        key: z.string().min(1).max(64),
+        code: z.string().min(1),
+        ts: z.coerce.number(),
+        result: z.enum(["GRANTED", "DENIED", "PROTECTED"]),
+        ticketId: z.coerce.number().int().optional().nullable(),
+      })
+    )
+    .max(500),
+});
+
 export const ticketCreateSchema = z.object({
   name: z.string().min(1),
   qrCode: z.string().optional().nullable(),